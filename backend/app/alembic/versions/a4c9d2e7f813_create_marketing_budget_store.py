@@ -0,0 +1,159 @@
+"""Create long-format marketing budget store
+
+Revision ID: a4c9d2e7f813
+Revises: e2f8c61b5a47
+Create Date: 2026-10-17 14:05:31.208417
+
+"""
+import re
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c9d2e7f813'
+down_revision = 'e2f8c61b5a47'
+branch_labels = None
+depends_on = None
+
+# Suffixes of the per-project presupuesto_mercadeo_<project>_<suffix> tables, longest first
+_SUFFIXES = {
+    'gastos_casa_modelo': 'gastos_casa_modelo',
+    'gastos_publicitarios': 'gastos_publicitarios',
+    'promociones_y_bonos': 'promociones_y_bonos',
+    'promociones_bonos': 'promociones_y_bonos',
+    'gastos_tramites': 'gastos_tramites',
+    'redes_sociales': 'redes_sociales',
+    'ferias_eventos': 'feria_eventos',
+    'feria_eventos': 'feria_eventos',
+    'casa_modelo': 'casa_modelo',
+}
+_AMOUNT_COLUMN_RE = re.compile(r'^amount_(?:amount_)?(\d{4})_(\d{2})$')
+
+
+def _parse_table_name(table_name):
+    rest = table_name[len('presupuesto_mercadeo_'):]
+    for suffix in sorted(_SUFFIXES, key=len, reverse=True):
+        if rest.endswith('_' + suffix) and len(rest) > len(suffix) + 1:
+            return rest[:-(len(suffix) + 1)], _SUFFIXES[suffix]
+    return None
+
+
+def _backfill_from_wide_tables(bind):
+    """Copy the concepts and non-zero amounts of the amount_YYYY_MM tables into the store"""
+    inspector = sa.inspect(bind)
+    lineas = sa.table(
+        'mercadeo_presupuesto_lineas',
+        sa.column('id', sa.Integer), sa.column('proyecto', sa.String), sa.column('categoria', sa.String),
+        sa.column('concepto', sa.String), sa.column('created_at', sa.DateTime), sa.column('updated_at', sa.DateTime),
+    )
+    montos = sa.table(
+        'mercadeo_presupuesto_montos',
+        sa.column('linea_id', sa.Integer), sa.column('proyecto', sa.String), sa.column('categoria', sa.String),
+        sa.column('periodo', sa.Date), sa.column('monto', sa.Numeric),
+    )
+
+    for table_name in sorted(inspector.get_table_names()):
+        if not table_name.startswith('presupuesto_mercadeo_'):
+            continue
+        parsed = _parse_table_name(table_name)
+        if parsed is None:
+            continue
+        proyecto, categoria = parsed
+
+        columns = [column['name'] for column in inspector.get_columns(table_name)]
+        concept_column = next((c for c in ('concepto', 'CONCEPTO', 'actividad') if c in columns), None)
+        amount_columns = {}
+        for column in columns:
+            match = _AMOUNT_COLUMN_RE.match(column)
+            if match and 1 <= int(match.group(2)) <= 12:
+                amount_columns[column] = date(int(match.group(1)), int(match.group(2)), 1)
+        # Month-name tables (enero..diciembre) have no calendar period and are left as they are
+        if concept_column is None or not amount_columns:
+            continue
+
+        selected = [concept_column] + list(amount_columns)
+        order = 'id' if 'id' in columns else concept_column
+        rows = bind.execute(sa.text(
+            'SELECT {} FROM "{}" ORDER BY "{}"'.format(', '.join('"{}"'.format(c) for c in selected), table_name, order)
+        )).fetchall()
+
+        for row in rows:
+            linea_id = bind.execute(
+                lineas.insert().values(
+                    proyecto=proyecto, categoria=categoria, concepto=row[0] or 'Sin Concepto',
+                    created_at=sa.func.now(), updated_at=sa.func.now(),
+                ).returning(lineas.c.id)
+            ).scalar()
+            amounts = {}
+            for column, value in zip(selected[1:], row[1:]):
+                if value:
+                    periodo = amount_columns[column]
+                    amounts[periodo] = amounts.get(periodo, 0) + value
+            if amounts:
+                bind.execute(montos.insert(), [
+                    {'linea_id': linea_id, 'proyecto': proyecto, 'categoria': categoria, 'periodo': periodo, 'monto': monto}
+                    for periodo, monto in amounts.items()
+                ])
+
+
+def upgrade():
+    op.create_table(
+        'mercadeo_presupuesto_lineas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('proyecto', sa.String(), nullable=False),
+        sa.Column('categoria', sa.String(length=64), nullable=False),
+        sa.Column('concepto', sa.String(length=255), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_mercadeo_presupuesto_lineas_id'), 'mercadeo_presupuesto_lineas', ['id'], unique=False)
+    op.create_index(
+        'ix_mercadeo_presupuesto_lineas_proyecto_categoria',
+        'mercadeo_presupuesto_lineas',
+        ['proyecto', 'categoria'],
+        unique=False
+    )
+
+    op.create_table(
+        'mercadeo_presupuesto_montos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('linea_id', sa.Integer(), nullable=False),
+        sa.Column('proyecto', sa.String(), nullable=False),
+        sa.Column('categoria', sa.String(length=64), nullable=False),
+        sa.Column('periodo', sa.Date(), nullable=False),
+        sa.Column('monto', sa.Numeric(precision=15, scale=2), nullable=False),
+        sa.ForeignKeyConstraint(['linea_id'], ['mercadeo_presupuesto_lineas.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_mercadeo_presupuesto_montos_id'), 'mercadeo_presupuesto_montos', ['id'], unique=False)
+    op.create_index(
+        'ux_mercadeo_presupuesto_montos_linea_periodo',
+        'mercadeo_presupuesto_montos',
+        ['linea_id', 'periodo'],
+        unique=True
+    )
+    op.create_index(
+        'ix_mercadeo_presupuesto_montos_proyecto_categoria_periodo',
+        'mercadeo_presupuesto_montos',
+        ['proyecto', 'categoria', 'periodo'],
+        unique=False
+    )
+    op.create_index('ix_mercadeo_presupuesto_montos_periodo', 'mercadeo_presupuesto_montos', ['periodo'], unique=False)
+
+    # The wide per-project tables are kept; their data is copied once into the store
+    _backfill_from_wide_tables(op.get_bind())
+
+
+def downgrade():
+    op.drop_index('ix_mercadeo_presupuesto_montos_periodo', table_name='mercadeo_presupuesto_montos')
+    op.drop_index('ix_mercadeo_presupuesto_montos_proyecto_categoria_periodo', table_name='mercadeo_presupuesto_montos')
+    op.drop_index('ux_mercadeo_presupuesto_montos_linea_periodo', table_name='mercadeo_presupuesto_montos')
+    op.drop_index(op.f('ix_mercadeo_presupuesto_montos_id'), table_name='mercadeo_presupuesto_montos')
+    op.drop_table('mercadeo_presupuesto_montos')
+    op.drop_index('ix_mercadeo_presupuesto_lineas_proyecto_categoria', table_name='mercadeo_presupuesto_lineas')
+    op.drop_index(op.f('ix_mercadeo_presupuesto_lineas_id'), table_name='mercadeo_presupuesto_lineas')
+    op.drop_table('mercadeo_presupuesto_lineas')
@@ -0,0 +1,52 @@
+"""Add summary columns to sales_projections
+
+Revision ID: a8e3f5c2d619
+Revises: f1c6a9d3b724
+Create Date: 2026-10-17 21:47:13.082651
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8e3f5c2d619'
+down_revision = 'f1c6a9d3b724'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sales_projections', sa.Column('total_revenue', sa.Numeric(precision=18, scale=2), nullable=True))
+    op.add_column('sales_projections', sa.Column('total_units', sa.Integer(), nullable=True))
+    op.add_column('sales_projections', sa.Column('duration_months', sa.Integer(), nullable=True))
+    op.create_index(
+        'ix_sales_projections_project_created', 'sales_projections',
+        ['scenario_project_id', 'created_at'], unique=False
+    )
+
+    # Backfill from the stored payloads (columnar or legacy list payment_flows)
+    op.execute("""
+        UPDATE sales_projections SET
+            total_units = CASE
+                WHEN jsonb_typeof(payment_flows) = 'object' THEN (payment_flows->>'count')::int
+                WHEN jsonb_typeof(payment_flows) = 'array' THEN jsonb_array_length(payment_flows)
+            END,
+            total_revenue = (
+                SELECT SUM((entry.value->>'total_revenue')::numeric)
+                FROM jsonb_each(monthly_revenue) AS entry
+                WHERE jsonb_typeof(entry.value) = 'object' AND entry.value ? 'total_revenue'
+            ),
+            duration_months = (
+                SELECT MAX(substring(entry.key FROM '^month_([0-9]+)$')::int)
+                FROM jsonb_each(monthly_revenue) AS entry
+            )
+        WHERE jsonb_typeof(monthly_revenue) = 'object'
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_sales_projections_project_created', table_name='sales_projections')
+    op.drop_column('sales_projections', 'duration_months')
+    op.drop_column('sales_projections', 'total_units')
+    op.drop_column('sales_projections', 'total_revenue')
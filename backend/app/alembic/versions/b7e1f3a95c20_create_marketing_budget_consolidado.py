@@ -0,0 +1,58 @@
+"""Create consolidated marketing budget table
+
+Revision ID: b7e1f3a95c20
+Revises: a4c9d2e7f813
+Create Date: 2026-10-17 16:42:09.517203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e1f3a95c20'
+down_revision = 'a4c9d2e7f813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'mercadeo_presupuesto_consolidado',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('concepto', sa.String(length=255), nullable=False),
+        sa.Column('periodo', sa.Date(), nullable=False),
+        sa.Column('monto', sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.Column('lineas_count', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_mercadeo_presupuesto_consolidado_id'), 'mercadeo_presupuesto_consolidado', ['id'], unique=False)
+    op.create_index(
+        'ux_mercadeo_presupuesto_consolidado_concepto_periodo',
+        'mercadeo_presupuesto_consolidado',
+        ['concepto', 'periodo'],
+        unique=True
+    )
+    op.create_index(
+        'ix_mercadeo_presupuesto_consolidado_periodo',
+        'mercadeo_presupuesto_consolidado',
+        ['periodo'],
+        unique=False
+    )
+
+    # Initial fill; afterwards the app refreshes the touched conceptos
+    op.execute("""
+        INSERT INTO mercadeo_presupuesto_consolidado (concepto, periodo, monto, lineas_count, updated_at)
+        SELECT l.concepto, m.periodo, SUM(m.monto), COUNT(DISTINCT m.linea_id), now()
+        FROM mercadeo_presupuesto_montos m
+        JOIN mercadeo_presupuesto_lineas l ON l.id = m.linea_id
+        GROUP BY l.concepto, m.periodo
+    """)
+
+
+def downgrade():
+    op.drop_index('ix_mercadeo_presupuesto_consolidado_periodo', table_name='mercadeo_presupuesto_consolidado')
+    op.drop_index('ux_mercadeo_presupuesto_consolidado_concepto_periodo', table_name='mercadeo_presupuesto_consolidado')
+    op.drop_index(op.f('ix_mercadeo_presupuesto_consolidado_id'), table_name='mercadeo_presupuesto_consolidado')
+    op.drop_table('mercadeo_presupuesto_consolidado')
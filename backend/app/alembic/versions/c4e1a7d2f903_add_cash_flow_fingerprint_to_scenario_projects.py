@@ -0,0 +1,26 @@
+"""Add cash flow fingerprint to ScenarioProject
+
+Revision ID: c4e1a7d2f903
+Revises: b295b6d0c8f7
+Create Date: 2026-10-17 09:12:40.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e1a7d2f903'
+down_revision = 'b295b6d0c8f7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('scenario_projects', sa.Column('cash_flow_fingerprint', sa.String(length=64), nullable=True))
+    op.add_column('scenario_projects', sa.Column('cash_flow_calculated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('scenario_projects', 'cash_flow_calculated_at')
+    op.drop_column('scenario_projects', 'cash_flow_fingerprint')
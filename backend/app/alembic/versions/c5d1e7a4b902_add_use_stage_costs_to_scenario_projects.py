@@ -0,0 +1,34 @@
+"""Add use_stage_costs to scenario_projects
+
+Revision ID: c5d1e7a4b902
+Revises: a8e3f5c2d619
+Create Date: 2026-10-18 10:12:36.204417
+
+Stage cost phasing (f1c6a9d3b724) added the estimated_cost of the stages on
+top of the cost items of every project. Projects that already carried stage
+estimates would have seen their cash flow change, with the same budget
+possibly counted twice. The phasing is now opt-in: existing projects start
+with use_stage_costs = false and keep the cash flow of their cost items.
+The new column is part of the cash-flow fingerprint, so persisted cash flows
+that included stage costs are recalculated on their next read.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d1e7a4b902'
+down_revision = 'a8e3f5c2d619'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'scenario_projects',
+        sa.Column('use_stage_costs', sa.Boolean(), nullable=False, server_default=sa.text('false'))
+    )
+
+
+def downgrade():
+    op.drop_column('scenario_projects', 'use_stage_costs')
@@ -0,0 +1,67 @@
+"""Create ledger monthly rollup table
+
+Revision ID: c9d4e6f1a2b8
+Revises: b7e1f3a95c20
+Create Date: 2026-10-17 18:21:44.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9d4e6f1a2b8'
+down_revision = 'b7e1f3a95c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'ledger_monthly_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(length=20), nullable=False),
+        sa.Column('project_name', sa.String(), nullable=False),
+        sa.Column('account', sa.String(), nullable=False),
+        sa.Column('year_month', sa.Date(), nullable=False),
+        sa.Column('credits', sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.Column('debits', sa.Numeric(precision=18, scale=2), nullable=False),
+        sa.Column('entries_count', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ledger_monthly_rollup_id'), 'ledger_monthly_rollup', ['id'], unique=False)
+    op.create_index(
+        'ux_ledger_monthly_rollup_key',
+        'ledger_monthly_rollup',
+        ['source', 'project_name', 'year_month', 'account'],
+        unique=True
+    )
+
+    # Initial fill; afterwards the ledger and admin-cost uploads refresh what they replace
+    op.execute("""
+        INSERT INTO ledger_monthly_rollup
+            (source, project_name, account, year_month, credits, debits, entries_count, updated_at)
+        SELECT 'ledger', project_name, COALESCE(account_description, ''),
+               CAST(date_trunc('month', entry_date) AS DATE),
+               COALESCE(SUM(credit_amount), 0), COALESCE(SUM(debit_amount), 0), COUNT(*), now()
+        FROM ledger_entries
+        WHERE entry_date IS NOT NULL AND project_name IS NOT NULL
+        GROUP BY project_name, COALESCE(account_description, ''), CAST(date_trunc('month', entry_date) AS DATE)
+    """)
+    op.execute("""
+        INSERT INTO ledger_monthly_rollup
+            (source, project_name, account, year_month, credits, debits, entries_count, updated_at)
+        SELECT 'admin_costs', '', COALESCE(account_description, ''),
+               CAST(date_trunc('month', entry_date) AS DATE),
+               COALESCE(SUM(credit_amount), 0), COALESCE(SUM(debit_amount), 0), COUNT(*), now()
+        FROM administrative_costs
+        WHERE entry_date IS NOT NULL
+        GROUP BY COALESCE(account_description, ''), CAST(date_trunc('month', entry_date) AS DATE)
+    """)
+
+
+def downgrade():
+    op.drop_index('ux_ledger_monthly_rollup_key', table_name='ledger_monthly_rollup')
+    op.drop_index(op.f('ix_ledger_monthly_rollup_id'), table_name='ledger_monthly_rollup')
+    op.drop_table('ledger_monthly_rollup')
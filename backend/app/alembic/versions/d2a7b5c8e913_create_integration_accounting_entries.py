@@ -0,0 +1,58 @@
+"""Create integration accounting entries table
+
+Revision ID: d2a7b5c8e913
+Revises: c9d4e6f1a2b8
+Create Date: 2026-10-17 19:02:13.518306
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a7b5c8e913'
+down_revision = 'c9d4e6f1a2b8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'integration_accounting_entries',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('integration_id', sa.String(length=100), nullable=False),
+        sa.Column('external_id', sa.String(), nullable=False),
+        sa.Column('account_code', sa.String(), nullable=True),
+        sa.Column('account_name', sa.String(), nullable=True),
+        sa.Column('entry_date', sa.Date(), nullable=False),
+        sa.Column('reference', sa.String(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('debit_amount', sa.Numeric(precision=18, scale=2), nullable=True),
+        sa.Column('credit_amount', sa.Numeric(precision=18, scale=2), nullable=True),
+        sa.Column('currency', sa.String(length=10), nullable=True),
+        sa.Column('project_code', sa.String(), nullable=True),
+        sa.Column('department', sa.String(), nullable=True),
+        sa.Column('external_updated_at', sa.DateTime(), nullable=True),
+        sa.Column('synced_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_integration_accounting_entries_id'), 'integration_accounting_entries', ['id'], unique=False)
+    op.create_index(
+        'ux_integration_entries_external',
+        'integration_accounting_entries',
+        ['integration_id', 'external_id'],
+        unique=True
+    )
+    op.create_index(
+        'ix_integration_entries_date',
+        'integration_accounting_entries',
+        ['integration_id', 'entry_date'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_integration_entries_date', table_name='integration_accounting_entries')
+    op.drop_index('ux_integration_entries_external', table_name='integration_accounting_entries')
+    op.drop_index(op.f('ix_integration_accounting_entries_id'), table_name='integration_accounting_entries')
+    op.drop_table('integration_accounting_entries')
@@ -0,0 +1,38 @@
+"""Add unique (project, year, month) index to ScenarioCashFlow
+
+Revision ID: d7b3e9a14c26
+Revises: c4e1a7d2f903
+Create Date: 2026-10-17 10:03:55.271840
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b3e9a14c26'
+down_revision = 'c4e1a7d2f903'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Keep only the newest row of any duplicated period before enforcing uniqueness
+    op.execute("""
+        DELETE FROM scenario_cash_flows a
+        USING scenario_cash_flows b
+        WHERE a.scenario_project_id = b.scenario_project_id
+          AND a.year = b.year
+          AND a.month = b.month
+          AND a.id < b.id
+    """)
+    op.create_index(
+        'ux_scenario_cash_flow_period',
+        'scenario_cash_flows',
+        ['scenario_project_id', 'year', 'month'],
+        unique=True
+    )
+
+
+def downgrade():
+    op.drop_index('ux_scenario_cash_flow_period', table_name='scenario_cash_flows')
@@ -0,0 +1,58 @@
+"""Create portfolio cash flow rollup table
+
+Revision ID: e2f8c61b5a47
+Revises: d7b3e9a14c26
+Create Date: 2026-10-17 11:20:08.649115
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2f8c61b5a47'
+down_revision = 'd7b3e9a14c26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'portfolio_cash_flow_rollup',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('project_status', sa.String(length=50), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Integer(), nullable=False),
+        sa.Column('total_ingresos', sa.Numeric(precision=18, scale=2), nullable=True),
+        sa.Column('total_egresos', sa.Numeric(precision=18, scale=2), nullable=True),
+        sa.Column('projects_count', sa.Integer(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_portfolio_cash_flow_rollup_id'), 'portfolio_cash_flow_rollup', ['id'], unique=False)
+    op.create_index(
+        'ux_portfolio_cash_flow_rollup_period',
+        'portfolio_cash_flow_rollup',
+        ['project_status', 'year', 'month'],
+        unique=True
+    )
+
+    # Initial fill from the persisted cash flows
+    op.execute("""
+        INSERT INTO portfolio_cash_flow_rollup
+            (project_status, year, month, total_ingresos, total_egresos, projects_count, updated_at)
+        SELECT p.status, cf.year, cf.month,
+               COALESCE(SUM(CASE WHEN cf.total_ingresos > 0 THEN cf.total_ingresos ELSE 0 END), 0),
+               COALESCE(SUM(CASE WHEN cf.total_egresos > 0 THEN cf.total_egresos ELSE 0 END), 0),
+               COUNT(DISTINCT cf.scenario_project_id),
+               NOW()
+        FROM scenario_cash_flows cf
+        JOIN scenario_projects p ON p.id = cf.scenario_project_id
+        GROUP BY p.status, cf.year, cf.month
+    """)
+
+
+def downgrade():
+    op.drop_index('ux_portfolio_cash_flow_rollup_period', table_name='portfolio_cash_flow_rollup')
+    op.drop_index(op.f('ix_portfolio_cash_flow_rollup_id'), table_name='portfolio_cash_flow_rollup')
+    op.drop_table('portfolio_cash_flow_rollup')
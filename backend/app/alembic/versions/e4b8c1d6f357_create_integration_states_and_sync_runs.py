@@ -0,0 +1,76 @@
+"""Create integration states and sync runs tables
+
+Revision ID: e4b8c1d6f357
+Revises: d2a7b5c8e913
+Create Date: 2026-10-17 20:11:37.264915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b8c1d6f357'
+down_revision = 'd2a7b5c8e913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'integration_states',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('integration_id', sa.String(length=100), nullable=False),
+        sa.Column('system_type', sa.String(length=30), nullable=False),
+        sa.Column('config', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('enabled', sa.Boolean(), nullable=False),
+        sa.Column('auto_sync', sa.Boolean(), nullable=False),
+        sa.Column('sync_frequency_hours', sa.Integer(), nullable=True),
+        sa.Column('last_sync', sa.DateTime(), nullable=True),
+        sa.Column('last_attempt_at', sa.DateTime(), nullable=True),
+        sa.Column('last_status', sa.String(length=20), nullable=True),
+        sa.Column('consecutive_failures', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_sync_at', sa.DateTime(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('integration_id')
+    )
+    op.create_index(op.f('ix_integration_states_id'), 'integration_states', ['id'], unique=False)
+
+    op.create_table(
+        'integration_sync_runs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('integration_id', sa.String(length=100), nullable=False),
+        sa.Column('trigger', sa.String(length=20), nullable=False),
+        sa.Column('attempt', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('finished_at', sa.DateTime(), nullable=False),
+        sa.Column('total_records', sa.Integer(), nullable=False),
+        sa.Column('successful_records', sa.Integer(), nullable=False),
+        sa.Column('failed_records', sa.Integer(), nullable=False),
+        sa.Column('execution_time_seconds', sa.Float(), nullable=True),
+        sa.Column('records_per_second', sa.Float(), nullable=True),
+        sa.Column('watermark_from', sa.DateTime(), nullable=True),
+        sa.Column('watermark_to', sa.DateTime(), nullable=True),
+        sa.Column('errors', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('warnings', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_integration_sync_runs_id'), 'integration_sync_runs', ['id'], unique=False)
+    op.create_index(
+        'ix_integration_sync_runs_started',
+        'integration_sync_runs',
+        ['integration_id', 'started_at'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index('ix_integration_sync_runs_started', table_name='integration_sync_runs')
+    op.drop_index(op.f('ix_integration_sync_runs_id'), table_name='integration_sync_runs')
+    op.drop_table('integration_sync_runs')
+    op.drop_index(op.f('ix_integration_states_id'), table_name='integration_states')
+    op.drop_table('integration_states')
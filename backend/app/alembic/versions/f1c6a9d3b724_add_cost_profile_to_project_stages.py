@@ -0,0 +1,27 @@
+"""Add cost_profile to project_stages
+
+Revision ID: f1c6a9d3b724
+Revises: e4b8c1d6f357
+Create Date: 2026-10-17 21:02:48.519304
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c6a9d3b724'
+down_revision = 'e4b8c1d6f357'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        'project_stages',
+        sa.Column('cost_profile', sa.String(length=20), nullable=False, server_default='LINEAR')
+    )
+
+
+def downgrade():
+    op.drop_column('project_stages', 'cost_profile')
@@ -0,0 +1,129 @@
+"""
+Fingerprint cache for persisted scenario cash flows.
+
+The fingerprint is a hash of every input the cash flow depends on: the project
+row, its active cost items, the costed stages, credit lines and usages, sold
+units and the active sales projection. It is stored on the project next to the persisted
+ScenarioCashFlow rows, so reads can serve those rows as long as the inputs
+hash to the same value, and only recalculate when something changed.
+"""
+
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from .models import (
+    ScenarioProject, ScenarioCostItem, ProjectUnit, ProjectStage,
+    LineaCreditoProyecto, LineaCreditoProyectoUso, SalesProjection
+)
+
+logger = logging.getLogger(__name__)
+
+# Project columns that do not affect the cash flow (or are the cache itself)
+_PROJECT_IGNORED_COLUMNS = {"updated_at", "cash_flow_fingerprint", "cash_flow_calculated_at"}
+_COST_ITEM_IGNORED_COLUMNS = {"created_at", "updated_at"}
+
+
+def _row_values(row, ignored=frozenset()):
+    return [getattr(row, column.key) for column in row.__table__.columns if column.key not in ignored]
+
+
+def compute_cash_flow_fingerprint(db: Session, project: ScenarioProject) -> str:
+    """Hash SHA-256 de todos los insumos del flujo de caja del proyecto"""
+    project_values = _row_values(project, _PROJECT_IGNORED_COLUMNS)
+
+    cost_items = db.query(ScenarioCostItem).filter(
+        ScenarioCostItem.scenario_project_id == project.id,
+        ScenarioCostItem.is_active == True
+    ).order_by(ScenarioCostItem.id).all()
+    cost_item_values = [_row_values(item, _COST_ITEM_IGNORED_COLUMNS) for item in cost_items]
+
+    # Stage dates, budget and profile drive the stage cost phasing
+    stage_values = db.query(
+        ProjectStage.id,
+        ProjectStage.parent_stage_id,
+        ProjectStage.stage_type,
+        ProjectStage.planned_start_date,
+        ProjectStage.planned_end_date,
+        ProjectStage.estimated_cost,
+        ProjectStage.cost_profile,
+    ).filter(
+        ProjectStage.scenario_project_id == project.id
+    ).order_by(ProjectStage.id).all()
+
+    credit_line_values = db.query(
+        LineaCreditoProyecto.id,
+        LineaCreditoProyecto.interest_rate,
+        LineaCreditoProyecto.monto_total_linea,
+    ).filter(
+        LineaCreditoProyecto.scenario_project_id == project.id
+    ).order_by(LineaCreditoProyecto.id).all()
+
+    usage_values = db.query(
+        LineaCreditoProyectoUso.id,
+        LineaCreditoProyectoUso.linea_credito_proyecto_id,
+        LineaCreditoProyectoUso.fecha_uso,
+        LineaCreditoProyectoUso.monto_usado,
+        LineaCreditoProyectoUso.tipo_transaccion,
+    ).join(LineaCreditoProyecto).filter(
+        LineaCreditoProyecto.scenario_project_id == project.id
+    ).order_by(LineaCreditoProyectoUso.id).all()
+
+    sold_unit_values = db.query(
+        ProjectUnit.id,
+        ProjectUnit.status,
+        ProjectUnit.delivery_date,
+        ProjectUnit.sale_price,
+        ProjectUnit.target_price_total,
+    ).filter(
+        ProjectUnit.scenario_project_id == project.id,
+        ProjectUnit.status == 'SOLD'
+    ).order_by(ProjectUnit.id).all()
+
+    active_projection = db.query(
+        SalesProjection.id,
+        SalesProjection.scenario_name,
+        SalesProjection.monthly_revenue,
+    ).filter(
+        SalesProjection.scenario_project_id == project.id,
+        SalesProjection.is_active == True
+    ).first()
+
+    payload = [
+        project_values,
+        cost_item_values,
+        [list(row) for row in stage_values],
+        [list(row) for row in credit_line_values],
+        [list(row) for row in usage_values],
+        [list(row) for row in sold_unit_values],
+        list(active_projection) if active_projection else None,
+    ]
+    encoded = json.dumps(payload, default=str, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def is_cash_flow_fresh(db: Session, project: ScenarioProject, fingerprint: Optional[str] = None) -> bool:
+    """True si el flujo persistido corresponde a los insumos actuales del proyecto"""
+    if not project.cash_flow_fingerprint:
+        return False
+    if fingerprint is None:
+        fingerprint = compute_cash_flow_fingerprint(db, project)
+    return fingerprint == project.cash_flow_fingerprint
+
+
+def store_cash_flow_fingerprint(project: ScenarioProject, fingerprint: str) -> None:
+    """Registrar en el proyecto el fingerprint del flujo recién persistido (sin commit)"""
+    project.cash_flow_fingerprint = fingerprint
+    project.cash_flow_calculated_at = datetime.utcnow()
+
+
+def invalidate_cash_flow_cache(db: Session, project_id: int) -> None:
+    """Marcar el flujo persistido como desactualizado con un solo UPDATE (sin commit)"""
+    db.query(ScenarioProject).filter(
+        ScenarioProject.id == project_id
+    ).update({ScenarioProject.cash_flow_fingerprint: None})
+    logger.debug(f"Invalidated cash flow cache for project {project_id}")
@@ -0,0 +1,116 @@
+"""
+Bulk persistence for ScenarioCashFlow rows.
+
+The computed month vector of a project is written with one multi-row
+INSERT ... ON CONFLICT (scenario_project_id, year, month) DO UPDATE, followed
+by a single DELETE of the months that fell outside the new period, inside
+portfolio_rollup_delta() so the portfolio rollup receives the difference
+between the old and the new vectors. All of it runs in the caller's
+transaction, so a concurrent reader sees either the old or the new cash flow,
+never an empty table.
+"""
+
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import and_, delete, not_, or_, tuple_
+from sqlalchemy.orm import Session
+
+from .database import insert_for_dialect
+from .models import ScenarioCashFlow
+from .portfolio_cash_flow import portfolio_rollup_delta
+
+logger = logging.getLogger(__name__)
+
+CONFLICT_COLUMNS = ("scenario_project_id", "year", "month")
+
+# Value columns copied from the computed rows; id/created_at are left to the database
+_VALUE_COLUMNS = [
+    column.key for column in ScenarioCashFlow.__table__.columns
+    if column.key not in ("id", "created_at", "updated_at")
+]
+
+# Rows per INSERT statement, well below the bind parameter limit of the drivers
+CHUNK_SIZE = 500
+
+
+def _row_dict(cash_flow, project_id: int, now: datetime) -> Dict:
+    row = {column: getattr(cash_flow, column) for column in _VALUE_COLUMNS}
+    row["scenario_project_id"] = project_id
+    row["updated_at"] = now
+    return row
+
+
+def upsert_cash_flows_batch(db: Session, cash_flows_by_project: Dict[int, List[ScenarioCashFlow]]) -> int:
+    """
+    Persistir los flujos de varios proyectos con INSERT ... ON CONFLICT (sin commit).
+
+    Los meses que ya no forman parte del flujo de cada proyecto se eliminan con
+    un solo DELETE. Retorna el número de filas escritas.
+    """
+    if not cash_flows_by_project:
+        return 0
+    with portfolio_rollup_delta(db, cash_flows_by_project):
+        return _write_cash_flows(db, cash_flows_by_project)
+
+
+def _write_cash_flows(db: Session, cash_flows_by_project: Dict[int, List[ScenarioCashFlow]]) -> int:
+    now = datetime.utcnow()
+    rows = [
+        _row_dict(cash_flow, project_id, now)
+        for project_id, cash_flows in cash_flows_by_project.items()
+        for cash_flow in cash_flows
+    ]
+
+    # Months outside the new vector of each project
+    stale_conditions = []
+    for project_id, cash_flows in cash_flows_by_project.items():
+        periods = [(cash_flow.year, cash_flow.month) for cash_flow in cash_flows]
+        condition = ScenarioCashFlow.scenario_project_id == project_id
+        if periods:
+            condition = and_(condition, not_(tuple_(ScenarioCashFlow.year, ScenarioCashFlow.month).in_(periods)))
+        stale_conditions.append(condition)
+    db.execute(delete(ScenarioCashFlow).where(or_(*stale_conditions)).execution_options(synchronize_session=False))
+
+    if not rows:
+        return 0
+
+    insert = insert_for_dialect(db)
+    table = ScenarioCashFlow.__table__
+    if insert is None:
+        # No upsert support: replace the remaining months inside the same transaction
+        db.execute(delete(ScenarioCashFlow).where(
+            ScenarioCashFlow.scenario_project_id.in_(list(cash_flows_by_project))
+        ).execution_options(synchronize_session=False))
+        for start in range(0, len(rows), CHUNK_SIZE):
+            db.execute(table.insert(), [dict(row, created_at=now) for row in rows[start:start + CHUNK_SIZE]])
+        return len(rows)
+
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = [dict(row, created_at=now) for row in rows[start:start + CHUNK_SIZE]]
+        statement = insert(table).values(chunk)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(CONFLICT_COLUMNS),
+            set_={
+                column: statement.excluded[column]
+                for column in _VALUE_COLUMNS + ["updated_at"]
+                if column not in CONFLICT_COLUMNS
+            },
+        )
+        db.execute(statement)
+
+    logger.debug(f"Upserted {len(rows)} cash flow rows for {len(cash_flows_by_project)} projects")
+    return len(rows)
+
+
+def upsert_cash_flows(db: Session, project_id: int, cash_flows: List[ScenarioCashFlow]) -> int:
+    """Persistir el vector mensual de un proyecto (sin commit)"""
+    return upsert_cash_flows_batch(db, {project_id: cash_flows})
+
+
+def load_cash_flows(db: Session, project_id: int) -> List[ScenarioCashFlow]:
+    """Flujos persistidos del proyecto, ordenados por período"""
+    return db.query(ScenarioCashFlow).filter(
+        ScenarioCashFlow.scenario_project_id == project_id
+    ).order_by(ScenarioCashFlow.year, ScenarioCashFlow.month).all()
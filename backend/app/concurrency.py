@@ -0,0 +1,58 @@
+"""
+Execution model for blocking work in the API.
+
+The database layer is synchronous (SQLAlchemy Session over psycopg2) and the
+Excel imports parse with pandas, so request handlers that touch the
+database or parse files are plain ``def`` functions: FastAPI runs them in
+the worker's thread pool and the event loop keeps serving other requests
+while one of them waits on PostgreSQL. ``async def`` is kept for handlers
+that await truly asynchronous I/O (the accounting integrations, the AI
+assistant) and for handlers that do no blocking work at all (OPTIONS
+responses, static catalogs, pure calculations), which run on the event loop
+instead of waiting for a thread behind slow recalculations. When a coroutine
+handler has to do blocking work it goes through run_blocking().
+
+The thread pool is bounded. Every blocking handler holds a database
+connection while it runs, so there is no point in running more of them at
+once than the connection pool can serve; extra requests wait for a thread
+instead of timing out on the pool. The default is DB_POOL_SIZE +
+DB_MAX_OVERFLOW (see database.py); THREADPOOL_SIZE overrides it.
+
+app/scripts/check_blocking_handlers.py is the lint that keeps sync database
+calls out of coroutine handlers.
+"""
+
+import logging
+import os
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+import anyio.to_thread
+
+from .database import pool_capacity
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+def threadpool_size() -> int:
+    """Hilos para handlers bloqueantes por worker (THREADPOOL_SIZE o el tamaño del pool de conexiones)"""
+    default = pool_capacity()
+    try:
+        return max(1, int(os.getenv("THREADPOOL_SIZE", default)))
+    except ValueError:
+        logger.warning("Invalid THREADPOOL_SIZE, using the default")
+        return default
+
+
+def configure_threadpool() -> int:
+    """Acotar el thread pool de AnyIO que usa FastAPI para los handlers def (llamar dentro del event loop)"""
+    size = threadpool_size()
+    anyio.to_thread.current_default_thread_limiter().total_tokens = size
+    logger.info(f"Blocking handler thread pool limited to {size} threads")
+    return size
+
+
+async def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Ejecutar trabajo bloqueante (ORM, pandas) desde una corrutina sin detener el event loop"""
+    return await anyio.to_thread.run_sync(partial(func, *args, **kwargs))
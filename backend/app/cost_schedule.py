@@ -0,0 +1,204 @@
+"""
+Cost schedule engine for scenario projects.
+
+Resolves every ScenarioCostItem once (actual cost, category and active month
+window) and builds the full month x category cost matrix in a single
+vectorized pass, instead of re-walking every item for every month. The phased
+estimated cost of the project stages (stage_cost_phasing) is added on top.
+"""
+
+from decimal import Decimal
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+# Order of the columns in the cost matrix. "financiacion" is always zero here:
+# financing costs come from the credit lines timeline, not from cost items.
+COST_CATEGORIES = ("terreno", "costos_duros", "costos_blandos", "financiacion", "marketing", "otros")
+
+# Largest magnitude we accumulate in int64 before falling back to Python ints
+_INT64_SAFE_LIMIT = 2 ** 62
+
+
+def _project_construction_area(project) -> Optional[Any]:
+    """Área construible del proyecto con los mismos fallbacks que el cálculo mensual"""
+    if project.buildable_area_m2:
+        return project.buildable_area_m2
+    if project.total_area_m2:
+        return project.total_area_m2
+    if project.total_units and project.avg_unit_size_m2:
+        return project.total_units * project.avg_unit_size_m2
+    return None
+
+
+def resolve_item_cost(item, project=None) -> Optional[Decimal]:
+    """Calcular el costo real de un item según su base_costo"""
+    actual_cost = item.monto_proyectado
+    base_costo = item.base_costo or ""
+
+    if "por m² construcción" in base_costo and item.unit_cost and project:
+        project_area = _project_construction_area(project)
+        if project_area:
+            actual_cost = item.unit_cost * Decimal(str(project_area))
+    elif "por m² propiedad" in base_costo and item.unit_cost and project and project.total_units and project.avg_unit_size_m2:
+        sellable_area = project.total_units * project.avg_unit_size_m2
+        if sellable_area and sellable_area > 0:
+            try:
+                actual_cost = item.unit_cost * Decimal(str(sellable_area))
+            except (ValueError, TypeError):
+                actual_cost = item.monto_proyectado
+    elif "por m²" in base_costo and item.unit_cost and project:  # Backward compatibility - treat as construcción
+        project_area = _project_construction_area(project)
+        if project_area and project_area > 0:
+            try:
+                actual_cost = item.unit_cost * Decimal(str(project_area))
+            except (ValueError, TypeError):
+                actual_cost = item.monto_proyectado
+    elif "por unidad" in base_costo and item.unit_cost and project and project.total_units:
+        if project.total_units > 0:
+            try:
+                actual_cost = item.unit_cost * Decimal(str(project.total_units))
+            except (ValueError, TypeError):
+                actual_cost = item.monto_proyectado
+    elif item.unit_cost and item.quantity:
+        try:
+            actual_cost = item.unit_cost * item.quantity
+        except (ValueError, TypeError):
+            actual_cost = item.monto_proyectado
+
+    return actual_cost
+
+
+def categorize_cost_item(item) -> Optional[str]:
+    """
+    Obtener la categoría del flujo de caja para un item.
+    Retorna None para items de financiación (se calculan desde las líneas de crédito).
+    """
+    categoria_lower = (item.categoria or "").lower()
+    if "financiacion" in categoria_lower:
+        return None
+
+    subcategoria_lower = (item.subcategoria or "").lower()
+    # Marketing takes priority - check both main category and subcategory
+    if "marketing" in categoria_lower or "marketing" in subcategoria_lower or "ventas" in subcategoria_lower:
+        return "marketing"
+    if "terreno" in categoria_lower:
+        return "terreno"
+    if "duros" in categoria_lower:
+        return "costos_duros"
+    if "blandos" in categoria_lower:
+        return "costos_blandos"
+    return "otros"
+
+
+def resolve_item_window(item) -> tuple:
+    """Obtener (mes_inicio, duración) 1-based del item"""
+    start_month = item.start_month if item.start_month is not None else 1
+    # Handle start_month = 0 as month 1
+    if start_month == 0:
+        start_month = 1
+    duration = item.duration_months or 1
+    return start_month, duration
+
+
+class CostSchedule:
+    """
+    Matriz de costos mes x categoría de un proyecto.
+
+    Los montos se guardan como Decimal con la misma precisión que el cálculo
+    item por item (costo / duración), de modo que los totales coinciden al centavo.
+    """
+
+    def __init__(self, total_months: int, matrix: List[List[Decimal]]):
+        self.total_months = total_months
+        self.matrix = matrix
+
+    def monthly_costs(self, month_offset: int) -> Dict[str, Decimal]:
+        """Costos por categoría del mes (0-based), mismo formato que calculate_monthly_costs"""
+        if 0 <= month_offset < self.total_months:
+            row = self.matrix[month_offset]
+        else:
+            row = [Decimal('0.00')] * len(COST_CATEGORIES)
+
+        costs = {category: row[idx] for idx, category in enumerate(COST_CATEGORIES)}
+        costs["total"] = sum(row, Decimal('0.00'))
+        return costs
+
+    def category_series(self, category: str) -> List[Decimal]:
+        """Serie mensual completa de una categoría"""
+        idx = COST_CATEGORIES.index(category)
+        return [row[idx] for row in self.matrix]
+
+
+def _add_stage_costs(matrix: List[List[Decimal]], stage_costs) -> None:
+    """Sumar a la matriz los costos en centavos de las etapas (ver stage_cost_phasing)"""
+    months = min(len(matrix), stage_costs.total_months)
+    for month_idx, cat_idx in zip(*np.nonzero(stage_costs.cents[:months])):
+        matrix[month_idx][cat_idx] += Decimal(int(stage_costs.cents[month_idx, cat_idx])) / 100
+
+
+def build_cost_schedule(cost_items: List[Any], total_months: int, project=None, stage_costs=None) -> CostSchedule:
+    """
+    Construir el calendario de costos para `total_months` meses.
+
+    Cada item se resuelve una vez. Los costos se acumulan como enteros escalados
+    en arreglos de diferencias agrupados por duración, y solo al final se divide
+    cada grupo entre su duración en Decimal. Si se pasa `stage_costs`
+    (StageCostPhasing), el costo estimado de las etapas se suma por mes y categoría.
+    """
+    total_months = max(int(total_months or 0), 0)
+    n_categories = len(COST_CATEGORIES)
+
+    resolved = []
+    for item in cost_items:
+        actual_cost = resolve_item_cost(item, project)
+        if not actual_cost:
+            continue
+
+        category = categorize_cost_item(item)
+        if category is None:
+            continue
+
+        start_month, duration = resolve_item_window(item)
+        if duration <= 0:
+            continue
+
+        first = max(start_month, 1)
+        last = min(start_month + duration - 1, total_months)
+        if first > last:
+            continue
+
+        resolved.append((Decimal(actual_cost), COST_CATEGORIES.index(category), first - 1, last, duration))
+
+    zero = Decimal('0.00')
+    matrix = [[zero] * n_categories for _ in range(total_months)]
+    if stage_costs is not None:
+        _add_stage_costs(matrix, stage_costs)
+    if not resolved:
+        return CostSchedule(total_months, matrix)
+
+    # Scale every amount to an integer number of 10^-places units
+    places = max(max(-cost.as_tuple().exponent, 0) for cost, *_ in resolved)
+    scale = Decimal(10) ** places
+    numerators = [int(cost * scale) for cost, *_ in resolved]
+    use_int64 = sum(abs(n) for n in numerators) < _INT64_SAFE_LIMIT
+    dtype = np.int64 if use_int64 else object
+
+    categories = np.array([r[1] for r in resolved], dtype=np.int64)
+    starts = np.array([r[2] for r in resolved], dtype=np.int64)
+    ends = np.array([r[3] for r in resolved], dtype=np.int64)
+    durations = np.array([r[4] for r in resolved], dtype=np.int64)
+    amounts = np.array(numerators, dtype=dtype)
+
+    for duration in np.unique(durations):
+        mask = durations == duration
+        diff = np.zeros((total_months + 1, n_categories), dtype=dtype)
+        np.add.at(diff, (starts[mask], categories[mask]), amounts[mask])
+        np.add.at(diff, (ends[mask], categories[mask]), -amounts[mask])
+        active = np.cumsum(diff[:-1], axis=0)
+
+        divisor = Decimal(int(duration)) * scale
+        for month_idx, cat_idx in zip(*np.nonzero(active)):
+            matrix[month_idx][cat_idx] += Decimal(int(active[month_idx, cat_idx])) / divisor
+
+    return CostSchedule(total_months, matrix)
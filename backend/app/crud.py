@@ -3,6 +3,7 @@ from . import models, schemas
 from typing import List, Optional, Dict, Any
 from sqlalchemy import func, extract, cast, Date
 from sqlalchemy.sql import text
+from .schema_catalog import get_schema_catalog
 
 # CRUD operations for PlantillaComisiones
 
@@ -152,24 +153,13 @@ def get_combined_marketing_cashflow(db: Session) -> list[dict]:
     Unions all 'vista_presupuesto_mercadeo_*_resumen' views with 'comisiones_ventas'
     and returns the aggregated cash flow data for the "Mercadeo" category.
     """
+    schema = get_schema_catalog(db)
+
     # Step 0: Check if comisiones_ventas table exists
-    comisiones_exists_query = text("""
-        SELECT EXISTS (
-            SELECT FROM information_schema.tables 
-            WHERE  table_schema = 'public'
-            AND    table_name   = 'comisiones_ventas'
-        );
-    """)
-    comisiones_exists = db.execute(comisiones_exists_query).scalar()
+    comisiones_exists = schema.has_table('comisiones_ventas')
 
     # Step 1: Find all marketing project summary views
-    view_query = text("""
-        SELECT table_name
-        FROM information_schema.views
-        WHERE table_schema = 'public'
-        AND table_name LIKE 'vista_presupuesto_mercadeo_%_resumen'
-    """)
-    project_views = [f'public."{row[0]}"' for row in db.execute(view_query)]
+    project_views = [f'public."{name}"' for name in schema.views_like('vista_presupuesto_mercadeo_%_resumen')]
     project_unions = " UNION ALL ".join([f'SELECT * FROM {view}' for view in project_views])
 
     # Step 2: Define a query for comisiones_ventas, if it exists
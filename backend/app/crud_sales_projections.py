@@ -1,26 +1,98 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, insert
 from typing import List, Optional, Dict, Any
 import json
+import os
+import re
 from . import schemas
-from datetime import datetime
+from .models import SalesProjection
+from datetime import datetime, timedelta
+
+# payment_flows is stored column-wise: one list per field instead of one dict per unit
+COLUMNAR_FORMAT = "columnar"
+
+# Projections saved by the unit sales simulator end with this suffix
+SIMULATION_SUFFIX = "_simulation"
+
+# Retention of simulated projections: the latest N per scenario name are kept, and
+# older ones too while they are younger than the retention period
+SIMULATION_KEEP_LATEST = int(os.getenv("SALES_PROJECTION_SIMULATION_KEEP_LATEST", "5"))
+SIMULATION_RETENTION_DAYS = int(os.getenv("SALES_PROJECTION_SIMULATION_RETENTION_DAYS", "30"))
+
+_MONTH_KEY = re.compile(r"^month_(\d+)$")
+
+def projection_summary(monthly_revenue: Any, payment_flows: Any) -> Dict[str, Any]:
+    """Totales de una proyección (ingresos, unidades, meses) para guardar junto a ella"""
+    if isinstance(monthly_revenue, str):
+        monthly_revenue = json.loads(monthly_revenue)
+    total_revenue = None
+    duration_months = None
+    if isinstance(monthly_revenue, dict):
+        revenues = [
+            value["total_revenue"] for value in monthly_revenue.values()
+            if isinstance(value, dict) and isinstance(value.get("total_revenue"), (int, float))
+        ]
+        total_revenue = round(sum(revenues), 2) if revenues else None
+        months = [int(match.group(1)) for match in map(_MONTH_KEY.match, monthly_revenue) if match]
+        duration_months = max(months) if months else None
+
+    if isinstance(payment_flows, dict) and payment_flows.get("format") == COLUMNAR_FORMAT:
+        total_units = payment_flows.get("count")
+    elif isinstance(payment_flows, list):
+        total_units = len(payment_flows)
+    else:
+        total_units = None
+    return {"total_revenue": total_revenue, "total_units": total_units, "duration_months": duration_months}
+
+def _impact_summary(row) -> Optional[Dict[str, Any]]:
+    if row.total_revenue is None and row.total_units is None and row.duration_months is None:
+        return None
+    return {
+        "total_revenue": float(row.total_revenue) if row.total_revenue is not None else None,
+        "total_units": row.total_units,
+        "project_duration_months": row.duration_months
+    }
+
+def pack_payment_flows(payment_flows: Optional[List[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """Convert per-unit payment flow dicts into a columnar payload"""
+    if not payment_flows:
+        return None
+    if isinstance(payment_flows, dict):
+        return payment_flows
+    fields = list(payment_flows[0].keys())
+    columns = {field: [flow.get(field) for flow in payment_flows] for field in fields}
+    return {"format": COLUMNAR_FORMAT, "count": len(payment_flows), "columns": columns}
+
+def unpack_payment_flows(value: Any) -> Optional[List[Dict[str, Any]]]:
+    """Per-unit payment flow dicts from a stored payload (columnar or legacy list)"""
+    if value and isinstance(value, str):
+        value = json.loads(value)
+    if isinstance(value, dict) and value.get("format") == COLUMNAR_FORMAT:
+        columns = value.get("columns") or {}
+        fields = list(columns.keys())
+        return [dict(zip(fields, values)) for values in zip(*(columns[field] for field in fields))]
+    return value
 
 def create_sales_projection(db: Session, projection: schemas.SalesProjectionCreate) -> Dict[str, Any]:
     """Create a new sales projection"""
     query = text("""
         INSERT INTO sales_projections 
-        (scenario_project_id, scenario_name, monthly_revenue, payment_flows, is_active, created_at)
-        VALUES (:scenario_project_id, :scenario_name, :monthly_revenue, :payment_flows, :is_active, :created_at)
+        (scenario_project_id, scenario_name, monthly_revenue, payment_flows, is_active, created_at,
+         total_revenue, total_units, duration_months)
+        VALUES (:scenario_project_id, :scenario_name, :monthly_revenue, :payment_flows, :is_active, :created_at,
+                :total_revenue, :total_units, :duration_months)
         RETURNING id, scenario_project_id, scenario_name, monthly_revenue, payment_flows, is_active, created_at
     """)
     
+    payment_flows = pack_payment_flows(projection.payment_flows)
     result = db.execute(query, {
         "scenario_project_id": projection.scenario_project_id,
         "scenario_name": projection.scenario_name,
         "monthly_revenue": json.dumps(projection.monthly_revenue),
-        "payment_flows": json.dumps(projection.payment_flows) if projection.payment_flows else None,
+        "payment_flows": json.dumps(payment_flows) if payment_flows else None,
         "is_active": projection.is_active,
-        "created_at": datetime.utcnow()
+        "created_at": datetime.utcnow(),
+        **projection_summary(projection.monthly_revenue, payment_flows)
     })
     
     row = result.fetchone()
@@ -30,12 +102,42 @@ def create_sales_projection(db: Session, projection: schemas.SalesProjectionCrea
             "scenario_project_id": row.scenario_project_id,
             "scenario_name": row.scenario_name,
             "monthly_revenue": json.loads(row.monthly_revenue) if isinstance(row.monthly_revenue, str) else row.monthly_revenue,
-            "payment_flows": json.loads(row.payment_flows) if row.payment_flows and isinstance(row.payment_flows, str) else row.payment_flows,
+            "payment_flows": unpack_payment_flows(row.payment_flows),
             "is_active": row.is_active,
             "created_at": row.created_at
         }
     return None
 
+def create_sales_projections_batch(db: Session, projections: List[schemas.SalesProjectionCreate]) -> List[Dict[str, Any]]:
+    """Insert several sales projections with one statement (no commit)"""
+    if not projections:
+        return []
+    now = datetime.utcnow()
+    rows = []
+    for projection in projections:
+        payment_flows = pack_payment_flows(projection.payment_flows)
+        rows.append({
+            "scenario_project_id": projection.scenario_project_id,
+            "scenario_name": projection.scenario_name,
+            "monthly_revenue": projection.monthly_revenue,
+            "payment_flows": payment_flows,
+            "is_active": projection.is_active,
+            "created_at": now,
+            **projection_summary(projection.monthly_revenue, payment_flows)
+        })
+    table = SalesProjection.__table__
+    result = db.execute(
+        insert(table).returning(table.c.id, table.c.scenario_project_id, table.c.scenario_name, table.c.is_active, table.c.created_at),
+        rows
+    )
+    return [{
+        "id": row.id,
+        "scenario_project_id": row.scenario_project_id,
+        "scenario_name": row.scenario_name,
+        "is_active": row.is_active,
+        "created_at": row.created_at
+    } for row in result]
+
 def get_sales_projection(db: Session, projection_id: int) -> Optional[Dict[str, Any]]:
     """Get a sales projection by ID"""
     query = text("""
@@ -53,7 +155,7 @@ def get_sales_projection(db: Session, projection_id: int) -> Optional[Dict[str,
             "scenario_project_id": row.scenario_project_id,
             "scenario_name": row.scenario_name,
             "monthly_revenue": json.loads(row.monthly_revenue) if isinstance(row.monthly_revenue, str) else row.monthly_revenue,
-            "payment_flows": json.loads(row.payment_flows) if row.payment_flows and isinstance(row.payment_flows, str) else row.payment_flows,
+            "payment_flows": unpack_payment_flows(row.payment_flows),
             "is_active": row.is_active,
             "created_at": row.created_at
         }
@@ -78,13 +180,71 @@ def get_sales_projections_by_project(db: Session, scenario_project_id: int) -> L
             "scenario_project_id": row.scenario_project_id,
             "scenario_name": row.scenario_name,
             "monthly_revenue": json.loads(row.monthly_revenue) if isinstance(row.monthly_revenue, str) else row.monthly_revenue,
-            "payment_flows": json.loads(row.payment_flows) if row.payment_flows and isinstance(row.payment_flows, str) else row.payment_flows,
+            "payment_flows": unpack_payment_flows(row.payment_flows),
             "is_active": row.is_active,
             "created_at": row.created_at
         })
     
     return projections
 
+def list_sales_projection_summaries(db: Session, scenario_project_id: int) -> List[Dict[str, Any]]:
+    """Proyecciones de un proyecto sin monthly_revenue ni payment_flows, con sus totales guardados"""
+    query = text("""
+        SELECT id, scenario_project_id, scenario_name, is_active, created_at,
+               total_revenue, total_units, duration_months
+        FROM sales_projections 
+        WHERE scenario_project_id = :scenario_project_id
+        ORDER BY created_at DESC, id DESC
+    """)
+    
+    result = db.execute(query, {"scenario_project_id": scenario_project_id})
+    return [{
+        "id": row.id,
+        "scenario_project_id": row.scenario_project_id,
+        "scenario_name": row.scenario_name,
+        "is_active": row.is_active,
+        "created_at": row.created_at,
+        "impact_summary": _impact_summary(row)
+    } for row in result]
+
+def prune_simulation_projections(
+    db: Session,
+    scenario_project_id: Optional[int] = None,
+    keep_latest: int = SIMULATION_KEEP_LATEST,
+    retention_days: int = SIMULATION_RETENTION_DAYS
+) -> List[int]:
+    """
+    Borrar en un solo DELETE las proyecciones simuladas vencidas (no commit).
+
+    Una proyección "_simulation" inactiva se borra si no está entre las keep_latest más
+    recientes de su nombre de escenario y es más antigua que retention_days.
+    Retorna los ids borrados.
+    """
+    project_filter = "AND scenario_project_id = :scenario_project_id" if scenario_project_id is not None else ""
+    query = text(f"""
+        DELETE FROM sales_projections
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, is_active, created_at,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY scenario_project_id, scenario_name
+                           ORDER BY created_at DESC, id DESC
+                       ) AS recency
+                FROM sales_projections
+                WHERE scenario_name LIKE :suffix_pattern ESCAPE '\\' {project_filter}
+            ) ranked
+            WHERE recency > :keep_latest AND NOT is_active AND created_at < :cutoff
+        )
+        RETURNING id
+    """)
+    result = db.execute(query, {
+        "suffix_pattern": "%" + SIMULATION_SUFFIX.replace("_", "\\_"),
+        "scenario_project_id": scenario_project_id,
+        "keep_latest": max(keep_latest, 0),
+        "cutoff": datetime.utcnow() - timedelta(days=max(retention_days, 0))
+    })
+    return [row.id for row in result]
+
 def get_active_sales_projection(db: Session, scenario_project_id: int) -> Optional[Dict[str, Any]]:
     """Get the active sales projection for a project"""
     query = text("""
@@ -104,7 +264,7 @@ def get_active_sales_projection(db: Session, scenario_project_id: int) -> Option
             "scenario_project_id": row.scenario_project_id,
             "scenario_name": row.scenario_name,
             "monthly_revenue": json.loads(row.monthly_revenue) if isinstance(row.monthly_revenue, str) else row.monthly_revenue,
-            "payment_flows": json.loads(row.payment_flows) if row.payment_flows and isinstance(row.payment_flows, str) else row.payment_flows,
+            "payment_flows": unpack_payment_flows(row.payment_flows),
             "is_active": row.is_active,
             "created_at": row.created_at
         }
@@ -123,6 +283,11 @@ def update_sales_projection(db: Session, projection_id: int, projection_update:
     if projection_update.monthly_revenue is not None:
         update_fields.append("monthly_revenue = :monthly_revenue")
         params["monthly_revenue"] = json.dumps(projection_update.monthly_revenue)
+        summary = projection_summary(projection_update.monthly_revenue, None)
+        update_fields.append("total_revenue = :total_revenue")
+        update_fields.append("duration_months = :duration_months")
+        params["total_revenue"] = summary["total_revenue"]
+        params["duration_months"] = summary["duration_months"]
     
     if projection_update.is_active is not None:
         update_fields.append("is_active = :is_active")
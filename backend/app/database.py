@@ -1,8 +1,12 @@
 # backend/app/database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import NullPool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
+import threading
+import time
+import zlib
 from dotenv import load_dotenv
 import logging
 from urllib.parse import quote_plus
@@ -56,8 +60,145 @@ if "DATABASE_URL" in os.environ and os.environ["DATABASE_URL"]:
 logger.info(f"Connecting to DB with URL from DATABASE_URL env var: {logged_db_url}")
 
 
+# Connection pool settings (per gunicorn worker; the database sees workers * (pool size + overflow))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Cloud SQL and load balancers drop idle connections; recycle before that happens
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# 0 disables the server-side statement timeout
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "60000"))
+# PgBouncer in transaction mode pools the server connections itself and rejects startup options
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool que mide cuánto espera cada checkout por una conexión libre"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._metrics_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+
+def create_db_engine(url: str = None, **overrides):
+    """
+    Crear el engine con el pool configurado por variables de entorno.
+
+    En modo PgBouncer (DB_PGBOUNCER) el pooling lo hace PgBouncer: se usa NullPool
+    y el statement_timeout debe configurarse en el rol o en PgBouncer.
+    """
+    url = url or SQLALCHEMY_DATABASE_URL
+    options = {}
+    if url.startswith("postgresql"):
+        if DB_PGBOUNCER:
+            options["poolclass"] = NullPool
+        else:
+            options.update(
+                poolclass=InstrumentedQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE,
+                pool_pre_ping=DB_POOL_PRE_PING,
+            )
+            if DB_STATEMENT_TIMEOUT_MS > 0:
+                options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    options.update(overrides)
+    return create_engine(url, **options)
+
+
+def pool_capacity() -> int:
+    """Conexiones que un worker puede tener abiertas a la vez"""
+    return DB_POOL_SIZE + DB_MAX_OVERFLOW
+
+
+def pool_metrics(target_engine=None) -> dict:
+    """Estado del pool del worker: conexiones en uso, overflow y espera por checkout"""
+    pool = (target_engine or engine).pool
+    metrics = {"pool_class": type(pool).__name__, "pgbouncer_mode": DB_PGBOUNCER}
+    if isinstance(pool, QueuePool):
+        metrics.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=DB_MAX_OVERFLOW,
+            timeout_seconds=DB_POOL_TIMEOUT,
+        )
+    if isinstance(pool, InstrumentedQueuePool):
+        with pool._metrics_lock:
+            checkouts = pool.checkouts
+            metrics.update(
+                checkouts=checkouts,
+                checkout_timeouts=pool.timeouts,
+                wait_avg_ms=round(pool.wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                wait_max_ms=round(pool.wait_max * 1000, 3),
+            )
+    return metrics
+
+
+def insert_for_dialect(db):
+    """
+    Constructor insert() con ON CONFLICT del dialecto de db (PostgreSQL o SQLite).
+
+    Retorna None en otros dialectos; el llamador reemplaza las filas con DELETE + INSERT.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    return insert
+
+
+def advisory_lock_key(name: str) -> int:
+    """Clave int4 estable de un nombre (crc32 con signo de 32 bits)"""
+    key = zlib.crc32(name.encode("utf-8"))
+    return key - (1 << 32) if key >= (1 << 31) else key
+
+
+def advisory_xact_lock(db, namespace: int, name: str, shared: bool = False) -> None:
+    """
+    Esperar el advisory lock (namespace, name) de PostgreSQL hasta el fin de la transacción de db.
+
+    Las transacciones que toman la misma clave se serializan; con shared=True solo esperan
+    a quien la tenga en modo exclusivo. El lock se libera con el commit o el rollback, así
+    que también funciona detrás de PgBouncer en modo transacción.
+    Fuera de PostgreSQL no hace nada (SQLite ya serializa las escrituras).
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    function = "pg_advisory_xact_lock_shared" if shared else "pg_advisory_xact_lock"
+    db.execute(
+        text(f"SELECT {function}(:namespace, :key)"),
+        {"namespace": namespace, "key": advisory_lock_key(name)},
+    )
+
+
 # Create SQLAlchemy engine
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+engine = create_db_engine()
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -66,8 +207,9 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 def get_db():
+    """Dependencia de sesión compartida por todos los routers: una sesión por request, devuelta al pool al terminar"""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,187 @@
+"""
+Delivery month of every unit of a sales projection.
+
+Months are 1-based and counted from the month of the project start, like the
+sale_month of the projection payment flows. For each payment flow:
+- a unit with a delivery_date is delivered in that month;
+- without a delivery window (project delivery start/end dates) the unit is
+  delivered DELIVERY_LAG_MONTHS after its sale;
+- a unit sold before the window is delivered in its first month, and a unit
+  sold after it in its sale month (it is already built);
+- units sold inside the window are allocated by capacity: every month of the
+  window takes at most ceil(deliveries in the window / window length) units,
+  and units are placed in (sale month, unit number) order in the first month
+  with room that is not before their sale. A unit that finds no room is
+  delivered in the last month of the window.
+
+The allocation only depends on its inputs (no per-process hash salt), so every
+worker computes the same months. It is computed once per projection and
+cached in the worker, keyed by the projection id and a digest of the inputs.
+"""
+
+import threading
+import zlib
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .models import ProjectUnit
+from .unit_sales_simulation import DELIVERY_LAG_MONTHS
+
+
+def months_from_start(start: date, when: date) -> int:
+    """Mes 1-based de `when` contado desde el mes de inicio del proyecto"""
+    return ((when.year - start.year) * 12) + (when.month - start.month) + 1
+
+
+def delivery_window(project) -> Optional[Tuple[int, int]]:
+    """(primer mes, último mes) del período de entregas del proyecto, o None si no está definido"""
+    if not (project.start_date and project.delivery_start_date and project.delivery_end_date):
+        return None
+    return (
+        months_from_start(project.start_date, project.delivery_start_date),
+        months_from_start(project.start_date, project.delivery_end_date),
+    )
+
+
+def flow_unit_key(flow: Dict[str, Any]) -> str:
+    """Identificador de la unidad de un flujo de pago"""
+    return flow.get("unit_number") or str(flow.get("unit_id", 0))
+
+
+def load_unit_delivery_months(db: Session, project) -> Dict[str, int]:
+    """Mes de entrega de las unidades con fecha de entrega, por número de unidad"""
+    if not project.start_date:
+        return {}
+    rows = db.query(ProjectUnit.unit_number, ProjectUnit.delivery_date).filter(
+        ProjectUnit.scenario_project_id == project.id,
+        ProjectUnit.delivery_date.isnot(None),
+        ProjectUnit.unit_number.isnot(None)
+    ).all()
+    return {unit_number: months_from_start(project.start_date, delivery_date) for unit_number, delivery_date in rows}
+
+
+def allocate_delivery_months(
+    payment_flows: List[Dict[str, Any]],
+    window: Optional[Tuple[int, int]],
+    unit_delivery_months: Dict[str, int],
+) -> List[int]:
+    """Mes de entrega de cada flujo de pago, en el mismo orden"""
+    months: List[Optional[int]] = [None] * len(payment_flows)
+    pending = []
+    for idx, flow in enumerate(payment_flows):
+        sale_month = flow.get("sale_month", 0) or 0
+        actual = unit_delivery_months.get(flow.get("unit_number"))
+        if actual is not None:
+            months[idx] = actual
+        elif window is None:
+            months[idx] = sale_month + DELIVERY_LAG_MONTHS
+        elif sale_month < window[0]:
+            months[idx] = window[0]
+        elif sale_month > window[1]:
+            months[idx] = sale_month
+        else:
+            pending.append((sale_month, flow_unit_key(flow), idx))
+
+    if not pending:
+        return months
+
+    first, last = window
+    length = last - first + 1
+    load = [0] * length
+    for month in months:
+        if month is not None and first <= month <= last:
+            load[month - first] += 1
+    capacity = -(-(sum(load) + len(pending)) // length)
+
+    # next_free[i]: first month index >= i with room (length when none), path-compressed
+    next_free = list(range(length + 1))
+
+    def find(i: int) -> int:
+        root = i
+        while next_free[root] != root:
+            root = next_free[root]
+        while next_free[i] != root:
+            next_free[i], i = root, next_free[i]
+        return root
+
+    for i in range(length):
+        if load[i] >= capacity:
+            next_free[i] = i + 1
+
+    for sale_month, _, idx in sorted(pending):
+        slot = find(sale_month - first)
+        if slot == length:
+            months[idx] = last
+            continue
+        months[idx] = first + slot
+        load[slot] += 1
+        if load[slot] >= capacity:
+            next_free[slot] = slot + 1
+    return months
+
+
+class DeliverySchedule:
+    """Mes de entrega por flujo de pago de una proyección de ventas"""
+
+    __slots__ = ("months",)
+
+    def __init__(self, months: List[int]):
+        self.months = months
+
+    def monthly_counts(self, payment_flows: List[Dict[str, Any]], amount_field: Optional[str] = None) -> Dict[int, int]:
+        """Unidades entregadas por mes (solo flujos con monto positivo en `amount_field` si se indica)"""
+        counts: Dict[int, int] = {}
+        for flow, month in zip(payment_flows, self.months):
+            if amount_field and not (flow.get(amount_field) or 0) > 0:
+                continue
+            counts[month] = counts.get(month, 0) + 1
+        return counts
+
+
+def _inputs_digest(payment_flows, window, unit_delivery_months) -> Tuple:
+    flows_key = "|".join(f"{flow_unit_key(flow)}:{flow.get('sale_month', 0)}" for flow in payment_flows)
+    units_key = "|".join(f"{unit}:{month}" for unit, month in sorted(unit_delivery_months.items()))
+    return (len(payment_flows), window, zlib.crc32(flows_key.encode("utf-8")), zlib.crc32(units_key.encode("utf-8")))
+
+
+class DeliveryScheduleCache:
+    """Calendarios de entrega por proyección en este worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[Any, Tuple[Tuple, DeliverySchedule]] = {}
+
+    def get(self, projection_id, payment_flows, window, unit_delivery_months) -> DeliverySchedule:
+        digest = _inputs_digest(payment_flows, window, unit_delivery_months)
+        with self._lock:
+            entry = self._entries.get(projection_id)
+            if entry and entry[0] == digest:
+                return entry[1]
+        schedule = DeliverySchedule(allocate_delivery_months(payment_flows, window, unit_delivery_months))
+        if projection_id is not None:
+            with self._lock:
+                self._entries[projection_id] = (digest, schedule)
+        return schedule
+
+    def invalidate(self, projection_id=None):
+        with self._lock:
+            if projection_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(projection_id, None)
+
+
+delivery_schedules = DeliveryScheduleCache()
+
+
+def projection_delivery_schedule(db: Session, project, projection: Dict[str, Any]) -> DeliverySchedule:
+    """Calendario de entregas de una proyección de ventas (dict de crud_sales_projections)"""
+    payment_flows = projection.get("payment_flows") or []
+    return delivery_schedules.get(
+        projection.get("id"),
+        payment_flows,
+        delivery_window(project),
+        load_unit_delivery_months(db, project),
+    )
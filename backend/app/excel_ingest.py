@@ -0,0 +1,240 @@
+"""
+Excel ingestion for the wide amount_YYYY_MM tables (miscelaneos,
+estudios_disenos_permisos, gastos_equipo).
+
+The sheet is processed column-wise:
+- headers are normalized once: every accepted month spelling (amount_2025_03,
+  2025_03, 2025/03, mar/2025, Excel dates) maps to the amount_YYYY_MM column;
+- the month columns are melted to (row, column, value) and validated with
+  pandas masks (empty concept, non-numeric amounts);
+- the valid rows are pivoted back to the columns the table actually has.
+
+The rows are loaded with a single COPY into a temporary staging table and
+merged into the target with set-based statements (DELETE + INSERT ... SELECT
+for replace, UPDATE ... FROM + INSERT ... SELECT for update). Everything runs
+in one transaction, so a failed upload leaves the table as it was.
+"""
+
+import io
+import logging
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .schema_catalog import get_schema_catalog
+
+logger = logging.getLogger(__name__)
+
+MONTH_ABBR = ["ene", "feb", "mar", "abr", "may", "jun", "jul", "ago", "sep", "oct", "nov", "dic"]
+MONTH_ABBR_EN = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+_MONTH_NUMBERS = {name: idx + 1 for names in (MONTH_ABBR, MONTH_ABBR_EN) for idx, name in enumerate(names)}
+
+AMOUNT_COLUMN_RE = re.compile(r"^amount_(\d{4})_(\d{2})$")
+_NUMERIC_MONTH_RE = re.compile(r"^(?:amount_)?(\d{4})[_/\-](\d{1,2})$")
+_NAMED_MONTH_RE = re.compile(r"^([a-z]{3})[a-z]*[\s/\-_]+(\d{4})$")
+
+STAGE_TABLE = "excel_upload_stage"
+
+UPDATE_MODES = ("replace", "append", "update")
+
+
+class ExcelIngestError(ValueError):
+    """Hoja o modo de carga inválido; nada se escribe"""
+
+
+def amount_column(year: int, month: int) -> str:
+    return f"amount_{year}_{month:02d}"
+
+
+def readable_month(column: str) -> str:
+    """amount_2025_03 -> Mar/2025 (formato del template)"""
+    year, month = AMOUNT_COLUMN_RE.match(column).groups()
+    return f"{MONTH_ABBR[int(month) - 1].capitalize()}/{year}"
+
+
+def normalize_header(header: Any) -> str:
+    """Nombre de columna normalizado: amount_YYYY_MM para los meses, minúsculas sin espacios para el resto"""
+    if isinstance(header, (datetime, date, pd.Timestamp)):
+        return amount_column(header.year, header.month)
+    name = str(header).strip().lower()
+    match = _NUMERIC_MONTH_RE.match(name)
+    if match and 1 <= int(match.group(2)) <= 12:
+        return amount_column(int(match.group(1)), int(match.group(2)))
+    match = _NAMED_MONTH_RE.match(name)
+    if match and match.group(1) in _MONTH_NUMBERS:
+        return amount_column(int(match.group(2)), _MONTH_NUMBERS[match.group(1)])
+    return name
+
+
+def read_sheet(contents: bytes, sheet_name: Optional[str] = None) -> pd.DataFrame:
+    """Leer la hoja y normalizar los encabezados; si dos encabezados son el mismo mes, vale el primero"""
+    df = pd.read_excel(io.BytesIO(contents), sheet_name=sheet_name or 0)
+    df.columns = [normalize_header(column) for column in df.columns]
+    return df.loc[:, ~df.columns.duplicated()]
+
+
+def month_columns(df: pd.DataFrame) -> List[str]:
+    return [column for column in df.columns if AMOUNT_COLUMN_RE.match(column)]
+
+
+def _numeric(values: pd.Series) -> pd.Series:
+    """Valores de celda a número; acepta separadores de miles y símbolo de moneda en texto"""
+    as_text = values.astype("string").str.replace(r"[,\s$]", "", regex=True)
+    return pd.to_numeric(values.where(~values.map(lambda v: isinstance(v, str)), as_text), errors="coerce")
+
+
+def prepare_rows(
+    df: pd.DataFrame,
+    key_column: str,
+    table_columns: List[str],
+) -> Tuple[pd.DataFrame, List[str], List[str]]:
+    """
+    Validar y transformar la hoja a filas de la tabla.
+
+    Retorna (filas válidas con key_column + columnas de meses de la tabla, errores,
+    meses de la hoja que la tabla no tiene). Una fila con el concepto vacío o con
+    un monto no numérico se omite completa.
+    """
+    if key_column not in df.columns:
+        raise ExcelIngestError(f"Falta la columna requerida '{key_column}'")
+
+    sheet_months = month_columns(df)
+    target_months = [column for column in sheet_months if column in table_columns]
+    ignored_months = [column for column in sheet_months if column not in table_columns]
+
+    frame = df[[key_column] + target_months].copy()
+    frame["_row"] = range(1, len(frame) + 1)
+    keys = frame[key_column].astype("string").str.strip()
+    empty_key = keys.isna() | (keys == "")
+
+    long = frame.melt(id_vars=["_row"], value_vars=target_months, var_name="column", value_name="raw")
+    long["amount"] = _numeric(long["raw"])
+    blank = long["raw"].isna() | (long["raw"].astype("string").str.strip() == "")
+    invalid = ~blank & long["amount"].isna()
+
+    errors = [f"Fila {row}: '{key_column}' vacío" for row in frame.loc[empty_key, "_row"]]
+    errors += [
+        f"Fila {row}: valor no numérico en {readable_month(column)} ({raw!r})"
+        for row, column, raw in long.loc[invalid, ["_row", "column", "raw"]].itertuples(index=False)
+    ]
+
+    bad_rows = set(frame.loc[empty_key, "_row"]) | set(long.loc[invalid, "_row"])
+    valid = frame.loc[~frame["_row"].isin(bad_rows), ["_row"]].copy()
+    valid[key_column] = keys[valid.index]
+
+    amounts = long.loc[~long["_row"].isin(bad_rows)].pivot(index="_row", columns="column", values="amount")
+    valid = valid.join(amounts, on="_row")
+    for column in target_months:
+        if column not in valid.columns:
+            valid[column] = 0.0
+    valid[target_months] = valid[target_months].fillna(0.0)
+    return valid.drop(columns="_row")[[key_column] + target_months], errors, ignored_months
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _load_stage(db: Session, rows: pd.DataFrame) -> None:
+    """Cargar las filas al staging: COPY en PostgreSQL, INSERT multi-fila en otros motores"""
+    columns = list(rows.columns)
+    if db.get_bind().dialect.name == "postgresql":
+        buffer = io.StringIO()
+        rows.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        raw_connection = db.connection().connection
+        with raw_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {STAGE_TABLE} ({', '.join(_quote(c) for c in columns)}) FROM STDIN WITH (FORMAT csv)",
+                buffer,
+            )
+    elif len(rows):
+        params = {f"p{idx}": column for idx, column in enumerate(columns)}
+        db.execute(
+            text(f"INSERT INTO {STAGE_TABLE} ({', '.join(_quote(c) for c in columns)}) "
+                 f"VALUES ({', '.join(':' + p for p in params)})"),
+            [dict(zip(params, values)) for values in rows.itertuples(index=False, name=None)],
+        )
+
+
+def load_rows(db: Session, table_name: str, key_column: str, rows: pd.DataFrame, update_mode: str) -> Dict[str, int]:
+    """
+    Escribir las filas en la tabla a través de un staging temporal (sin commit).
+
+    replace: DELETE + INSERT ... SELECT en la misma transacción.
+    append: INSERT ... SELECT.
+    update: UPDATE ... FROM por key_column para los existentes e INSERT ... SELECT para los nuevos;
+    si el concepto se repite en la hoja, vale la última fila.
+    """
+    if update_mode not in UPDATE_MODES:
+        raise ExcelIngestError(f"Modo de carga '{update_mode}' no válido ({', '.join(UPDATE_MODES)})")
+    if update_mode == "update":
+        rows = rows.drop_duplicates(subset=[key_column], keep="last")
+
+    columns = list(rows.columns)
+    months = columns[1:]
+    column_list = ", ".join(_quote(c) for c in columns)
+    target, key = _quote(table_name), _quote(key_column)
+    is_postgres = db.get_bind().dialect.name == "postgresql"
+
+    db.execute(text(f"DROP TABLE IF EXISTS {STAGE_TABLE}"))
+    db.execute(text(
+        f"CREATE TEMPORARY TABLE {STAGE_TABLE} "
+        f"{'ON COMMIT DROP ' if is_postgres else ''}AS SELECT {column_list} FROM {target} WHERE 1 = 0"
+    ))
+    _load_stage(db, rows)
+
+    results = {"created": 0, "updated": 0, "deleted": 0}
+    if update_mode == "replace":
+        results["deleted"] = db.execute(text(f"DELETE FROM {target}")).rowcount or 0
+    if update_mode == "update" and months:
+        assignments = ", ".join(f"{_quote(m)} = s.{_quote(m)}" for m in months)
+        results["updated"] = db.execute(text(
+            f"UPDATE {target} SET {assignments}, updated_at = CURRENT_TIMESTAMP "
+            f"FROM {STAGE_TABLE} s WHERE {target}.{key} = s.{key}"
+        )).rowcount or 0
+
+    if update_mode == "update":
+        staged = ", ".join(f"s.{_quote(c)}" for c in columns)
+        insert_from_stage = (
+            f"INSERT INTO {target} ({column_list}) SELECT {staged} FROM {STAGE_TABLE} s "
+            f"WHERE NOT EXISTS (SELECT 1 FROM {target} t WHERE t.{key} = s.{key})"
+        )
+    else:
+        insert_from_stage = f"INSERT INTO {target} ({column_list}) SELECT {column_list} FROM {STAGE_TABLE}"
+    results["created"] = db.execute(text(insert_from_stage)).rowcount or 0
+
+    if not is_postgres:
+        db.execute(text(f"DROP TABLE {STAGE_TABLE}"))
+    return results
+
+
+def ingest_sheet(
+    db: Session,
+    contents: bytes,
+    table_name: str,
+    key_column: str,
+    update_mode: str = "replace",
+    sheet_name: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Leer, validar y cargar una hoja en la tabla (sin commit); retorna el resumen para la respuesta"""
+    df = read_sheet(contents, sheet_name)
+    table_columns = [c for c in get_schema_catalog(db).columns(table_name) if AMOUNT_COLUMN_RE.match(c)]
+    rows, errors, ignored_months = prepare_rows(df, key_column, table_columns)
+    counts = load_rows(db, table_name, key_column, rows, update_mode)
+    logger.info(
+        f"Excel upload into {table_name} ({update_mode}): {len(rows)} rows, "
+        f"{counts['created']} created, {counts['updated']} updated, {len(errors)} errors"
+    )
+    return {
+        "processed": len(rows),
+        "errors": errors,
+        "created": counts["created"],
+        "updated": counts["updated"],
+        "skipped": len(df) - len(rows),
+        "ignored_months": ignored_months,
+    }
@@ -0,0 +1,129 @@
+"""
+Credit line ledger for scenario projects.
+
+Loads every credit line and usage of a project once and derives the running
+drawdown/payment balance and the monthly interest series in a single sweep,
+instead of issuing SUM queries per credit line per month.
+"""
+
+import logging
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from .models import LineaCreditoProyecto, LineaCreditoProyectoUso
+
+logger = logging.getLogger(__name__)
+
+# Transaction types that increase / decrease the outstanding balance for interest purposes
+DRAWDOWN_TYPES = ("DRAWDOWN", "DISPOSICION")
+PAYMENT_TYPES = ("PAYMENT", "ABONO_CAPITAL", "ABONO_COBRO_CLIENTE")
+
+# Transaction types counted as financing inflows in the project cash flow
+INFLOW_TYPES = ("DISPOSICION", "DRAWDOWN")
+
+
+class CreditLineLedger:
+    """Usos de las líneas de crédito de un proyecto, ordenados por fecha_uso"""
+
+    def __init__(self, credit_lines: List[LineaCreditoProyecto], usages: List[LineaCreditoProyectoUso]):
+        self.credit_lines = credit_lines
+        self.usages = sorted(usages, key=lambda u: (u.fecha_uso, u.id or 0))
+
+        self._usages_by_line: Dict[int, List[LineaCreditoProyectoUso]] = {line.id: [] for line in credit_lines}
+        self._usages_by_month: Dict[Tuple[int, int, int], List[LineaCreditoProyectoUso]] = {}
+        for usage in self.usages:
+            line_id = usage.linea_credito_proyecto_id
+            self._usages_by_line.setdefault(line_id, []).append(usage)
+            key = (line_id, usage.fecha_uso.year, usage.fecha_uso.month)
+            self._usages_by_month.setdefault(key, []).append(usage)
+
+    def usages_in_month(self, credit_line_id: int, year: int, month: int) -> List[LineaCreditoProyectoUso]:
+        """Usos de una línea dentro del mes calendario indicado"""
+        return self._usages_by_month.get((credit_line_id, year, month), [])
+
+    def monthly_financing_flows(self) -> Dict[str, Dict[str, Decimal]]:
+        """Entradas (disposiciones) y salidas (abonos, pagos) agregadas por período YYYY-MM"""
+        flows: Dict[str, Dict[str, Decimal]] = {}
+        for usage in self.usages:
+            period_key = usage.fecha_uso.strftime('%Y-%m')
+            if period_key not in flows:
+                flows[period_key] = {'inflow': Decimal('0.0'), 'outflow': Decimal('0.0')}
+
+            if usage.tipo_transaccion in INFLOW_TYPES:
+                flows[period_key]['inflow'] += Decimal(usage.monto_usado)
+            else:  # ABONO, PAGO_INTERESES, etc.
+                flows[period_key]['outflow'] += Decimal(usage.monto_usado)
+        return flows
+
+    def balance_sweep(self, periods: List[Tuple[int, int]]) -> List[Dict[int, Decimal]]:
+        """
+        Saldo de cada línea al primer día de cada período (year, month).
+
+        Incluye los usos con fecha_uso <= primer día del mes, igual que el cálculo
+        de intereses original. Una sola pasada por los usos ordenados de cada línea.
+        """
+        order = sorted(range(len(periods)), key=lambda i: periods[i])
+        results: List[Optional[Dict[int, Decimal]]] = [None] * len(periods)
+
+        cursors = {line.id: 0 for line in self.credit_lines}
+        drawdowns = {line.id: Decimal('0.0') for line in self.credit_lines}
+        payments = {line.id: Decimal('0.0') for line in self.credit_lines}
+
+        for idx in order:
+            year, month = periods[idx]
+            cutoff = date(year, month, 1)
+            balances = {}
+            for line in self.credit_lines:
+                line_usages = self._usages_by_line.get(line.id, [])
+                cursor = cursors[line.id]
+                while cursor < len(line_usages) and line_usages[cursor].fecha_uso <= cutoff:
+                    usage = line_usages[cursor]
+                    if usage.tipo_transaccion in DRAWDOWN_TYPES:
+                        drawdowns[line.id] += usage.monto_usado
+                    elif usage.tipo_transaccion in PAYMENT_TYPES:
+                        payments[line.id] += usage.monto_usado
+                    cursor += 1
+                cursors[line.id] = cursor
+                balances[line.id] = drawdowns[line.id] - payments[line.id]
+            results[idx] = balances
+
+        return results
+
+    def interest_series(self, periods: List[Tuple[int, int]]) -> List[Decimal]:
+        """Costo financiero (intereses) de cada período sobre el saldo de las líneas"""
+        series = []
+        for balances in self.balance_sweep(periods):
+            total_interest = Decimal('0.0')
+            for line in self.credit_lines:
+                if not (line.interest_rate and line.monto_total_linea):
+                    continue
+                current_balance = balances[line.id]
+                if current_balance > 0:
+                    monthly_rate = line.interest_rate / 12
+                    total_interest += current_balance * monthly_rate
+            series.append(total_interest)
+        return series
+
+    def monthly_interest(self, year: int, month: int) -> Decimal:
+        """Costo financiero de un solo período"""
+        return self.interest_series([(year, month)])[0]
+
+
+def load_credit_line_ledger(db: Session, project_id: int) -> CreditLineLedger:
+    """Cargar todas las líneas y usos del proyecto en dos consultas"""
+    credit_lines = db.query(LineaCreditoProyecto).filter(
+        LineaCreditoProyecto.scenario_project_id == project_id
+    ).order_by(LineaCreditoProyecto.id).all()
+
+    if not credit_lines:
+        return CreditLineLedger([], [])
+
+    usages = db.query(LineaCreditoProyectoUso).join(LineaCreditoProyecto).filter(
+        LineaCreditoProyecto.scenario_project_id == project_id
+    ).order_by(LineaCreditoProyectoUso.fecha_uso, LineaCreditoProyectoUso.id).all()
+
+    logger.debug(f"Loaded credit line ledger for project {project_id}: {len(credit_lines)} lines, {len(usages)} usages")
+    return CreditLineLedger(credit_lines, usages)
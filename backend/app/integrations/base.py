@@ -1,15 +1,29 @@
 """
 Base classes and interfaces for accounting system integrations
+
+Integrations talk to the external systems through one pooled httpx.AsyncClient
+per integration (connections capped by max_concurrency) and fetch entries page
+by page. A sync streams the pages through a bounded asyncio.Queue into batched
+database writes that run in the thread pool, so neither the full result set
+nor a blocking HTTP call ever sits on the event loop.
 """
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional, Union
+from typing import AsyncIterator, List, Dict, Any, Optional, Union
 from datetime import datetime, date
 from enum import Enum
 from pydantic import BaseModel, Field
+import httpx
 import logging
 
+from ..concurrency import run_blocking
+from .store import store_entries_batch
+
 logger = logging.getLogger(__name__)
 
+# Marks the end of the entry stream on the sync queue
+_END_OF_STREAM = object()
+
 class IntegrationStatus(str, Enum):
     """Status of integration operations"""
     SUCCESS = "success"
@@ -93,6 +107,7 @@ class SyncResult(BaseModel):
     warnings: List[str] = []
     sync_timestamp: datetime = Field(default_factory=datetime.now)
     execution_time_seconds: Optional[float] = None
+    records_per_second: Optional[float] = None
 
 class IntegrationConfig(BaseModel):
     """Base configuration for integrations"""
@@ -105,13 +120,58 @@ class IntegrationConfig(BaseModel):
     last_sync: Optional[datetime] = None
     connection_params: Dict[str, Any] = {}
 
+    # Fetch and write tuning
+    page_size: int = Field(default=500, ge=1, description="Records requested per page")
+    max_concurrency: int = Field(default=4, ge=1, description="Simultaneous HTTP connections to the external system")
+    request_timeout_seconds: float = 30.0
+    batch_size: int = Field(default=500, ge=1, description="Entries per database write")
+    queue_size: int = Field(default=2000, ge=1, description="Entries buffered between fetch and write")
+
 class BaseAccountingIntegration(ABC):
     """Abstract base class for all accounting system integrations"""
     
     def __init__(self, config: IntegrationConfig):
         self.config = config
+        self.integration_id = config.name  # The manager sets the registered id
         self.logger = logging.getLogger(f"{self.__class__.__module__}.{self.__class__.__name__}")
-        self._connection = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_loop = None
+        # Set when the integration rotates its credentials (OAuth refresh); the manager persists them
+        self.credentials_changed = False
+    
+    def _client_options(self) -> Dict[str, Any]:
+        """Extra httpx.AsyncClient options (base_url, headers, auth) of the integration"""
+        return {}
+    
+    def http_client(self) -> httpx.AsyncClient:
+        """Pooled async HTTP client of the integration (one per event loop)"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            limits = httpx.Limits(
+                max_connections=self.config.max_concurrency,
+                max_keepalive_connections=self.config.max_concurrency,
+            )
+            self._client = httpx.AsyncClient(
+                limits=limits,
+                timeout=self.config.request_timeout_seconds,
+                **self._client_options()
+            )
+            self._client_loop = loop
+        return self._client
+    
+    def reset_client(self):
+        """Drop the pooled client so the next request picks up new credentials"""
+        self._client = None
+    
+    async def aclose(self):
+        """Close the pooled HTTP client"""
+        if self._client is not None and not self._client.is_closed:
+            try:
+                await self._client.aclose()
+            except RuntimeError:
+                # Client created on an event loop that is already gone
+                pass
+        self._client = None
     
     @abstractmethod
     async def test_connection(self) -> bool:
@@ -119,6 +179,16 @@ class BaseAccountingIntegration(ABC):
         pass
     
     @abstractmethod
+    def iter_accounting_entries(
+        self, 
+        start_date: Optional[date] = None, 
+        end_date: Optional[date] = None,
+        project_code: Optional[str] = None,
+        modified_since: Optional[datetime] = None
+    ) -> AsyncIterator[List[BaseAccountingEntry]]:
+        """Yield accounting entries page by page; errors propagate to the caller"""
+        pass
+    
     async def get_accounting_entries(
         self, 
         start_date: Optional[date] = None, 
@@ -126,7 +196,14 @@ class BaseAccountingIntegration(ABC):
         project_code: Optional[str] = None
     ) -> List[BaseAccountingEntry]:
         """Retrieve accounting entries from external system"""
-        pass
+        entries = []
+        try:
+            async for page in self.iter_accounting_entries(start_date, end_date, project_code):
+                entries.extend(page)
+        except Exception as e:
+            self.logger.error(f"Error retrieving entries: {str(e)}")
+            return []
+        return entries
     
     @abstractmethod
     async def get_customers(self) -> List[BaseCustomer]:
@@ -148,40 +225,92 @@ class BaseAccountingIntegration(ABC):
         start_date: Optional[date] = None, 
         end_date: Optional[date] = None
     ) -> SyncResult:
-        """Synchronize accounting entries with local database"""
+        """
+        Synchronize accounting entries with local database
+        
+        Without a date range the sync is incremental: only entries modified
+        since the last successful sync are requested. The watermark is the
+        start of the sync, and it only moves when every page was fetched and
+        written; a sync of an explicit date range leaves it untouched.
+        """
         start_time = datetime.now()
+        # Watermarks are naive UTC, like the timestamps stored in the database
+        watermark = datetime.utcnow()
+        incremental = start_date is None and end_date is None
+        modified_since = self.config.last_sync if incremental else None
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.config.queue_size)
+        result = SyncResult(
+            status=IntegrationStatus.SUCCESS,
+            total_records=0,
+            successful_records=0,
+            failed_records=0
+        )
+        
+        async def produce():
+            try:
+                async for page in self.iter_accounting_entries(start_date, end_date, modified_since=modified_since):
+                    for entry in page:
+                        await queue.put(entry)
+            finally:
+                await queue.put(_END_OF_STREAM)
         
+        async def consume():
+            batch = []
+            while True:
+                entry = await queue.get()
+                if entry is not _END_OF_STREAM:
+                    batch.append(entry)
+                if batch and (entry is _END_OF_STREAM or len(batch) >= self.config.batch_size):
+                    await self._write_batch(batch, result)
+                    batch = []
+                if entry is _END_OF_STREAM:
+                    return
+        
+        producer = asyncio.create_task(produce())
         try:
-            # Get entries from external system
-            entries = await self.get_accounting_entries(start_date, end_date)
-            
-            # Process and store entries
-            result = await self._process_accounting_entries(entries)
-            
-            # Calculate execution time
-            execution_time = (datetime.now() - start_time).total_seconds()
-            result.execution_time_seconds = execution_time
-            
-            # Update last sync timestamp
-            self.config.last_sync = datetime.now()
-            
-            return result
+            await consume()
+            await producer
             
+            if result.failed_records:
+                result.status = IntegrationStatus.PARTIAL if result.successful_records else IntegrationStatus.FAILED
+            elif incremental:
+                # Update last sync timestamp
+                self.config.last_sync = watermark
+                
         except Exception as e:
             self.logger.error(f"Error during sync: {str(e)}", exc_info=True)
-            return SyncResult(
-                status=IntegrationStatus.FAILED,
-                total_records=0,
-                successful_records=0,
-                failed_records=0,
-                errors=[str(e)],
-                execution_time_seconds=(datetime.now() - start_time).total_seconds()
-            )
+            producer.cancel()
+            result.status = IntegrationStatus.PARTIAL if result.successful_records else IntegrationStatus.FAILED
+            result.errors.append(str(e))
+        
+        # Calculate execution time and throughput
+        result.execution_time_seconds = (datetime.now() - start_time).total_seconds()
+        if result.execution_time_seconds:
+            result.records_per_second = round(result.successful_records / result.execution_time_seconds, 2)
+        return result
+    
+    async def _write_batch(self, batch: List[BaseAccountingEntry], result: SyncResult):
+        """Write one batch in the thread pool and add it to the sync result"""
+        result.total_records += len(batch)
+        try:
+            stored = await self._process_accounting_entries(batch)
+            result.successful_records += stored.successful_records
+            result.failed_records += stored.failed_records
+            result.errors.extend(stored.errors)
+        except Exception as e:
+            self.logger.error(f"Error writing batch of {len(batch)} entries: {str(e)}")
+            result.failed_records += len(batch)
+            result.errors.append(str(e))
     
-    @abstractmethod
     async def _process_accounting_entries(self, entries: List[BaseAccountingEntry]) -> SyncResult:
         """Process and store accounting entries in local database"""
-        pass
+        await run_blocking(store_entries_batch, self.integration_id, entries)
+        return SyncResult(
+            status=IntegrationStatus.SUCCESS,
+            total_records=len(entries),
+            successful_records=len(entries),
+            failed_records=0
+        )
     
     async def get_integration_status(self) -> Dict[str, Any]:
         """Get current status of the integration"""
@@ -195,4 +324,4 @@ class BaseAccountingIntegration(ABC):
             "last_sync": self.config.last_sync,
             "auto_sync": self.config.auto_sync,
             "sync_frequency_hours": self.config.sync_frequency_hours
-        } 
\ No newline at end of file
+        } 
@@ -0,0 +1,87 @@
+"""
+Encryption of the integration secrets stored in integration_states.config.
+
+Passwords, client secrets, API keys and OAuth tokens are stored as Fernet
+tokens ("enc:" prefix) instead of plaintext JSONB. The key is
+INTEGRATION_SECRETS_KEY (a Fernet key, see Fernet.generate_key()); without
+it the key is derived from the application SECRET_KEY, so every worker of a
+deployment decrypts what another one wrote. Rows written before the
+encryption still hold plaintext values: they are read as they are and
+encrypted the next time the integration is saved.
+"""
+import base64
+import hashlib
+import logging
+import os
+from functools import lru_cache
+from typing import Any, Dict
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from ..auth import SECRET_KEY
+
+logger = logging.getLogger(__name__)
+
+# Config fields that hold credentials, in any integration type
+SECRET_FIELDS = ("password", "client_secret", "api_key", "access_token", "refresh_token")
+# Credentials an integration may rotate by itself (OAuth token refresh)
+ROTATING_FIELDS = ("access_token", "refresh_token")
+
+ENCRYPTED_PREFIX = "enc:"
+
+
+class CredentialsError(ValueError):
+    """A stored secret cannot be decrypted with the configured key"""
+
+
+@lru_cache(maxsize=1)
+def _fernet() -> Fernet:
+    key = os.getenv("INTEGRATION_SECRETS_KEY")
+    if not key:
+        logger.warning("INTEGRATION_SECRETS_KEY not set, deriving the integration secrets key from SECRET_KEY")
+        key = base64.urlsafe_b64encode(hashlib.sha256(f"integrations:{SECRET_KEY}".encode("utf-8")).digest())
+    return Fernet(key)
+
+
+def encrypt_value(value: str) -> str:
+    return ENCRYPTED_PREFIX + _fernet().encrypt(value.encode("utf-8")).decode("ascii")
+
+
+def decrypt_value(value: str) -> str:
+    if not value.startswith(ENCRYPTED_PREFIX):
+        return value
+    try:
+        return _fernet().decrypt(value[len(ENCRYPTED_PREFIX):].encode("ascii")).decode("utf-8")
+    except InvalidToken as e:
+        raise CredentialsError("Integration secret encrypted with a different key") from e
+
+
+def encrypt_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of the config with the secret fields encrypted"""
+    stored = dict(config)
+    for field in SECRET_FIELDS:
+        value = stored.get(field)
+        if isinstance(value, str) and value and not value.startswith(ENCRYPTED_PREFIX):
+            stored[field] = encrypt_value(value)
+    return stored
+
+
+def decrypt_config(stored: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of the stored config with the secret fields in plaintext"""
+    config = dict(stored)
+    for field in SECRET_FIELDS:
+        value = config.get(field)
+        if isinstance(value, str):
+            config[field] = decrypt_value(value)
+    return config
+
+
+def apply_rotated_credentials(config, stored: Dict[str, Any]) -> bool:
+    """Copy the persisted OAuth tokens to the in-memory config; True if any changed"""
+    changed = False
+    persisted = decrypt_config(stored)
+    for field in ROTATING_FIELDS:
+        if field in persisted and hasattr(config, field) and getattr(config, field) != persisted[field]:
+            setattr(config, field, persisted[field])
+            changed = True
+    return changed
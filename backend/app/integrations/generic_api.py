@@ -2,10 +2,8 @@
 Generic API Integration for various accounting systems
 Supports systems like Xero, Sage, ODOO, ContPAQ, Aspel, and custom APIs
 """
-import requests
-from typing import List, Dict, Any, Optional, Callable
+from typing import AsyncIterator, List, Dict, Any, Optional, Callable
 from datetime import date, datetime
-import json
 
 from .base import (
     BaseAccountingIntegration, 
@@ -13,8 +11,6 @@ from .base import (
     BaseCustomer, 
     BaseVendor, 
     BaseProject,
-    SyncResult,
-    IntegrationStatus,
     IntegrationConfig
 )
 
@@ -86,33 +82,37 @@ class GenericAPIConfig(IntegrationConfig):
     date_format: str = "%Y-%m-%d"
     currency_field: Optional[str] = None
     
+    # Pagination (page number + page size query params); page_param None disables paging
+    page_param: Optional[str] = "page"
+    page_size_param: str = "per_page"
+    first_page: int = 1
+    # Query param for incremental sync (entries modified since the last sync)
+    modified_since_param: Optional[str] = "modified_since"
+    
 class GenericAPIIntegration(BaseAccountingIntegration):
     """Generic API integration for various accounting systems"""
     
     def __init__(self, config: GenericAPIConfig):
         super().__init__(config)
         self.config: GenericAPIConfig = config
-        self.session = requests.Session()
-        self._setup_authentication()
     
-    def _setup_authentication(self):
+    def _client_options(self) -> Dict[str, Any]:
         """Setup authentication headers based on auth type"""
+        # Common headers
+        headers = {
+            'Content-Type': 'application/json',
+            'Accept': 'application/json'
+        }
+        options: Dict[str, Any] = {"headers": headers}
+        
         if self.config.auth_type == "bearer" and self.config.access_token:
-            self.session.headers.update({
-                'Authorization': f'Bearer {self.config.access_token}'
-            })
+            headers['Authorization'] = f'Bearer {self.config.access_token}'
         elif self.config.auth_type == "basic" and self.config.username and self.config.password:
-            self.session.auth = (self.config.username, self.config.password)
+            options["auth"] = (self.config.username, self.config.password)
         elif self.config.auth_type == "api_key" and self.config.api_key:
-            self.session.headers.update({
-                'X-API-Key': self.config.api_key
-            })
+            headers['X-API-Key'] = self.config.api_key
         
-        # Common headers
-        self.session.headers.update({
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        })
+        return options
     
     def _build_url(self, endpoint_key: str) -> str:
         """Build full URL for an endpoint"""
@@ -144,95 +144,102 @@ class GenericAPIIntegration(BaseAccountingIntegration):
         
         return mapped_data
     
+    async def _pages(self, endpoint_key: str, params: Optional[Dict[str, Any]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield the records of an endpoint page by page; the last page is the first short or empty one"""
+        url = self._build_url(endpoint_key)
+        params = dict(params or {})
+        page = self.config.first_page
+        while True:
+            if self.config.page_param:
+                params[self.config.page_param] = page
+                params[self.config.page_size_param] = self.config.page_size
+            response = await self.http_client().get(url, params=params)
+            if response.status_code != 200:
+                raise RuntimeError(f"API request failed with status {response.status_code}: {response.text}")
+            data = response.json()
+            records = data if isinstance(data, list) else data.get('data', [])
+            if records:
+                yield records
+            if not self.config.page_param or len(records) < self.config.page_size:
+                return
+            page += 1
+    
+    async def _all_records(self, endpoint_key: str) -> List[Dict[str, Any]]:
+        records = []
+        async for page in self._pages(endpoint_key):
+            records.extend(page)
+        return records
+    
     async def test_connection(self) -> bool:
         """Test connection to the API"""
         try:
             url = self._build_url("test")
-            response = self.session.get(url, timeout=10)
+            response = await self.http_client().get(url, timeout=10)
             return response.status_code in [200, 201, 204]
             
         except Exception as e:
             self.logger.error(f"API connection test failed: {str(e)}")
             return False
     
-    async def get_accounting_entries(
+    async def iter_accounting_entries(
         self, 
         start_date: Optional[date] = None, 
         end_date: Optional[date] = None,
-        project_code: Optional[str] = None
-    ) -> List[BaseAccountingEntry]:
-        """Retrieve accounting entries from the API"""
-        try:
-            url = self._build_url("entries")
-            params = {}
-            
-            if start_date:
-                params['start_date'] = start_date.strftime(self.config.date_format)
-            if end_date:
-                params['end_date'] = end_date.strftime(self.config.date_format)
-            if project_code:
-                params['project_code'] = project_code
-            
-            response = self.session.get(url, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                entries_data = data if isinstance(data, list) else data.get('data', [])
-                
-                entries = []
-                for entry_data in entries_data:
-                    mapped_data = self._map_fields(entry_data, "entries")
-                    
-                    entry = BaseAccountingEntry(
-                        external_id=str(mapped_data.get('external_id', '')),
-                        account_code=mapped_data.get('account_code'),
-                        account_name=mapped_data.get('account_name'),
-                        entry_date=mapped_data.get('entry_date', date.today()),
-                        reference=mapped_data.get('reference'),
-                        description=mapped_data.get('description', ''),
-                        debit_amount=mapped_data.get('debit_amount'),
-                        credit_amount=mapped_data.get('credit_amount'),
-                        project_code=mapped_data.get('project_code'),
-                        currency=self.config.currency_field or "USD"
-                    )
-                    entries.append(entry)
-                
-                return entries
-            else:
-                self.logger.error(f"API request failed with status {response.status_code}: {response.text}")
-                return []
+        project_code: Optional[str] = None,
+        modified_since: Optional[datetime] = None
+    ) -> AsyncIterator[List[BaseAccountingEntry]]:
+        """Retrieve accounting entries from the API page by page"""
+        params = {}
+        
+        if start_date:
+            params['start_date'] = start_date.strftime(self.config.date_format)
+        if end_date:
+            params['end_date'] = end_date.strftime(self.config.date_format)
+        if project_code:
+            params['project_code'] = project_code
+        if modified_since and self.config.modified_since_param:
+            params[self.config.modified_since_param] = modified_since.replace(microsecond=0).isoformat()
+        
+        async for page in self._pages("entries", params):
+            entries = []
+            for entry_data in page:
+                mapped_data = self._map_fields(entry_data, "entries")
                 
-        except Exception as e:
-            self.logger.error(f"Error retrieving entries from API: {str(e)}")
-            return []
+                entry = BaseAccountingEntry(
+                    external_id=str(mapped_data.get('external_id', '')),
+                    account_code=mapped_data.get('account_code'),
+                    account_name=mapped_data.get('account_name'),
+                    entry_date=mapped_data.get('entry_date') or date.today(),
+                    reference=mapped_data.get('reference'),
+                    description=mapped_data.get('description', ''),
+                    debit_amount=mapped_data.get('debit_amount'),
+                    credit_amount=mapped_data.get('credit_amount'),
+                    project_code=mapped_data.get('project_code'),
+                    currency=self.config.currency_field or "USD"
+                )
+                entries.append(entry)
+            yield entries
     
     async def get_customers(self) -> List[BaseCustomer]:
         """Retrieve customers from the API"""
         try:
-            url = self._build_url("customers")
-            response = self.session.get(url)
+            customers_data = await self._all_records("customers")
             
-            if response.status_code == 200:
-                data = response.json()
-                customers_data = data if isinstance(data, list) else data.get('data', [])
+            customers = []
+            for customer_data in customers_data:
+                mapped_data = self._map_fields(customer_data, "customers")
                 
-                customers = []
-                for customer_data in customers_data:
-                    mapped_data = self._map_fields(customer_data, "customers")
-                    
-                    customer = BaseCustomer(
-                        external_id=str(mapped_data.get('external_id', '')),
-                        name=mapped_data.get('name', ''),
-                        email=mapped_data.get('email'),
-                        phone=mapped_data.get('phone'),
-                        address=mapped_data.get('address'),
-                        tax_id=mapped_data.get('tax_id')
-                    )
-                    customers.append(customer)
-                
-                return customers
-            else:
-                return []
+                customer = BaseCustomer(
+                    external_id=str(mapped_data.get('external_id', '')),
+                    name=mapped_data.get('name', ''),
+                    email=mapped_data.get('email'),
+                    phone=mapped_data.get('phone'),
+                    address=mapped_data.get('address'),
+                    tax_id=mapped_data.get('tax_id')
+                )
+                customers.append(customer)
+            
+            return customers
                 
         except Exception as e:
             self.logger.error(f"Error retrieving customers from API: {str(e)}")
@@ -241,30 +248,23 @@ class GenericAPIIntegration(BaseAccountingIntegration):
     async def get_vendors(self) -> List[BaseVendor]:
         """Retrieve vendors from the API"""
         try:
-            url = self._build_url("vendors")
-            response = self.session.get(url)
+            vendors_data = await self._all_records("vendors")
             
-            if response.status_code == 200:
-                data = response.json()
-                vendors_data = data if isinstance(data, list) else data.get('data', [])
+            vendors = []
+            for vendor_data in vendors_data:
+                mapped_data = self._map_fields(vendor_data, "vendors")
                 
-                vendors = []
-                for vendor_data in vendors_data:
-                    mapped_data = self._map_fields(vendor_data, "vendors")
-                    
-                    vendor = BaseVendor(
-                        external_id=str(mapped_data.get('external_id', '')),
-                        name=mapped_data.get('name', ''),
-                        email=mapped_data.get('email'),
-                        phone=mapped_data.get('phone'),
-                        address=mapped_data.get('address'),
-                        tax_id=mapped_data.get('tax_id')
-                    )
-                    vendors.append(vendor)
-                
-                return vendors
-            else:
-                return []
+                vendor = BaseVendor(
+                    external_id=str(mapped_data.get('external_id', '')),
+                    name=mapped_data.get('name', ''),
+                    email=mapped_data.get('email'),
+                    phone=mapped_data.get('phone'),
+                    address=mapped_data.get('address'),
+                    tax_id=mapped_data.get('tax_id')
+                )
+                vendors.append(vendor)
+            
+            return vendors
                 
         except Exception as e:
             self.logger.error(f"Error retrieving vendors from API: {str(e)}")
@@ -273,43 +273,26 @@ class GenericAPIIntegration(BaseAccountingIntegration):
     async def get_projects(self) -> List[BaseProject]:
         """Retrieve projects from the API"""
         try:
-            url = self._build_url("projects")
-            response = self.session.get(url)
+            projects_data = await self._all_records("projects")
             
-            if response.status_code == 200:
-                data = response.json()
-                projects_data = data if isinstance(data, list) else data.get('data', [])
+            projects = []
+            for project_data in projects_data:
+                mapped_data = self._map_fields(project_data, "projects")
                 
-                projects = []
-                for project_data in projects_data:
-                    mapped_data = self._map_fields(project_data, "projects")
-                    
-                    project = BaseProject(
-                        external_id=str(mapped_data.get('external_id', '')),
-                        name=mapped_data.get('name', ''),
-                        code=mapped_data.get('code'),
-                        description=mapped_data.get('description'),
-                        start_date=mapped_data.get('start_date'),
-                        end_date=mapped_data.get('end_date'),
-                        budget=mapped_data.get('budget'),
-                        status=mapped_data.get('status')
-                    )
-                    projects.append(project)
-                
-                return projects
-            else:
-                return []
+                project = BaseProject(
+                    external_id=str(mapped_data.get('external_id', '')),
+                    name=mapped_data.get('name', ''),
+                    code=mapped_data.get('code'),
+                    description=mapped_data.get('description'),
+                    start_date=mapped_data.get('start_date'),
+                    end_date=mapped_data.get('end_date'),
+                    budget=mapped_data.get('budget'),
+                    status=mapped_data.get('status')
+                )
+                projects.append(project)
+            
+            return projects
                 
         except Exception as e:
             self.logger.error(f"Error retrieving projects from API: {str(e)}")
             return []
-    
-    async def _process_accounting_entries(self, entries: List[BaseAccountingEntry]) -> SyncResult:
-        """Process and store accounting entries in local database"""
-        # This would integrate with your existing database models
-        return SyncResult(
-            status=IntegrationStatus.SUCCESS,
-            total_records=len(entries),
-            successful_records=len(entries),
-            failed_records=0
-        ) 
\ No newline at end of file
@@ -2,10 +2,16 @@
 Integration Manager - Centralized service for managing all accounting integrations
 """
 import asyncio
-from typing import Dict, List, Optional, Type, Any
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type, TypeVar
 from datetime import datetime, date
 import logging
-from sqlalchemy.orm import Session
+
+from ..concurrency import run_blocking
+from . import state as integration_state
+from .credentials import apply_rotated_credentials, decrypt_config
 
 from .base import (
     BaseAccountingIntegration,
@@ -20,12 +26,25 @@ from .generic_api import GenericAPIIntegration, GenericAPIConfig
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+# Integrations synchronized at the same time by sync_all_integrations
+DEFAULT_SYNC_CONCURRENCY = int(os.getenv("INTEGRATION_SYNC_CONCURRENCY", "4"))
+
+class IntegrationBusyError(RuntimeError):
+    """Another request or worker holds the lock of the integration"""
+
 class IntegrationManager:
     """Manages all accounting system integrations"""
     
     def __init__(self):
         self.integrations: Dict[str, BaseAccountingIntegration] = {}
         self.configs: Dict[str, IntegrationConfig] = {}
+        # Integrations with a sync in progress (one sync per integration at a time)
+        self._running_syncs: set = set()
+        # Persisted configuration each registered integration was built from
+        self._state_fingerprints: Dict[str, str] = {}
+        self._registry_loaded_at = 0.0
         
         # Registry of available integration types
         self.integration_registry: Dict[AccountingSystemType, Type[BaseAccountingIntegration]] = {
@@ -61,6 +80,7 @@ class IntegrationManager:
             
             # Create and store the integration
             integration = integration_class(config)
+            integration.integration_id = integration_id
             self.integrations[integration_id] = integration
             self.configs[integration_id] = config
             
@@ -77,6 +97,7 @@ class IntegrationManager:
             if integration_id in self.integrations:
                 del self.integrations[integration_id]
                 del self.configs[integration_id]
+                self._state_fingerprints.pop(integration_id, None)
                 logger.info(f"Unregistered integration: {integration_id}")
                 return True
             return False
@@ -84,6 +105,73 @@ class IntegrationManager:
             logger.error(f"Error unregistering integration {integration_id}: {str(e)}")
             return False
     
+    def config_from_state(self, state: Dict[str, Any]) -> IntegrationConfig:
+        """Build the integration config from its persisted row"""
+        config_class = self.config_registry[AccountingSystemType(state["system_type"])]
+        config = config_class(**decrypt_config(state["config"]))
+        config.last_sync = state["last_sync"]
+        return config
+    
+    def apply_states(self, states: List[Dict[str, Any]]) -> List[BaseAccountingIntegration]:
+        """
+        Bring the in-memory registry in line with the persisted integrations
+        
+        Integrations whose persisted configuration changed are rebuilt and the
+        ones deleted from the database are dropped. Returns the replaced
+        integrations, whose HTTP clients the caller closes.
+        """
+        replaced = []
+        persisted_ids = set()
+        for row in states:
+            integration_id = row["integration_id"]
+            persisted_ids.add(integration_id)
+            fingerprint = json.dumps(row["config"], sort_keys=True, default=str)
+            if self._state_fingerprints.get(integration_id) == fingerprint and integration_id in self.integrations:
+                continue
+            try:
+                config = self.config_from_state(row)
+            except Exception as e:
+                logger.error(f"Invalid persisted configuration for integration {integration_id}: {str(e)}")
+                continue
+            previous = self.integrations.get(integration_id)
+            if self.register_integration(integration_id, config):
+                self._state_fingerprints[integration_id] = fingerprint
+                if previous is not None:
+                    replaced.append(previous)
+        
+        for integration_id in list(self._state_fingerprints):
+            if integration_id not in persisted_ids:
+                previous = self.integrations.get(integration_id)
+                self.unregister_integration(integration_id)
+                self._state_fingerprints.pop(integration_id, None)
+                if previous is not None:
+                    replaced.append(previous)
+        return replaced
+    
+    async def refresh_from_db(self, max_age_seconds: float = 0) -> Optional[List[Dict[str, Any]]]:
+        """
+        Reload the registry from integration_states if it is older than max_age_seconds
+        
+        Returns the persisted states, or None when the registry was fresh enough
+        or the database could not be read.
+        """
+        if self._registry_loaded_at and time.monotonic() - self._registry_loaded_at < max_age_seconds:
+            return None
+        try:
+            states = await run_blocking(integration_state.load_integration_states)
+        except Exception as e:
+            logger.warning(f"Could not load integration states: {str(e)}")
+            return None
+        
+        self._registry_loaded_at = time.monotonic()
+        for integration in self.apply_states(states):
+            await integration.aclose()
+        return states
+    
+    def mark_persisted(self, integration_id: str, stored_config: Dict[str, Any]):
+        """Record that the registered integration matches its persisted row (its stored config)"""
+        self._state_fingerprints[integration_id] = json.dumps(stored_config, sort_keys=True, default=str)
+    
     def get_integration(self, integration_id: str) -> Optional[BaseAccountingIntegration]:
         """Get an integration by ID"""
         return self.integrations.get(integration_id)
@@ -117,19 +205,73 @@ class IntegrationManager:
             results[integration_id] = await self.test_connection(integration_id)
         return results
     
+    def _already_running(self, integration_id: str) -> SyncResult:
+        return SyncResult(
+            status=IntegrationStatus.PENDING,
+            total_records=0,
+            successful_records=0,
+            failed_records=0,
+            warnings=[f"A sync of {integration_id} is already running"]
+        )
+    
     async def sync_integration(
         self, 
         integration_id: str, 
         start_date: Optional[date] = None, 
-        end_date: Optional[date] = None
+        end_date: Optional[date] = None,
+        trigger: str = "manual",
+        only_if_due: bool = False,
+        attempt: int = 1
     ) -> Optional[SyncResult]:
-        """Sync data for a specific integration"""
+        """
+        Sync data for a specific integration
+        
+        The sync runs under the advisory lock of the integration: if another
+        worker holds it, the result is PENDING and nothing is fetched. The
+        watermark is read from the database after taking the lock and the
+        attempt is recorded in integration_sync_runs before releasing it.
+        With only_if_due, returns None when the integration is no longer due
+        (another worker synced it first).
+        """
         integration = self.get_integration(integration_id)
         if not integration or not integration.config.enabled:
             return None
         
+        if integration_id in self._running_syncs:
+            return self._already_running(integration_id)
+        
+        self._running_syncs.add(integration_id)
+        acquired, lock_connection = False, None
         try:
-            return await integration.sync_accounting_entries(start_date, end_date)
+            acquired, lock_connection, persisted = await self._acquire_lock(integration)
+            if not acquired:
+                return self._already_running(integration_id)
+            
+            if persisted:
+                if only_if_due and not integration_state.is_due(persisted):
+                    return None
+                integration.config.last_sync = persisted["last_sync"]
+            
+            watermark_from = integration.config.last_sync
+            started_at = datetime.utcnow()
+            result = await integration.sync_accounting_entries(start_date, end_date)
+            
+            try:
+                await run_blocking(
+                    integration_state.record_sync_run,
+                    integration_id,
+                    result,
+                    trigger,
+                    started_at,
+                    watermark_from,
+                    integration.config.last_sync,
+                    attempt
+                )
+            except Exception as e:
+                logger.error(f"Could not record sync of integration {integration_id}: {str(e)}")
+                result.warnings.append(f"Sync history not recorded: {str(e)}")
+            
+            return result
         except Exception as e:
             logger.error(f"Error syncing integration {integration_id}: {str(e)}")
             return SyncResult(
@@ -139,26 +281,103 @@ class IntegrationManager:
                 failed_records=0,
                 errors=[str(e)]
             )
+        finally:
+            if acquired:
+                await self._release_lock(integration, lock_connection)
+            self._running_syncs.discard(integration_id)
+    
+    async def _acquire_lock(self, integration: BaseAccountingIntegration):
+        """
+        Take the advisory lock of the integration and load its persisted state
+        
+        Returns (acquired, lock connection, persisted state). The OAuth tokens
+        another worker rotated are copied to the in-memory config.
+        """
+        integration_id = integration.integration_id
+        acquired, lock_connection = await run_blocking(integration_state.try_advisory_lock, integration_id)
+        if not acquired:
+            return False, None, None
+        try:
+            persisted = await run_blocking(integration_state.read_sync_state, integration_id)
+            if persisted:
+                apply_rotated_credentials(integration.config, persisted["config"])
+        except Exception:
+            await run_blocking(integration_state.release_advisory_lock, lock_connection, integration_id)
+            raise
+        return True, lock_connection, persisted
+    
+    async def _release_lock(self, integration: BaseAccountingIntegration, lock_connection):
+        """Persist the credentials rotated under the lock, then release it"""
+        integration_id = integration.integration_id
+        if integration.credentials_changed:
+            try:
+                stored = await run_blocking(integration_state.save_rotated_credentials, integration_id, integration.config)
+                integration.credentials_changed = False
+                if stored is not None:
+                    self.mark_persisted(integration_id, stored)
+            except Exception as e:
+                logger.error(f"Could not persist the rotated credentials of integration {integration_id}: {str(e)}")
+        if lock_connection is not None:
+            try:
+                await run_blocking(integration_state.release_advisory_lock, lock_connection, integration_id)
+            except Exception as e:
+                logger.error(f"Error releasing sync lock of integration {integration_id}: {str(e)}")
+    
+    async def run_locked(self, integration_id: str, operation: Callable[[BaseAccountingIntegration], Awaitable[T]]) -> T:
+        """
+        Run operation(integration) under the lock of the integration
+        
+        Reads that may refresh the OAuth token (customers, vendors, ...) go through
+        here, so a rotated token is persisted before another worker uses the old one.
+        Raises IntegrationBusyError while a sync of the integration is running.
+        """
+        integration = self.get_integration(integration_id)
+        if integration_id in self._running_syncs:
+            raise IntegrationBusyError(f"A sync of {integration_id} is already running")
+        
+        self._running_syncs.add(integration_id)
+        acquired, lock_connection = False, None
+        try:
+            acquired, lock_connection, _ = await self._acquire_lock(integration)
+            if not acquired:
+                raise IntegrationBusyError(f"A sync of {integration_id} is already running")
+            return await operation(integration)
+        finally:
+            if acquired:
+                await self._release_lock(integration, lock_connection)
+            self._running_syncs.discard(integration_id)
     
     async def sync_all_integrations(
         self, 
         start_date: Optional[date] = None, 
-        end_date: Optional[date] = None
+        end_date: Optional[date] = None,
+        max_parallel: Optional[int] = None
     ) -> Dict[str, SyncResult]:
-        """Sync data for all enabled integrations"""
-        sync_tasks = []
-        integration_ids = []
+        """
+        Sync data for all enabled integrations
         
-        for integration_id, integration in self.integrations.items():
-            if integration.config.enabled:
-                sync_tasks.append(self.sync_integration(integration_id, start_date, end_date))
-                integration_ids.append(integration_id)
+        At most max_parallel integrations (INTEGRATION_SYNC_CONCURRENCY by default)
+        sync at the same time; within each one, HTTP requests are capped by its
+        own max_concurrency connection pool.
+        """
+        integration_ids = [
+            integration_id for integration_id, integration in self.integrations.items()
+            if integration.config.enabled
+        ]
         
-        if not sync_tasks:
+        if not integration_ids:
             return {}
         
-        # Run all syncs in parallel
-        results = await asyncio.gather(*sync_tasks, return_exceptions=True)
+        limit = asyncio.Semaphore(max(1, max_parallel or DEFAULT_SYNC_CONCURRENCY))
+        
+        async def limited_sync(integration_id: str):
+            async with limit:
+                return await self.sync_integration(integration_id, start_date, end_date)
+        
+        results = await asyncio.gather(
+            *(limited_sync(integration_id) for integration_id in integration_ids),
+            return_exceptions=True
+        )
         
         # Combine results
         sync_results = {}
@@ -194,6 +413,11 @@ class IntegrationManager:
                 statuses[integration_id] = status
         return statuses
     
+    async def aclose(self):
+        """Close the HTTP clients of all integrations"""
+        for integration in self.integrations.values():
+            await integration.aclose()
+    
     def get_supported_systems(self) -> List[Dict[str, str]]:
         """Get list of supported accounting systems"""
         return [
@@ -1,24 +1,22 @@
 """
 QuickBooks Online API Integration
 """
-import requests
 import base64
-from typing import List, Dict, Any, Optional
-from datetime import date, datetime
-from urllib.parse import urlencode
-import json
+from typing import AsyncIterator, List, Dict, Any, Optional
+from datetime import date, datetime, timezone
 
 from .base import (
-    BaseAccountingIntegration, 
-    BaseAccountingEntry, 
-    BaseCustomer, 
-    BaseVendor, 
+    BaseAccountingIntegration,
+    BaseAccountingEntry,
+    BaseCustomer,
+    BaseVendor,
     BaseProject,
-    SyncResult,
-    IntegrationStatus,
     IntegrationConfig
 )
 
+# QuickBooks query API returns at most 1000 rows per query
+QUICKBOOKS_MAX_RESULTS = 1000
+
 class QuickBooksConfig(IntegrationConfig):
     """QuickBooks specific configuration"""
     client_id: str
@@ -28,238 +26,239 @@ class QuickBooksConfig(IntegrationConfig):
     refresh_token: Optional[str] = None
     realm_id: str  # Company ID
     base_url: str = "https://sandbox-quickbooks.api.intuit.com"  # Use production URL in prod
-    
+    token_url: str = "https://oauth.platform.intuit.com/oauth2/v1/tokens/bearer"
+
 class QuickBooksIntegration(BaseAccountingIntegration):
     """QuickBooks Online API integration"""
-    
+
     def __init__(self, config: QuickBooksConfig):
         super().__init__(config)
         self.config: QuickBooksConfig = config
-        self.session = requests.Session()
-    
+
+    def _client_options(self) -> Dict[str, Any]:
+        return {"base_url": self.config.base_url}
+
+    def _company_path(self, path: str) -> str:
+        return f"/v3/company/{self.config.realm_id}/{path}"
+
     async def test_connection(self) -> bool:
         """Test connection to QuickBooks API"""
         try:
             if not self.config.access_token:
                 return False
-            
-            headers = self._get_auth_headers()
-            url = f"{self.config.base_url}/v3/company/{self.config.realm_id}/companyinfo/{self.config.realm_id}"
-            
-            response = self.session.get(url, headers=headers)
+
+            response = await self.http_client().get(
+                self._company_path(f"companyinfo/{self.config.realm_id}"),
+                headers=self._get_auth_headers()
+            )
             return response.status_code == 200
-            
+
         except Exception as e:
             self.logger.error(f"QuickBooks connection test failed: {str(e)}")
             return False
-    
+
     def _get_auth_headers(self) -> Dict[str, str]:
         """Get authorization headers for API requests"""
         return {
             'Authorization': f'Bearer {self.config.access_token}',
             'Accept': 'application/json'
         }
-    
+
     async def refresh_access_token(self) -> bool:
         """Refresh the access token using refresh token"""
         try:
             if not self.config.refresh_token:
                 return False
-            
+
             auth_string = f"{self.config.client_id}:{self.config.client_secret}"
             auth_bytes = auth_string.encode('ascii')
             auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
-            
+
             headers = {
                 'Authorization': f'Basic {auth_b64}',
                 'Content-Type': 'application/x-www-form-urlencoded'
             }
-            
+
             data = {
                 'grant_type': 'refresh_token',
                 'refresh_token': self.config.refresh_token
             }
-            
-            response = self.session.post(
-                'https://oauth.platform.intuit.com/oauth2/v1/tokens/bearer',
-                headers=headers,
-                data=data
-            )
-            
+
+            response = await self.http_client().post(self.config.token_url, headers=headers, data=data)
+
             if response.status_code == 200:
                 token_data = response.json()
                 self.config.access_token = token_data.get('access_token')
                 self.config.refresh_token = token_data.get('refresh_token')
+                self.credentials_changed = True
                 return True
-            
+
             return False
-            
+
         except Exception as e:
             self.logger.error(f"Token refresh failed: {str(e)}")
             return False
-    
-    async def get_accounting_entries(
-        self, 
-        start_date: Optional[date] = None, 
+
+    async def _query(self, query: str) -> Dict[str, Any]:
+        """Run one query against the QuickBooks query API, refreshing the token once on 401"""
+        url = self._company_path("query")
+        response = await self.http_client().get(url, headers=self._get_auth_headers(), params={'query': query})
+        if response.status_code == 401 and await self.refresh_access_token():
+            response = await self.http_client().get(url, headers=self._get_auth_headers(), params={'query': query})
+        response.raise_for_status()
+        return response.json().get('QueryResponse', {})
+
+    async def query_pages(self, entity: str, conditions: Optional[List[str]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield the rows of SELECT * FROM entity page by page (STARTPOSITION / MAXRESULTS)"""
+        page_size = min(self.config.page_size, QUICKBOOKS_MAX_RESULTS)
+        query = f"SELECT * FROM {entity}"
+        if conditions:
+            query += f" WHERE {' AND '.join(conditions)}"
+
+        start_position = 1
+        while True:
+            data = await self._query(
+                f"{query} ORDERBY Id STARTPOSITION {start_position} MAXRESULTS {page_size}"
+            )
+            rows = data.get(entity, [])
+            if rows:
+                yield rows
+            if len(rows) < page_size:
+                return
+            start_position += page_size
+
+    async def _all_rows(self, entity: str) -> List[Dict[str, Any]]:
+        rows = []
+        async for page in self.query_pages(entity):
+            rows.extend(page)
+        return rows
+
+    def _parse_timestamp(self, value: Optional[str]) -> Optional[datetime]:
+        """QuickBooks timestamps carry an offset; store them as naive UTC"""
+        if not value:
+            return None
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+
+    def _journal_entry_lines(self, entry: Dict[str, Any], project_code: Optional[str]) -> List[BaseAccountingEntry]:
+        """Convert the journal entry lines of one QuickBooks JournalEntry"""
+        entries = []
+        metadata = entry.get('MetaData', {})
+        updated_at = metadata.get('LastUpdatedTime')
+
+        for line in entry.get('Line', []):
+            if line.get('DetailType') == 'JournalEntryLineDetail':
+                detail = line.get('JournalEntryLineDetail', {})
+                account_ref = detail.get('AccountRef', {})
+
+                # Determine debit/credit amounts
+                posting_type = detail.get('PostingType')
+                amount = float(line.get('Amount', 0))
+
+                debit_amount = amount if posting_type == 'Debit' else None
+                credit_amount = amount if posting_type == 'Credit' else None
+
+                accounting_entry = BaseAccountingEntry(
+                    external_id=f"qb_{entry.get('Id')}_{line.get('Id')}",
+                    account_code=account_ref.get('value'),
+                    account_name=account_ref.get('name'),
+                    entry_date=datetime.strptime(entry.get('TxnDate'), '%Y-%m-%d').date(),
+                    reference=entry.get('DocNumber'),
+                    description=line.get('Description', entry.get('PrivateNote', '')),
+                    debit_amount=debit_amount,
+                    credit_amount=credit_amount,
+                    project_code=project_code,  # QuickBooks uses Classes for projects
+                    updated_at=self._parse_timestamp(updated_at)
+                )
+                entries.append(accounting_entry)
+
+        return entries
+
+    async def iter_accounting_entries(
+        self,
+        start_date: Optional[date] = None,
         end_date: Optional[date] = None,
-        project_code: Optional[str] = None
-    ) -> List[BaseAccountingEntry]:
-        """Retrieve journal entries from QuickBooks"""
-        try:
-            headers = self._get_auth_headers()
+        project_code: Optional[str] = None,
+        modified_since: Optional[datetime] = None
+    ) -> AsyncIterator[List[BaseAccountingEntry]]:
+        """Retrieve journal entries from QuickBooks page by page"""
+        # Build query conditions
+        conditions = []
+        if start_date:
+            conditions.append(f"TxnDate >= '{start_date.isoformat()}'")
+        if end_date:
+            conditions.append(f"TxnDate <= '{end_date.isoformat()}'")
+        if modified_since:
+            conditions.append(f"MetaData.LastUpdatedTime >= '{modified_since.replace(microsecond=0).isoformat()}Z'")
+
+        async for page in self.query_pages("JournalEntry", conditions):
             entries = []
-            
-            # Build query parameters
-            query_parts = []
-            if start_date:
-                query_parts.append(f"TxnDate >= '{start_date.isoformat()}'")
-            if end_date:
-                query_parts.append(f"TxnDate <= '{end_date.isoformat()}'")
-            
-            where_clause = " AND ".join(query_parts) if query_parts else ""
-            query = f"SELECT * FROM JournalEntry"
-            if where_clause:
-                query += f" WHERE {where_clause}"
-            
-            url = f"{self.config.base_url}/v3/company/{self.config.realm_id}/query"
-            params = {'query': query}
-            
-            response = self.session.get(url, headers=headers, params=params)
-            
-            if response.status_code == 200:
-                data = response.json()
-                journal_entries = data.get('QueryResponse', {}).get('JournalEntry', [])
-                
-                for entry in journal_entries:
-                    for line in entry.get('Line', []):
-                        if line.get('DetailType') == 'JournalEntryLineDetail':
-                            detail = line.get('JournalEntryLineDetail', {})
-                            account_ref = detail.get('AccountRef', {})
-                            
-                            # Determine debit/credit amounts
-                            posting_type = detail.get('PostingType')
-                            amount = float(line.get('Amount', 0))
-                            
-                            debit_amount = amount if posting_type == 'Debit' else None
-                            credit_amount = amount if posting_type == 'Credit' else None
-                            
-                            accounting_entry = BaseAccountingEntry(
-                                external_id=f"qb_{entry.get('Id')}_{line.get('Id')}",
-                                account_code=account_ref.get('value'),
-                                account_name=account_ref.get('name'),
-                                entry_date=datetime.strptime(entry.get('TxnDate'), '%Y-%m-%d').date(),
-                                reference=entry.get('DocNumber'),
-                                description=line.get('Description', entry.get('PrivateNote', '')),
-                                debit_amount=debit_amount,
-                                credit_amount=credit_amount,
-                                project_code=project_code  # QuickBooks uses Classes for projects
-                            )
-                            entries.append(accounting_entry)
-            
-            return entries
-            
-        except Exception as e:
-            self.logger.error(f"Error retrieving QuickBooks entries: {str(e)}")
-            return []
-    
+            for entry in page:
+                entries.extend(self._journal_entry_lines(entry, project_code))
+            yield entries
+
     async def get_customers(self) -> List[BaseCustomer]:
         """Retrieve customers from QuickBooks"""
         try:
-            headers = self._get_auth_headers()
-            url = f"{self.config.base_url}/v3/company/{self.config.realm_id}/query"
-            params = {'query': "SELECT * FROM Customer"}
-            
-            response = self.session.get(url, headers=headers, params=params)
             customers = []
-            
-            if response.status_code == 200:
-                data = response.json()
-                qb_customers = data.get('QueryResponse', {}).get('Customer', [])
-                
-                for customer in qb_customers:
-                    customer_obj = BaseCustomer(
-                        external_id=f"qb_{customer.get('Id')}",
-                        name=customer.get('Name', ''),
-                        email=customer.get('PrimaryEmailAddr', {}).get('Address'),
-                        phone=customer.get('PrimaryPhone', {}).get('FreeFormNumber'),
-                        tax_id=customer.get('ResaleNum'),
-                        credit_limit=customer.get('CreditLimit', {}).get('value')
-                    )
-                    customers.append(customer_obj)
-            
+
+            for customer in await self._all_rows('Customer'):
+                customer_obj = BaseCustomer(
+                    external_id=f"qb_{customer.get('Id')}",
+                    name=customer.get('Name', customer.get('DisplayName', '')),
+                    email=customer.get('PrimaryEmailAddr', {}).get('Address'),
+                    phone=customer.get('PrimaryPhone', {}).get('FreeFormNumber'),
+                    tax_id=customer.get('ResaleNum'),
+                    credit_limit=customer.get('CreditLimit', {}).get('value')
+                )
+                customers.append(customer_obj)
+
             return customers
-            
+
         except Exception as e:
             self.logger.error(f"Error retrieving QuickBooks customers: {str(e)}")
             return []
-    
+
     async def get_vendors(self) -> List[BaseVendor]:
         """Retrieve vendors from QuickBooks"""
         try:
-            headers = self._get_auth_headers()
-            url = f"{self.config.base_url}/v3/company/{self.config.realm_id}/query"
-            params = {'query': "SELECT * FROM Vendor"}
-            
-            response = self.session.get(url, headers=headers, params=params)
             vendors = []
-            
-            if response.status_code == 200:
-                data = response.json()
-                qb_vendors = data.get('QueryResponse', {}).get('Vendor', [])
-                
-                for vendor in qb_vendors:
-                    vendor_obj = BaseVendor(
-                        external_id=f"qb_{vendor.get('Id')}",
-                        name=vendor.get('Name', ''),
-                        email=vendor.get('PrimaryEmailAddr', {}).get('Address'),
-                        phone=vendor.get('PrimaryPhone', {}).get('FreeFormNumber'),
-                        tax_id=vendor.get('Vendor1099')
-                    )
-                    vendors.append(vendor_obj)
-            
+
+            for vendor in await self._all_rows('Vendor'):
+                vendor_obj = BaseVendor(
+                    external_id=f"qb_{vendor.get('Id')}",
+                    name=vendor.get('Name', vendor.get('DisplayName', '')),
+                    email=vendor.get('PrimaryEmailAddr', {}).get('Address'),
+                    phone=vendor.get('PrimaryPhone', {}).get('FreeFormNumber'),
+                    tax_id=vendor.get('Vendor1099')
+                )
+                vendors.append(vendor_obj)
+
             return vendors
-            
+
         except Exception as e:
             self.logger.error(f"Error retrieving QuickBooks vendors: {str(e)}")
             return []
-    
+
     async def get_projects(self) -> List[BaseProject]:
         """Retrieve classes (projects) from QuickBooks"""
         try:
-            headers = self._get_auth_headers()
-            url = f"{self.config.base_url}/v3/company/{self.config.realm_id}/query"
-            params = {'query': "SELECT * FROM Class"}
-            
-            response = self.session.get(url, headers=headers, params=params)
             projects = []
-            
-            if response.status_code == 200:
-                data = response.json()
-                qb_classes = data.get('QueryResponse', {}).get('Class', [])
-                
-                for cls in qb_classes:
-                    project_obj = BaseProject(
-                        external_id=f"qb_{cls.get('Id')}",
-                        name=cls.get('Name', ''),
-                        code=cls.get('Name', ''),
-                        description=cls.get('Name', ''),
-                        status='Active' if cls.get('Active') else 'Inactive'
-                    )
-                    projects.append(project_obj)
-            
+
+            for cls in await self._all_rows('Class'):
+                project_obj = BaseProject(
+                    external_id=f"qb_{cls.get('Id')}",
+                    name=cls.get('Name', ''),
+                    code=cls.get('Name', ''),
+                    description=cls.get('Name', ''),
+                    status='Active' if cls.get('Active') else 'Inactive'
+                )
+                projects.append(project_obj)
+
             return projects
-            
+
         except Exception as e:
             self.logger.error(f"Error retrieving QuickBooks projects: {str(e)}")
             return []
-    
-    async def _process_accounting_entries(self, entries: List[BaseAccountingEntry]) -> SyncResult:
-        """Process and store accounting entries in local database"""
-        # This would integrate with your existing database models
-        # For now, return a mock result
-        return SyncResult(
-            status=IntegrationStatus.SUCCESS,
-            total_records=len(entries),
-            successful_records=len(entries),
-            failed_records=0
-        ) 
\ No newline at end of file
@@ -1,10 +1,8 @@
 """
 SAP Integration using RFC calls and OData services
 """
-import requests
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 from datetime import date, datetime
-import json
 import base64
 
 from .base import (
@@ -13,8 +11,6 @@ from .base import (
     BaseCustomer, 
     BaseVendor, 
     BaseProject,
-    SyncResult,
-    IntegrationStatus,
     IntegrationConfig
 )
 
@@ -30,6 +26,8 @@ class SAPConfig(IntegrationConfig):
     # OData service configuration
     odata_base_url: Optional[str] = None
     use_odata: bool = True
+    # Line item field compared against the last sync watermark (incremental sync)
+    modified_field: Optional[str] = "LastChangeDateTime"
     
     # RFC configuration (if using pyrfc)
     use_rfc: bool = False
@@ -40,30 +38,54 @@ class SAPIntegration(BaseAccountingIntegration):
     def __init__(self, config: SAPConfig):
         super().__init__(config)
         self.config: SAPConfig = config
-        self.session = requests.Session()
-        
-        # Set up authentication
-        if self.config.use_odata and self.config.odata_base_url:
-            self._setup_odata_auth()
     
-    def _setup_odata_auth(self):
+    def _client_options(self) -> Dict[str, Any]:
         """Setup authentication for OData services"""
+        if not (self.config.use_odata and self.config.odata_base_url):
+            return {}
+        
         auth_string = f"{self.config.username}:{self.config.password}"
         auth_bytes = auth_string.encode('ascii')
         auth_b64 = base64.b64encode(auth_bytes).decode('ascii')
         
-        self.session.headers.update({
-            'Authorization': f'Basic {auth_b64}',
-            'Content-Type': 'application/json',
-            'Accept': 'application/json'
-        })
+        return {
+            "headers": {
+                'Authorization': f'Basic {auth_b64}',
+                'Content-Type': 'application/json',
+                'Accept': 'application/json'
+            }
+        }
+    
+    async def _odata_pages(self, entity_set: str, filters: Optional[List[str]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield the results of an OData entity set page by page ($top / $skip)"""
+        params = {'$format': 'json', '$top': str(self.config.page_size)}
+        if filters:
+            params['$filter'] = " and ".join(filters)
+        
+        url = f"{self.config.odata_base_url}/{entity_set}"
+        skip = 0
+        while True:
+            response = await self.http_client().get(url, params={**params, '$skip': str(skip)})
+            response.raise_for_status()
+            results = response.json().get('d', {}).get('results', [])
+            if results:
+                yield results
+            if len(results) < self.config.page_size:
+                return
+            skip += self.config.page_size
+    
+    async def _odata_all(self, entity_set: str) -> List[Dict[str, Any]]:
+        results = []
+        async for page in self._odata_pages(entity_set):
+            results.extend(page)
+        return results
     
     async def test_connection(self) -> bool:
         """Test connection to SAP system"""
         try:
             if self.config.use_odata and self.config.odata_base_url:
                 # Test OData connection
-                response = self.session.get(f"{self.config.odata_base_url}/$metadata")
+                response = await self.http_client().get(f"{self.config.odata_base_url}/$metadata")
                 return response.status_code == 200
             elif self.config.use_rfc:
                 # Test RFC connection (would require pyrfc library)
@@ -76,84 +98,69 @@ class SAPIntegration(BaseAccountingIntegration):
             self.logger.error(f"SAP connection test failed: {str(e)}")
             return False
     
-    async def get_accounting_entries(
+    async def iter_accounting_entries(
         self, 
         start_date: Optional[date] = None, 
         end_date: Optional[date] = None,
-        project_code: Optional[str] = None
-    ) -> List[BaseAccountingEntry]:
-        """Retrieve accounting entries from SAP"""
-        try:
-            if self.config.use_odata:
-                return await self._get_entries_via_odata(start_date, end_date, project_code)
-            elif self.config.use_rfc:
-                return await self._get_entries_via_rfc(start_date, end_date, project_code)
-            else:
-                return []
-                
-        except Exception as e:
-            self.logger.error(f"Error retrieving SAP entries: {str(e)}")
-            return []
+        project_code: Optional[str] = None,
+        modified_since: Optional[datetime] = None
+    ) -> AsyncIterator[List[BaseAccountingEntry]]:
+        """Retrieve accounting entries from SAP page by page"""
+        if self.config.use_odata and self.config.odata_base_url:
+            pages = self._get_entries_via_odata(start_date, end_date, project_code, modified_since)
+        elif self.config.use_rfc:
+            pages = self._get_entries_via_rfc(start_date, end_date, project_code)
+        else:
+            return
+        
+        async for page in pages:
+            yield page
+    
+    def _odata_entry(self, entry: Dict[str, Any]) -> BaseAccountingEntry:
+        return BaseAccountingEntry(
+            external_id=f"sap_{entry.get('CompanyCode')}_{entry.get('DocumentNumber')}_{entry.get('LineItem')}",
+            account_code=entry.get('GLAccount'),
+            account_name=entry.get('GLAccountName'),
+            entry_date=self._parse_sap_date(entry.get('PostingDate')),
+            reference=entry.get('DocumentNumber'),
+            description=entry.get('DocumentItemText', ''),
+            debit_amount=float(entry.get('DebitAmount', 0)) if entry.get('DebitAmount') else None,
+            credit_amount=float(entry.get('CreditAmount', 0)) if entry.get('CreditAmount') else None,
+            project_code=entry.get('WBSElement'),
+            department=entry.get('CostCenter')
+        )
     
     async def _get_entries_via_odata(
         self, 
         start_date: Optional[date] = None, 
         end_date: Optional[date] = None,
-        project_code: Optional[str] = None
-    ) -> List[BaseAccountingEntry]:
+        project_code: Optional[str] = None,
+        modified_since: Optional[datetime] = None
+    ) -> AsyncIterator[List[BaseAccountingEntry]]:
         """Get entries using SAP OData services"""
-        entries = []
+        # Build OData filter
+        filters = []
+        if start_date:
+            filters.append(f"PostingDate ge datetime'{start_date.isoformat()}T00:00:00'")
+        if end_date:
+            filters.append(f"PostingDate le datetime'{end_date.isoformat()}T23:59:59'")
+        if project_code:
+            filters.append(f"WBSElement eq '{project_code}'")
+        if modified_since and self.config.modified_field:
+            filters.append(
+                f"{self.config.modified_field} ge datetime'{modified_since.replace(microsecond=0).isoformat()}'"
+            )
         
-        try:
-            # Build OData filter
-            filters = []
-            if start_date:
-                filters.append(f"PostingDate ge datetime'{start_date.isoformat()}T00:00:00'")
-            if end_date:
-                filters.append(f"PostingDate le datetime'{end_date.isoformat()}T23:59:59'")
-            if project_code:
-                filters.append(f"WBSElement eq '{project_code}'")
-            
-            filter_string = " and ".join(filters) if filters else ""
-            
-            # Example OData endpoint for GL account line items
-            endpoint = f"{self.config.odata_base_url}/GLAccountLineItemSet"
-            if filter_string:
-                endpoint += f"?$filter={filter_string}"
-            
-            response = self.session.get(endpoint)
-            
-            if response.status_code == 200:
-                data = response.json()
-                sap_entries = data.get('d', {}).get('results', [])
-                
-                for entry in sap_entries:
-                    accounting_entry = BaseAccountingEntry(
-                        external_id=f"sap_{entry.get('CompanyCode')}_{entry.get('DocumentNumber')}_{entry.get('LineItem')}",
-                        account_code=entry.get('GLAccount'),
-                        account_name=entry.get('GLAccountName'),
-                        entry_date=self._parse_sap_date(entry.get('PostingDate')),
-                        reference=entry.get('DocumentNumber'),
-                        description=entry.get('DocumentItemText', ''),
-                        debit_amount=float(entry.get('DebitAmount', 0)) if entry.get('DebitAmount') else None,
-                        credit_amount=float(entry.get('CreditAmount', 0)) if entry.get('CreditAmount') else None,
-                        project_code=entry.get('WBSElement'),
-                        department=entry.get('CostCenter')
-                    )
-                    entries.append(accounting_entry)
-            
-            return entries
-            
-        except Exception as e:
-            self.logger.error(f"Error in OData retrieval: {str(e)}")
-            return []
+        # Example OData endpoint for GL account line items
+        async for page in self._odata_pages("GLAccountLineItemSet", filters):
+            yield [self._odata_entry(entry) for entry in page]
     
     async def _get_entries_via_rfc(
         self, 
         start_date: Optional[date] = None, 
         end_date: Optional[date] = None,
         project_code: Optional[str] = None
-    ) -> List[BaseAccountingEntry]:
+    ) -> AsyncIterator[List[BaseAccountingEntry]]:
         """Get entries using SAP RFC calls"""
         # This would require the pyrfc library
         # Placeholder implementation
@@ -178,11 +185,12 @@ class SAPIntegration(BaseAccountingIntegration):
             # )
             
             self.logger.info("RFC integration not implemented - requires pyrfc library")
-            return entries
             
         except Exception as e:
             self.logger.error(f"Error in RFC retrieval: {str(e)}")
-            return []
+        
+        if entries:
+            yield entries
     
     def _parse_sap_date(self, sap_date_string: str) -> date:
         """Parse SAP date format to Python date"""
@@ -203,25 +211,20 @@ class SAPIntegration(BaseAccountingIntegration):
             if not self.config.use_odata or not self.config.odata_base_url:
                 return []
             
-            endpoint = f"{self.config.odata_base_url}/CustomerSet"
-            response = self.session.get(endpoint)
+            sap_customers = await self._odata_all("CustomerSet")
             customers = []
             
-            if response.status_code == 200:
-                data = response.json()
-                sap_customers = data.get('d', {}).get('results', [])
-                
-                for customer in sap_customers:
-                    customer_obj = BaseCustomer(
-                        external_id=f"sap_{customer.get('CustomerNumber')}",
-                        name=customer.get('CustomerName', ''),
-                        email=customer.get('EmailAddress'),
-                        phone=customer.get('PhoneNumber'),
-                        address=f"{customer.get('Street', '')} {customer.get('City', '')}",
-                        tax_id=customer.get('TaxNumber'),
-                        credit_limit=float(customer.get('CreditLimit', 0)) if customer.get('CreditLimit') else None
-                    )
-                    customers.append(customer_obj)
+            for customer in sap_customers:
+                customer_obj = BaseCustomer(
+                    external_id=f"sap_{customer.get('CustomerNumber')}",
+                    name=customer.get('CustomerName', ''),
+                    email=customer.get('EmailAddress'),
+                    phone=customer.get('PhoneNumber'),
+                    address=f"{customer.get('Street', '')} {customer.get('City', '')}",
+                    tax_id=customer.get('TaxNumber'),
+                    credit_limit=float(customer.get('CreditLimit', 0)) if customer.get('CreditLimit') else None
+                )
+                customers.append(customer_obj)
             
             return customers
             
@@ -235,24 +238,19 @@ class SAPIntegration(BaseAccountingIntegration):
             if not self.config.use_odata or not self.config.odata_base_url:
                 return []
             
-            endpoint = f"{self.config.odata_base_url}/VendorSet"
-            response = self.session.get(endpoint)
+            sap_vendors = await self._odata_all("VendorSet")
             vendors = []
             
-            if response.status_code == 200:
-                data = response.json()
-                sap_vendors = data.get('d', {}).get('results', [])
-                
-                for vendor in sap_vendors:
-                    vendor_obj = BaseVendor(
-                        external_id=f"sap_{vendor.get('VendorNumber')}",
-                        name=vendor.get('VendorName', ''),
-                        email=vendor.get('EmailAddress'),
-                        phone=vendor.get('PhoneNumber'),
-                        address=f"{vendor.get('Street', '')} {vendor.get('City', '')}",
-                        tax_id=vendor.get('TaxNumber')
-                    )
-                    vendors.append(vendor_obj)
+            for vendor in sap_vendors:
+                vendor_obj = BaseVendor(
+                    external_id=f"sap_{vendor.get('VendorNumber')}",
+                    name=vendor.get('VendorName', ''),
+                    email=vendor.get('EmailAddress'),
+                    phone=vendor.get('PhoneNumber'),
+                    address=f"{vendor.get('Street', '')} {vendor.get('City', '')}",
+                    tax_id=vendor.get('TaxNumber')
+                )
+                vendors.append(vendor_obj)
             
             return vendors
             
@@ -266,39 +264,24 @@ class SAPIntegration(BaseAccountingIntegration):
             if not self.config.use_odata or not self.config.odata_base_url:
                 return []
             
-            endpoint = f"{self.config.odata_base_url}/WBSElementSet"
-            response = self.session.get(endpoint)
+            sap_projects = await self._odata_all("WBSElementSet")
             projects = []
             
-            if response.status_code == 200:
-                data = response.json()
-                sap_projects = data.get('d', {}).get('results', [])
-                
-                for project in sap_projects:
-                    project_obj = BaseProject(
-                        external_id=f"sap_{project.get('WBSElement')}",
-                        name=project.get('Description', ''),
-                        code=project.get('WBSElement'),
-                        description=project.get('Description'),
-                        start_date=self._parse_sap_date(project.get('StartDate')) if project.get('StartDate') else None,
-                        end_date=self._parse_sap_date(project.get('EndDate')) if project.get('EndDate') else None,
-                        budget=float(project.get('Budget', 0)) if project.get('Budget') else None,
-                        status=project.get('Status')
-                    )
-                    projects.append(project_obj)
+            for project in sap_projects:
+                project_obj = BaseProject(
+                    external_id=f"sap_{project.get('WBSElement')}",
+                    name=project.get('Description', ''),
+                    code=project.get('WBSElement'),
+                    description=project.get('Description'),
+                    start_date=self._parse_sap_date(project.get('StartDate')) if project.get('StartDate') else None,
+                    end_date=self._parse_sap_date(project.get('EndDate')) if project.get('EndDate') else None,
+                    budget=float(project.get('Budget', 0)) if project.get('Budget') else None,
+                    status=project.get('Status')
+                )
+                projects.append(project_obj)
             
             return projects
             
         except Exception as e:
             self.logger.error(f"Error retrieving SAP projects: {str(e)}")
             return []
-    
-    async def _process_accounting_entries(self, entries: List[BaseAccountingEntry]) -> SyncResult:
-        """Process and store accounting entries in local database"""
-        # This would integrate with your existing database models
-        return SyncResult(
-            status=IntegrationStatus.SUCCESS,
-            total_records=len(entries),
-            successful_records=len(entries),
-            failed_records=0
-        ) 
\ No newline at end of file
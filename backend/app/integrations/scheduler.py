@@ -0,0 +1,154 @@
+"""
+Background scheduler of the automatic integration syncs.
+
+Every gunicorn worker runs one SyncScheduler on its event loop. Each tick
+reloads the registry from integration_states and starts a job for every
+integration with auto_sync whose next_sync_at has arrived. A job waits a
+random jitter (so the workers do not hit the database and the external
+systems in lockstep) and then syncs through IntegrationManager.sync_integration,
+which takes the advisory lock of the integration: the first worker to get it
+runs the sync, the others see it running or no longer due and skip it.
+
+A failed or partial sync is retried with exponential backoff plus jitter, up
+to INTEGRATION_SYNC_MAX_ATTEMPTS attempts; every attempt is recorded in
+integration_sync_runs.
+
+Settings (environment):
+- INTEGRATION_SCHEDULER_ENABLED (true): run the scheduler in this process
+- INTEGRATION_SCHEDULER_INTERVAL (60): seconds between ticks
+- INTEGRATION_SCHEDULER_JITTER (15): maximum random delay in seconds
+- INTEGRATION_SYNC_MAX_ATTEMPTS (3): attempts per scheduled sync
+- INTEGRATION_SYNC_BACKOFF (30): seconds before the first retry, doubled on each one
+"""
+import asyncio
+import logging
+import os
+import random
+from typing import Dict, List, Optional
+
+from .base import IntegrationStatus, SyncResult
+from .manager import DEFAULT_SYNC_CONCURRENCY, IntegrationManager, integration_manager
+from . import state as integration_state
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_INTERVAL_SECONDS = float(os.getenv("INTEGRATION_SCHEDULER_INTERVAL", "60"))
+SCHEDULER_JITTER_SECONDS = float(os.getenv("INTEGRATION_SCHEDULER_JITTER", "15"))
+SYNC_MAX_ATTEMPTS = int(os.getenv("INTEGRATION_SYNC_MAX_ATTEMPTS", "3"))
+RETRY_BACKOFF_SECONDS = float(os.getenv("INTEGRATION_SYNC_BACKOFF", "30"))
+
+# Results that are not retried: done, or running in another worker
+_FINAL_STATUSES = (IntegrationStatus.SUCCESS, IntegrationStatus.PENDING)
+
+
+def scheduler_enabled() -> bool:
+    return os.getenv("INTEGRATION_SCHEDULER_ENABLED", "true").strip().lower() in ("1", "true", "yes")
+
+
+class SyncScheduler:
+    """Periodic runner of the integrations with auto_sync"""
+    
+    def __init__(
+        self,
+        manager: IntegrationManager,
+        interval_seconds: float = SCHEDULER_INTERVAL_SECONDS,
+        jitter_seconds: float = SCHEDULER_JITTER_SECONDS,
+        max_attempts: int = SYNC_MAX_ATTEMPTS,
+        backoff_seconds: float = RETRY_BACKOFF_SECONDS,
+        max_parallel: int = DEFAULT_SYNC_CONCURRENCY
+    ):
+        self.manager = manager
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_seconds = backoff_seconds
+        self.max_parallel = max(1, max_parallel)
+        self._task: Optional[asyncio.Task] = None
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._limit: Optional[asyncio.Semaphore] = None
+    
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+    
+    def start(self):
+        """Start the scheduler loop on the running event loop"""
+        if self.running:
+            return
+        self._limit = asyncio.Semaphore(self.max_parallel)
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Integration sync scheduler started (every {self.interval_seconds:.0f}s)")
+    
+    async def stop(self):
+        """Stop the loop and cancel the jobs in progress"""
+        tasks = list(self._jobs.values())
+        if self._task is not None:
+            tasks.append(self._task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._jobs.clear()
+    
+    async def _run(self):
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Integration scheduler tick failed: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.interval_seconds + random.uniform(0, self.jitter_seconds))
+    
+    async def tick(self) -> List[str]:
+        """Start a job for every due integration; returns the integration ids started"""
+        if self._limit is None:
+            self._limit = asyncio.Semaphore(self.max_parallel)
+        states = await self.manager.refresh_from_db()
+        if states is None:
+            return []
+        
+        started = []
+        for row in states:
+            integration_id = row["integration_id"]
+            if integration_id in self._jobs or not integration_state.is_due(row):
+                continue
+            task = asyncio.create_task(self.run_job(integration_id))
+            self._jobs[integration_id] = task
+            task.add_done_callback(lambda _, key=integration_id: self._jobs.pop(key, None))
+            started.append(integration_id)
+        return started
+    
+    def _retry_delay(self, attempt: int) -> float:
+        return self.backoff_seconds * 2 ** (attempt - 1) + random.uniform(0, self.jitter_seconds)
+    
+    async def run_job(self, integration_id: str) -> Optional[SyncResult]:
+        """Scheduled sync of one integration with jitter, retries and backoff"""
+        await asyncio.sleep(random.uniform(0, self.jitter_seconds))
+        
+        result = None
+        for attempt in range(1, self.max_attempts + 1):
+            async with self._limit:
+                # Only the first attempt checks the schedule: a failed attempt already moved next_sync_at
+                result = await self.manager.sync_integration(
+                    integration_id,
+                    trigger="scheduled",
+                    only_if_due=attempt == 1,
+                    attempt=attempt
+                )
+            if result is None or result.status in _FINAL_STATUSES:
+                return result
+            
+            if attempt < self.max_attempts:
+                delay = self._retry_delay(attempt)
+                logger.warning(
+                    f"Scheduled sync of {integration_id} ended {result.status.value} "
+                    f"(attempt {attempt}/{self.max_attempts}), retrying in {delay:.0f}s"
+                )
+                await asyncio.sleep(delay)
+        
+        logger.error(f"Scheduled sync of {integration_id} failed after {self.max_attempts} attempts")
+        return result
+
+# Global instance
+integration_scheduler = SyncScheduler(integration_manager)
@@ -0,0 +1,251 @@
+"""
+Database-backed state of the accounting integrations.
+
+The integration registry used to live only in the memory of each gunicorn
+worker. integration_states now holds the configuration, the incremental
+sync watermark (last_sync) and the schedule of every integration; each
+worker rebuilds its registry from it. integration_sync_runs keeps one row per
+sync attempt with its throughput. Secrets in the configuration are stored
+encrypted (see credentials.py).
+
+A sync runs under a PostgreSQL transaction-level advisory lock keyed on the
+integration id: a dedicated connection opens a transaction, takes
+pg_try_advisory_xact_lock and keeps the transaction open for the duration of
+the sync; rolling it back releases the lock. Because lock and release belong
+to one transaction, this also holds behind PgBouncer in transaction mode,
+which keeps the server connection assigned until the transaction ends
+(idle_in_transaction_session_timeout, if set, must exceed the longest sync).
+Two workers never sync the same integration at once. The watermark and the
+OAuth tokens are read after taking the lock, and the tokens rotated during
+the sync are written back before releasing it.
+
+These functions are blocking; coroutines call them through run_blocking().
+"""
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal, advisory_lock_key, engine
+from ..models import IntegrationState, IntegrationSyncRun
+from .credentials import ROTATING_FIELDS, encrypt_config
+
+logger = logging.getLogger(__name__)
+
+# First key of pg_try_advisory_xact_lock(int, int): namespace of the integration locks
+ADVISORY_LOCK_NAMESPACE = 0x1A7E
+
+
+def try_advisory_lock(integration_id: str) -> Tuple[bool, Optional[Any]]:
+    """
+    Take the sync lock of the integration without waiting.
+
+    Returns (acquired, connection); the connection holds the lock in an open
+    transaction and must be passed to release_advisory_lock. Outside PostgreSQL
+    there is no cross-process lock and the in-process guard of the manager is
+    the only one.
+    """
+    if engine.dialect.name != "postgresql":
+        return True, None
+    connection = engine.connect()
+    try:
+        acquired = connection.execute(
+            text("SELECT pg_try_advisory_xact_lock(:namespace, :key)"),
+            {"namespace": ADVISORY_LOCK_NAMESPACE, "key": advisory_lock_key(integration_id)},
+        ).scalar()
+    except Exception:
+        connection.close()
+        raise
+    if not acquired:
+        connection.rollback()
+        connection.close()
+        return False, None
+    return True, connection
+
+
+def release_advisory_lock(connection, integration_id: str) -> None:
+    """End the lock transaction of the integration (the lock goes with it)"""
+    if connection is None:
+        return
+    try:
+        connection.rollback()
+    except Exception:
+        # Dropping the connection ends the database session, and with it the lock
+        connection.invalidate()
+        raise
+    finally:
+        connection.close()
+
+
+def _next_sync_at(state: IntegrationState, after: datetime) -> Optional[datetime]:
+    if not (state.auto_sync and state.sync_frequency_hours):
+        return None
+    return after + timedelta(hours=state.sync_frequency_hours)
+
+
+def save_integration_state(
+    db: Session, integration_id: str, config, keep_rotated_credentials: bool = False
+) -> IntegrationState:
+    """
+    Create or update the persisted configuration of an integration (no commit)
+
+    With keep_rotated_credentials the stored OAuth tokens are kept: another worker
+    may have rotated them after this worker loaded its copy of the config.
+    """
+    state = db.query(IntegrationState).filter(IntegrationState.integration_id == integration_id).first()
+    if state is None:
+        state = IntegrationState(integration_id=integration_id, last_sync=config.last_sync)
+        db.add(state)
+
+    stored = encrypt_config(config.model_dump(mode="json", exclude={"last_sync"}))
+    if keep_rotated_credentials and state.config:
+        stored.update({field: state.config[field] for field in ROTATING_FIELDS if field in state.config})
+    state.system_type = config.system_type.value
+    state.config = stored
+    state.enabled = config.enabled
+    state.auto_sync = config.auto_sync
+    state.sync_frequency_hours = config.sync_frequency_hours
+    state.updated_at = datetime.utcnow()
+    if not (state.auto_sync and state.sync_frequency_hours):
+        state.next_sync_at = None
+    db.flush()
+    return state
+
+
+def save_rotated_credentials(integration_id: str, config) -> Optional[Dict[str, Any]]:
+    """
+    Write the OAuth tokens the integration rotated (call while holding its lock).
+
+    Returns the stored configuration, or None if the integration is not persisted.
+    """
+    db = SessionLocal()
+    try:
+        state = db.query(IntegrationState).filter(IntegrationState.integration_id == integration_id).first()
+        if state is None:
+            return None
+        stored = dict(state.config or {})
+        stored.update(encrypt_config({
+            field: getattr(config, field) for field in ROTATING_FIELDS if hasattr(config, field)
+        }))
+        state.config = stored
+        state.updated_at = datetime.utcnow()
+        db.commit()
+        return stored
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def delete_integration_state(db: Session, integration_id: str) -> bool:
+    """Delete the persisted integration (no commit); the sync history is kept"""
+    deleted = db.query(IntegrationState).filter(
+        IntegrationState.integration_id == integration_id
+    ).delete(synchronize_session=False)
+    return bool(deleted)
+
+
+def _state_dict(state: IntegrationState) -> Dict[str, Any]:
+    return {
+        "integration_id": state.integration_id,
+        "system_type": state.system_type,
+        "config": state.config,
+        "enabled": state.enabled,
+        "auto_sync": state.auto_sync,
+        "sync_frequency_hours": state.sync_frequency_hours,
+        "last_sync": state.last_sync,
+        "last_attempt_at": state.last_attempt_at,
+        "last_status": state.last_status,
+        "consecutive_failures": state.consecutive_failures,
+        "next_sync_at": state.next_sync_at,
+        "updated_at": state.updated_at,
+    }
+
+
+def load_integration_states() -> List[Dict[str, Any]]:
+    """All persisted integrations as plain dicts"""
+    db = SessionLocal()
+    try:
+        return [_state_dict(state) for state in db.query(IntegrationState).all()]
+    finally:
+        db.close()
+
+
+def read_sync_state(integration_id: str) -> Optional[Dict[str, Any]]:
+    """Persisted state of one integration, or None if it is not persisted"""
+    db = SessionLocal()
+    try:
+        state = db.query(IntegrationState).filter(IntegrationState.integration_id == integration_id).first()
+        return _state_dict(state) if state else None
+    finally:
+        db.close()
+
+
+def is_due(state: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    """The integration is enabled, has auto_sync and its next scheduled sync has arrived"""
+    if not (state["enabled"] and state["auto_sync"] and state["sync_frequency_hours"]):
+        return False
+    return state["next_sync_at"] is None or state["next_sync_at"] <= (now or datetime.utcnow())
+
+
+def record_sync_run(
+    integration_id: str,
+    result,
+    trigger: str,
+    started_at: datetime,
+    watermark_from: Optional[datetime],
+    watermark_to: Optional[datetime],
+    attempt: int = 1,
+) -> None:
+    """Store a sync attempt and move the watermark and schedule of the integration"""
+    finished_at = datetime.utcnow()
+
+    db = SessionLocal()
+    try:
+        db.add(IntegrationSyncRun(
+            integration_id=integration_id,
+            trigger=trigger,
+            attempt=attempt,
+            status=result.status.value,
+            started_at=started_at,
+            finished_at=finished_at,
+            total_records=result.total_records,
+            successful_records=result.successful_records,
+            failed_records=result.failed_records,
+            execution_time_seconds=result.execution_time_seconds,
+            records_per_second=result.records_per_second,
+            watermark_from=watermark_from,
+            watermark_to=watermark_to,
+            errors=result.errors or None,
+            warnings=result.warnings or None,
+        ))
+
+        state = db.query(IntegrationState).filter(IntegrationState.integration_id == integration_id).first()
+        if state is not None:
+            succeeded = result.status.value == "success"
+            if succeeded and watermark_to:
+                state.last_sync = watermark_to
+            state.last_attempt_at = finished_at
+            state.last_status = result.status.value
+            state.consecutive_failures = 0 if succeeded else (state.consecutive_failures or 0) + 1
+            state.next_sync_at = _next_sync_at(state, finished_at)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def list_sync_runs(db: Session, integration_id: str, limit: int = 50) -> List[IntegrationSyncRun]:
+    """Most recent sync attempts of an integration"""
+    return (
+        db.query(IntegrationSyncRun)
+        .filter(IntegrationSyncRun.integration_id == integration_id)
+        .order_by(IntegrationSyncRun.started_at.desc(), IntegrationSyncRun.id.desc())
+        .limit(limit)
+        .all()
+    )
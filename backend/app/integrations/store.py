@@ -0,0 +1,93 @@
+"""
+Batched persistence of synchronized accounting entries.
+
+Each batch coming off the sync queue is written with one multi-row
+INSERT ... ON CONFLICT (integration_id, external_id) DO UPDATE and committed
+on its own, so a long sync keeps a bounded amount of work per transaction and
+a re-sync of the same window updates rows instead of duplicating them.
+"""
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List
+
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal, insert_for_dialect
+from ..models import IntegrationAccountingEntry
+
+if TYPE_CHECKING:
+    from .base import BaseAccountingEntry
+
+logger = logging.getLogger(__name__)
+
+CONFLICT_COLUMNS = ("integration_id", "external_id")
+
+# Rows per INSERT statement, well below the bind parameter limit of the drivers
+CHUNK_SIZE = 500
+
+
+def _row_dict(integration_id: str, entry: "BaseAccountingEntry", now: datetime) -> Dict:
+    return {
+        "integration_id": integration_id,
+        "external_id": entry.external_id,
+        "account_code": entry.account_code,
+        "account_name": entry.account_name,
+        "entry_date": entry.entry_date,
+        "reference": entry.reference,
+        "description": entry.description,
+        "debit_amount": entry.debit_amount,
+        "credit_amount": entry.credit_amount,
+        "currency": entry.currency,
+        "project_code": entry.project_code,
+        "department": entry.department,
+        "external_updated_at": entry.updated_at,
+        "synced_at": now,
+    }
+
+
+def upsert_entries(db: Session, integration_id: str, entries: List["BaseAccountingEntry"]) -> int:
+    """Write a batch of entries with INSERT ... ON CONFLICT (no commit); returns the rows written"""
+    if not entries:
+        return 0
+
+    now = datetime.utcnow()
+    # Last occurrence wins when an external id repeats inside the batch
+    rows = list({entry.external_id: _row_dict(integration_id, entry, now) for entry in entries}.values())
+    table = IntegrationAccountingEntry.__table__
+    insert = insert_for_dialect(db)
+
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        if insert is None:
+            # No upsert support: replace the rows of the chunk inside the same transaction
+            db.execute(table.delete().where(
+                table.c.integration_id == integration_id,
+                table.c.external_id.in_([row["external_id"] for row in chunk]),
+            ))
+            db.execute(table.insert(), chunk)
+            continue
+        statement = insert(table).values(chunk)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(CONFLICT_COLUMNS),
+            set_={
+                column: statement.excluded[column]
+                for column in chunk[0]
+                if column not in CONFLICT_COLUMNS
+            },
+        )
+        db.execute(statement)
+    return len(rows)
+
+
+def store_entries_batch(integration_id: str, entries: List["BaseAccountingEntry"]) -> int:
+    """Write and commit one batch in its own session (runs in the thread pool)"""
+    db = SessionLocal()
+    try:
+        written = upsert_entries(db, integration_id, entries)
+        db.commit()
+        return written
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
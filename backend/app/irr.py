@@ -0,0 +1,291 @@
+"""
+Internal rate of return solvers for project cash flows.
+
+Periodic IRR is solved with Newton iteration and, when Newton fails to
+converge or leaves the valid domain, with Brent's method on a bracket found by
+scanning the NPV curve. The same scan detects cash flows with more than one
+IRR. `irr_batch` solves a 2-D array of cash-flow vectors at once (one row per
+scenario), vectorizing Newton across rows and warm-starting stragglers from
+the root of their nearest converged neighbour.
+"""
+
+import logging
+import math
+from datetime import date
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TOLERANCE = 1e-10
+MAX_NEWTON_ITERATIONS = 50
+MAX_BRENT_ITERATIONS = 200
+
+# Periodic rates scanned for NPV sign changes (root bracketing / multiple roots).
+# Dense near zero, where monthly project IRRs live, sparse towards the extremes.
+_SCAN_RATES = np.unique(np.concatenate([
+    np.linspace(-0.99, -0.1, 30),
+    np.linspace(-0.1, 0.1, 81),
+    np.linspace(0.1, 1.0, 31),
+    np.geomspace(1.0, 100.0, 20),
+]))
+
+
+def npv_at(rate: float, cash_flows: Sequence[float]) -> float:
+    """Valor presente de flujos periódicos (el primero en t=0) a una tasa periódica"""
+    flows = np.asarray(cash_flows, dtype=float)
+    if rate <= -1:
+        return math.nan
+    discount = (1.0 + rate) ** -np.arange(len(flows))
+    return float(flows @ discount)
+
+
+def _has_sign_change(flows: np.ndarray) -> bool:
+    nonzero = flows[flows != 0]
+    return len(nonzero) > 1 and bool(np.any(nonzero[:-1] * nonzero[1:] < 0))
+
+
+def count_sign_changes(cash_flows: Sequence[float]) -> int:
+    """Número de cambios de signo; por la regla de Descartes acota el número de TIRs"""
+    flows = np.asarray(cash_flows, dtype=float)
+    nonzero = flows[flows != 0]
+    if len(nonzero) < 2:
+        return 0
+    return int(np.count_nonzero(nonzero[:-1] * nonzero[1:] < 0))
+
+
+def _newton(flows: np.ndarray, guess: float) -> Optional[float]:
+    periods = np.arange(len(flows))
+    rate = guess
+    for _ in range(MAX_NEWTON_ITERATIONS):
+        if rate <= -1:
+            return None
+        discount = (1.0 + rate) ** -periods
+        value = flows @ discount
+        derivative = -(periods * flows) @ (discount / (1.0 + rate))
+        if derivative == 0 or not math.isfinite(derivative):
+            return None
+        step = value / derivative
+        rate -= step
+        if abs(step) < TOLERANCE:
+            return rate if rate > -1 and math.isfinite(rate) else None
+    return None
+
+
+def _brent(func, low: float, high: float) -> Optional[float]:
+    """Método de Brent sobre un intervalo [low, high] con cambio de signo de func"""
+    a, b = low, high
+    fa, fb = func(a), func(b)
+    if fa * fb > 0:
+        return None
+    c, fc = b, fb
+    d = e = b - a
+
+    for _ in range(MAX_BRENT_ITERATIONS):
+        if (fb > 0 and fc > 0) or (fb < 0 and fc < 0):
+            c, fc = a, fa
+            d = e = b - a
+        if abs(fc) < abs(fb):
+            a, b, c = b, c, b
+            fa, fb, fc = fb, fc, fb
+
+        tol = 2 * np.finfo(float).eps * abs(b) + TOLERANCE / 2
+        midpoint = (c - b) / 2
+        if abs(midpoint) <= tol or fb == 0:
+            return b
+
+        if abs(e) >= tol and abs(fa) > abs(fb):
+            # Inverse quadratic interpolation, or secant when only two points differ
+            s = fb / fa
+            if a == c:
+                p = 2 * midpoint * s
+                q = 1 - s
+            else:
+                q = fa / fc
+                r = fb / fc
+                p = s * (2 * midpoint * q * (q - r) - (b - a) * (r - 1))
+                q = (q - 1) * (r - 1) * (s - 1)
+            if p > 0:
+                q = -q
+            p = abs(p)
+            if 2 * p < min(3 * midpoint * q - abs(tol * q), abs(e * q)):
+                e, d = d, p / q
+            else:
+                d = e = midpoint
+        else:
+            d = e = midpoint
+
+        a, fa = b, fb
+        b += d if abs(d) > tol else math.copysign(tol, midpoint)
+        fb = func(b)
+    return b
+
+
+def irr_roots(cash_flows: Sequence[float]) -> List[float]:
+    """
+    Todas las TIRs periódicas encontradas en el rango escaneado.
+
+    Más de una raíz indica flujos no convencionales (varios cambios de signo),
+    para los cuales la TIR es ambigua.
+    """
+    flows = np.asarray(cash_flows, dtype=float)
+    if not _has_sign_change(flows):
+        return []
+
+    with np.errstate(over='ignore', invalid='ignore'):
+        values = np.array([npv_at(rate, flows) for rate in _SCAN_RATES])
+    roots = []
+    for i in range(len(_SCAN_RATES) - 1):
+        if values[i] == 0:
+            roots.append(float(_SCAN_RATES[i]))
+        elif math.isfinite(values[i]) and math.isfinite(values[i + 1]) and values[i] * values[i + 1] < 0:
+            root = _brent(lambda rate: npv_at(rate, flows), float(_SCAN_RATES[i]), float(_SCAN_RATES[i + 1]))
+            if root is not None:
+                roots.append(root)
+    return roots
+
+
+def solve_irr(cash_flows: Sequence[float], guess: float = 0.01) -> Optional[float]:
+    """
+    TIR periódica de una serie de flujos.
+
+    `guess` permite arrancar desde la raíz de un escenario vecino. Retorna None
+    si los flujos no cambian de signo o no se encuentra raíz. Con varias raíces
+    retorna la más cercana a `guess` y lo registra en el log.
+    """
+    flows = np.asarray(cash_flows, dtype=float)
+    if len(flows) < 2 or not _has_sign_change(flows):
+        return None
+
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        rate = _newton(flows, guess)
+        multiple_roots = count_sign_changes(flows) > 1
+        if rate is not None and not multiple_roots:
+            return rate
+
+        roots = irr_roots(flows)
+    if not roots:
+        return rate
+    if len(roots) > 1:
+        logger.warning(f"Cash flows have {len(roots)} IRRs ({', '.join(f'{r:.6f}' for r in roots)}); using the one closest to {guess}")
+    return min(roots, key=lambda root: abs(root - guess))
+
+
+def annualize_rate(periodic_rate: Optional[float], periods_per_year: int = 12) -> Optional[float]:
+    """Convertir una tasa periódica (mensual por defecto) a tasa efectiva anual"""
+    if periodic_rate is None:
+        return None
+    return (1.0 + periodic_rate) ** periods_per_year - 1.0
+
+
+def periodic_rate(annual_rate: float, periods_per_year: int = 12) -> float:
+    """Convertir una tasa efectiva anual a tasa periódica"""
+    return (1.0 + annual_rate) ** (1.0 / periods_per_year) - 1.0
+
+
+def monthly_irr_annualized(cash_flows: Sequence[float], annual_guess: float = 0.1) -> Optional[float]:
+    """TIR anual efectiva de flujos mensuales"""
+    monthly = solve_irr(cash_flows, guess=periodic_rate(annual_guess))
+    return annualize_rate(monthly)
+
+
+def xirr(cash_flows: Sequence[float], dates: Sequence[date], guess: float = 0.1) -> Optional[float]:
+    """TIR anual para flujos en fechas irregulares (convención actual/365)"""
+    if len(cash_flows) != len(dates) or len(cash_flows) < 2:
+        return None
+    flows = np.asarray(cash_flows, dtype=float)
+    if not _has_sign_change(flows):
+        return None
+
+    first = min(dates)
+    years = np.array([(d - first).days / 365.0 for d in dates])
+
+    def value(rate):
+        return float(flows @ (1.0 + rate) ** -years)
+
+    def derivative(rate):
+        return float(-(years * flows) @ (1.0 + rate) ** (-years - 1))
+
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        rate = guess
+        for _ in range(MAX_NEWTON_ITERATIONS):
+            if rate <= -1:
+                break
+            slope = derivative(rate)
+            if slope == 0 or not math.isfinite(slope):
+                break
+            step = value(rate) / slope
+            rate -= step
+            if abs(step) < TOLERANCE and rate > -1:
+                return rate
+
+        # Bracket over annual rates and fall back to Brent
+        grid = np.concatenate([np.linspace(-0.99, 1.0, 200), np.geomspace(1.0, 1000.0, 40)[1:]])
+        values = [value(r) for r in grid]
+        for i in range(len(grid) - 1):
+            if math.isfinite(values[i]) and math.isfinite(values[i + 1]) and values[i] * values[i + 1] <= 0:
+                return _brent(value, float(grid[i]), float(grid[i + 1]))
+    return None
+
+
+def irr_batch(cash_flow_matrix: Iterable[Sequence[float]], guess=0.01, warm_start: bool = True) -> List[Optional[float]]:
+    """
+    TIR periódica de cada fila de una matriz de flujos (escenarios x períodos).
+
+    Newton se itera sobre todas las filas a la vez. Las filas que no convergen
+    se resuelven una por una, arrancando desde la raíz de la fila convergida más
+    cercana (filas vecinas de una grilla de sensibilidad tienen raíces similares)
+    cuando `warm_start` está activo. `guess` puede ser un escalar o un valor por fila.
+    """
+    matrix = np.atleast_2d(np.asarray(cash_flow_matrix, dtype=float))
+    n_rows, n_periods = matrix.shape
+    if n_rows == 0:
+        return []
+    if n_periods < 2:
+        return [None] * n_rows
+
+    valid = np.array([_has_sign_change(row) for row in matrix])
+    single_root = np.array([count_sign_changes(row) <= 1 for row in matrix])
+    rates = np.broadcast_to(np.asarray(guess, dtype=float), (n_rows,)).copy()
+    converged = np.zeros(n_rows, dtype=bool)
+    active = valid & single_root
+    periods = np.arange(n_periods)
+
+    with np.errstate(over='ignore', invalid='ignore', divide='ignore'):
+        for _ in range(MAX_NEWTON_ITERATIONS):
+            if not active.any():
+                break
+            r = rates[active]
+            discount = (1.0 + r)[:, None] ** -periods
+            values = np.einsum('ij,ij->i', matrix[active], discount)
+            derivatives = -np.einsum('ij,ij->i', matrix[active] * periods, discount) / (1.0 + r)
+            steps = values / derivatives
+            new_rates = r - steps
+
+            indices = np.nonzero(active)[0]
+            failed = ~np.isfinite(new_rates) | (new_rates <= -1) | (derivatives == 0)
+            done = ~failed & (np.abs(steps) < TOLERANCE)
+            rates[indices] = np.where(failed, rates[indices], new_rates)
+            converged[indices[done]] = True
+            active[indices[done | failed]] = False
+
+    results: List[Optional[float]] = [float(rates[i]) if converged[i] else None for i in range(n_rows)]
+
+    converged_rows = np.nonzero(converged)[0]
+    for i in np.nonzero(valid & ~converged)[0]:
+        row_guess = float(np.broadcast_to(np.asarray(guess, dtype=float), (n_rows,))[i])
+        if warm_start and len(converged_rows):
+            neighbour = converged_rows[np.argmin(np.abs(converged_rows - i))]
+            row_guess = results[neighbour]
+        results[i] = solve_irr(matrix[i], guess=row_guess)
+        if results[i] is not None:
+            converged_rows = np.sort(np.append(converged_rows, i))
+
+    return results
+
+
+def irr_batch_annualized(cash_flow_matrix: Iterable[Sequence[float]], annual_guess: float = 0.1, periods_per_year: int = 12) -> List[Optional[float]]:
+    """TIR anual efectiva de cada fila de una matriz de flujos mensuales"""
+    monthly = irr_batch(cash_flow_matrix, guess=periodic_rate(annual_guess, periods_per_year))
+    return [annualize_rate(rate, periods_per_year) for rate in monthly]
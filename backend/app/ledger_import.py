@@ -0,0 +1,285 @@
+"""
+Streaming import of general-ledger exports into ledger_entries.
+
+A multi-year export has 100k+ lines. Instead of loading the workbook into a
+DataFrame and creating one ORM object per row, the import:
+- iterates the sheet with openpyxl in read-only mode (rows are never all in
+  memory at once);
+- parses dates and amounts in vectorized chunks of CHUNK_ROWS rows;
+- streams every chunk as CSV into a single COPY ... FROM STDIN.
+
+The backup of the rows being replaced is a COPY (SELECT ...) TO STDOUT
+snapshot written to a gzip CSV, so existing rows are not materialized as ORM
+or Pydantic objects. Backup, DELETE, COPY and the refresh of the monthly
+ledger rollup run in the caller's transaction:
+if the file turns out to be invalid, the previous ledger of the project is
+still there.
+"""
+
+import csv
+import gzip
+import io
+import logging
+import os
+from datetime import datetime
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import delete, func, select
+from sqlalchemy.orm import Session
+
+from .ledger_rollup import SOURCE_LEDGER, lock_rollup_source, refresh_ledger_rollup
+from .models import LedgerEntryDB
+
+logger = logging.getLogger(__name__)
+
+# Header row of the accounting system export (Excel row 5)
+HEADER_ROW = 5
+CHUNK_ROWS = 10000
+
+# Excel header -> ledger_entries column
+LEDGER_COLUMNS = {
+    "Date": "entry_date",
+    "Reference": "reference",
+    "Trans Description": "transaction_description",
+    "Debit Amt": "debit_amount",
+    "Credit Amt": "credit_amount",
+    "Balance": "balance",
+    "Account ID": "account_id",
+    "Jrnl": "journal",
+}
+TEXT_COLUMNS = ["reference", "transaction_description", "account_id", "journal"]
+AMOUNT_COLUMNS = ["debit_amount", "credit_amount", "balance"]
+COPY_COLUMNS = ["project_name", "entry_date"] + TEXT_COLUMNS + AMOUNT_COLUMNS
+
+# Excel serial dates count days from 1899-12-30
+_EXCEL_EPOCH = pd.Timestamp("1899-12-30")
+
+
+class LedgerImportError(ValueError):
+    """El archivo no tiene el formato del libro mayor; nada se modifica"""
+
+
+def _match_columns(header: Iterable) -> Dict[str, int]:
+    """Posición de cada columna del libro mayor en el encabezado (sin distinguir mayúsculas ni espacios)"""
+    wanted = {name.strip().lower(): column for name, column in LEDGER_COLUMNS.items()}
+    positions = {}
+    for idx, name in enumerate(header):
+        column = wanted.get(str(name).strip().lower()) if name is not None else None
+        if column and column not in positions:
+            positions[column] = idx
+    if "entry_date" not in positions:
+        raise LedgerImportError(
+            f"El archivo Excel no contiene la columna de fecha esperada ('Date'). "
+            f"Columnas encontradas: {[name for name in header if name is not None]}"
+        )
+    return positions
+
+
+def iter_sheet_rows(fileobj: IO[bytes], filename: str = "", header_row: int = HEADER_ROW) -> Tuple[Dict[str, int], Iterator[tuple]]:
+    """
+    (posiciones de columnas, iterador de filas) de la primera hoja.
+
+    .xlsx se lee con openpyxl en modo read-only; los .xls antiguos (sin soporte en
+    openpyxl) se leen con pandas.
+    """
+    if filename.lower().endswith(".xls"):
+        df = pd.read_excel(fileobj, header=None, skiprows=header_row - 1, dtype=object)
+        rows = df.itertuples(index=False, name=None)
+    else:
+        from openpyxl import load_workbook
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+        rows = workbook.worksheets[0].iter_rows(min_row=header_row, values_only=True)
+    header = next(rows, None)
+    if header is None:
+        raise LedgerImportError("El archivo Excel está vacío")
+    return _match_columns(header), rows
+
+
+def _chunks(rows: Iterator[tuple], size: int) -> Iterator[List[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _parse_dates(values: pd.Series) -> pd.Series:
+    """Fechas de celda (datetime, serial de Excel o texto) -> datetime64, NaT si no se puede"""
+    numeric = pd.to_numeric(values.where(values.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool))), errors="coerce")
+    from_serial = _EXCEL_EPOCH + pd.to_timedelta(numeric, unit="D")
+    others = values.where(numeric.isna())
+    parsed = pd.to_datetime(others.map(lambda v: v if not isinstance(v, str) else v.strip()), errors="coerce", format="mixed")
+    return parsed.fillna(from_serial).dt.normalize()
+
+
+def _parse_amounts(values: pd.Series) -> pd.Series:
+    as_text = values.astype("string").str.replace(",", "", regex=False).str.strip()
+    return pd.to_numeric(values.where(~values.map(lambda v: isinstance(v, str)), as_text), errors="coerce").round(2)
+
+
+def parse_chunk(rows: List[tuple], positions: Dict[str, int], project_name: str) -> Tuple[pd.DataFrame, int]:
+    """
+    Filas crudas -> DataFrame con COPY_COLUMNS (vectorizado por columna).
+
+    Se omiten las filas sin fecha válida o sin descripción (saldos iniciales,
+    totales, filas vacías). Retorna (filas válidas, filas omitidas).
+    """
+    width = max(positions.values()) + 1
+    raw = pd.DataFrame([tuple(row[:width]) + (None,) * (width - len(row)) for row in rows], dtype=object)
+
+    def column(name):
+        return raw[positions[name]] if name in positions else pd.Series([None] * len(raw), dtype=object)
+
+    frame = pd.DataFrame({"project_name": project_name}, index=raw.index)
+    frame["entry_date"] = _parse_dates(column("entry_date"))
+    for name in TEXT_COLUMNS:
+        text_values = column(name).astype("string").str.strip()
+        frame[name] = text_values.mask(text_values == "")
+    for name in AMOUNT_COLUMNS:
+        frame[name] = _parse_amounts(column(name))
+
+    valid = frame["entry_date"].notna() & frame["transaction_description"].notna()
+    frame = frame.loc[valid, COPY_COLUMNS]
+    frame["entry_date"] = frame["entry_date"].dt.date
+    return frame, int((~valid).sum())
+
+
+class _CsvStream(io.RawIOBase):
+    """Archivo de solo lectura que produce CSV a partir de los chunks, para COPY ... FROM STDIN"""
+
+    def __init__(self, frames: Iterator[pd.DataFrame]):
+        self._frames = frames
+        self._buffer = b""
+        self._position = 0
+        self.rows = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) - self._position < size:
+            frame = next(self._frames, None)
+            if frame is None:
+                break
+            self.rows += len(frame)
+            encoded = frame.to_csv(index=False, header=False, na_rep="").encode("utf-8")
+            self._buffer = self._buffer[self._position:] + encoded
+            self._position = 0
+        end = len(self._buffer) if size < 0 else self._position + size
+        data = self._buffer[self._position:end]
+        self._position = min(end, len(self._buffer))
+        return data
+
+
+def backup_project_ledger(db: Session, project_name: str, backup_dir: str) -> Tuple[Optional[str], int]:
+    """
+    Respaldar el libro mayor del proyecto en un CSV gzip (COPY ... TO STDOUT en PostgreSQL).
+
+    Retorna (ruta del archivo, filas) o (None, 0) si el proyecto no tiene asientos.
+    """
+    table = LedgerEntryDB.__table__
+    rows = db.execute(select(func.count()).select_from(table).where(table.c.project_name == project_name)).scalar()
+    if not rows:
+        return None, 0
+
+    os.makedirs(backup_dir, exist_ok=True)
+    file_path = os.path.join(
+        backup_dir, f"{project_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv.gz"
+    )
+    columns = [column.name for column in table.columns]
+
+    with gzip.open(file_path, "wb") as gz_file:
+        if db.get_bind().dialect.name == "postgresql":
+            raw_connection = db.connection().connection
+            with raw_connection.cursor() as cursor:
+                query = cursor.mogrify(
+                    f"SELECT {', '.join(columns)} FROM {table.name} WHERE project_name = %s ORDER BY id",
+                    (project_name,),
+                ).decode("utf-8")
+                cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true)", gz_file)
+        else:
+            text_file = io.TextIOWrapper(gz_file, encoding="utf-8", newline="")
+            writer = csv.writer(text_file)
+            writer.writerow(columns)
+            result = db.execute(
+                select(*table.columns).where(table.c.project_name == project_name).order_by(table.c.id)
+                .execution_options(yield_per=CHUNK_ROWS)
+            )
+            for row in result:
+                writer.writerow(row)
+            text_file.flush()
+            text_file.detach()
+
+    return file_path, rows
+
+
+def replace_project_ledger(
+    db: Session,
+    project_name: str,
+    fileobj: IO[bytes],
+    filename: str = "",
+    backup_dir: Optional[str] = None,
+) -> Dict[str, object]:
+    """
+    Reemplazar el libro mayor del proyecto con el archivo (sin commit).
+
+    Respaldo, DELETE, carga y refresco del rollup mensual ocurren en la transacción del llamador.
+    """
+    positions, rows = iter_sheet_rows(fileobj, filename)
+
+    # A concurrent import of the same project waits until this one commits
+    lock_rollup_source(db, SOURCE_LEDGER, project_name)
+
+    backup_path, backed_up = (None, 0)
+    if backup_dir:
+        backup_path, backed_up = backup_project_ledger(db, project_name, backup_dir)
+
+    deleted = db.execute(
+        delete(LedgerEntryDB).where(LedgerEntryDB.project_name == project_name)
+        .execution_options(synchronize_session=False)
+    ).rowcount or 0
+
+    skipped = 0
+
+    def frames():
+        nonlocal skipped
+        for chunk in _chunks(rows, CHUNK_ROWS):
+            frame, chunk_skipped = parse_chunk(chunk, positions, project_name)
+            skipped += chunk_skipped
+            if len(frame):
+                yield frame
+
+    if db.get_bind().dialect.name == "postgresql":
+        stream = _CsvStream(frames())
+        raw_connection = db.connection().connection
+        with raw_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {LedgerEntryDB.__tablename__} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+                stream,
+            )
+        inserted = stream.rows
+    else:
+        inserted = 0
+        table = LedgerEntryDB.__table__
+        for frame in frames():
+            records = frame.astype(object).where(frame.notna(), None).to_dict("records")
+            db.execute(table.insert(), records)
+            inserted += len(records)
+
+    refresh_ledger_rollup(db, project_name)
+
+    logger.info(
+        f"Ledger import for '{project_name}': {inserted} rows loaded, {skipped} skipped, "
+        f"{deleted} replaced, {backed_up} backed up" + (f" to {backup_path}" if backup_path else "")
+    )
+    return {
+        "inserted": inserted,
+        "skipped": skipped,
+        "deleted": deleted,
+        "backed_up": backed_up,
+        "backup_file": backup_path,
+    }
@@ -0,0 +1,137 @@
+"""
+Monthly rollup of the general ledger and the administrative costs.
+
+The project cash-flow page grouped ledger_entries by year, month and account
+on every request, which no index can serve. LedgerMonthlyRollup keeps
+those sums per (source, project_name, year_month, account) behind a
+composite unique index, so the page reads a few hundred rows by index range
+whatever the size of the ledger.
+
+The rollup is rebuilt per key with the same DELETE + INSERT ... SELECT as
+the portfolio cash-flow rollup, inside the transaction of the upload that
+changed the data: the ledger import refreshes the project it replaced and
+the administrative-costs upload refreshes the 'admin_costs' source.
+
+Two uploads of the same key would insert the same rollup rows (and replace
+each other's entries), so the uploads take lock_rollup_source before touching
+the data: a transaction-level advisory lock on (source, project_name) that
+makes the second upload wait for the first to commit.
+"""
+
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from sqlalchemy import Date, cast, delete, func, literal, literal_column, select
+from sqlalchemy.orm import Session
+
+from .database import advisory_xact_lock
+from .models import AdministrativeCostDB, LedgerEntryDB, LedgerMonthlyRollup
+
+logger = logging.getLogger(__name__)
+
+SOURCE_LEDGER = "ledger"
+SOURCE_ADMIN_COSTS = "admin_costs"
+
+# First key of pg_advisory_xact_lock(int, int) for the uploads of each rollup key
+ROLLUP_LOCK_NAMESPACE = 0x2C11
+
+_ROLLUP_COLUMNS = ["source", "project_name", "account", "year_month", "credits", "debits", "entries_count", "updated_at"]
+
+
+def month_start(db: Session, column):
+    """Expresión SQL del primer día del mes de una fecha"""
+    # Literal SQL instead of bind parameters, so GROUP BY matches the SELECT expression
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column, literal_column("'start of month'"))
+    return cast(func.date_trunc(literal_column("'month'"), column), Date)
+
+
+def first_of_month(value: date) -> date:
+    return value.replace(day=1)
+
+
+def lock_rollup_source(db: Session, source: str, project_name: Optional[str] = None) -> None:
+    """Esperar el advisory lock de (source, project_name) hasta el fin de la transacción"""
+    advisory_xact_lock(db, ROLLUP_LOCK_NAMESPACE, f"{source}:{project_name or ''}")
+
+
+def _refresh(db: Session, source: str, model, project_name: Optional[str] = None) -> None:
+    lock_rollup_source(db, source, project_name)
+    db.flush()
+    table = LedgerMonthlyRollup.__table__
+    month = month_start(db, model.entry_date)
+    account = func.coalesce(model.account_description, literal_column("''"))
+    aggregate = select(
+        literal(source),
+        literal(project_name or ""),
+        account,
+        month,
+        func.coalesce(func.sum(model.credit_amount), 0),
+        func.coalesce(func.sum(model.debit_amount), 0),
+        func.count(),
+        literal(datetime.utcnow()),
+    ).where(model.entry_date.isnot(None)).group_by(account, month)
+    if project_name is not None:
+        aggregate = aggregate.where(model.project_name == project_name)
+
+    db.execute(delete(table).where(table.c.source == source, table.c.project_name == (project_name or "")))
+    db.execute(table.insert().from_select(_ROLLUP_COLUMNS, aggregate))
+
+
+def refresh_ledger_rollup(db: Session, project_name: str) -> None:
+    """Recalcular el rollup del libro mayor de un proyecto (sin commit)"""
+    _refresh(db, SOURCE_LEDGER, LedgerEntryDB, project_name)
+
+
+def refresh_admin_costs_rollup(db: Session) -> None:
+    """Recalcular el rollup de los costos administrativos (sin commit)"""
+    _refresh(db, SOURCE_ADMIN_COSTS, AdministrativeCostDB)
+
+
+def _rollup_query(db: Session, source: str, project_name: str, start: Optional[date], end: Optional[date]):
+    query = db.query(LedgerMonthlyRollup).filter(
+        LedgerMonthlyRollup.source == source,
+        LedgerMonthlyRollup.project_name == project_name,
+    )
+    if start:
+        query = query.filter(LedgerMonthlyRollup.year_month >= first_of_month(start))
+    if end:
+        query = query.filter(LedgerMonthlyRollup.year_month <= first_of_month(end))
+    return query
+
+
+def project_cash_flow(
+    db: Session,
+    project_name: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> List[Dict]:
+    """
+    Neto mensual (créditos - débitos) por cuenta del libro mayor del proyecto.
+
+    Retorna [{"category": cuenta, "months": {"YYYY-MM": neto}}] en orden de mes y cuenta;
+    las filas sin cuenta no se incluyen.
+    """
+    rows = _rollup_query(db, SOURCE_LEDGER, project_name, start, end).filter(
+        LedgerMonthlyRollup.account != ""
+    ).order_by(LedgerMonthlyRollup.year_month, LedgerMonthlyRollup.account).all()
+
+    summary: Dict[str, Dict] = {}
+    for row in rows:
+        item = summary.setdefault(row.account, {"category": row.account, "months": {}})
+        item["months"][row.year_month.strftime("%Y-%m")] = (row.credits or Decimal(0)) - (row.debits or Decimal(0))
+    return list(summary.values())
+
+
+def admin_costs_monthly_debits(db: Session, start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Decimal]:
+    """Débitos de costos administrativos por mes ("YYYY_MM"), solo meses con débitos"""
+    totals = (
+        _rollup_query(db, SOURCE_ADMIN_COSTS, "", start, end)
+        .with_entities(LedgerMonthlyRollup.year_month, func.sum(LedgerMonthlyRollup.debits))
+        .group_by(LedgerMonthlyRollup.year_month)
+        .order_by(LedgerMonthlyRollup.year_month)
+        .all()
+    )
+    return {month.strftime("%Y_%m"): debits for month, debits in totals if debits}
@@ -34,7 +34,12 @@ logger.addHandler(console_handler)
 # dotenv_path = os.path.join(os.path.dirname(__file__), '..', '..', 'martamaria', '.env')
 # load_dotenv(dotenv_path=dotenv_path)
 
-from .database import engine, Base
+from .database import engine, Base, SessionLocal, pool_metrics
+from .schema_catalog import catalog as schema_catalog
+from .concurrency import configure_threadpool
+from .sensitivity import shutdown_executor as shutdown_sensitivity_executor
+from .integrations.manager import integration_manager
+from .integrations.scheduler import integration_scheduler, scheduler_enabled
 
 # Import all routers with consistent aliases
 from .routers.auth_router import router as auth_router
@@ -132,10 +137,55 @@ app.include_router(integrations_router, tags=["Accounting Integrations"])
 # app.include_router(marta_router, prefix="/api", tags=["AI Assistant"])
 
 
+@app.on_event("startup")
+async def limit_blocking_threadpool():
+    """Acotar los hilos de los handlers bloqueantes al tamaño del pool de conexiones"""
+    configure_threadpool()
+
+
+@app.on_event("startup")
+def load_schema_catalog():
+    """Cargar el catálogo del esquema en cada worker al arrancar"""
+    db = SessionLocal()
+    try:
+        schema_catalog.refresh(db)
+    except Exception as e:
+        # The catalog is loaded lazily on the first request instead
+        logger.warning(f"Could not load schema catalog at startup: {e}")
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+async def start_integration_scheduler():
+    """Cargar las integraciones persistidas e iniciar las sincronizaciones automáticas"""
+    await integration_manager.refresh_from_db()
+    if scheduler_enabled():
+        integration_scheduler.start()
+
+
+@app.on_event("shutdown")
+async def close_integration_clients():
+    """Detener el scheduler y cerrar los clientes HTTP de las integraciones contables"""
+    await integration_scheduler.stop()
+    await integration_manager.aclose()
+
+
+@app.on_event("shutdown")
+def close_sensitivity_pool():
+    """Cerrar el pool de procesos del análisis de sensibilidad"""
+    shutdown_sensitivity_executor()
+
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Financial Dashboard API"}
 
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "message": "Backend is running"}
\ No newline at end of file
+    return {"status": "ok", "message": "Backend is running"}
+
+@app.get("/health/db-pool")
+def db_pool_health():
+    """Métricas del pool de conexiones de este worker (en uso, overflow, espera por checkout)"""
+    return pool_metrics()
\ No newline at end of file
@@ -0,0 +1,502 @@
+"""
+Long-format store for the marketing budget of each project.
+
+Every project used to get seven presupuesto_mercadeo_<project>_<category>
+tables with one amount_YYYY_MM column per month, so every reader had to look
+up its columns in information_schema and build the SQL on the fly. The
+budget now lives in two tables: one row per line (project, category,
+concepto) and one row per non-zero monthly amount. Reading a 39-month window
+is a single range scan on (proyecto, categoria, periodo), and the pivot
+helpers below rebuild the wide rows the API has always returned.
+
+PresupuestoMercadeoConsolidado keeps the totals of every project per
+(concepto, month). The mutation helpers refresh it for the conceptos they
+touch, so the consolidated cash flow reads one small indexed table and is
+pivoted in SQL, whatever the number of projects. Every project is seeded with
+the same conceptos, so edits in different projects refresh the same rows: the
+refresh runs under a transaction-level advisory lock and concurrent edits
+take turns instead of inserting the same (concepto, periodo) twice.
+
+The old table names are still the identifiers the frontend uses, so
+budget_table_name/parse_budget_table_name map between them and
+(proyecto, categoria).
+"""
+
+import logging
+import re
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import and_, case, delete, func, literal, select
+from sqlalchemy.orm import Session
+
+from .database import advisory_xact_lock, insert_for_dialect
+from .models import PresupuestoMercadeoConsolidado, PresupuestoMercadeoLinea, PresupuestoMercadeoMonto
+
+logger = logging.getLogger(__name__)
+
+BUDGET_TABLE_PREFIX = "presupuesto_mercadeo_"
+
+# First key of pg_advisory_xact_lock(int, int) for the consolidated refresh
+CONSOLIDATED_LOCK_NAMESPACE = 0x2C10
+
+# Standard categories of a project budget: table suffix -> label
+MARKETING_CATEGORIES = {
+    "casa_modelo": "CASA MODELO",
+    "feria_eventos": "FERIA Y EVENTOS",
+    "gastos_casa_modelo": "GASTOS DE CASA MODELO",
+    "gastos_publicitarios": "GASTOS PUBLICITARIOS",
+    "gastos_tramites": "GASTOS DE TRÁMITES",
+    "promociones_y_bonos": "PROMOCIONES Y BONOS",
+    "redes_sociales": "REDES SOCIALES",
+}
+
+# Suffixes used by older creation paths for the same categories
+CATEGORY_ALIASES = {
+    "ferias_eventos": "feria_eventos",
+    "promociones_bonos": "promociones_y_bonos",
+}
+
+DEFAULT_ACTIVITIES = {
+    "casa_modelo": ["Alquiler de Local", "Decoración y Mobiliario", "Servicios Públicos", "Mantenimiento"],
+    "feria_eventos": ["Participación en Ferias", "Eventos de Lanzamiento", "Stand y Equipos", "Material Promocional"],
+    "gastos_casa_modelo": ["Decoración", "Mobiliario", "Equipamiento", "Ambientación"],
+    "gastos_publicitarios": ["Publicidad Digital", "Publicidad Impresa", "Radio y TV", "Vallas Publicitarias"],
+    "gastos_tramites": ["Permisos y Licencias", "Trámites Legales", "Documentación", "Gestorías"],
+    "promociones_y_bonos": ["Bonos de Enganche", "Descuentos Especiales", "Promociones Temporales", "Incentivos de Venta"],
+    "redes_sociales": ["Facebook Ads", "Instagram Marketing", "Google Ads", "Community Management"],
+}
+
+# Rolling window of the budget screens: 3 months back + current + 35 forward
+WINDOW_MONTHS_BACK = 3
+WINDOW_MONTHS = 39
+
+CONCEPT_KEYS = ("concepto", "CONCEPTO", "actividad")
+
+_PERIOD_KEY_RE = re.compile(r"^(?:amount_)*(\d{4})[_-](\d{1,2})$")
+
+_ALL_SUFFIXES = sorted(list(MARKETING_CATEGORIES) + list(CATEGORY_ALIASES), key=len, reverse=True)
+
+
+def rolling_periods(today: Optional[date] = None, months: int = WINDOW_MONTHS) -> List[date]:
+    """Primer día de cada mes de la ventana móvil"""
+    today = today or date.today()
+    start = date(today.year, today.month, 1) - relativedelta(months=WINDOW_MONTHS_BACK)
+    return [start + relativedelta(months=offset) for offset in range(months)]
+
+
+def period_key(periodo: date) -> str:
+    """date -> 'YYYY_MM'"""
+    return f"{periodo.year}_{periodo.month:02d}"
+
+
+def amount_column(periodo: date) -> str:
+    """date -> 'amount_YYYY_MM'"""
+    return f"amount_{period_key(periodo)}"
+
+
+def parse_period_key(key: str) -> Optional[date]:
+    """Acepta YYYY_MM, YYYY-MM, amount_YYYY_MM y amount_amount_YYYY_MM; None si no es un período"""
+    match = _PERIOD_KEY_RE.match(str(key))
+    if not match:
+        return None
+    month = int(match.group(2))
+    if not 1 <= month <= 12:
+        return None
+    return date(int(match.group(1)), month, 1)
+
+
+def normalize_categoria(categoria: str) -> str:
+    return CATEGORY_ALIASES.get(categoria, categoria)
+
+
+def category_label(categoria: str) -> str:
+    return MARKETING_CATEGORIES.get(categoria, categoria.replace("_", " ").upper())
+
+
+def budget_table_name(proyecto: str, categoria: str) -> str:
+    """Nombre de tabla con el que el frontend identifica una categoría del proyecto"""
+    return f"{BUDGET_TABLE_PREFIX}{proyecto}_{categoria}"
+
+
+def parse_budget_table_name(table_name: str, proyecto: Optional[str] = None) -> Optional[Tuple[str, str]]:
+    """'presupuesto_mercadeo_<proyecto>_<categoria>' -> (proyecto, categoria), o None"""
+    if not table_name.startswith(BUDGET_TABLE_PREFIX):
+        return None
+    rest = table_name[len(BUDGET_TABLE_PREFIX):]
+    for suffix in _ALL_SUFFIXES:
+        if rest.endswith(f"_{suffix}") and len(rest) > len(suffix) + 1:
+            table_project = rest[:-(len(suffix) + 1)]
+            if proyecto is not None and table_project != proyecto:
+                return None
+            return table_project, normalize_categoria(suffix)
+    return None
+
+
+def _to_float(value) -> float:
+    return float(value) if value is not None else 0.0
+
+
+# --- Proyectos y categorías ---
+
+def project_categories(db: Session, proyecto: str) -> List[str]:
+    """Categorías del proyecto: las estándar más cualquier otra con líneas"""
+    stored = [row[0] for row in db.query(PresupuestoMercadeoLinea.categoria).filter(
+        PresupuestoMercadeoLinea.proyecto == proyecto
+    ).distinct().all()]
+    if not stored:
+        return []
+    return list(MARKETING_CATEGORIES) + sorted(set(stored) - set(MARKETING_CATEGORIES))
+
+
+def list_budget_tables(db: Session, proyecto: Optional[str] = None) -> List[str]:
+    """Nombres de tabla de los presupuestos existentes (de un proyecto o de todos)"""
+    query = db.query(PresupuestoMercadeoLinea.proyecto, PresupuestoMercadeoLinea.categoria).distinct()
+    if proyecto is not None:
+        query = query.filter(PresupuestoMercadeoLinea.proyecto == proyecto)
+    by_project: Dict[str, set] = defaultdict(set)
+    for table_project, categoria in query.all():
+        by_project[table_project].add(categoria)
+
+    tables = []
+    for table_project in sorted(by_project):
+        extra = sorted(by_project[table_project] - set(MARKETING_CATEGORIES))
+        for categoria in list(MARKETING_CATEGORIES) + extra:
+            tables.append(budget_table_name(table_project, categoria))
+    return sorted(tables)
+
+
+def project_has_budget(db: Session, proyecto: str) -> bool:
+    return db.query(PresupuestoMercadeoLinea.id).filter(
+        PresupuestoMercadeoLinea.proyecto == proyecto
+    ).first() is not None
+
+
+def seed_project_budget(db: Session, proyecto: str, activities: Optional[Dict[str, List[str]]] = None) -> List[str]:
+    """Crear las líneas por defecto de cada categoría (sin commit). Retorna los nombres de tabla"""
+    activities = activities or DEFAULT_ACTIVITIES
+    now = datetime.utcnow()
+    rows = [
+        {"proyecto": proyecto, "categoria": categoria, "concepto": concepto, "created_at": now, "updated_at": now}
+        for categoria in MARKETING_CATEGORIES
+        for concepto in activities.get(categoria, ["Actividad General"])
+    ]
+    db.execute(PresupuestoMercadeoLinea.__table__.insert(), rows)
+    return [budget_table_name(proyecto, categoria) for categoria in MARKETING_CATEGORIES]
+
+
+def delete_project_budget(db: Session, proyecto: str, categoria: Optional[str] = None) -> int:
+    """Eliminar las líneas y montos del proyecto (o de una categoría), sin commit"""
+    amount_filter = [PresupuestoMercadeoMonto.proyecto == proyecto]
+    line_filter = [PresupuestoMercadeoLinea.proyecto == proyecto]
+    if categoria is not None:
+        amount_filter.append(PresupuestoMercadeoMonto.categoria == categoria)
+        line_filter.append(PresupuestoMercadeoLinea.categoria == categoria)
+    conceptos = [row[0] for row in db.query(PresupuestoMercadeoLinea.concepto).filter(*line_filter).distinct().all()]
+    db.execute(delete(PresupuestoMercadeoMonto).where(*amount_filter).execution_options(synchronize_session=False))
+    result = db.execute(delete(PresupuestoMercadeoLinea).where(*line_filter).execution_options(synchronize_session=False))
+    refresh_consolidated(db, conceptos)
+    return result.rowcount or 0
+
+
+# --- Líneas ---
+
+def load_budget_lines(
+    db: Session,
+    proyecto: str,
+    categoria: str,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> List[Tuple[PresupuestoMercadeoLinea, Dict[date, Decimal]]]:
+    """Líneas de una categoría con sus montos por período (opcionalmente solo entre start y end)"""
+    lines = db.query(PresupuestoMercadeoLinea).filter(
+        PresupuestoMercadeoLinea.proyecto == proyecto,
+        PresupuestoMercadeoLinea.categoria == categoria,
+    ).order_by(PresupuestoMercadeoLinea.id).all()
+
+    amounts_query = db.query(
+        PresupuestoMercadeoMonto.linea_id,
+        PresupuestoMercadeoMonto.periodo,
+        PresupuestoMercadeoMonto.monto,
+    ).filter(
+        PresupuestoMercadeoMonto.proyecto == proyecto,
+        PresupuestoMercadeoMonto.categoria == categoria,
+    )
+    if start is not None:
+        amounts_query = amounts_query.filter(PresupuestoMercadeoMonto.periodo >= start)
+    if end is not None:
+        amounts_query = amounts_query.filter(PresupuestoMercadeoMonto.periodo <= end)
+
+    amounts: Dict[int, Dict[date, Decimal]] = defaultdict(dict)
+    for linea_id, periodo, monto in amounts_query.all():
+        amounts[linea_id][periodo] = monto
+    return [(line, amounts.get(line.id, {})) for line in lines]
+
+
+def line_to_raw_row(line: PresupuestoMercadeoLinea, amounts: Dict[date, Decimal], periods: Iterable[date]) -> Dict[str, Any]:
+    """Fila con la forma de las tablas anchas: id, concepto y amount_YYYY_MM"""
+    row = {"id": line.id, "concepto": line.concepto}
+    for periodo in periods:
+        row[amount_column(periodo)] = _to_float(amounts.get(periodo))
+    return row
+
+
+def raw_table(db: Session, proyecto: str, categoria: str) -> Dict[str, Any]:
+    """Columnas y filas de una categoría: ventana móvil más cualquier otro mes con montos"""
+    lines = load_budget_lines(db, proyecto, categoria)
+    periods = set(rolling_periods())
+    for _, amounts in lines:
+        periods.update(amounts)
+    periods = sorted(periods)
+    return {
+        "columns": ["id", "concepto"] + [amount_column(periodo) for periodo in periods],
+        "data": [line_to_raw_row(line, amounts, periods) for line, amounts in lines],
+    }
+
+
+def split_line_values(data: Dict[str, Any]) -> Tuple[Optional[str], Dict[date, Any]]:
+    """Separar el concepto y los montos por período de un payload (claves anchas o YYYY_MM)"""
+    concepto = None
+    for key in CONCEPT_KEYS:
+        if key in data and data[key] is not None:
+            concepto = str(data[key])
+            break
+    values = {}
+    for key, value in data.items():
+        periodo = parse_period_key(key)
+        if periodo is not None:
+            values[periodo] = value
+    return concepto, values
+
+
+def _decimal(value) -> Decimal:
+    if value is None or value == "":
+        return Decimal("0")
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+def apply_line_values(db: Session, line: PresupuestoMercadeoLinea, values: Dict[date, Any]) -> None:
+    """
+    Escribir montos de una línea (sin commit).
+
+    Los montos distintos de cero se insertan con INSERT ... ON CONFLICT
+    (linea_id, periodo) DO UPDATE; un cero elimina el mes. El consolidado lo
+    refresca quien llama (add_line/update_line).
+    """
+    if not values:
+        return
+    amounts = {periodo: _decimal(value) for periodo, value in values.items()}
+    zero_periods = [periodo for periodo, amount in amounts.items() if amount == 0]
+    rows = [
+        {"linea_id": line.id, "proyecto": line.proyecto, "categoria": line.categoria, "periodo": periodo, "monto": amount}
+        for periodo, amount in amounts.items() if amount != 0
+    ]
+
+    if zero_periods:
+        db.execute(delete(PresupuestoMercadeoMonto).where(
+            PresupuestoMercadeoMonto.linea_id == line.id,
+            PresupuestoMercadeoMonto.periodo.in_(zero_periods),
+        ).execution_options(synchronize_session=False))
+
+    if rows:
+        table = PresupuestoMercadeoMonto.__table__
+        insert = insert_for_dialect(db)
+        if insert is None:
+            db.execute(delete(PresupuestoMercadeoMonto).where(
+                PresupuestoMercadeoMonto.linea_id == line.id,
+                PresupuestoMercadeoMonto.periodo.in_([row["periodo"] for row in rows]),
+            ).execution_options(synchronize_session=False))
+            db.execute(table.insert(), rows)
+        else:
+            statement = insert(table).values(rows)
+            statement = statement.on_conflict_do_update(
+                index_elements=["linea_id", "periodo"],
+                set_={"monto": statement.excluded.monto},
+            )
+            db.execute(statement)
+
+    line.updated_at = datetime.utcnow()
+
+
+def get_line(db: Session, proyecto: str, categoria: str, line_id: int) -> Optional[PresupuestoMercadeoLinea]:
+    return db.query(PresupuestoMercadeoLinea).filter(
+        PresupuestoMercadeoLinea.id == line_id,
+        PresupuestoMercadeoLinea.proyecto == proyecto,
+        PresupuestoMercadeoLinea.categoria == categoria,
+    ).first()
+
+
+def add_line(db: Session, proyecto: str, categoria: str, concepto: str, values: Optional[Dict[date, Any]] = None) -> PresupuestoMercadeoLinea:
+    """Crear una línea con sus montos (sin commit)"""
+    line = PresupuestoMercadeoLinea(proyecto=proyecto, categoria=categoria, concepto=concepto)
+    db.add(line)
+    db.flush()
+    apply_line_values(db, line, values or {})
+    if values:
+        refresh_consolidated(db, [concepto])
+    return line
+
+
+def update_line(db: Session, line: PresupuestoMercadeoLinea, data: Dict[str, Any]) -> bool:
+    """Aplicar un payload (concepto y/o montos) a una línea (sin commit). False si no había nada que actualizar"""
+    concepto, values = split_line_values(data)
+    if concepto is None and not values:
+        return False
+    touched = {line.concepto}
+    if concepto is not None:
+        line.concepto = concepto
+        touched.add(concepto)
+    apply_line_values(db, line, values)
+    refresh_consolidated(db, touched)
+    return True
+
+
+def delete_line(db: Session, line: PresupuestoMercadeoLinea) -> None:
+    """Eliminar una línea y sus montos (sin commit)"""
+    db.execute(delete(PresupuestoMercadeoMonto).where(
+        PresupuestoMercadeoMonto.linea_id == line.id
+    ).execution_options(synchronize_session=False))
+    db.delete(line)
+    refresh_consolidated(db, [line.concepto])
+
+
+def line_amounts(db: Session, line: PresupuestoMercadeoLinea) -> Dict[date, Decimal]:
+    rows = db.query(PresupuestoMercadeoMonto.periodo, PresupuestoMercadeoMonto.monto).filter(
+        PresupuestoMercadeoMonto.linea_id == line.id
+    ).all()
+    return {periodo: monto for periodo, monto in rows}
+
+
+# --- Consolidados ---
+
+def refresh_consolidated(db: Session, conceptos: Optional[Iterable[str]] = None) -> None:
+    """
+    Recalcular el consolidado para los conceptos indicados (todos si conceptos es None), sin commit.
+
+    Un DELETE de esos conceptos y un INSERT ... SELECT agrupado por concepto y mes, bajo
+    el advisory lock del consolidado hasta el fin de la transacción.
+    """
+    db.flush()
+    table = PresupuestoMercadeoConsolidado.__table__
+
+    delete_statement = delete(table)
+    aggregate = select(
+        PresupuestoMercadeoLinea.concepto,
+        PresupuestoMercadeoMonto.periodo,
+        func.sum(PresupuestoMercadeoMonto.monto),
+        func.count(func.distinct(PresupuestoMercadeoMonto.linea_id)),
+        literal(datetime.utcnow()),
+    ).select_from(PresupuestoMercadeoMonto).join(
+        PresupuestoMercadeoLinea, PresupuestoMercadeoLinea.id == PresupuestoMercadeoMonto.linea_id
+    ).group_by(PresupuestoMercadeoLinea.concepto, PresupuestoMercadeoMonto.periodo)
+
+    if conceptos is not None:
+        conceptos = sorted(set(conceptos))
+        if not conceptos:
+            return
+        delete_statement = delete_statement.where(table.c.concepto.in_(conceptos))
+        aggregate = aggregate.where(PresupuestoMercadeoLinea.concepto.in_(conceptos))
+
+    advisory_xact_lock(db, CONSOLIDATED_LOCK_NAMESPACE, "presupuesto_mercadeo_consolidado")
+    db.execute(delete_statement)
+    db.execute(table.insert().from_select(
+        ["concepto", "periodo", "monto", "lineas_count", "updated_at"],
+        aggregate
+    ))
+
+
+def consolidated_pivot(db: Session, periods: List[date], key=period_key) -> List[Dict[str, Any]]:
+    """
+    Consolidado de todos los proyectos por actividad, pivotado en SQL.
+
+    Una fila por concepto con una columna SUM(CASE ...) por mes de la ventana;
+    los conceptos sin montos en la ventana salen en cero.
+    """
+    rollup = PresupuestoMercadeoConsolidado
+    conceptos = select(PresupuestoMercadeoLinea.concepto).distinct().subquery()
+    in_window = and_(
+        rollup.concepto == conceptos.c.concepto,
+        rollup.periodo.between(periods[0], periods[-1]),
+    )
+    month_columns = [
+        func.coalesce(func.sum(case((rollup.periodo == periodo, rollup.monto), else_=0)), 0).label(f"m{idx}")
+        for idx, periodo in enumerate(periods)
+    ]
+    statement = select(conceptos.c.concepto, *month_columns).select_from(conceptos).outerjoin(
+        rollup, in_window
+    ).group_by(conceptos.c.concepto).order_by(conceptos.c.concepto)
+
+    keys = [key(periodo) for periodo in periods]
+    rows = []
+    for row in db.execute(statement):
+        data = {"actividad": row[0]}
+        data.update(zip(keys, (float(value) for value in row[1:])))
+        rows.append(data)
+    return rows
+
+
+def consolidated_with_total(db: Session, periods: List[date], key=period_key) -> Dict[str, Any]:
+    """Filas del consolidado más la fila TOTAL, con la forma de respuesta de los endpoints"""
+    keys = [key(periodo) for periodo in periods]
+    rows = consolidated_pivot(db, periods, key)
+    total_row = {"actividad": "TOTAL"}
+    for period in keys:
+        total_row[period] = sum(row[period] for row in rows)
+    rows.append(total_row)
+    return {"data": rows, "columns": ["actividad"] + keys}
+
+
+def summary_by_categoria(db: Session, periods: List[date], proyecto: Optional[str] = None) -> Dict[str, Dict[date, Decimal]]:
+    """Suma por categoría y mes (de un proyecto o de todos) sobre el índice (proyecto, categoria, periodo)"""
+    query = db.query(
+        PresupuestoMercadeoMonto.categoria,
+        PresupuestoMercadeoMonto.periodo,
+        func.sum(PresupuestoMercadeoMonto.monto),
+    ).filter(PresupuestoMercadeoMonto.periodo.between(periods[0], periods[-1]))
+    if proyecto is not None:
+        query = query.filter(PresupuestoMercadeoMonto.proyecto == proyecto)
+    rows = query.group_by(PresupuestoMercadeoMonto.categoria, PresupuestoMercadeoMonto.periodo).all()
+
+    summary: Dict[str, Dict[date, Decimal]] = {}
+    if proyecto is not None:
+        for categoria in project_categories(db, proyecto):
+            summary[categoria] = {}
+    for categoria, periodo, total in rows:
+        summary.setdefault(categoria, {})[periodo] = total or Decimal("0")
+    return summary
+
+
+def pivot_row(amounts: Dict[date, Decimal], periods: List[date], key=period_key) -> Dict[str, float]:
+    """Montos por período -> {clave_del_mes: float} con ceros en los meses sin datos"""
+    return {key(periodo): _to_float(amounts.get(periodo)) for periodo in periods}
+
+
+def project_consolidated_rows(db: Session, proyecto: str, periods: List[date]) -> List[Dict[str, Any]]:
+    """Filas de la vista consolidada del proyecto: categoria, actividad, amount_YYYY_MM y total"""
+    rows = []
+    for categoria in project_categories(db, proyecto):
+        for line, amounts in load_budget_lines(db, proyecto, categoria, periods[0], periods[-1]):
+            row = {"categoria": category_label(categoria), "actividad": line.concepto}
+            row.update(pivot_row(amounts, periods, amount_column))
+            row["total"] = sum(_to_float(amount) for amount in amounts.values())
+            rows.append(row)
+    return rows
+
+
+def project_summary_rows(db: Session, periods: List[date], proyecto: Optional[str] = None, key=amount_column) -> List[Dict[str, Any]]:
+    """Filas de la vista resumen: una por categoría con sus totales mensuales"""
+    rows = []
+    for categoria, amounts in summary_by_categoria(db, periods, proyecto).items():
+        row = {"categoria": category_label(categoria)}
+        row.update(pivot_row(amounts, periods, key))
+        row["total"] = sum(_to_float(amount) for amount in amounts.values())
+        rows.append(row)
+    return rows
+
+
+def project_view_names(proyecto: str) -> List[str]:
+    """Vistas que ofrece el presupuesto de un proyecto"""
+    return [f"v_presupuesto_mercadeo_{proyecto}_consolidado", f"v_presupuesto_mercadeo_{proyecto}_resumen"]
@@ -113,6 +113,100 @@ class AdministrativeCostDB(Base):
     credit_amount = Column(Numeric(12, 2), nullable=True)
     balance = Column(Numeric(12, 2), nullable=True)
 
+class LedgerMonthlyRollup(Base):
+    """
+    Créditos y débitos mensuales por proyecto y cuenta de ledger_entries (source 'ledger')
+    y de administrative_costs (source 'admin_costs', project_name vacío).
+    Se refresca al reemplazar el libro mayor de un proyecto o los costos administrativos.
+    """
+    __tablename__ = "ledger_monthly_rollup"
+    id = Column(Integer, primary_key=True, index=True)
+    source = Column(String(20), nullable=False)
+    project_name = Column(String, nullable=False, default="")
+    account = Column(String, nullable=False, default="")
+    year_month = Column(Date, nullable=False)  # primer día del mes
+    credits = Column(Numeric(18, 2), nullable=False, default=0.00)
+    debits = Column(Numeric(18, 2), nullable=False, default=0.00)
+    entries_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ux_ledger_monthly_rollup_key', 'source', 'project_name', 'year_month', 'account', unique=True),
+    )
+
+class IntegrationAccountingEntry(Base):
+    """
+    Asientos importados de los sistemas contables externos (QuickBooks, SAP, APIs genéricas).
+    Una fila por (integration_id, external_id); las sincronizaciones posteriores la actualizan.
+    """
+    __tablename__ = "integration_accounting_entries"
+    id = Column(Integer, primary_key=True, index=True)
+    integration_id = Column(String(100), nullable=False)
+    external_id = Column(String, nullable=False)
+    account_code = Column(String, nullable=True)
+    account_name = Column(String, nullable=True)
+    entry_date = Column(Date, nullable=False)
+    reference = Column(String, nullable=True)
+    description = Column(Text, nullable=True)
+    debit_amount = Column(Numeric(18, 2), nullable=True)
+    credit_amount = Column(Numeric(18, 2), nullable=True)
+    currency = Column(String(10), nullable=True)
+    project_code = Column(String, nullable=True)
+    department = Column(String, nullable=True)
+    external_updated_at = Column(DateTime, nullable=True)
+    synced_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('ux_integration_entries_external', 'integration_id', 'external_id', unique=True),
+        Index('ix_integration_entries_date', 'integration_id', 'entry_date'),
+    )
+
+class IntegrationState(Base):
+    """
+    Configuración y estado de sincronización de cada integración contable, compartidos
+    por todos los workers (cada worker reconstruye su registro en memoria desde aquí).
+    last_sync es la marca de agua de la sincronización incremental.
+    """
+    __tablename__ = "integration_states"
+    id = Column(Integer, primary_key=True, index=True)
+    integration_id = Column(String(100), nullable=False, unique=True)
+    system_type = Column(String(30), nullable=False)
+    config = Column(JSONB, nullable=False)  # IntegrationConfig serializada (sin last_sync)
+    enabled = Column(Boolean, default=False, nullable=False)
+    auto_sync = Column(Boolean, default=False, nullable=False)
+    sync_frequency_hours = Column(Integer, nullable=True)
+    last_sync = Column(DateTime, nullable=True)
+    last_attempt_at = Column(DateTime, nullable=True)
+    last_status = Column(String(20), nullable=True)
+    consecutive_failures = Column(Integer, default=0, nullable=False)
+    next_sync_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IntegrationSyncRun(Base):
+    """Historial de sincronizaciones (un registro por intento) con métricas de rendimiento"""
+    __tablename__ = "integration_sync_runs"
+    id = Column(Integer, primary_key=True, index=True)
+    integration_id = Column(String(100), nullable=False)
+    trigger = Column(String(20), nullable=False)  # manual, scheduled
+    attempt = Column(Integer, default=1, nullable=False)
+    status = Column(String(20), nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime, nullable=False)
+    total_records = Column(Integer, default=0, nullable=False)
+    successful_records = Column(Integer, default=0, nullable=False)
+    failed_records = Column(Integer, default=0, nullable=False)
+    execution_time_seconds = Column(Float, nullable=True)
+    records_per_second = Column(Float, nullable=True)
+    watermark_from = Column(DateTime, nullable=True)
+    watermark_to = Column(DateTime, nullable=True)
+    errors = Column(JSONB, nullable=True)
+    warnings = Column(JSONB, nullable=True)
+
+    __table_args__ = (
+        Index('ix_integration_sync_runs_started', 'integration_id', 'started_at'),
+    )
+
 class CostoDirectoTable(Base):
     __tablename__ = "costo_directo"
     id = Column(Integer, primary_key=True, index=True)
@@ -423,6 +517,62 @@ class Proyecto(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+class PresupuestoMercadeoLinea(Base):
+    """
+    Línea (concepto) del presupuesto de mercadeo de un proyecto.
+    Reemplaza las filas de las tablas presupuesto_mercadeo_<proyecto>_<categoria>.
+    """
+    __tablename__ = "mercadeo_presupuesto_lineas"
+    id = Column(Integer, primary_key=True, index=True)
+    proyecto = Column(String, nullable=False)  # keyword del proyecto, e.g. 'chepo'
+    categoria = Column(String(64), nullable=False)  # sufijo de la tabla, e.g. 'gastos_publicitarios'
+    concepto = Column(String(255), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    montos = relationship("PresupuestoMercadeoMonto", back_populates="linea", cascade="all, delete-orphan", passive_deletes=True)
+
+    __table_args__ = (
+        Index('ix_mercadeo_presupuesto_lineas_proyecto_categoria', 'proyecto', 'categoria'),
+    )
+
+class PresupuestoMercadeoMonto(Base):
+    """Monto mensual de una línea del presupuesto de mercadeo (formato largo)"""
+    __tablename__ = "mercadeo_presupuesto_montos"
+    id = Column(Integer, primary_key=True, index=True)
+    linea_id = Column(Integer, ForeignKey("mercadeo_presupuesto_lineas.id", ondelete="CASCADE"), nullable=False)
+    # Copiados de la línea para que las ventanas por proyecto/categoría sean un solo range scan
+    proyecto = Column(String, nullable=False)
+    categoria = Column(String(64), nullable=False)
+    periodo = Column(Date, nullable=False)  # primer día del mes
+    monto = Column(Numeric(15, 2), nullable=False, default=0.00)
+
+    linea = relationship("PresupuestoMercadeoLinea", back_populates="montos")
+
+    __table_args__ = (
+        Index('ux_mercadeo_presupuesto_montos_linea_periodo', 'linea_id', 'periodo', unique=True),
+        Index('ix_mercadeo_presupuesto_montos_proyecto_categoria_periodo', 'proyecto', 'categoria', 'periodo'),
+        Index('ix_mercadeo_presupuesto_montos_periodo', 'periodo'),
+    )
+
+class PresupuestoMercadeoConsolidado(Base):
+    """
+    Totales mensuales del presupuesto de mercadeo de todos los proyectos por concepto.
+    Se refresca de forma incremental cuando cambian las líneas o montos de un concepto.
+    """
+    __tablename__ = "mercadeo_presupuesto_consolidado"
+    id = Column(Integer, primary_key=True, index=True)
+    concepto = Column(String(255), nullable=False)
+    periodo = Column(Date, nullable=False)
+    monto = Column(Numeric(18, 2), nullable=False, default=0.00)
+    lineas_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ux_mercadeo_presupuesto_consolidado_concepto_periodo', 'concepto', 'periodo', unique=True),
+        Index('ix_mercadeo_presupuesto_consolidado_periodo', 'periodo'),
+    )
+
 class GastoCategorizado(Base):
     __tablename__ = "gastos_categorizados"
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
@@ -519,6 +669,13 @@ class ScenarioProject(Base):
     # New field for payment distribution configuration
     payment_distribution_config = Column(JSONB, nullable=True)
 
+    # Sumar al flujo el costo estimado de las etapas (además de las partidas de costo)
+    use_stage_costs = Column(Boolean, default=False, server_default=text('false'), nullable=False)
+
+    # Cache del flujo de caja persistido: hash de los insumos con que se calculó
+    cash_flow_fingerprint = Column(String(64), nullable=True)
+    cash_flow_calculated_at = Column(DateTime, nullable=True)
+
     # Metadatos
     created_by = Column(String(100), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -633,6 +790,10 @@ class ScenarioCashFlow(Base):
     # Relaciones
     project = relationship("ScenarioProject", back_populates="cash_flows")
 
+    __table_args__ = (
+        Index('ux_scenario_cash_flow_period', 'scenario_project_id', 'year', 'month', unique=True),
+    )
+
     def to_dict(self):
         """Converts the SQLAlchemy model instance to a dictionary."""
         return {
@@ -658,6 +819,28 @@ class ScenarioCashFlow(Base):
             "updated_at": self.updated_at.isoformat() if self.updated_at else None,
         }
 
+class PortfolioCashFlowRollup(Base):
+    """
+    Totales mensuales del flujo de caja de todos los proyectos de escenario por estado.
+    Se refresca de forma incremental cuando cambia el flujo o el estado de un proyecto.
+    """
+    __tablename__ = "portfolio_cash_flow_rollup"
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_status = Column(String(50), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+
+    total_ingresos = Column(Numeric(18, 2), default=0.00)
+    total_egresos = Column(Numeric(18, 2), default=0.00)
+    projects_count = Column(Integer, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('ux_portfolio_cash_flow_rollup_period', 'project_status', 'year', 'month', unique=True),
+    )
+
 class SensitivityAnalysis(Base):
     """
     Análisis de sensibilidad para proyectos de escenario
@@ -1302,6 +1485,8 @@ class ProjectStage(Base):
     # Recursos y costos asociados
     estimated_cost = Column(Numeric(15, 2), nullable=True)
     actual_cost = Column(Numeric(15, 2), nullable=True)
+    cost_profile = Column(String(20), default="LINEAR", server_default="LINEAR", nullable=False)
+    # LINEAR, S_CURVE, FRONT_LOADED: curva con que estimated_cost entra al flujo de caja
     
     # Personal y recursos requeridos
     required_personnel = Column(JSONB, nullable=True)  # {"architects": 2, "engineers": 1, "workers": 10}
@@ -1341,5 +1526,14 @@ class SalesProjection(Base):
     is_active = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # Resumen guardado al escribir, para listar sin leer los JSONB
+    total_revenue = Column(Numeric(18, 2), nullable=True)
+    total_units = Column(Integer, nullable=True)
+    duration_months = Column(Integer, nullable=True)
+    
     project = relationship("ScenarioProject", foreign_keys=[scenario_project_id])
+    
+    __table_args__ = (
+        Index('ix_sales_projections_project_created', 'scenario_project_id', 'created_at'),
+    )
 
@@ -0,0 +1,336 @@
+"""
+Portfolio-wide consolidated cash flow for scenario projects.
+
+Monthly ingresos/egresos of every project with a given status are aggregated
+by one grouped query over scenario_cash_flows joined to scenario_projects and
+placed on a calendar axis (year, month), so projects that start in different
+months line up correctly.
+
+PortfolioCashFlowRollup keeps the same totals per (status, year, month).
+It is maintained incrementally: whatever changes the cash flow, the status or
+the existence of projects runs inside portfolio_rollup_delta(), which reads
+the contribution of those projects to the rollup before and after the change
+and adds the difference to the touched keys with
+INSERT ... ON CONFLICT (project_status, year, month) DO UPDATE
+SET total = total + excluded.total. The work is proportional to the months of
+the projects that changed, and the row locks on those keys are the only
+serialization between recalculations of different projects; the project rows
+are locked FOR UPDATE so two recalculations of the same project cannot both
+apply a delta against the same old state.
+
+refresh_portfolio_rollup() rebuilds the table from scratch (DELETE plus
+INSERT ... SELECT) for POST refresh-rollup. It takes the rollup advisory lock
+in exclusive mode; the deltas take it in shared mode, so they never wait on
+each other, only on a rebuild in progress.
+"""
+
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, literal, select, tuple_
+from sqlalchemy.orm import Session
+
+from .database import advisory_xact_lock, insert_for_dialect
+from .models import PortfolioCashFlowRollup, ScenarioCashFlow, ScenarioProject
+
+logger = logging.getLogger(__name__)
+
+# Default axis of the consolidated dashboard: 3 months back + current + 35 forward
+DEFAULT_MONTHS_BACK = 3
+DEFAULT_AXIS_MONTHS = 39
+
+Period = Tuple[int, int]
+RollupKey = Tuple[str, int, int]
+# (total_ingresos, total_egresos, projects_count) of a rollup key
+Contribution = Tuple[Decimal, Decimal, int]
+
+# First key of pg_advisory_xact_lock(int, int) for the rollup tables
+ROLLUP_LOCK_NAMESPACE = 0x2C0F
+ROLLUP_LOCK_NAME = "portfolio_cash_flow_rollup"
+
+_NO_CONTRIBUTION: Contribution = (Decimal('0'), Decimal('0'), 0)
+
+# Rollup keys per INSERT statement, well below the bind parameter limit of the drivers
+CHUNK_SIZE = 500
+
+
+def calendar_axis(start: Period, months: int) -> List[Period]:
+    """Lista de (año, mes) consecutivos desde start"""
+    year, month = start
+    axis = []
+    for _ in range(months):
+        axis.append((year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return axis
+
+
+def default_axis_start(today: Optional[date] = None) -> Period:
+    """Primer mes del eje por defecto: DEFAULT_MONTHS_BACK meses antes del mes actual"""
+    today = today or date.today()
+    index = today.year * 12 + (today.month - 1) - DEFAULT_MONTHS_BACK
+    return index // 12, index % 12 + 1
+
+
+def _period_index(year_column, month_column):
+    return year_column * 12 + month_column
+
+
+def _positive_sum(column):
+    # Only positive amounts count, as in the per-project dashboard rows
+    return func.coalesce(func.sum(case((column > 0, column), else_=0)), 0)
+
+
+def consolidated_cash_flow(
+    db: Session,
+    status: str = "ACTIVE",
+    start: Optional[Period] = None,
+    months: int = DEFAULT_AXIS_MONTHS,
+    include_projects: bool = True,
+    use_rollup: bool = False,
+) -> Dict:
+    """
+    Ingresos y egresos consolidados de los proyectos con `status` sobre un eje calendario.
+
+    Retorna vectores por proyecto (si include_projects) y totales por mes.
+    Con use_rollup los totales se leen de la tabla de rollup.
+    """
+    start = start or default_axis_start()
+    axis = calendar_axis(start, months)
+    position = {period: idx for idx, period in enumerate(axis)}
+    first = start[0] * 12 + start[1]
+    last = first + months - 1
+
+    total_ingresos_by_month = [Decimal('0')] * months
+    total_egresos_by_month = [Decimal('0')] * months
+    project_details = []
+
+    if include_projects or not use_rollup:
+        in_window = and_(
+            ScenarioCashFlow.scenario_project_id == ScenarioProject.id,
+            _period_index(ScenarioCashFlow.year, ScenarioCashFlow.month).between(first, last),
+        )
+        rows = db.query(
+            ScenarioProject.id,
+            ScenarioProject.name,
+            ScenarioProject.status,
+            ScenarioCashFlow.year,
+            ScenarioCashFlow.month,
+            _positive_sum(ScenarioCashFlow.total_ingresos).label("ingresos"),
+            _positive_sum(ScenarioCashFlow.total_egresos).label("egresos"),
+        ).outerjoin(
+            ScenarioCashFlow, in_window
+        ).filter(
+            ScenarioProject.status == status
+        ).group_by(
+            ScenarioProject.id, ScenarioProject.name, ScenarioProject.status,
+            ScenarioCashFlow.year, ScenarioCashFlow.month
+        ).order_by(ScenarioProject.id).all()
+
+        projects: Dict[int, Dict] = {}
+        for project_id, name, project_status, year, month, ingresos, egresos in rows:
+            detail = projects.get(project_id)
+            if detail is None:
+                detail = projects[project_id] = {
+                    "project_id": project_id,
+                    "project_name": name,
+                    "project_status": project_status,
+                    "ingresos_by_month": [Decimal('0')] * months,
+                    "egresos_by_month": [Decimal('0')] * months,
+                }
+            idx = position.get((year, month))
+            if idx is None:
+                continue
+            detail["ingresos_by_month"][idx] += Decimal(ingresos)
+            detail["egresos_by_month"][idx] += Decimal(egresos)
+            if not use_rollup:
+                total_ingresos_by_month[idx] += Decimal(ingresos)
+                total_egresos_by_month[idx] += Decimal(egresos)
+
+        for detail in projects.values():
+            detail["total_ingresos_proyecto"] = float(sum(detail["ingresos_by_month"]))
+            detail["total_egresos_proyecto"] = float(sum(detail["egresos_by_month"]))
+            detail["ingresos_by_month"] = [float(value) for value in detail["ingresos_by_month"]]
+            detail["egresos_by_month"] = [float(value) for value in detail["egresos_by_month"]]
+            project_details.append(detail)
+        projects_count = len(projects)
+    else:
+        projects_count = db.query(func.count(ScenarioProject.id)).filter(ScenarioProject.status == status).scalar() or 0
+
+    if use_rollup:
+        rollup_rows = db.query(
+            PortfolioCashFlowRollup.year,
+            PortfolioCashFlowRollup.month,
+            PortfolioCashFlowRollup.total_ingresos,
+            PortfolioCashFlowRollup.total_egresos,
+        ).filter(
+            PortfolioCashFlowRollup.project_status == status,
+            _period_index(PortfolioCashFlowRollup.year, PortfolioCashFlowRollup.month).between(first, last),
+        ).all()
+        for year, month, ingresos, egresos in rollup_rows:
+            idx = position[(year, month)]
+            total_ingresos_by_month[idx] = Decimal(ingresos or 0)
+            total_egresos_by_month[idx] = Decimal(egresos or 0)
+
+    total_ingresos = sum(total_ingresos_by_month, Decimal('0'))
+    total_egresos = sum(total_egresos_by_month, Decimal('0'))
+    return {
+        "periods": [f"{year}-{month:02d}" for year, month in axis],
+        "projects": project_details,
+        "consolidated_cash_flow": {
+            "total_ingresos_by_month": [float(value) for value in total_ingresos_by_month],
+            "total_egresos_by_month": [float(value) for value in total_egresos_by_month],
+            "total_ingresos": float(total_ingresos),
+            "total_egresos": float(total_egresos),
+            "flujo_neto_total": float(total_ingresos - total_egresos),
+            "projects_count": projects_count,
+        },
+    }
+
+
+def refresh_portfolio_rollup(db: Session) -> None:
+    """
+    Reconstruir el rollup completo desde scenario_cash_flows, sin commit.
+
+    Un DELETE de la tabla y un INSERT ... SELECT agrupado por estado y mes, bajo el
+    advisory lock exclusivo del rollup hasta el fin de la transacción.
+    """
+    db.flush()
+    table = PortfolioCashFlowRollup.__table__
+    advisory_xact_lock(db, ROLLUP_LOCK_NAMESPACE, ROLLUP_LOCK_NAME)
+    db.execute(delete(table))
+
+    aggregate = select(
+        ScenarioProject.status,
+        ScenarioCashFlow.year,
+        ScenarioCashFlow.month,
+        _positive_sum(ScenarioCashFlow.total_ingresos),
+        _positive_sum(ScenarioCashFlow.total_egresos),
+        func.count(func.distinct(ScenarioCashFlow.scenario_project_id)),
+        literal(datetime.utcnow()),
+    ).select_from(ScenarioCashFlow).join(
+        ScenarioProject, ScenarioProject.id == ScenarioCashFlow.scenario_project_id
+    ).group_by(ScenarioProject.status, ScenarioCashFlow.year, ScenarioCashFlow.month)
+
+    db.execute(table.insert().from_select(
+        ["project_status", "year", "month", "total_ingresos", "total_egresos", "projects_count", "updated_at"],
+        aggregate
+    ))
+
+
+def project_contributions(db: Session, project_ids: Iterable[int]) -> Dict[RollupKey, Contribution]:
+    """Aporte de los proyectos indicados a cada (estado, año, mes) del rollup"""
+    project_ids = list(project_ids)
+    if not project_ids:
+        return {}
+    rows = db.query(
+        ScenarioProject.status,
+        ScenarioCashFlow.year,
+        ScenarioCashFlow.month,
+        _positive_sum(ScenarioCashFlow.total_ingresos),
+        _positive_sum(ScenarioCashFlow.total_egresos),
+        func.count(func.distinct(ScenarioCashFlow.scenario_project_id)),
+    ).join(
+        ScenarioProject, ScenarioProject.id == ScenarioCashFlow.scenario_project_id
+    ).filter(
+        ScenarioCashFlow.scenario_project_id.in_(project_ids)
+    ).group_by(ScenarioProject.status, ScenarioCashFlow.year, ScenarioCashFlow.month).all()
+    return {
+        (status, year, month): (Decimal(str(ingresos or 0)), Decimal(str(egresos or 0)), int(count))
+        for status, year, month, ingresos, egresos, count in rows
+    }
+
+
+def apply_rollup_delta(
+    db: Session,
+    before: Dict[RollupKey, Contribution],
+    after: Dict[RollupKey, Contribution],
+) -> int:
+    """
+    Sumar al rollup la diferencia entre dos aportes (sin commit); retorna las claves tocadas.
+
+    Las claves van ordenadas para que dos transacciones bloqueen las filas en el mismo
+    orden, y las que quedan sin proyectos se eliminan como en la reconstrucción completa.
+    """
+    now = datetime.utcnow()
+    rows = []
+    for key in sorted(set(before) | set(after)):
+        old = before.get(key, _NO_CONTRIBUTION)
+        new = after.get(key, _NO_CONTRIBUTION)
+        delta = [new_value - old_value for new_value, old_value in zip(new, old)]
+        if not any(delta):
+            continue
+        status, year, month = key
+        rows.append({
+            "project_status": status, "year": year, "month": month,
+            "total_ingresos": delta[0], "total_egresos": delta[1], "projects_count": delta[2],
+            "updated_at": now,
+        })
+    if not rows:
+        return 0
+
+    table = PortfolioCashFlowRollup.__table__
+    insert = insert_for_dialect(db)
+    for start in range(0, len(rows), CHUNK_SIZE):
+        chunk = rows[start:start + CHUNK_SIZE]
+        if insert is None:
+            # No upsert support: update the existing keys and insert the missing ones
+            for row in chunk:
+                updated = db.execute(table.update().where(
+                    table.c.project_status == row["project_status"],
+                    table.c.year == row["year"],
+                    table.c.month == row["month"],
+                ).values(
+                    total_ingresos=func.coalesce(table.c.total_ingresos, 0) + row["total_ingresos"],
+                    total_egresos=func.coalesce(table.c.total_egresos, 0) + row["total_egresos"],
+                    projects_count=func.coalesce(table.c.projects_count, 0) + row["projects_count"],
+                    updated_at=now,
+                ))
+                if not updated.rowcount:
+                    db.execute(table.insert(), [row])
+            continue
+        statement = insert(table).values(chunk)
+        statement = statement.on_conflict_do_update(
+            index_elements=["project_status", "year", "month"],
+            set_={
+                **{
+                    column: func.coalesce(table.c[column], 0) + statement.excluded[column]
+                    for column in ("total_ingresos", "total_egresos", "projects_count")
+                },
+                "updated_at": statement.excluded.updated_at,
+            },
+        )
+        db.execute(statement)
+
+    keys = [(row["project_status"], row["year"], row["month"]) for row in rows]
+    for start in range(0, len(keys), CHUNK_SIZE):
+        db.execute(delete(table).where(
+            tuple_(table.c.project_status, table.c.year, table.c.month).in_(keys[start:start + CHUNK_SIZE]),
+            table.c.projects_count <= 0,
+        ))
+    return len(rows)
+
+
+@contextmanager
+def portfolio_rollup_delta(db: Session, project_ids: Iterable[int]) -> Iterator[None]:
+    """
+    Mantener el rollup al día con los cambios hechos dentro del bloque (sin commit).
+
+    Bloquea las filas de los proyectos (FOR UPDATE, en orden de id), lee su aporte al
+    rollup, ejecuta el bloque y suma la diferencia con el aporte resultante. Todo lo que
+    cambie el flujo, el estado o la existencia de esos proyectos debe ir dentro del bloque.
+    """
+    project_ids = sorted(set(project_ids))
+    if not project_ids:
+        yield
+        return
+    advisory_xact_lock(db, ROLLUP_LOCK_NAMESPACE, ROLLUP_LOCK_NAME, shared=True)
+    db.query(ScenarioProject.id).filter(
+        ScenarioProject.id.in_(project_ids)
+    ).order_by(ScenarioProject.id).with_for_update().all()
+    before = project_contributions(db, project_ids)
+    yield
+    db.flush()
+    apply_rollup_delta(db, before, project_contributions(db, project_ids))
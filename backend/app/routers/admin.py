@@ -7,6 +7,8 @@ from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
 from .. import auth
+from .. import marketing_budget as budget
+from ..schema_catalog import get_schema_catalog, invalidate_schema_catalog
 from ..models import Proyecto, User
 
 router = APIRouter(
@@ -43,7 +45,7 @@ class UserResponse(BaseModel):
 
 # Admin Panel Routes
 @router.get("/panel", response_class=HTMLResponse)
-async def admin_panel(request: Request, current_user: User = Depends(auth.require_admin), db: Session = Depends(auth.get_db)):
+def admin_panel(request: Request, current_user: User = Depends(auth.require_admin), db: Session = Depends(auth.get_db)):
     """
     Render the admin panel HTML page
     """
@@ -56,7 +58,7 @@ async def admin_panel(request: Request, current_user: User = Depends(auth.requir
 
 # User Management Endpoints
 @router.get("/users", response_model=List[UserResponse])
-async def get_users(current_user: User = Depends(auth.require_admin), db: Session = Depends(auth.get_db)):
+def get_users(current_user: User = Depends(auth.require_admin), db: Session = Depends(auth.get_db)):
     """
     Get all users for admin management
     """
@@ -64,7 +66,7 @@ async def get_users(current_user: User = Depends(auth.require_admin), db: Sessio
     return users
 
 @router.post("/create-user")
-async def create_user(user_data: UserCreateRequest, current_user: User = Depends(auth.require_admin), db: Session = Depends(auth.get_db)):
+def create_user(user_data: UserCreateRequest, current_user: User = Depends(auth.require_admin), db: Session = Depends(auth.get_db)):
     """
     Create a new user (admin only)
     """
@@ -101,7 +103,7 @@ async def create_user(user_data: UserCreateRequest, current_user: User = Depends
         return {"success": False, "error": f"Error al crear usuario: {str(e)}"}
 
 @router.post("/update-user-status")
-async def update_user_status(user_id: int, is_active: bool, current_user: User = Depends(auth.require_admin), db: Session = Depends(auth.get_db)):
+def update_user_status(user_id: int, is_active: bool, current_user: User = Depends(auth.require_admin), db: Session = Depends(auth.get_db)):
     """
     Update user active status (admin only)
     """
@@ -125,7 +127,7 @@ async def update_user_status(user_id: int, is_active: bool, current_user: User =
         return {"success": False, "error": f"Error al actualizar estado: {str(e)}"}
 
 @router.post("/update-user-role")
-async def update_user_role(user_id: int, role: str, current_user: User = Depends(auth.require_admin), db: Session = Depends(auth.get_db)):
+def update_user_role(user_id: int, role: str, current_user: User = Depends(auth.require_admin), db: Session = Depends(auth.get_db)):
     """
     Update user role (admin only)
     """
@@ -151,7 +153,7 @@ async def update_user_role(user_id: int, role: str, current_user: User = Depends
         return {"success": False, "error": f"Error al actualizar rol: {str(e)}"}
 
 @router.delete("/delete-project/{project_name}")
-async def delete_project(
+def delete_project(
     project_name: str,
     db: Session = Depends(auth.get_db)
 ):
@@ -201,16 +203,11 @@ async def delete_project(
             f"v_presupuesto_mercadeo_{project_name}_resumen"
         ])
         
+        schema = get_schema_catalog(db)
         for view_name in views_to_delete:
             try:
                 # Verificar si la vista existe
-                check_view = db.execute(text("""
-                    SELECT EXISTS (
-                        SELECT 1 FROM information_schema.views 
-                        WHERE table_schema = 'public' 
-                        AND table_name = :view_name
-                    )
-                """), {"view_name": view_name}).scalar()
+                check_view = schema.has_view(view_name)
                 
                 if check_view:
                     db.execute(text(f"DROP VIEW IF EXISTS {view_name} CASCADE"))
@@ -234,13 +231,7 @@ async def delete_project(
         for table_name in tables_to_delete:
             try:
                 # Verificar si la tabla existe
-                check_table = db.execute(text("""
-                    SELECT EXISTS (
-                        SELECT 1 FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = :table_name
-                    )
-                """), {"table_name": table_name}).scalar()
+                check_table = schema.has_table(table_name)
                 
                 if check_table:
                     db.execute(text(f"DROP TABLE IF EXISTS {table_name} CASCADE"))
@@ -250,7 +241,12 @@ async def delete_project(
             except Exception as e:
                 print(f"⚠️ Error eliminando tabla {table_name}: {e}")
         
-        # 3. Delete project data from related tables
+        # 3. Delete the marketing budget lines and amounts
+        deleted_lines = budget.delete_project_budget(db, project_name)
+        if deleted_lines:
+            deleted_items["related_data"].append(f"mercadeo_presupuesto_lineas: {deleted_lines} rows")
+        
+        # 4. Delete project data from related tables
         tables_to_clean = [
             "infraestructura_pagos",
             "vivienda_pagos", 
@@ -269,7 +265,7 @@ async def delete_project(
             except Exception as e:
                 print(f"⚠️ Error cleaning {table}: {e}")
         
-        # 4. Delete from projects table
+        # 5. Delete from projects table
         project_to_delete = db.query(Proyecto).filter(Proyecto.keyword == project_name).first()
         if project_to_delete:
             db.delete(project_to_delete)
@@ -278,6 +274,7 @@ async def delete_project(
         
         # Confirmar cambios
         db.commit()
+        invalidate_schema_catalog()
         
         print(f"🎉 Proyecto '{project_name}' eliminado completamente")
         
@@ -301,7 +298,7 @@ async def delete_project(
         )
 
 @router.get("/projects")
-async def list_projects(db: Session = Depends(auth.get_db)):
+def list_projects(db: Session = Depends(auth.get_db)):
     """
     Obtiene la lista de todos los proyectos registrados en la base de datos con información de estado
     """
@@ -313,46 +310,8 @@ async def list_projects(db: Session = Depends(auth.get_db)):
         
         projects = []
         for project in projects_from_db:
-            # Verificar si las tablas de marketing existen para este proyecto
-            tables_exist = False
-            views_exist = False
-            
-            # Check if any marketing tables exist (new format)
-            table_suffixes = ["casa_modelo", "feria_eventos", "gastos_casa_modelo", 
-                             "gastos_publicitarios", "gastos_tramites", "promociones_y_bonos", "redes_sociales"]
-            
-            for suffix in table_suffixes:
-                table_name = f"presupuesto_mercadeo_{project.keyword}_{suffix}"
-                check_table = db.execute(text("""
-                    SELECT EXISTS (
-                        SELECT 1 FROM information_schema.tables 
-                        WHERE table_schema = 'public' 
-                        AND table_name = :table_name
-                    )
-                """), {"table_name": table_name}).scalar()
-                
-                if check_table:
-                    tables_exist = True
-                    break
-            
-            # Check if any views exist
-            view_names = [
-                f"v_presupuesto_mercadeo_{project.keyword}_consolidado",
-                f"v_presupuesto_mercadeo_{project.keyword}_resumen"
-            ]
-            
-            for view_name in view_names:
-                check_view = db.execute(text("""
-                    SELECT EXISTS (
-                        SELECT 1 FROM information_schema.views 
-                        WHERE table_schema = 'public' 
-                        AND table_name = :view_name
-                    )
-                """), {"view_name": view_name}).scalar()
-                
-                if check_view:
-                    views_exist = True
-                    break
+            # Verificar si el presupuesto de marketing existe para este proyecto
+            tables_exist = views_exist = budget.project_has_budget(db, project.keyword)
             
             projects.append({
                 "keyword": project.keyword,
@@ -85,7 +85,7 @@ async def get_bid_template():
     return StandardTemplate()
 
 @router.get("/template/download")
-async def download_bid_template():
+def download_bid_template():
     """Descargar template Excel de ejemplo para licitaciones"""
     
     # Create sample template data
@@ -135,7 +135,7 @@ async def download_bid_template():
     )
 
 @router.post("/preview", response_model=BidImportPreview)
-async def preview_bid_file(
+def preview_bid_file(
     project_id: int = Form(...),
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
@@ -152,7 +152,7 @@ async def preview_bid_file(
     
     try:
         # Read Excel file
-        contents = await file.read()
+        contents = file.file.read()
         df = pd.read_excel(io.BytesIO(contents), sheet_name='LICITACION')
         
         # Validate template compliance
@@ -259,7 +259,7 @@ async def preview_bid_file(
         raise HTTPException(status_code=400, detail=f"Error procesando archivo: {str(e)}")
 
 @router.post("/import", response_model=BidImportResponse)
-async def import_bid_items(
+def import_bid_items(
     import_request: BidImportRequest,
     db: Session = Depends(get_db)
 ):
@@ -334,7 +334,7 @@ async def import_bid_items(
         )
 
 @router.get("/projects/{project_id}/imported-bids")
-async def get_imported_bids(project_id: int, db: Session = Depends(get_db)):
+def get_imported_bids(project_id: int, db: Session = Depends(get_db)):
     """Obtener historial de licitaciones importadas para un proyecto"""
     
     project = db.query(ConstructionProject).filter(ConstructionProject.id == project_id).first()
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from .. import crud_clientes, schemas, models
-from ..database import SessionLocal
+from ..database import get_db
 
 router = APIRouter(
     prefix="/api/clientes",
@@ -11,14 +11,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=schemas.Cliente, status_code=201)
 def create_new_cliente(cliente: schemas.ClienteCreate, db: Session = Depends(get_db)):
     # Uniqueness checks are handled in crud_clientes.create_cliente
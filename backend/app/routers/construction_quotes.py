@@ -285,7 +285,7 @@ class QuoteSummaryResponse(BaseModel):
 
 @router.get("/projects", response_model=ProjectSummaryResponse, include_in_schema=False)
 @router.get("/projects/", response_model=ProjectSummaryResponse)
-async def list_construction_projects(
+def list_construction_projects(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     status: Optional[str] = Query(None),
@@ -309,7 +309,7 @@ async def list_construction_projects(
     return ProjectSummaryResponse(projects=projects, total=total)
 
 @router.post("/projects", response_model=ConstructionProjectSchema)
-async def create_construction_project(
+def create_construction_project(
     project: ConstructionProjectCreate,
     db: Session = Depends(get_db)
 ):
@@ -325,7 +325,7 @@ async def create_construction_project(
     return db_project
 
 @router.get("/projects/{project_id}", response_model=ConstructionProjectSchema)
-async def get_construction_project(project_id: int, db: Session = Depends(get_db)):
+def get_construction_project(project_id: int, db: Session = Depends(get_db)):
     """Obtener un proyecto de construcción específico"""
     project = db.query(ConstructionProject).filter(
         ConstructionProject.id == project_id
@@ -337,7 +337,7 @@ async def get_construction_project(project_id: int, db: Session = Depends(get_db
     return project
 
 @router.put("/projects/{project_id}", response_model=ConstructionProjectSchema)
-async def update_construction_project(
+def update_construction_project(
     project_id: int,
     project_update: ConstructionProjectUpdate,
     db: Session = Depends(get_db)
@@ -360,7 +360,7 @@ async def update_construction_project(
     return db_project
 
 @router.delete("/projects/{project_id}")
-async def delete_construction_project(project_id: int, db: Session = Depends(get_db)):
+def delete_construction_project(project_id: int, db: Session = Depends(get_db)):
     """Eliminar un proyecto de construcción"""
     db_project = db.query(ConstructionProject).filter(
         ConstructionProject.id == project_id
@@ -378,7 +378,7 @@ async def delete_construction_project(project_id: int, db: Session = Depends(get
 # === COST ITEMS ENDPOINTS ===
 
 @router.get("/cost-items", response_model=List[CostItemSchema])
-async def list_cost_items(
+def list_cost_items(
     skip: int = Query(0, ge=0),
     limit: int = Query(1000, ge=1, le=1000),
     item_type: Optional[str] = Query(None),
@@ -398,7 +398,7 @@ async def list_cost_items(
     return items
 
 @router.post("/cost-items", response_model=CostItemSchema)
-async def create_cost_item(
+def create_cost_item(
     cost_item: CostItemCreate,
     db: Session = Depends(get_db)
 ):
@@ -419,7 +419,7 @@ async def create_cost_item(
     return db_item
 
 @router.get("/cost-items/{item_id}", response_model=CostItemSchema)
-async def get_cost_item(item_id: int, db: Session = Depends(get_db)):
+def get_cost_item(item_id: int, db: Session = Depends(get_db)):
     """Obtener un item de costo específico"""
     item = db.query(CostItem).filter(CostItem.id == item_id).first()
     if not item:
@@ -430,7 +430,7 @@ async def get_cost_item(item_id: int, db: Session = Depends(get_db)):
 # === ASSEMBLIES ENDPOINTS ===
 
 @router.get("/assemblies", response_model=List[ConstructionAssemblySchema])
-async def list_assemblies(
+def list_assemblies(
     skip: int = Query(0, ge=0),
     limit: int = Query(1000, ge=1, le=1000),
     assembly_type: Optional[str] = Query(None),
@@ -452,7 +452,7 @@ async def list_assemblies(
     return assemblies
 
 @router.post("/assemblies", response_model=ConstructionAssemblySchema)
-async def create_assembly(
+def create_assembly(
     assembly: ConstructionAssemblyCreate,
     db: Session = Depends(get_db)
 ):
@@ -475,7 +475,7 @@ async def create_assembly(
     return db_assembly
 
 @router.get("/assemblies/{assembly_id}", response_model=ConstructionAssemblySchema)
-async def get_assembly(assembly_id: int, db: Session = Depends(get_db)):
+def get_assembly(assembly_id: int, db: Session = Depends(get_db)):
     """Obtener un ensamblaje específico"""
     assembly = db.query(ConstructionAssembly).options(
         joinedload(ConstructionAssembly.components).joinedload(AssemblyComponent.cost_item)
@@ -506,7 +506,7 @@ class AssemblyCalculationResponse(BaseModel):
     component_breakdown: List[dict]
     
 @router.post("/assemblies/calculate", response_model=AssemblyCalculationResponse)
-async def calculate_assembly_cost(
+def calculate_assembly_cost(
     request: AssemblyCalculationRequest,
     db: Session = Depends(get_db)
 ):
@@ -604,7 +604,7 @@ class AssemblyToLineItemRequest(BaseModel):
     notes: Optional[str] = None
 
 @router.post("/assemblies/add-to-quote", response_model=QuoteLineItemSchema)
-async def add_assembly_to_quote(
+def add_assembly_to_quote(
     request: AssemblyToLineItemRequest,
     db: Session = Depends(get_db)
 ):
@@ -633,7 +633,7 @@ async def add_assembly_to_quote(
         complexity_factor=quote.project.complexity_factor
     )
     
-    calculation = await calculate_assembly_cost(calc_request, db)
+    calculation = calculate_assembly_cost(calc_request, db)
     
     # Get next line number
     max_line = db.query(func.max(QuoteLineItem.line_number)).filter(
@@ -716,7 +716,7 @@ def get_location_adjusted_cost(cost_item: CostItem, location_factor: Decimal) ->
     return cost_item.base_cost * location_factor
 
 @router.get("/assemblies/{assembly_id}/preview", response_model=AssemblyCalculationResponse)
-async def preview_assembly_cost(
+def preview_assembly_cost(
     assembly_id: int,
     location_factor: Optional[Decimal] = Query(Decimal("1.0")),
     complexity_factor: Optional[Decimal] = Query(Decimal("1.0")),
@@ -738,13 +738,13 @@ async def preview_assembly_cost(
         complexity_factor=complexity_factor
     )
     
-    return await calculate_assembly_cost(request, db)
+    return calculate_assembly_cost(request, db)
 
 
 # === QUOTES ENDPOINTS ===
 
 @router.get("/projects/{project_id}/quotes", response_model=List[ConstructionQuoteSchema])
-async def list_project_quotes(
+def list_project_quotes(
     project_id: int,
     db: Session = Depends(get_db)
 ):
@@ -758,7 +758,7 @@ async def list_project_quotes(
     return quotes
 
 @router.post("/projects/{project_id}/quotes", response_model=ConstructionQuoteSchema)
-async def create_quote(
+def create_quote(
     project_id: int,
     quote: ConstructionQuoteCreate,
     db: Session = Depends(get_db)
@@ -796,7 +796,7 @@ async def create_quote(
     return db_quote
 
 @router.get("/quotes/{quote_id}", response_model=ConstructionQuoteSchema)
-async def get_quote(quote_id: int, db: Session = Depends(get_db)):
+def get_quote(quote_id: int, db: Session = Depends(get_db)):
     """Obtener una cotización específica"""
     quote = db.query(ConstructionQuote).options(
         joinedload(ConstructionQuote.line_items).joinedload(QuoteLineItem.cost_item),
@@ -812,7 +812,7 @@ async def get_quote(quote_id: int, db: Session = Depends(get_db)):
 # === QUOTE LINE ITEMS ENDPOINTS ===
 
 @router.get("/quotes/{quote_id}/line-items", response_model=List[QuoteLineItemSchema])
-async def get_quote_line_items(
+def get_quote_line_items(
     quote_id: int,
     db: Session = Depends(get_db)
 ):
@@ -827,7 +827,7 @@ async def get_quote_line_items(
     return line_items
 
 @router.post("/line-items", response_model=QuoteLineItemSchema)
-async def add_line_item(
+def add_line_item(
     line_item: QuoteLineItemCreate,
     db: Session = Depends(get_db)
 ):
@@ -879,7 +879,7 @@ async def add_line_item(
     return db_line_item
 
 @router.put("/line-items/{line_item_id}", response_model=QuoteLineItemSchema)
-async def update_line_item(
+def update_line_item(
     line_item_id: int,
     line_item_update: dict,
     db: Session = Depends(get_db)
@@ -925,7 +925,7 @@ async def update_line_item(
     return line_item
 
 @router.delete("/line-items/{line_item_id}")
-async def delete_line_item(
+def delete_line_item(
     line_item_id: int,
     db: Session = Depends(get_db)
 ):
@@ -945,7 +945,7 @@ async def delete_line_item(
     return {"message": "Partida eliminada exitosamente"}
 
 @router.put("/quotes/{quote_id}", response_model=ConstructionQuoteSchema)
-async def update_quote(
+def update_quote(
     quote_id: int,
     quote_update: dict,
     db: Session = Depends(get_db)
@@ -968,7 +968,7 @@ async def update_quote(
     return quote
 
 @router.post("/quotes/{quote_id}/calculate", response_model=ConstructionQuoteSchema)
-async def calculate_quote_costs(
+def calculate_quote_costs(
     quote_id: int,
     db: Session = Depends(get_db)
 ):
@@ -1055,7 +1055,7 @@ async def get_assembly_types():
 # === QUOTE TEMPLATES ===
 
 @router.get("/templates", response_model=List[QuoteTemplateSchema])
-async def list_quote_templates(
+def list_quote_templates(
     project_type: Optional[str] = Query(None),
     is_active: bool = Query(True),
     db: Session = Depends(get_db)
@@ -1072,7 +1072,7 @@ async def list_quote_templates(
     return templates
 
 @router.post("/templates", response_model=QuoteTemplateSchema)
-async def create_quote_template(
+def create_quote_template(
     template: QuoteTemplateCreate,
     db: Session = Depends(get_db)
 ):
@@ -1089,7 +1089,7 @@ async def create_quote_template(
     return db_template
 
 @router.get("/templates/{template_id}", response_model=QuoteTemplateSchema)
-async def get_quote_template(template_id: int, db: Session = Depends(get_db)):
+def get_quote_template(template_id: int, db: Session = Depends(get_db)):
     """Get a specific quote template"""
     template = db.query(QuoteTemplate).filter(
         QuoteTemplate.id == template_id
@@ -1101,7 +1101,7 @@ async def get_quote_template(template_id: int, db: Session = Depends(get_db)):
     return template
 
 @router.post("/projects/{project_id}/quotes/from-template/{template_id}", response_model=ConstructionQuoteSchema)
-async def create_quote_from_template(
+def create_quote_from_template(
     project_id: int,
     template_id: int,
     quote_name: str,
@@ -1192,7 +1192,7 @@ async def create_quote_from_template(
 # === PROJECT WORKFLOW ENDPOINTS ===
 
 @router.post("/projects/{project_id}/award-project")
-async def award_project(
+def award_project(
     project_id: int,
     award_data: dict,
     db: Session = Depends(get_db)
@@ -1282,7 +1282,7 @@ async def award_project(
         raise HTTPException(status_code=500, detail=f"Error marcando proyecto como ganado: {str(e)}")
 
 @router.post("/projects/{project_id}/start-construction")
-async def start_construction(
+def start_construction(
     project_id: int,
     start_data: dict,
     db: Session = Depends(get_db)
@@ -1322,7 +1322,7 @@ async def start_construction(
         raise HTTPException(status_code=500, detail=f"Error iniciando construcción: {str(e)}")
 
 @router.get("/projects/{project_id}/transition-options")
-async def get_project_transition_options(project_id: int, db: Session = Depends(get_db)):
+def get_project_transition_options(project_id: int, db: Session = Depends(get_db)):
     """
     Obtener opciones de transición disponibles para un proyecto según su estado actual
     """
@@ -8,6 +8,7 @@ from datetime import datetime, date, timedelta
 import math
 
 from ..database import get_db
+from ..irr import monthly_irr_annualized
 from ..models import (
     ConstructionProject, ConstructionQuote, ProjectTakeoff, CostItem, 
     ConstructionAssembly, QuoteLineItem, ConstructionCostItem
@@ -136,7 +137,7 @@ class FinancialCalculationResponse(BaseModel):
 # === ENDPOINTS ===
 
 @router.get("/projects/{project_id}/cost-items", response_model=List[ConstructionCostItemSchema])
-async def get_project_cost_items(project_id: int, db: Session = Depends(get_db)):
+def get_project_cost_items(project_id: int, db: Session = Depends(get_db)):
     """Obtener items de costo de un proyecto de construcción"""
     
     # Verify project exists
@@ -153,7 +154,7 @@ async def get_project_cost_items(project_id: int, db: Session = Depends(get_db))
     return cost_items
 
 @router.post("/projects/{project_id}/cost-items", response_model=ConstructionCostItemSchema)
-async def create_cost_item(
+def create_cost_item(
     project_id: int,
     cost_item: ConstructionCostItemCreate,
     db: Session = Depends(get_db)
@@ -178,7 +179,7 @@ async def create_cost_item(
     return db_cost_item
 
 @router.put("/projects/{project_id}/cost-items/{cost_item_id}", response_model=ConstructionCostItemSchema)
-async def update_cost_item(
+def update_cost_item(
     project_id: int,
     cost_item_id: int,
     cost_item_update: ConstructionCostItemUpdate,
@@ -214,7 +215,7 @@ async def update_cost_item(
     return db_cost_item
 
 @router.delete("/projects/{project_id}/cost-items/{cost_item_id}")
-async def delete_cost_item(
+def delete_cost_item(
     project_id: int,
     cost_item_id: int,
     db: Session = Depends(get_db)
@@ -244,7 +245,7 @@ async def delete_cost_item(
     return {"success": True, "message": "Item de costo desactivado exitosamente"}
 
 @router.get("/projects/{project_id}/cash-flow")
-async def get_project_cash_flow(project_id: int, db: Session = Depends(get_db)):
+def get_project_cash_flow(project_id: int, db: Session = Depends(get_db)):
     """Obtener flujo de caja proyectado del proyecto de construcción"""
     
     project = db.query(ConstructionProject).filter(ConstructionProject.id == project_id).first()
@@ -299,7 +300,7 @@ async def get_project_cash_flow(project_id: int, db: Session = Depends(get_db)):
     return cash_flow
 
 @router.get("/projects/{project_id}/metrics", response_model=ConstructionMetrics)
-async def get_project_metrics(project_id: int, db: Session = Depends(get_db)):
+def get_project_metrics(project_id: int, db: Session = Depends(get_db)):
     """Obtener métricas financieras del proyecto de construcción"""
     
     project = db.query(ConstructionProject).filter(ConstructionProject.id == project_id).first()
@@ -330,7 +331,7 @@ async def get_project_metrics(project_id: int, db: Session = Depends(get_db)):
     return metrics
 
 @router.post("/projects/{project_id}/calculate-financials", response_model=FinancialCalculationResponse)
-async def calculate_project_financials(
+def calculate_project_financials(
     project_id: int,
     calculation_request: FinancialCalculationRequest,
     db: Session = Depends(get_db)
@@ -348,7 +349,7 @@ async def calculate_project_financials(
         # 3. Store results in database
         
         # For now, return mock calculation result
-        metrics = await get_project_metrics(project_id, db)
+        metrics = get_project_metrics(project_id, db)
         
         return FinancialCalculationResponse(
             success=True,
@@ -365,7 +366,7 @@ async def calculate_project_financials(
         )
 
 @router.post("/projects/{project_id}/simulate-payments", response_model=PaymentSimulationResponse)
-async def simulate_client_payments(
+def simulate_client_payments(
     project_id: int,
     simulation_request: PaymentSimulationRequest,
     db: Session = Depends(get_db)
@@ -452,7 +453,7 @@ async def simulate_client_payments(
         )
 
 @router.get("/projects/{project_id}/cash-flow-impact")
-async def get_project_cash_flow_impact(project_id: int, db: Session = Depends(get_db)):
+def get_project_cash_flow_impact(project_id: int, db: Session = Depends(get_db)):
     """Obtener el impacto del proyecto en el cash flow empresarial"""
     
     project = db.query(ConstructionProject).filter(ConstructionProject.id == project_id).first()
@@ -496,6 +497,7 @@ def calculate_construction_metrics(project: ConstructionProject, cash_flows: Lis
     pass
 
 def calculate_irr(cash_flows: List[float], initial_guess: float = 0.1) -> Optional[float]:
-    """Calculate Internal Rate of Return using Newton-Raphson method"""
-    # Same implementation as in scenario_projects.py
-    pass 
\ No newline at end of file
+    """Calculate annual Internal Rate of Return of monthly cash flows (Newton with Brent fallback)"""
+    if not cash_flows or len(cash_flows) < 2:
+        return None
+    return monthly_irr_annualized(cash_flows, annual_guess=initial_guess)
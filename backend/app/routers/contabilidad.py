@@ -15,7 +15,9 @@ from ..auth import require_role, get_db # Assuming get_db is here from main.py
 from .. import schemas # Import your Pydantic schemas
 from .. import models # Import your SQLAlchemy models
 from .. import crud # Assuming crud.py might be used later
+from .. import ledger_import, ledger_rollup
 from ..database import get_db, SessionLocal # Ensure SessionLocal is available if needed directly
+from ..schema_catalog import get_schema_catalog
 from ..models import LedgerEntryDB, AdministrativeCostDB # Added AdministrativeCostDB
 from ..schemas import LedgerEntry, AdministrativeCost, AdministrativeCostCreate # Added AdministrativeCost
 
@@ -42,19 +44,6 @@ def backup_data_to_jsonl_gz(data: List[dict], file_path: str):
         logging.error(f"Error backing up data to {file_path}: {e}", exc_info=True)
         # Depending on desired behavior, you might re-raise or handle
 
-# Expected columns from the Excel file (adjust as necessary based on the Excel structure)
-# These should map to the CSV columns you originally provided for the ingestion script.
-EXPECTED_COLUMNS_EXCEL = {
-    'Date': 'entry_date',
-    'Reference': 'reference',
-    'Trans Description': 'transaction_description',
-    'Debit Amt': 'debit_amount',
-    'Credit Amt': 'credit_amount',
-    'Balance': 'balance',
-    'Account ID': 'account_id',
-    'Jrnl': 'journal'
-}
-
 # Expected columns for the Administrative Costs Excel/CSV upload
 # Based on CSV: Account ID,,Date,Reference,Jrnl,Trans Description,Debit Amt,Credit Amt,Balance
 # We will assume the uploaded Excel/CSV for admin costs will have a similar structure where data starts effectively after some header rows.
@@ -169,197 +158,44 @@ def get_ledger_entries(
         ) 
 
 @router.post("/upload-replace-ledger")
-async def upload_replace_ledger(
+def upload_replace_ledger(
     project_name: str = Form(...),
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     # user: dict = Depends(require_role(["Contabilidad", "Admin"])) # Optional: protect with roles
 ):
+    """
+    Reemplazar el libro mayor del proyecto con el archivo (importación por streaming).
+
+    El respaldo (COPY ... TO), el DELETE y la carga (COPY ... FROM) van en una sola
+    transacción: si el archivo falla, los asientos anteriores se conservan.
+    """
     if not project_name:
         raise HTTPException(status_code=400, detail="Project name is required.")
 
-    # Step 1: Backup current data for the project
-    try:
-        current_entries_db = db.query(models.LedgerEntryDB).filter(models.LedgerEntryDB.project_name == project_name).all()
-        
-        if current_entries_db:
-            backup_file_name = f"{project_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl.gz"
-            backup_file_path = os.path.join(BACKUP_DIR, backup_file_name)
-            
-            with gzip.open(backup_file_path, 'wt', encoding='utf-8') as gz_file:
-                for entry_db in current_entries_db:
-                    # Convert SQLAlchemy model to Pydantic model then to dict for JSON serialization
-                    entry_schema = schemas.LedgerEntry.from_orm(entry_db)
-                    # Use model_dump(mode='json') for proper serialization of date/datetime objects
-                    gz_file.write(json.dumps(entry_schema.model_dump(mode='json')) + '\n')
-            print(f"Backed up {len(current_entries_db)} entries for project '{project_name}' to {backup_file_path}")
-        else:
-            print(f"No existing entries found for project '{project_name}' to back up.")
-
-    except Exception as e:
-        print(f"Error during backup for project '{project_name}': {e}")
-        raise HTTPException(status_code=500, detail=f"Error during data backup: {str(e)}")
-
-    # Step 2: Delete existing entries for the project from the database
     try:
-        deleted_rows = db.query(models.LedgerEntryDB).filter(models.LedgerEntryDB.project_name == project_name).delete(synchronize_session=False)
+        with file.file as f:
+            result = ledger_import.replace_project_ledger(db, project_name, f, file.filename, backup_dir=BACKUP_DIR)
         db.commit()
-        print(f"Deleted {deleted_rows} existing entries for project '{project_name}'.")
+    except ledger_import.LedgerImportError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         db.rollback()
-        print(f"Error deleting entries for project '{project_name}': {e}")
-        raise HTTPException(status_code=500, detail=f"Error deleting existing data: {str(e)}")
+        logging.error(f"Error processing Excel file for project '{project_name}': {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error processing Excel file: {str(e)}")
 
-    # Step 3: Process new Excel file and insert data
-    try:
-        # Read Excel file into pandas DataFrame
-        # Use a context manager for the file to ensure it's closed
-        with file.file as f:
-            # Step 1: Read Excel without parse_dates first to inspect columns
-            # User specified that headers are on Excel row 5, which is header=4 for 0-indexed pandas
-            df_initial_read = pd.read_excel(f, header=4)
-        
-        print(f"DEBUG: Initial DataFrame columns from Excel (using header=4): {df_initial_read.columns.tolist()}")
-
-        # Check if 'Date' column exists based on what we expect
-        expected_date_column_name = 'Date' # This is what we expect based on user's image
-
-        if expected_date_column_name not in df_initial_read.columns:
-            print(f"ERROR: The expected date column '{expected_date_column_name}' was NOT FOUND in the Excel columns: {df_initial_read.columns.tolist()}")
-            # Attempt to find a case-insensitive match or a match with stripped whitespace as a fallback
-            found_alternative = False
-            for col in df_initial_read.columns:
-                if isinstance(col, str) and col.strip().lower() == expected_date_column_name.lower():
-                    print(f"INFO: Found a potential alternative date column: '{col}'. Will attempt to use this.")
-                    expected_date_column_name = col # Use the actual found column name
-                    found_alternative = True
-                    break
-            if not found_alternative:
-                 raise HTTPException(status_code=400, detail=f"El archivo Excel no contiene la columna de fecha esperada ('{expected_date_column_name}'). Columnas encontradas: {df_initial_read.columns.tolist()}")
-
-        # Step 2: If we are here, we have a date column name (either 'Date' or an alternative)
-        # Re-read or use existing df, now focusing on using the identified date column for parsing.
-        # For simplicity, we can work with df_initial_read, but ensure type consistency for date column later.
-        df = df_initial_read
-        
-        # Now, attempt to convert the identified date column to datetime objects
-        # This replaces the direct parse_dates in read_excel
-        try:
-            df[expected_date_column_name] = pd.to_datetime(df[expected_date_column_name], errors='coerce')
-            print(f"DEBUG: Successfully converted column '{expected_date_column_name}' to datetime (with NaT for errors).")
-        except Exception as e_conversion:
-            print(f"ERROR: Failed to convert column '{expected_date_column_name}' to datetime: {e_conversion}. Will proceed with row-by-row parsing.")
-            # If this broad conversion fails, parse_date_excel will handle it row by row
-            pass
-
-
-        print(f"DEBUG: DataFrame shape (rows, cols): {df.shape}")
-        if not df.empty and expected_date_column_name in df.columns:
-            print(f"DEBUG: First few (up to 5) '{expected_date_column_name}' column raw values from DataFrame after manual to_datetime conversion:")
-            for i, val in enumerate(df[expected_date_column_name].head()):
-                 print(f"  df index {i}: Raw '{expected_date_column_name}' val='{val}', type='{type(val)}', pd.isna='{pd.isna(val)}'")
+    if not result["inserted"]:
+        return {"message": "Proceso completado. No se encontraron asientos válidos en el archivo subido. Los datos anteriores del proyecto han sido eliminados."}
 
-
-        new_entries_to_add = []
-        for index, row in df.iterrows():
-            excel_row_num_approx = index + 2 # For logging, assuming header is row 1
-
-            raw_date_val_from_df = row.get(expected_date_column_name) # Use the identified date column
-            
-            print(f"DEBUG Processing df_index {index} (Excel_row ~{excel_row_num_approx}): Raw '{expected_date_column_name}' from df='{raw_date_val_from_df}', Type='{type(raw_date_val_from_df)}', pd.isna='{pd.isna(raw_date_val_from_df)}'")
-
-            if expected_date_column_name not in df.columns: 
-                print(f"CRITICAL_ERROR: '{expected_date_column_name}' column somehow not in DataFrame at df_index {index}. This shouldn't happen.")
-                continue
-
-            if pd.isna(raw_date_val_from_df): # Check for NaT or NaN
-                 print(f"INFO Skipping df_index {index} (Excel_row ~{excel_row_num_approx}) due to '{expected_date_column_name}' field being NA/NaT (missing or unparseable). Value: '{raw_date_val_from_df}'")
-                 continue
-            
-            parsed_date = parse_date_excel(raw_date_val_from_df, excel_row_num_approx)
-
-            # Map other columns using EXPECTED_COLUMNS_EXCEL, but ensure the date is handled by 'expected_date_column_name'
-            entry_data = {
-                'project_name': project_name,
-                'entry_date': parsed_date,
-                'reference': str(row.get(EXPECTED_COLUMNS_EXCEL.get('Reference', 'Reference'), '')).strip() if pd.notna(row.get(EXPECTED_COLUMNS_EXCEL.get('Reference', 'Reference'))) else None,
-                'transaction_description': str(row.get(EXPECTED_COLUMNS_EXCEL.get('Trans Description', 'Trans Description'), '')).strip(),
-                'debit_amount': parse_float_excel(row.get(EXPECTED_COLUMNS_EXCEL.get('Debit Amt', 'Debit Amt'))),
-                'credit_amount': parse_float_excel(row.get(EXPECTED_COLUMNS_EXCEL.get('Credit Amt', 'Credit Amt'))),
-                'balance': parse_float_excel(row.get(EXPECTED_COLUMNS_EXCEL.get('Balance', 'Balance'))),
-                'account_id': str(row.get(EXPECTED_COLUMNS_EXCEL.get('Account ID', 'Account ID'), '')).strip() if pd.notna(row.get(EXPECTED_COLUMNS_EXCEL.get('Account ID', 'Account ID'))) else None,
-                'account_description': None, 
-                'journal': str(row.get(EXPECTED_COLUMNS_EXCEL.get('Jrnl', 'Jrnl'), '')).strip() if pd.notna(row.get(EXPECTED_COLUMNS_EXCEL.get('Jrnl', 'Jrnl'))) else None
-            }
-            # Adjust the row.get calls to use the original Excel column names as defined in EXPECTED_COLUMNS_EXCEL keys
-            # The date column is handled separately via expected_date_column_name
-
-            # Corrected data mapping:
-            current_excel_date_key = None
-            for k, v in EXPECTED_COLUMNS_EXCEL.items():
-                if v == 'entry_date':
-                    current_excel_date_key = k
-                    break
-            
-            entry_data = {
-                'project_name': project_name,
-                'entry_date': parsed_date, # Already handled
-            }
-
-            for excel_col_name, db_col_name in EXPECTED_COLUMNS_EXCEL.items():
-                if db_col_name == 'entry_date': # Skip, already handled by parsed_date using expected_date_column_name
-                    continue 
-                
-                raw_val = row.get(excel_col_name)
-
-                if db_col_name in ['debit_amount', 'credit_amount', 'balance']:
-                    entry_data[db_col_name] = parse_float_excel(raw_val)
-                elif db_col_name == 'account_description': # Explicitly set to None as per earlier logic
-                     entry_data[db_col_name] = None
-                else: # For reference, transaction_description, account_id, journal
-                    entry_data[db_col_name] = str(raw_val).strip() if pd.notna(raw_val) else None
-
-
-            if not entry_data.get('entry_date'): # Check .get() for safety, though parsed_date should exist
-                print(f"INFO Skipping df_index {index} (Excel_row ~{excel_row_num_approx}) due to 'entry_date' being None after full parsing. Original df Date value: '{raw_date_val_from_df}'")
-                continue
-            
-            if not entry_data['transaction_description']:
-                 print(f"INFO Skipping df_index {index} (Excel_row ~{excel_row_num_approx}) due to missing 'Trans Description'. Value: '{row.get('Trans Description')}'")
-                 continue
-
-            try:
-                new_entry_db = models.LedgerEntryDB(**entry_data)
-                new_entries_to_add.append(new_entry_db)
-            except Exception as e_model:
-                print(f"ERROR Creating LedgerEntryDB model for df_index {index} (Excel_row ~{excel_row_num_approx}): {e_model}. Data: {entry_data}")
-                continue
-
-
-        if not new_entries_to_add:
-            print("No valid entries found in the uploaded Excel file.")
-            # No need to raise an error here, could be an empty file or all rows invalid
-            # The deletion of old entries would have already happened.
-            db.commit() # ensure deletion commit even if no new entries
-            return {"message": "Proceso completado. No se encontraron asientos válidos en el archivo subido. Los datos anteriores del proyecto han sido eliminados."}
-
-        db.add_all(new_entries_to_add)
-        db.commit()
-        print(f"Successfully added {len(new_entries_to_add)} new ledger entries for project '{project_name}' from Excel file.")
-        return {"message": f"Libro mayor reemplazado exitosamente. {len(current_entries_db) if current_entries_db else 0} asientos archivados, {deleted_rows} eliminados, {len(new_entries_to_add)} nuevos asientos agregados."}
-
-    except Exception as e:
-        db.rollback()
-        print(f"Error processing Excel file for project '{project_name}': {e}")
-        # Consider if you need to restore backup here, though that's complex
-        raise HTTPException(status_code=500, detail=f"Error processing Excel file: {str(e)}") 
+    return {"message": f"Libro mayor reemplazado exitosamente. {result['backed_up']} asientos archivados, {result['deleted']} eliminados, {result['inserted']} nuevos asientos agregados."}
 
 # Helper to convert model instance to schema, handling date/Decimal
 def convert_admin_cost_db_to_schema(db_entry: AdministrativeCostDB) -> AdministrativeCost:
     return AdministrativeCost.model_validate(db_entry)
 
 @router.get("/administrative-costs", response_model=List[AdministrativeCost])
-async def get_administrative_costs(db: Session = Depends(get_db)):
+def get_administrative_costs(db: Session = Depends(get_db)):
     """Retrieve all administrative cost entries."""
     try:
         admin_costs_db = db.query(AdministrativeCostDB).order_by(AdministrativeCostDB.entry_date.desc()).all()
@@ -371,23 +207,14 @@ async def get_administrative_costs(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Internal server error while fetching administrative costs: {str(e)}")
 
 @router.get("/administrative-costs/monthly-summary", response_model=schemas.AdministrativeCostsMonthlySummary)
-async def get_administrative_costs_monthly_summary(db: Session = Depends(get_db)):
+def get_administrative_costs_monthly_summary(db: Session = Depends(get_db)):
     """
     Returns the total administrative costs per month (YYYY_MM), summing debit_amount for each month.
     """
     try:
-        # Query all admin costs
-        admin_costs = db.query(AdministrativeCostDB).all()
-        monthly_totals = {}
-        for entry in admin_costs:
-            if entry.entry_date and entry.debit_amount:
-                month_key = f"{entry.entry_date.year}_{entry.entry_date.month:02d}"
-                monthly_totals[month_key] = monthly_totals.get(month_key, 0) + float(entry.debit_amount)
-        # Sort months
-        sorted_months = sorted(monthly_totals.keys())
-        # Convert values to Decimal for schema
-        totals_by_month = {k: Decimal(str(v)) for k, v in monthly_totals.items()}
-        return schemas.AdministrativeCostsMonthlySummary(months=sorted_months, totals_by_month=totals_by_month)
+        # Monthly debits come from the ledger rollup
+        totals_by_month = ledger_rollup.admin_costs_monthly_debits(db)
+        return schemas.AdministrativeCostsMonthlySummary(months=sorted(totals_by_month), totals_by_month=totals_by_month)
     except Exception as e:
         logging.error(f"Error aggregating administrative costs monthly: {e}")
         raise HTTPException(status_code=500, detail=f"Internal server error while aggregating administrative costs: {str(e)}")
@@ -501,7 +328,7 @@ def process_uploaded_admin_costs_file(file_contents: bytes, db: Session, filenam
 
 
 @router.post("/upload-replace-admin-costs", response_model=schemas.Msg)
-async def upload_replace_admin_costs(
+def upload_replace_admin_costs(
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
@@ -519,6 +346,9 @@ async def upload_replace_admin_costs(
     backup_file_path = os.path.join(backup_dir, backup_file_name)
 
     try:
+        # A concurrent upload waits until this one commits
+        ledger_rollup.lock_rollup_source(db, ledger_rollup.SOURCE_ADMIN_COSTS)
+
         # 1. Backup existing data
         existing_entries_db = db.query(models.AdministrativeCostDB).all()
         if existing_entries_db:
@@ -533,11 +363,12 @@ async def upload_replace_admin_costs(
         logging.info(f"Deleted {num_deleted} existing admin cost entries.")
 
         # 3. Process new file
-        file_contents = await file.read()
+        file_contents = file.file.read()
         new_entries_data = process_uploaded_admin_costs_file(file_contents, db, file.filename)
 
         if not new_entries_data:
             # Commit deletions even if new file is empty or invalid, as per "truncate and replace"
+            ledger_rollup.refresh_admin_costs_rollup(db)
             db.commit()
             logging.warning(f"No valid entries found in uploaded admin costs file: {file.filename}. Table remains empty after backup and delete.")
             return schemas.Msg(message="Admin costs table cleared. No new valid entries found in the uploaded file.")
@@ -545,6 +376,7 @@ async def upload_replace_admin_costs(
         # 4. Add new entries to DB
         db_entries = [models.AdministrativeCostDB(**entry.model_dump()) for entry in new_entries_data]
         db.add_all(db_entries)
+        ledger_rollup.refresh_admin_costs_rollup(db)
         
         db.commit() # Commit deletions and additions together
         logging.info(f"Successfully processed and inserted {len(db_entries)} new admin cost entries from {file.filename}.")
@@ -559,7 +391,7 @@ async def upload_replace_admin_costs(
         # Consider if you need to restore backup here, though that's complex
         raise HTTPException(status_code=500, detail=f"Error processing administrative costs file: {str(e)}")
     finally:
-        await file.close() 
+        file.file.close() 
 
 # Define the response model for project cash flow items
 class ProjectCashFlowItem(schemas.BaseModel):
@@ -571,76 +403,30 @@ class ProjectCashFlowItem(schemas.BaseModel):
         from_attributes = True
 
 @router.get("/project-cash-flow", response_model=List[ProjectCashFlowItem])
-async def get_project_cash_flow(
+def get_project_cash_flow(
     project_name: str = Query(..., description="The name of the project to fetch cash flow for"),
+    start_date: Optional[date] = Query(None, description="First month to include (YYYY-MM-DD, any day of the month)"),
+    end_date: Optional[date] = Query(None, description="Last month to include (YYYY-MM-DD, any day of the month)"),
     db: Session = Depends(get_db)
 ):
     """
     Generates a monthly cash flow summary for a given project based on ledger entries.
     Each item represents an account_description, with monthly net amounts.
     Net amount = sum(credit_amount) - sum(debit_amount) for that account_description in that month.
+    Read from the monthly ledger rollup, optionally limited to a range of months.
     """
     if not project_name:
         raise HTTPException(status_code=400, detail="Project name is required.")
 
     try:
-        # Query to get sum of credits and debits per account_description per month
-        # for the specified project.
-        # We need to group by year, month, and account_description.
-        monthly_data = (
-            db.query(
-                models.LedgerEntryDB.account_description,
-                extract('year', models.LedgerEntryDB.entry_date).label('year'),
-                extract('month', models.LedgerEntryDB.entry_date).label('month'),
-                func.sum(models.LedgerEntryDB.credit_amount).label('total_credits'),
-                func.sum(models.LedgerEntryDB.debit_amount).label('total_debits')
-            )
-            .filter(models.LedgerEntryDB.project_name == project_name)
-            .group_by(
-                models.LedgerEntryDB.account_description,
-                extract('year', models.LedgerEntryDB.entry_date),
-                extract('month', models.LedgerEntryDB.entry_date)
-            )
-            .order_by(
-                extract('year', models.LedgerEntryDB.entry_date),
-                extract('month', models.LedgerEntryDB.entry_date),
-                models.LedgerEntryDB.account_description
-            )
-            .all()
-        )
-
-        # Process the data into the desired response format
-        cash_flow_summary = {}
-        for row in monthly_data:
-            account_desc, year, month, total_credits, total_debits = row
-            year = int(year) if year else 0
-            month = int(month) if month else 0
-            
-            if not account_desc: # Skip entries with no account description for categorization
-                continue
-
-            # Ensure amounts are Decimal and handle None
-            total_credits = total_credits or Decimal(0)
-            total_debits = total_debits or Decimal(0)
-
-            net_amount = total_credits - total_debits
-            month_key = f"{year:04d}-{month:02d}"
-
-            if account_desc not in cash_flow_summary:
-                cash_flow_summary[account_desc] = {
-                    "category": account_desc,
-                    "months": {}
-                }
-            cash_flow_summary[account_desc]["months"][month_key] = net_amount
-        
-        return list(cash_flow_summary.values())
+        return ledger_rollup.project_cash_flow(db, project_name, start_date, end_date)
 
     except Exception as e:
         logging.error(f"Error generating project cash flow for '{project_name}': {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error while generating cash flow: {str(e)}")
 
 @router.get("/distinct-project-names", response_model=List[str])
-async def get_distinct_project_names(
+def get_distinct_project_names(
     db: Session = Depends(get_db)
 ):
     """
@@ -676,15 +462,7 @@ def list_marketing_summary_views(db: Session = Depends(get_db)):
     List all marketing summary views (vista_presupuesto_mercadeo_%_resumen)
     """
     try:
-        result = db.execute(text("""
-            SELECT table_name
-            FROM information_schema.views
-            WHERE table_schema = 'public'
-            AND table_name LIKE 'vista_presupuesto_mercadeo_%_resumen'
-            ORDER BY table_name
-        """))
-        views = [row[0] for row in result.fetchall()]
-        return views
+        return get_schema_catalog(db).views_like('vista_presupuesto_mercadeo_%_resumen')
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing summary views: {str(e)}")
 
@@ -61,7 +61,7 @@ def get_distinct_proyectos(db: Session = Depends(get_db)):
     return [p[0] for p in proyectos]
 
 @router.get("/proyectos-marketing", response_model=List[dict])
-async def get_marketing_proyectos(request: Request, db: Session = Depends(get_db)):
+def get_marketing_proyectos(request: Request, db: Session = Depends(get_db)):
     import sys
     print(f"[DEBUG] /proyectos-marketing called: {request.method} {request.url}", file=sys.stderr)
     # Use the new proyectos table instead of the old marketing_proyectos table
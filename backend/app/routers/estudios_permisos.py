@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from .. import crud_estudios_permisos, schemas
-from ..database import SessionLocal
+from ..database import get_db
 
 router = APIRouter(
     prefix="/api/estudios_disenos_permisos",
@@ -11,14 +11,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/", response_model=List[dict])
 def read_estudios_permisos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     estudios_permisos = crud_estudios_permisos.get_estudios_permisos(db, skip=skip, limit=limit)
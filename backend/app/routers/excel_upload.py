@@ -6,8 +6,8 @@ import io
 from datetime import datetime
 import json
 
-from .. import models, schemas
-from ..database import SessionLocal
+from .. import excel_ingest, models, schemas
+from ..database import get_db
 
 router = APIRouter(
     prefix="/api/excel-upload",
@@ -15,14 +15,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 # Mapeo de tablas disponibles
 AVAILABLE_TABLES = {
     "miscelaneos": {
@@ -74,7 +66,7 @@ async def get_available_tables():
     }
 
 @router.post("/preview/{table_name}")
-async def preview_excel_data(
+def preview_excel_data(
     table_name: str,
     file: UploadFile = File(...),
     sheet_name: Optional[str] = Form(None)
@@ -88,12 +80,8 @@ async def preview_excel_data(
         raise HTTPException(status_code=400, detail="Solo se permiten archivos Excel (.xlsx, .xls)")
     
     try:
-        # Leer el archivo Excel
-        contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents), sheet_name=sheet_name or 0)
-        
-        # Limpiar nombres de columnas
-        df.columns = df.columns.str.strip().str.lower()
+        # Leer el archivo Excel (encabezados de mes normalizados a amount_YYYY_MM)
+        df = excel_ingest.read_sheet(file.file.read(), sheet_name)
         
         # Obtener información de la tabla
         table_info = AVAILABLE_TABLES[table_name]
@@ -102,36 +90,9 @@ async def preview_excel_data(
         # Verificar columnas requeridas
         missing_cols = [col for col in required_cols if col not in df.columns]
         
-        # Función para convertir formato de mes a formato legible (para preview)
-        def month_key_to_readable_preview(month_key):
-            clean_key = month_key.replace("amount_", "")
-            year, month = clean_key.split('_')
-            month_names = {
-                '01': 'Ene', '02': 'Feb', '03': 'Mar', '04': 'Abr',
-                '05': 'May', '06': 'Jun', '07': 'Jul', '08': 'Ago',
-                '09': 'Sep', '10': 'Oct', '11': 'Nov', '12': 'Dic'
-            }
-            return f"{month_names[month]}/{year}"
-        
-        # Generar columnas de meses disponibles
-        month_columns = generate_month_columns()
-        available_month_cols = []
-        
-        for month_col in month_columns:
-            month_key = month_col.replace("amount_", "")
-            readable_format = month_key_to_readable_preview(month_col)
-            
-            possible_keys = [
-                month_col,                          # amount_2025_03
-                month_key,                          # 2025_03
-                month_key.replace("_", "/"),        # 2025/03
-                readable_format,                    # Mar/2025
-                readable_format.lower(),            # mar/2025
-                readable_format.upper()             # MAR/2025
-            ]
-            
-            if any(key in df.columns for key in possible_keys):
-                available_month_cols.append(month_col)
+        # Columnas de meses de la ventana presentes en el archivo
+        sheet_months = set(excel_ingest.month_columns(df))
+        available_month_cols = [col for col in generate_month_columns() if col in sheet_months]
         
         # Preparar vista previa
         preview_data = df.head(10).fillna(0).to_dict('records')
@@ -151,7 +112,7 @@ async def preview_excel_data(
         raise HTTPException(status_code=400, detail=f"Error procesando archivo: {str(e)}")
 
 @router.post("/upload/{table_name}")
-async def upload_excel_data(
+def upload_excel_data(
     table_name: str,
     file: UploadFile = File(...),
     sheet_name: Optional[str] = Form(None),
@@ -167,133 +128,17 @@ async def upload_excel_data(
         raise HTTPException(status_code=400, detail="Solo se permiten archivos Excel (.xlsx, .xls)")
     
     try:
-        # Leer el archivo Excel
-        contents = await file.read()
-        df = pd.read_excel(io.BytesIO(contents), sheet_name=sheet_name or 0)
-        
-        # Limpiar nombres de columnas
-        df.columns = df.columns.str.strip().str.lower()
-        
-        # Obtener información de la tabla
         table_info = AVAILABLE_TABLES[table_name]
-        model = table_info["model"]
-        table_name_db = table_info["table_name"]
-        
-        # Procesar según el modo
-        results = {
-            "processed": 0,
-            "errors": [],
-            "created": 0,
-            "updated": 0,
-            "skipped": 0
-        }
-        
-        if update_mode == "replace":
-            # Eliminar todos los registros existentes
-            from sqlalchemy import text
-            db.execute(text(f"DELETE FROM {table_name_db}"))
-            db.commit()
-        
-        # Procesar cada fila
-        for index, row in df.iterrows():
-            try:
-                # Preparar datos base
-                row_data = {}
-                
-                # Agregar columna principal (concepto/actividad)
-                if table_name == "miscelaneos" or table_name == "gastos_equipo":
-                    row_data["concepto"] = str(row.get("concepto", f"Item {index + 1}"))
-                elif table_name == "estudios_permisos":
-                    row_data["actividad"] = str(row.get("actividad", f"Actividad {index + 1}"))
-                
-                # Función para convertir formato de mes a formato legible
-                def month_key_to_readable(month_key):
-                    # month_key viene como "amount_2025_03"
-                    clean_key = month_key.replace("amount_", "")  # "2025_03"
-                    year, month = clean_key.split('_')
-                    month_names = {
-                        '01': 'Ene', '02': 'Feb', '03': 'Mar', '04': 'Abr',
-                        '05': 'May', '06': 'Jun', '07': 'Jul', '08': 'Ago',
-                        '09': 'Sep', '10': 'Oct', '11': 'Nov', '12': 'Dic'
-                    }
-                    return f"{month_names[month]}/{year}"
-                
-                # Función para convertir formato legible a month_key
-                def readable_to_month_key(readable_format):
-                    # readable_format viene como "Mar/2025"
-                    try:
-                        month_name, year = readable_format.split('/')
-                        month_names_reverse = {
-                            'Ene': '01', 'Feb': '02', 'Mar': '03', 'Abr': '04',
-                            'May': '05', 'Jun': '06', 'Jul': '07', 'Ago': '08',
-                            'Sep': '09', 'Oct': '10', 'Nov': '11', 'Dic': '12'
-                        }
-                        month_num = month_names_reverse.get(month_name, '01')
-                        return f"amount_{year}_{month_num}"
-                    except:
-                        return None
-                
-                # Procesar columnas de meses
-                month_columns = generate_month_columns()
-                for month_col in month_columns:
-                    # Buscar la columna en diferentes formatos
-                    month_key = month_col.replace("amount_", "")
-                    readable_format = month_key_to_readable(month_col)
-                    
-                    possible_keys = [
-                        month_col,                          # amount_2025_03
-                        month_key,                          # 2025_03
-                        month_key.replace("_", "/"),        # 2025/03
-                        readable_format,                    # Mar/2025
-                        readable_format.lower(),            # mar/2025
-                        readable_format.upper()             # MAR/2025
-                    ]
-                    
-                    value = 0
-                    for key in possible_keys:
-                        if key in row and pd.notna(row[key]):
-                            try:
-                                value = float(row[key])
-                                break
-                            except:
-                                continue
-                    
-                    row_data[month_col] = value
-                
-                # Insertar o actualizar registro
-                if update_mode == "update":
-                    # Buscar registro existente
-                    if table_name == "miscelaneos":
-                        existing = db.query(model).filter(model.concepto == row_data["concepto"]).first()
-                    elif table_name == "gastos_equipo":
-                        existing = db.query(model).filter(model.concepto == row_data["concepto"]).first()
-                    elif table_name == "estudios_permisos":
-                        existing = db.query(model).filter(model.actividad == row_data["actividad"]).first()
-                    
-                    if existing:
-                        # Actualizar registro existente
-                        for key, value in row_data.items():
-                            setattr(existing, key, value)
-                        results["updated"] += 1
-                    else:
-                        # Crear nuevo registro
-                        new_record = model(**row_data)
-                        db.add(new_record)
-                        results["created"] += 1
-                else:
-                    # Crear nuevo registro (replace o append)
-                    new_record = model(**row_data)
-                    db.add(new_record)
-                    results["created"] += 1
-                
-                results["processed"] += 1
-                
-            except Exception as e:
-                results["errors"].append(f"Fila {index + 1}: {str(e)}")
-                results["skipped"] += 1
-                continue
+        results = excel_ingest.ingest_sheet(
+            db,
+            file.file.read(),
+            table_info["table_name"],
+            table_info["required_columns"][0],
+            update_mode=update_mode,
+            sheet_name=sheet_name,
+        )
         
-        # Confirmar cambios
+        # Confirmar cambios (una sola transacción: si algo falla, la tabla queda como estaba)
         db.commit()
         
         return {
@@ -307,7 +152,7 @@ async def upload_excel_data(
         raise HTTPException(status_code=400, detail=f"Error procesando archivo: {str(e)}")
 
 @router.get("/template/{table_name}")
-async def download_template(table_name: str):
+def download_template(table_name: str):
     """Genera un template Excel para la tabla especificada"""
     
     if table_name not in AVAILABLE_TABLES:
@@ -318,23 +163,11 @@ async def download_template(table_name: str):
         month_columns = generate_month_columns()
         table_info = AVAILABLE_TABLES[table_name]
         
-        # Función para convertir formato de mes
-        def format_month_header(month_key):
-            # month_key viene como "amount_2025_03"
-            clean_key = month_key.replace("amount_", "")  # "2025_03"
-            year, month = clean_key.split('_')
-            month_names = {
-                '01': 'Ene', '02': 'Feb', '03': 'Mar', '04': 'Abr',
-                '05': 'May', '06': 'Jun', '07': 'Jul', '08': 'Ago',
-                '09': 'Sep', '10': 'Oct', '11': 'Nov', '12': 'Dic'
-            }
-            return f"{month_names[month]}/{year}"
-        
         # Crear DataFrame con columnas base
         if table_name in ["miscelaneos", "gastos_equipo"]:
-            columns = ["concepto"] + [format_month_header(col) for col in month_columns]
+            columns = ["concepto"] + [excel_ingest.readable_month(col) for col in month_columns]
         elif table_name == "estudios_permisos":
-            columns = ["actividad"] + [format_month_header(col) for col in month_columns]
+            columns = ["actividad"] + [excel_ingest.readable_month(col) for col in month_columns]
         
         # Crear DataFrame vacío con ejemplo
         df = pd.DataFrame(columns=columns)
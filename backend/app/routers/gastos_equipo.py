@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from .. import crud_gastos_equipo, schemas
-from ..database import SessionLocal
+from ..database import get_db
 
 router = APIRouter(
     prefix="/api/gastos_equipo",
@@ -11,14 +11,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/", response_model=List[dict])
 def read_gastos_equipo(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     gastos_equipo = crud_gastos_equipo.get_gastos_equipo(db, skip=skip, limit=limit)
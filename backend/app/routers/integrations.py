@@ -2,12 +2,15 @@
 FastAPI router for accounting system integrations
 """
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
+from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from datetime import date, datetime
 from pydantic import BaseModel, Field
 import logging
 
-from ..integrations.manager import integration_manager
+from ..database import get_db
+from ..integrations import state as integration_state
+from ..integrations.manager import IntegrationBusyError, integration_manager
 from ..integrations.base import (
     IntegrationConfig, 
     AccountingSystemType, 
@@ -24,7 +27,18 @@ from ..integrations.generic_api import GenericAPIConfig
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/integrations", tags=["Accounting Integrations"])
+# Seconds a worker serves its in-memory registry before reloading it from integration_states
+REGISTRY_MAX_AGE_SECONDS = 10
+
+async def refresh_integration_registry():
+    """Reload the integrations created or changed by other workers"""
+    await integration_manager.refresh_from_db(max_age_seconds=REGISTRY_MAX_AGE_SECONDS)
+
+router = APIRouter(
+    prefix="/api/integrations",
+    tags=["Accounting Integrations"],
+    dependencies=[Depends(refresh_integration_registry)]
+)
 
 # Request/Response models
 class IntegrationCreateRequest(BaseModel):
@@ -37,6 +51,8 @@ class IntegrationCreateRequest(BaseModel):
 class IntegrationUpdateRequest(BaseModel):
     name: Optional[str] = None
     enabled: Optional[bool] = None
+    auto_sync: Optional[bool] = None
+    sync_frequency_hours: Optional[int] = Field(None, ge=1)
     config_data: Optional[Dict[str, Any]] = None
 
 class SyncRequest(BaseModel):
@@ -61,6 +77,28 @@ class SyncResultResponse(BaseModel):
     warnings: List[str]
     sync_timestamp: datetime
     execution_time_seconds: Optional[float] = None
+    records_per_second: Optional[float] = None
+
+class SyncRunResponse(BaseModel):
+    id: int
+    integration_id: str
+    trigger: str
+    attempt: int
+    status: str
+    started_at: datetime
+    finished_at: datetime
+    total_records: int
+    successful_records: int
+    failed_records: int
+    execution_time_seconds: Optional[float] = None
+    records_per_second: Optional[float] = None
+    watermark_from: Optional[datetime] = None
+    watermark_to: Optional[datetime] = None
+    errors: Optional[List[str]] = None
+    warnings: Optional[List[str]] = None
+
+    class Config:
+        from_attributes = True
 
 class ConnectionTestResponse(BaseModel):
     integration_id: str
@@ -79,7 +117,7 @@ async def list_integrations():
     return [IntegrationResponse(**integration) for integration in integrations]
 
 @router.post("/", response_model=Dict[str, str])
-async def create_integration(request: IntegrationCreateRequest):
+def create_integration(request: IntegrationCreateRequest, db: Session = Depends(get_db)):
     """Create a new integration"""
     try:
         # Create appropriate config based on system type
@@ -108,11 +146,19 @@ async def create_integration(request: IntegrationCreateRequest):
         success = integration_manager.register_integration(request.integration_id, config)
         
         if success:
+            # Persist so every worker (and the scheduler) sees the integration
+            stored = integration_state.save_integration_state(db, request.integration_id, config).config
+            db.commit()
+            integration_manager.mark_persisted(request.integration_id, stored)
             return {"message": f"Integration {request.integration_id} created successfully"}
         else:
             raise HTTPException(status_code=400, detail="Failed to create integration")
             
+    except HTTPException:
+        raise
     except Exception as e:
+        db.rollback()
+        integration_manager.unregister_integration(request.integration_id)
         logger.error(f"Error creating integration: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -204,16 +250,18 @@ async def sync_all_integrations(request: SyncRequest = Body(default=SyncRequest(
         }
 
 @router.delete("/{integration_id}")
-async def delete_integration(integration_id: str):
+def delete_integration(integration_id: str, db: Session = Depends(get_db)):
     """Delete an integration"""
     success = integration_manager.unregister_integration(integration_id)
+    success = integration_state.delete_integration_state(db, integration_id) or success
+    db.commit()
     if success:
         return {"message": f"Integration {integration_id} deleted successfully"}
     else:
         raise HTTPException(status_code=404, detail="Integration not found")
 
 @router.put("/{integration_id}")
-async def update_integration(integration_id: str, request: IntegrationUpdateRequest):
+def update_integration(integration_id: str, request: IntegrationUpdateRequest, db: Session = Depends(get_db)):
     """Update an integration configuration"""
     integration = integration_manager.get_integration(integration_id)
     if not integration:
@@ -225,16 +273,36 @@ async def update_integration(integration_id: str, request: IntegrationUpdateRequ
             integration.config.name = request.name
         if request.enabled is not None:
             integration.config.enabled = request.enabled
+        if request.auto_sync is not None:
+            integration.config.auto_sync = request.auto_sync
+        if request.sync_frequency_hours is not None:
+            integration.config.sync_frequency_hours = request.sync_frequency_hours
         if request.config_data:
             # Update connection parameters
             integration.config.connection_params.update(request.config_data)
         
+        stored = integration_state.save_integration_state(
+            db, integration_id, integration.config, keep_rotated_credentials=True
+        ).config
+        db.commit()
+        integration_manager.mark_persisted(integration_id, stored)
+        
         return {"message": f"Integration {integration_id} updated successfully"}
         
     except Exception as e:
+        db.rollback()
         logger.error(f"Error updating integration: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{integration_id}/sync-history", response_model=List[SyncRunResponse])
+def get_sync_history(
+    integration_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Sync attempts of an integration (most recent first) with their throughput"""
+    return integration_state.list_sync_runs(db, integration_id, limit)
+
 @router.get("/{integration_id}/entries", response_model=List[BaseAccountingEntry])
 async def get_integration_entries(
     integration_id: str,
@@ -248,8 +316,12 @@ async def get_integration_entries(
         raise HTTPException(status_code=404, detail="Integration not found")
     
     try:
-        entries = await integration.get_accounting_entries(start_date, end_date, project_code)
+        entries = await integration_manager.run_locked(
+            integration_id, lambda integration: integration.get_accounting_entries(start_date, end_date, project_code)
+        )
         return entries
+    except IntegrationBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving entries: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -262,8 +334,12 @@ async def get_integration_customers(integration_id: str):
         raise HTTPException(status_code=404, detail="Integration not found")
     
     try:
-        customers = await integration.get_customers()
+        customers = await integration_manager.run_locked(
+            integration_id, lambda integration: integration.get_customers()
+        )
         return customers
+    except IntegrationBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving customers: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -276,8 +352,12 @@ async def get_integration_vendors(integration_id: str):
         raise HTTPException(status_code=404, detail="Integration not found")
     
     try:
-        vendors = await integration.get_vendors()
+        vendors = await integration_manager.run_locked(
+            integration_id, lambda integration: integration.get_vendors()
+        )
         return vendors
+    except IntegrationBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving vendors: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -290,8 +370,12 @@ async def get_integration_projects(integration_id: str):
         raise HTTPException(status_code=404, detail="Integration not found")
     
     try:
-        projects = await integration.get_projects()
+        projects = await integration_manager.run_locked(
+            integration_id, lambda integration: integration.get_projects()
+        )
         return projects
+    except IntegrationBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving projects: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -7,7 +7,7 @@ from decimal import Decimal
 from .. import crud_lineas_de_credito # Adjusted for router location
 from .. import schemas # Adjusted for router location
 from .. import models
-from ..database import SessionLocal # Assuming SessionLocal is the way to get a session
+from ..database import get_db
 
 router = APIRouter(
     prefix="/api/lineas-credito",
@@ -15,14 +15,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=schemas.LineaCredito, status_code=201)
 def create_linea_credito(
     linea_credito_data: schemas.LineaCreditoCreate,
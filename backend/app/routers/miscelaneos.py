@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from .. import crud_miscelaneos, schemas
-from ..database import SessionLocal
+from ..database import get_db
 
 router = APIRouter(
     prefix="/api/miscelaneos",
@@ -11,14 +11,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/", response_model=List[schemas.Miscelaneos])
 def read_miscelaneos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     miscelaneos = crud_miscelaneos.get_miscelaneos(db, skip=skip, limit=limit)
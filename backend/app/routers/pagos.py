@@ -4,7 +4,7 @@ from typing import List
 
 from .. import crud_pagos, models # Relative import for sibling modules
 from .. import schemas as schemas_module # Alias to avoid conflict and ensure clarity
-from ..database import SessionLocal # Relative import for database
+from ..database import get_db
 
 router = APIRouter(
     prefix="/api/pagos",
@@ -12,14 +12,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/", response_model=schemas_module.Pago)
 def create_new_pago(pago: schemas_module.PagoCreate, db: Session = Depends(get_db)):
     return crud_pagos.create_pago(db=db, pago=pago)
@@ -3,7 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from .. import crud_pagos_tierra, schemas
-from ..database import SessionLocal
+from ..database import get_db
 
 router = APIRouter(
     prefix="/api/pagos_tierra",
@@ -11,14 +11,6 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.get("/", response_model=List[dict])
 def read_pagos_tierra(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
     pagos_tierra = crud_pagos_tierra.get_pagos_tierra(db, skip=skip, limit=limit)
@@ -16,15 +16,15 @@ router = APIRouter(
 )
 
 # Helper function to check for existing record by nombre (PK)
-async def check_existing_record(db: Session, get_function: callable, nombre: str, record_type: str):
+def check_existing_record(db: Session, get_function: callable, nombre: str, record_type: str):
     existing = get_function(db, nombre=nombre)
     if existing:
         raise HTTPException(status_code=400, detail=f"{record_type} with NOMBRE '{nombre}' already exists.")
 
 # --- API Endpoints for PlanillaAdministracion ---
 @router.post("/planillas/administracion/", response_model=schemas.PlanillaAdministracion, status_code=201)
-async def create_planilla_administracion(planilla: schemas.PlanillaAdministracionCreate, db: Session = Depends(get_db)):
-    await check_existing_record(db, crud_payroll.get_planilla_administracion, planilla.nombre, "Planilla Administracion")
+def create_planilla_administracion(planilla: schemas.PlanillaAdministracionCreate, db: Session = Depends(get_db)):
+    check_existing_record(db, crud_payroll.get_planilla_administracion, planilla.nombre, "Planilla Administracion")
     return crud_payroll.create_planilla_administracion(db=db, planilla=planilla)
 
 @router.get("/planillas/administracion/{nombre}", response_model=schemas.PlanillaAdministracion)
@@ -54,8 +54,8 @@ def delete_planilla_administracion(nombre: str, db: Session = Depends(get_db)):
 
 # --- API Endpoints for PlanillaFijaConstruccion ---
 @router.post("/planillas/fija_construccion/", response_model=schemas.PlanillaFijaConstruccion, status_code=201)
-async def create_planilla_fija_construccion(planilla: schemas.PlanillaFijaConstruccionCreate, db: Session = Depends(get_db)):
-    await check_existing_record(db, crud_payroll.get_planilla_fija_construccion, planilla.nombre, "Planilla Fija Construccion")
+def create_planilla_fija_construccion(planilla: schemas.PlanillaFijaConstruccionCreate, db: Session = Depends(get_db)):
+    check_existing_record(db, crud_payroll.get_planilla_fija_construccion, planilla.nombre, "Planilla Fija Construccion")
     return crud_payroll.create_planilla_fija_construccion(db=db, planilla=planilla)
 
 @router.get("/planillas/fija_construccion/{nombre}", response_model=schemas.PlanillaFijaConstruccion)
@@ -85,8 +85,8 @@ def delete_planilla_fija_construccion(nombre: str, db: Session = Depends(get_db)
 
 # --- API Endpoints for PlanillaGerencial ---
 @router.post("/planillas/gerencial/", response_model=schemas.PlanillaGerencial, status_code=201)
-async def create_planilla_gerencial(planilla: schemas.PlanillaGerencialCreate, db: Session = Depends(get_db)):
-    await check_existing_record(db, crud_payroll.get_planilla_gerencial, planilla.nombre, "Planilla Gerencial")
+def create_planilla_gerencial(planilla: schemas.PlanillaGerencialCreate, db: Session = Depends(get_db)):
+    check_existing_record(db, crud_payroll.get_planilla_gerencial, planilla.nombre, "Planilla Gerencial")
     return crud_payroll.create_planilla_gerencial(db=db, planilla=planilla)
 
 @router.get("/planillas/gerencial/{nombre}", response_model=schemas.PlanillaGerencial)
@@ -116,8 +116,8 @@ def delete_planilla_gerencial(nombre: str, db: Session = Depends(get_db)):
 
 # --- API Endpoints for PlanillaServicioProfesionales ---
 @router.post("/planillas/servicio_profesionales/", response_model=schemas.PlanillaServicioProfesionales, status_code=201)
-async def create_planilla_servicio_profesionales(planilla: schemas.PlanillaServicioProfesionalesCreate, db: Session = Depends(get_db)):
-    await check_existing_record(db, crud_payroll.get_planilla_servicio_profesionales, planilla.nombre, "Planilla Servicio Profesionales")
+def create_planilla_servicio_profesionales(planilla: schemas.PlanillaServicioProfesionalesCreate, db: Session = Depends(get_db)):
+    check_existing_record(db, crud_payroll.get_planilla_servicio_profesionales, planilla.nombre, "Planilla Servicio Profesionales")
     return crud_payroll.create_planilla_servicio_profesionales(db=db, planilla=planilla)
 
 @router.get("/planillas/servicio_profesionales/{nombre}", response_model=schemas.PlanillaServicioProfesionales)
@@ -147,8 +147,8 @@ def delete_planilla_servicio_profesionales(nombre: str, db: Session = Depends(ge
 
 # --- API Endpoints for PlanillaVariableConstruccion ---
 @router.post("/planillas/variable_construccion/", response_model=schemas.PlanillaVariableConstruccion, status_code=201)
-async def create_planilla_variable_construccion(planilla: schemas.PlanillaVariableConstruccionCreate, db: Session = Depends(get_db)):
-    await check_existing_record(db, crud_payroll.get_planilla_variable_construccion, planilla.nombre, "Planilla Variable Construccion")
+def create_planilla_variable_construccion(planilla: schemas.PlanillaVariableConstruccionCreate, db: Session = Depends(get_db)):
+    check_existing_record(db, crud_payroll.get_planilla_variable_construccion, planilla.nombre, "Planilla Variable Construccion")
     return crud_payroll.create_planilla_variable_construccion(db=db, planilla=planilla)
 
 @router.get("/planillas/variable_construccion/{nombre}", response_model=schemas.PlanillaVariableConstruccion)
@@ -3,10 +3,12 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date, datetime, timedelta
 from decimal import Decimal
-from dateutil.relativedelta import relativedelta
 
+from ..cash_flow_cache import invalidate_cash_flow_cache
+from ..crud_sales_projections import get_active_sales_projection
 from ..database import get_db
-from ..models import LineaCreditoProyecto, LineaCreditoProyectoUso, ScenarioProject, ProjectUnit
+from ..financing_ledger import load_credit_line_ledger
+from ..models import LineaCreditoProyecto, LineaCreditoProyectoUso, ScenarioProject
 from ..schemas import (
     LineaCreditoProyecto as LineaCreditoProyectoSchema,
     LineaCreditoProyectoCreate,
@@ -38,7 +40,7 @@ def get_project_credit_lines(
 
 
 @router.get("/scenario-projects/{project_id}/credit-lines/monthly-timeline")
-async def get_credit_lines_monthly_timeline(
+def get_credit_lines_monthly_timeline(
     project_id: int,
     db: Session = Depends(get_db)
 ):
@@ -52,10 +54,9 @@ async def get_credit_lines_monthly_timeline(
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Get all credit lines for the project
-    credit_lines = db.query(LineaCreditoProyecto).filter(
-        LineaCreditoProyecto.scenario_project_id == project_id
-    ).all()
+    # Get all credit lines and their usages for the project in one pass
+    credit_ledger = load_credit_line_ledger(db, project_id)
+    credit_lines = credit_ledger.credit_lines
     
     if not credit_lines:
         return {"timeline": [], "summary": {"total_lines": 0}}
@@ -64,20 +65,19 @@ async def get_credit_lines_monthly_timeline(
     try:
         logger.info(f"Fetching enhanced cash flow data for project {project_id}")
         
-        # Import and call the same endpoint that the cash flow table uses
-        from .scenario_projects import get_project_cash_flow_with_sales_projections
-        enhanced_cash_flow_response = await get_project_cash_flow_with_sales_projections(project_id, db)
+        # Same rows and delivery months as the cash flow table, without the project cash flow
+        from .scenario_projects import sales_projection_cash_flow
+        active_projection = get_active_sales_projection(db, project_id)
         
-        if not enhanced_cash_flow_response.get("has_active_projection"):
+        if not active_projection or not active_projection.get("monthly_revenue"):
             logger.info("No active sales projection found")
             return {"timeline": [], "summary": {"total_lines": 0, "error": "No active sales projection"}}
             
-        enhanced_cash_flow_data = enhanced_cash_flow_response.get("cash_flow", [])
+        enhanced_cash_flow_data, delivery = sales_projection_cash_flow(project, active_projection, db)
         logger.info(f"Found enhanced cash flow with {len(enhanced_cash_flow_data)} entries")
         
         # Get payment flows for automatic payment calculations
-        projection_data = enhanced_cash_flow_response.get("projection_data", {})
-        payment_flows = projection_data.get("payment_flows", [])
+        payment_flows = active_projection.get("payment_flows") or []
         logger.info(f"Found {len(payment_flows)} payment flows for automatic payment calculations")
         
     except Exception as e:
@@ -127,9 +127,8 @@ async def get_credit_lines_monthly_timeline(
     if payment_flows and payment_config:
         logger.info(f"Calculating automatic payments from {len(payment_flows)} payment flows")
         
-        for flow in payment_flows:
+        for flow, delivery_month in zip(payment_flows, delivery.months):
             sale_month = flow.get("sale_month", 0)
-            unit_number = flow.get("unit_number", "")
             
             # Calculate separation payment to credit lines
             separation_amount = Decimal(str(flow.get("separation_amount", 0)))
@@ -147,34 +146,7 @@ async def get_credit_lines_monthly_timeline(
             
             # Add delivery payment in delivery month (using same logic as enhanced cash flow)
             if credit_line_delivery > 0:
-                # Use same delivery date calculation as enhanced cash flow
-                delivery_month = sale_month + 12  # Fallback
-                
-                # Try to get actual delivery date if available
-                if project.start_date:
-                    units = db.query(ProjectUnit).filter(ProjectUnit.scenario_project_id == project_id).all()
-                    for unit in units:
-                        if unit.delivery_date and unit.unit_number == unit_number:
-                            months_diff = ((unit.delivery_date.year - project.start_date.year) * 12) + (unit.delivery_date.month - project.start_date.month) + 1
-                            delivery_month = months_diff
-                            break
-                    else:
-                        # Use project delivery period logic if no specific date
-                        if project.delivery_start_date and project.delivery_end_date:
-                            delivery_start_month = ((project.delivery_start_date.year - project.start_date.year) * 12) + (project.delivery_start_date.month - project.start_date.month) + 1
-                            delivery_end_month = ((project.delivery_end_date.year - project.start_date.year) * 12) + (project.delivery_end_date.month - project.start_date.month) + 1
-                            
-                            if sale_month < delivery_start_month:
-                                delivery_month = delivery_start_month
-                            elif sale_month > delivery_end_month:
-                                delivery_month = sale_month
-                            else:
-                                # Distribute across delivery period
-                                delivery_period_length = delivery_end_month - delivery_start_month + 1
-                                unit_hash = hash(unit_number) if unit_number else hash(str(flow.get("unit_id", 0)))
-                                delivery_offset = abs(unit_hash) % delivery_period_length
-                                delivery_month = delivery_start_month + delivery_offset
-                
+                # Same delivery month as the enhanced cash flow
                 if delivery_month not in monthly_automatic_payments:
                     monthly_automatic_payments[delivery_month] = 0.0
                 monthly_automatic_payments[delivery_month] += float(credit_line_delivery)
@@ -216,14 +188,7 @@ async def get_credit_lines_monthly_timeline(
         
         for line in credit_lines:
             # Get usage records for this month and credit line
-            month_start = current_date
-            month_end = (current_date + relativedelta(months=1)) - timedelta(days=1)
-            
-            usage_records = db.query(LineaCreditoProyectoUso).filter(
-                LineaCreditoProyectoUso.linea_credito_proyecto_id == line.id,
-                LineaCreditoProyectoUso.fecha_uso >= month_start,
-                LineaCreditoProyectoUso.fecha_uso <= month_end
-            ).all()
+            usage_records = credit_ledger.usages_in_month(line.id, current_date.year, current_date.month)
             
             # Calculate monthly activity from manual usage records
             monthly_withdrawals = 0.0
@@ -370,6 +335,7 @@ def create_project_credit_line(
         db_credit_line.es_simulacion = (project.status in ["DRAFT", "PLANNING"])
     
     db.add(db_credit_line)
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     db.refresh(db_credit_line)
     
@@ -426,6 +392,7 @@ def update_project_credit_line(
         
         credit_line.monto_disponible = credit_line.monto_total_linea - used_amount
     
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     db.refresh(credit_line)
     
@@ -448,6 +415,7 @@ def delete_project_credit_line(
         raise HTTPException(status_code=404, detail="Credit line not found")
     
     db.delete(credit_line)
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     
     return {"message": "Credit line deleted successfully"}
@@ -524,6 +492,7 @@ def create_credit_line_usage(
     elif usage.tipo_transaccion == "PAYMENT":
         credit_line.monto_disponible += monto_decimal
     
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     db.refresh(db_usage)
     
@@ -568,6 +537,7 @@ def delete_credit_line_usage(
     
     # Delete the usage record
     db.delete(usage_record)
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     
     return {"message": "Usage record deleted successfully"}
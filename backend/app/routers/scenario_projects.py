@@ -12,6 +12,7 @@ try:
     import math
     import pandas as pd
     import io
+    import time
     from pydantic import BaseModel
 
     from ..database import get_db
@@ -27,10 +28,11 @@ try:
         CostCategory as CostCategorySchema, CostCategoryCreate,
         ScenarioCostItem as ScenarioCostItemSchema,
         ScenarioCostItemCreate, ScenarioCostItemUpdate,
-        ScenarioCashFlow as ScenarioCashFlowSchema,
+        ScenarioCashFlow as ScenarioCashFlowSchema, CashFlowBatchRecalculateRequest,
         ProjectFinancialMetrics as ProjectFinancialMetricsSchema,
         FinancialCalculationRequest, FinancialCalculationResponse,
         SensitivityAnalysisRequest, SensitivityAnalysis as SensitivityAnalysisSchema,
+        SensitivityTornadoRequest,
         SalesSimulationRequest, SalesSimulationResponse, SalesScenarioConfig,
         SalesScenarioMetrics, CompanyLiquidityAnalysis,
         ProjectUnit as ProjectUnitSchema, ProjectUnitsStats,
@@ -38,17 +40,41 @@ try:
         LineaCreditoProyecto as LineaCreditoProyectoSchema, PaymentDistributionConfig,
         UnitSalesScenarioConfig, UnitSalesPaymentFlow, UnitSalesSimulationRequest,
         UnitSalesSimulationResponse, UnitSalesScenarioMetrics,
+        UnitSalesMonteCarloRequest, UnitSalesMonteCarloResponse,
         ProjectStage as ProjectStageSchema, ProjectStageCreate, ProjectStageUpdate, ProjectStageWithSubStages, ProjectStageTemplateResponse, ProjectTimelineResponse,
         ProjectStatusTransitionsResponse, ProjectTransitionResponse, ProjectRejectionRequest
     )
+    from ..cost_schedule import build_cost_schedule
+    from ..stage_cost_phasing import PHASING_PROFILES, load_stage_cost_phasing
+    from ..delivery_schedule import projection_delivery_schedule, delivery_schedules, delivery_window
+    from ..financing_ledger import load_credit_line_ledger
+    from ..irr import monthly_irr_annualized
+    from ..cash_flow_cache import (
+        compute_cash_flow_fingerprint, is_cash_flow_fresh,
+        store_cash_flow_fingerprint, invalidate_cash_flow_cache
+    )
+    from ..cash_flow_store import upsert_cash_flows, upsert_cash_flows_batch, load_cash_flows
+    from ..portfolio_cash_flow import (
+        consolidated_cash_flow, refresh_portfolio_rollup, portfolio_rollup_delta, DEFAULT_AXIS_MONTHS
+    )
+    from ..unit_sales_simulation import (
+        UnitArrays, UnitScheduleError, simulate_payment_flows, simulate_monte_carlo, project_cost_vector,
+        DELIVERY_LAG_MONTHS
+    )
+    from ..unit_import import UnitImportError, prepare_units, insert_units, format_row_error
+    from ..stage_schedule import StageGraph, StageScheduleError, schedules as stage_schedules
+    from ..sensitivity import snapshot_project, run_sensitivity_grid, base_value_for_variable, SENSITIVITY_VARIABLES
     from ..crud_sales_projections import (
-        create_sales_projection, get_sales_projections_by_project, 
+        create_sales_projection, create_sales_projections_batch, get_sales_projections_by_project, 
         get_active_sales_projection, update_sales_projection, 
-        delete_sales_projection, set_active_projection
+        delete_sales_projection, set_active_projection,
+        get_sales_projection, list_sales_projection_summaries, prune_simulation_projections,
+        get_active_sales_projection as get_active_sales_projection_crud,
+        SIMULATION_KEEP_LATEST, SIMULATION_RETENTION_DAYS
     )
     from ..schemas import (
         SalesProjectionCreate, SalesProjection, SalesProjectionUpdate, 
-        SalesProjectionWithImpact
+        SalesProjectionWithImpact, SalesProjectionSummary, SalesProjectionPruneResponse
     )
 except ImportError as e:
     print(f"Error importing modules in scenario_projects.py: {e}")
@@ -78,126 +104,128 @@ async def options_get_project(project_id: int):
 
 
 
+# Cached project counts per status filter: {status: (expires_at, count)}
+PROJECT_COUNT_TTL_SECONDS = 60
+_project_count_cache: Dict[Optional[str], tuple] = {}
+
+def count_scenario_projects(db: Session, status: Optional[str] = None) -> int:
+    """Total de proyectos (por estado), cacheado por PROJECT_COUNT_TTL_SECONDS"""
+    now = time.monotonic()
+    cached = _project_count_cache.get(status)
+    if cached and cached[0] > now:
+        return cached[1]
+    
+    count_query = db.query(func.count(ScenarioProject.id))
+    if status:
+        count_query = count_query.filter(ScenarioProject.status == status)
+    total = count_query.scalar() or 0
+    _project_count_cache[status] = (now + PROJECT_COUNT_TTL_SECONDS, total)
+    return total
+
+def invalidate_project_count_cache():
+    _project_count_cache.clear()
+
 @router.get("/", response_model=ScenarioProjectsListResponse)
-async def list_scenario_projects(
+def list_scenario_projects(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     status: Optional[str] = Query(None),
+    cursor: Optional[int] = Query(None, description="Id del último proyecto de la página anterior (paginación keyset)"),
     db: Session = Depends(get_db)
 ):
     """Listar todos los proyectos de escenario con métricas básicas"""
-    query = db.query(ScenarioProject)
+    # Projects and their NPV/IRR in a single LEFT JOIN, only the listed columns
+    query = db.query(
+        ScenarioProject.id,
+        ScenarioProject.name,
+        ScenarioProject.description,
+        ScenarioProject.location,
+        ScenarioProject.status,
+        ScenarioProject.total_units,
+        ScenarioProject.target_price_per_m2,
+        ScenarioProject.created_at,
+        ScenarioProject.updated_at,
+        ProjectFinancialMetrics.npv,
+        ProjectFinancialMetrics.irr,
+    ).outerjoin(
+        ProjectFinancialMetrics,
+        ProjectFinancialMetrics.scenario_project_id == ScenarioProject.id
+    )
     
     if status:
         query = query.filter(ScenarioProject.status == status)
     
-    # Get projects with financial metrics
-    projects = query.options(
-        joinedload(ScenarioProject.cost_items),
-    ).offset(skip).limit(limit).all()
-    
-    total = query.count()
-    
-    # Get financial metrics for each project
-    project_summaries = []
-    for project in projects:
-        metrics = db.query(ProjectFinancialMetrics).filter(
-            ProjectFinancialMetrics.scenario_project_id == project.id
-        ).first()
-        
-        summary = ScenarioProjectSummary(
-            id=project.id,
-            name=project.name,
-            description=project.description,
-            location=project.location,
-            status=project.status,
-            total_units=project.total_units,
-            target_price_per_m2=project.target_price_per_m2,
-            npv=metrics.npv if metrics else None,
-            irr=metrics.irr if metrics else None,
-            created_at=project.created_at,
-            updated_at=project.updated_at
+    query = query.order_by(ScenarioProject.id)
+    if cursor is not None:
+        query = query.filter(ScenarioProject.id > cursor)
+    elif skip:
+        # Legacy offset pagination
+        query = query.offset(skip)
+    
+    rows = query.limit(limit).all()
+    
+    project_summaries = [
+        ScenarioProjectSummary(
+            id=row.id,
+            name=row.name,
+            description=row.description,
+            location=row.location,
+            status=row.status,
+            total_units=row.total_units,
+            target_price_per_m2=row.target_price_per_m2,
+            npv=row.npv,
+            irr=row.irr,
+            created_at=row.created_at,
+            updated_at=row.updated_at
         )
-        project_summaries.append(summary)
+        for row in rows
+    ]
     
-    return ScenarioProjectsListResponse(projects=project_summaries, total=total)
+    return ScenarioProjectsListResponse(
+        projects=project_summaries,
+        total=count_scenario_projects(db, status),
+        next_cursor=rows[-1].id if len(rows) == limit else None
+    )
 
 @router.get("/consolidated/cash-flow-impact")
 def get_consolidated_scenario_projects_cash_flow_impact(
+    start: Optional[str] = Query(None, description="Primer mes del eje, YYYY-MM (por defecto 3 meses antes del actual)"),
+    months: int = Query(DEFAULT_AXIS_MONTHS, ge=1, le=240),
+    status: str = Query("ACTIVE"),
+    include_projects: bool = Query(True),
+    use_rollup: bool = Query(False),
     db: Session = Depends(get_db)
 ):
     """
     Obtener el impacto consolidado en el flujo de caja de todos los proyectos escenario aprobados.
+    Los meses se alinean por calendario, no por posición dentro del flujo de cada proyecto.
     """
+    axis_start = None
+    if start:
+        try:
+            parsed = datetime.strptime(start, "%Y-%m")
+            axis_start = (parsed.year, parsed.month)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="El parámetro start debe tener formato YYYY-MM")
+    
     try:
-        # Get all active scenario projects (ACTIVE status)
-        projects = db.query(ScenarioProject).filter(
-            ScenarioProject.status == "ACTIVE"
-        ).all()
-        
-        # Initialize consolidated data
-        consolidated_ingresos = [0.0] * 39
-        consolidated_egresos = [0.0] * 39
-        total_ingresos = 0.0
-        total_egresos = 0.0
-        project_details = []
-        
-        # Process each active project
-        for project in projects:
-            try:
-                # Get project cash flow impact
-                project_cash_flows = db.query(ScenarioCashFlow).filter(
-                    ScenarioCashFlow.scenario_project_id == project.id
-                ).order_by(ScenarioCashFlow.year, ScenarioCashFlow.month).all()
-                
-                project_ingresos = [0.0] * 39
-                project_egresos = [0.0] * 39
-                
-                for i, cash_flow in enumerate(project_cash_flows[:39]):
-                    if cash_flow.total_ingresos and cash_flow.total_ingresos > 0:
-                        project_ingresos[i] = float(cash_flow.total_ingresos)
-                        consolidated_ingresos[i] += float(cash_flow.total_ingresos)
-                        total_ingresos += float(cash_flow.total_ingresos)
-                    
-                    if cash_flow.total_egresos and cash_flow.total_egresos > 0:
-                        project_egresos[i] = float(cash_flow.total_egresos)
-                        consolidated_egresos[i] += float(cash_flow.total_egresos)
-                        total_egresos += float(cash_flow.total_egresos)
-                
-                project_details.append({
-                    "project_id": project.id,
-                    "project_name": project.name,
-                    "project_status": project.status,
-                    "ingresos_by_month": project_ingresos,
-                    "egresos_by_month": project_egresos,
-                    "total_ingresos_proyecto": sum(project_ingresos),
-                    "total_egresos_proyecto": sum(project_egresos)
-                })
-                
-            except Exception as e:
-                print(f"Error processing project {project.id}: {str(e)}")
-                continue
-        
-        return {
-            "projects": project_details,
-            "consolidated_cash_flow": {
-                "total_ingresos_by_month": consolidated_ingresos,
-                "total_egresos_by_month": consolidated_egresos,
-                "total_ingresos": total_ingresos,
-                "total_egresos": total_egresos,
-                "flujo_neto_total": total_ingresos - total_egresos,
-                "projects_count": len(projects)
-            }
-        }
-        
+        return consolidated_cash_flow(
+            db,
+            status=status,
+            start=axis_start,
+            months=months,
+            include_projects=include_projects,
+            use_rollup=use_rollup,
+        )
     except Exception as e:
-        print(f"Error in consolidated cash flow impact: {str(e)}")
+        logging.error(f"Error in consolidated cash flow impact: {e}", exc_info=True)
         # Return empty data structure on error
         return {
+            "periods": [],
             "projects": [],
             "consolidated_cash_flow": {
-                "total_ingresos_by_month": [0.0] * 39,
-                "total_egresos_by_month": [0.0] * 39,
+                "total_ingresos_by_month": [0.0] * months,
+                "total_egresos_by_month": [0.0] * months,
                 "total_ingresos": 0.0,
                 "total_egresos": 0.0,
                 "flujo_neto_total": 0.0,
@@ -205,10 +233,15 @@ def get_consolidated_scenario_projects_cash_flow_impact(
             }
         }
 
-
+@router.post("/consolidated/cash-flow-impact/refresh-rollup")
+def refresh_consolidated_cash_flow_rollup(db: Session = Depends(get_db)):
+    """Reconstruir por completo el rollup mensual del portafolio"""
+    refresh_portfolio_rollup(db)
+    db.commit()
+    return {"message": "Rollup del flujo de caja consolidado actualizado"}
 
 @router.post("/", response_model=ScenarioProjectSchema)
-async def create_scenario_project(
+def create_scenario_project(
     project: ScenarioProjectCreate,
     db: Session = Depends(get_db)
 ):
@@ -216,15 +249,16 @@ async def create_scenario_project(
     db_project = ScenarioProject(**project.dict())
     db.add(db_project)
     db.commit()
+    invalidate_project_count_cache()
     db.refresh(db_project)
     
     # Initialize with default cost categories for Panama
-    await initialize_default_cost_categories(db_project.id, db)
+    initialize_default_cost_categories(db_project.id, db)
     
     return db_project
 
 @router.get("/{project_id}", response_model=ScenarioProjectWithDetails)
-async def get_scenario_project(project_id: int, db: Session = Depends(get_db)):
+def get_scenario_project(project_id: int, db: Session = Depends(get_db)):
     """Obtener un proyecto de escenario específico con todos sus detalles"""
     project = db.query(ScenarioProject).options(
         joinedload(ScenarioProject.cost_items)
@@ -282,6 +316,9 @@ def update_scenario_project(
     
     update_data = project_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
+        if field == "status":
+            # Applied below, inside the portfolio rollup delta
+            continue
         if field == "payment_distribution_config" and value is not None:
             # Manually convert Decimal values within the dictionary to float
             # This is necessary because SQLAlchemy's JSONB type doesn't automatically serialize Decimals
@@ -291,6 +328,11 @@ def update_scenario_project(
             setattr(db_project, field, value)
     
     db_project.updated_at = datetime.utcnow()
+    db_project.cash_flow_fingerprint = None
+    if "status" in update_data:
+        with portfolio_rollup_delta(db, [project_id]):
+            db_project.status = update_data["status"]
+        invalidate_project_count_cache()
     db.commit()
     db.refresh(db_project)
     
@@ -364,6 +406,7 @@ def create_project_unit(
     db_unit = ProjectUnit(**unit_dict)
     
     db.add(db_unit)
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     db.refresh(db_unit)
     
@@ -431,6 +474,7 @@ def update_project_unit(
                     )
                     db.add(new_payment)
 
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     db.refresh(db_unit)
     
@@ -460,6 +504,7 @@ def delete_project_unit(
         raise HTTPException(status_code=404, detail="Unidad no encontrada")
     
     db.delete(db_unit)
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     
     return {"message": "Unidad eliminada exitosamente"}
@@ -570,36 +615,38 @@ def approve_project(
             )
             db.add(baseline_item)
         
-        # 2. Create baseline snapshot of cash flow
-        cash_flows = db.query(ScenarioCashFlow).filter(
-            ScenarioCashFlow.scenario_project_id == project_id
-        ).all()
-        
-        for cf in cash_flows:
-            baseline_cf = ScenarioCashFlow(
-                scenario_project_id=project_id,
-                year=cf.year,
-                month=cf.month,
-                period_label=cf.period_label + " (BASELINE)",
-                ingresos_ventas=cf.ingresos_ventas,
-                total_ingresos=cf.total_ingresos,
-                costos_terreno=cf.costos_terreno,
-                costos_duros=cf.costos_duros,
-                costos_blandos=cf.costos_blandos,
-                costos_financiacion=cf.costos_financiacion,
-                costos_marketing=cf.costos_marketing,
-                total_egresos=cf.total_egresos,
-                flujo_neto=cf.flujo_neto,
-                flujo_acumulado=cf.flujo_acumulado,
-                flujo_descontado=cf.flujo_descontado,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
-            )
-            db.add(baseline_cf)
+        with portfolio_rollup_delta(db, [project.id]):
+            # 2. Create baseline snapshot of cash flow
+            cash_flows = db.query(ScenarioCashFlow).filter(
+                ScenarioCashFlow.scenario_project_id == project_id
+            ).all()
         
-        # 3. Update project status to APPROVED
-        project.status = "APPROVED"
-        project.updated_at = datetime.utcnow()
+            for cf in cash_flows:
+                baseline_cf = ScenarioCashFlow(
+                    scenario_project_id=project_id,
+                    year=cf.year,
+                    month=cf.month,
+                    period_label=cf.period_label + " (BASELINE)",
+                    ingresos_ventas=cf.ingresos_ventas,
+                    total_ingresos=cf.total_ingresos,
+                    costos_terreno=cf.costos_terreno,
+                    costos_duros=cf.costos_duros,
+                    costos_blandos=cf.costos_blandos,
+                    costos_financiacion=cf.costos_financiacion,
+                    costos_marketing=cf.costos_marketing,
+                    total_egresos=cf.total_egresos,
+                    flujo_neto=cf.flujo_neto,
+                    flujo_acumulado=cf.flujo_acumulado,
+                    flujo_descontado=cf.flujo_descontado,
+                    created_at=datetime.utcnow(),
+                    updated_at=datetime.utcnow()
+                )
+                db.add(baseline_cf)
+        
+            # 3. Update project status to APPROVED
+            project.status = "APPROVED"
+            project.updated_at = datetime.utcnow()
+        invalidate_project_count_cache()
         
         db.commit()
         
@@ -632,8 +679,9 @@ def reject_project(
         raise HTTPException(status_code=400, detail=f"Solo se pueden rechazar proyectos en estado UNDER_REVIEW. Estado actual: {project.status}")
     
     try:
-        project.status = "DRAFT"
-        project.updated_at = datetime.utcnow()
+        with portfolio_rollup_delta(db, [project.id]):
+            project.status = "DRAFT"
+            project.updated_at = datetime.utcnow()
         
         # Agregar nota de rechazo si se proporciona
         if rejection_data.reason:
@@ -641,6 +689,7 @@ def reject_project(
             rejection_note = f"\n\n[RECHAZADO - {datetime.utcnow().strftime('%Y-%m-%d %H:%M')}]: {rejection_data.reason}"
             project.description = existing_notes + rejection_note
         
+        invalidate_project_count_cache()
         db.commit()
         
         return {
@@ -691,6 +740,7 @@ def activate_project(
         project.active_sales_projection_id = sales_projection.id
         project.status = "ACTIVE"
         project.updated_at = datetime.utcnow()
+        invalidate_project_count_cache()
 
         # Recalculate cash flows and financial metrics based on the activated sales projection
         # Temporarily attach the sales projection to the project for calculate_monthly_revenue
@@ -1035,21 +1085,23 @@ def get_baseline_comparison(
         raise HTTPException(status_code=500, detail=f"Error al obtener comparación: {str(e)}")
 
 @router.delete("/{project_id}")
-async def delete_scenario_project(project_id: int, db: Session = Depends(get_db)):
+def delete_scenario_project(project_id: int, db: Session = Depends(get_db)):
     """Eliminar un proyecto de escenario"""
     db_project = db.query(ScenarioProject).filter(ScenarioProject.id == project_id).first()
     if not db_project:
         raise HTTPException(status_code=404, detail="Proyecto no encontrado")
     
-    db.delete(db_project)
+    with portfolio_rollup_delta(db, [project_id]):
+        db.delete(db_project)
     db.commit()
+    invalidate_project_count_cache()
     
     return {"message": "Proyecto eliminado exitosamente"}
 
 # --- Cost Items Management ---
 
 @router.get("/{project_id}/cost-items", response_model=List[ScenarioCostItemSchema])
-async def get_project_cost_items(project_id: int, db: Session = Depends(get_db)):
+def get_project_cost_items(project_id: int, db: Session = Depends(get_db)):
     """Obtener todos los items de costo de un proyecto"""
     items = db.query(ScenarioCostItem).filter(
         ScenarioCostItem.scenario_project_id == project_id,
@@ -1059,7 +1111,7 @@ async def get_project_cost_items(project_id: int, db: Session = Depends(get_db))
     return items
 
 @router.post("/{project_id}/cost-items", response_model=ScenarioCostItemSchema)
-async def create_cost_item(
+def create_cost_item(
     project_id: int,
     cost_item: ScenarioCostItemCreate,
     db: Session = Depends(get_db)
@@ -1073,13 +1125,14 @@ async def create_cost_item(
     cost_item.scenario_project_id = project_id
     db_cost_item = ScenarioCostItem(**cost_item.dict())
     db.add(db_cost_item)
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     db.refresh(db_cost_item)
     
     return db_cost_item
 
 @router.get("/{project_id}/cost-items/{item_id}", response_model=ScenarioCostItemSchema)
-async def get_cost_item(
+def get_cost_item(
     project_id: int,
     item_id: int,
     db: Session = Depends(get_db)
@@ -1098,7 +1151,7 @@ async def get_cost_item(
     return db_item
 
 @router.put("/{project_id}/cost-items/{item_id}", response_model=ScenarioCostItemSchema)
-async def update_cost_item(
+def update_cost_item(
     project_id: int,
     item_id: int,
     item_update: ScenarioCostItemUpdate,
@@ -1120,22 +1173,15 @@ async def update_cost_item(
         setattr(db_item, field, value)
     
     db_item.updated_at = datetime.utcnow()
+    # Cash flows are recalculated lazily on the next read
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     db.refresh(db_item)
     
-    # Recalculate cash flows when cost items are updated
-    try:
-        project = db.query(ScenarioProject).filter(ScenarioProject.id == project_id).first()
-        if project:
-            calculate_cash_flows(project, db)
-    except Exception as e:
-        # Log error but don't fail the cost item update
-        print(f"Warning: Could not recalculate cash flows after cost update: {e}")
-    
     return db_item
 
 @router.delete("/{project_id}/cost-items/{item_id}")
-async def delete_cost_item(project_id: int, item_id: int, db: Session = Depends(get_db)):
+def delete_cost_item(project_id: int, item_id: int, db: Session = Depends(get_db)):
     """Eliminar un item de costo"""
     db_item = db.query(ScenarioCostItem).filter(
         and_(
@@ -1148,6 +1194,7 @@ async def delete_cost_item(project_id: int, item_id: int, db: Session = Depends(
         raise HTTPException(status_code=404, detail="Item de costo no encontrado")
     
     db.delete(db_item)
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     
     return {"message": "Item de costo eliminado exitosamente"}
@@ -1155,7 +1202,7 @@ async def delete_cost_item(project_id: int, item_id: int, db: Session = Depends(
 # --- Financial Calculations ---
 
 @router.post("/{project_id}/calculate-financials", response_model=FinancialCalculationResponse)
-async def calculate_project_financials(
+def calculate_project_financials(
     project_id: int,
     calculation_request: FinancialCalculationRequest,
     db: Session = Depends(get_db)
@@ -1210,8 +1257,33 @@ async def calculate_project_financials(
             cash_flow_periods=None
         )
 
+@router.post("/cash-flows/recalculate")
+def recalculate_projects_cash_flows(
+    batch_request: CashFlowBatchRecalculateRequest,
+    db: Session = Depends(get_db)
+):
+    """Recalcular y persistir los flujos de caja de varios proyectos en una sola transacción"""
+    projects = db.query(ScenarioProject).filter(
+        ScenarioProject.id.in_(batch_request.project_ids)
+    ).all()
+    missing = sorted(set(batch_request.project_ids) - {project.id for project in projects})
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Proyectos no encontrados: {missing}")
+    
+    try:
+        periods = recalculate_cash_flows_batch(projects, db)
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error in recalculate_projects_cash_flows: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Error al recalcular los flujos de caja.")
+    
+    return {
+        "success": True,
+        "projects": [{"project_id": project_id, "cash_flow_periods": count} for project_id, count in periods.items()]
+    }
+
 @router.get("/{project_id}/cash-flow")
-async def get_project_cash_flow(project_id: int, db: Session = Depends(get_db)):
+def get_project_cash_flow(project_id: int, db: Session = Depends(get_db)):
     """Obtener el flujo de caja del proyecto"""
     try:
         # Get the project to check if we need to recalculate
@@ -1219,44 +1291,14 @@ async def get_project_cash_flow(project_id: int, db: Session = Depends(get_db)):
         if not project:
             raise HTTPException(status_code=404, detail="Proyecto no encontrado")
         
-        # Get existing cash flows
-        cash_flows = db.query(ScenarioCashFlow).filter(
-            ScenarioCashFlow.scenario_project_id == project_id
-        ).order_by(ScenarioCashFlow.year, ScenarioCashFlow.month).all()
-        
-        # Check if we need to recalculate due to delivery period extension
-        needs_recalculation = False
-        if project.delivery_end_date and cash_flows:
-            # Check if the last cash flow period covers the delivery end date
-            last_flow = cash_flows[-1]
-            last_date = datetime(last_flow.year, last_flow.month, 1).date()
-            
-            # Ensure delivery_end_date is a date object for comparison
-            if hasattr(project.delivery_end_date, 'date'):
-                delivery_end = project.delivery_end_date.date().replace(day=1)
-            else:
-                delivery_end = project.delivery_end_date.replace(day=1)
-            
-            if last_date < delivery_end:
-                needs_recalculation = True
-                logging.info(f"Cash flow needs recalculation: last={last_date.strftime('%Y-%m')}, delivery_end={delivery_end.strftime('%Y-%m')}")
-        
-        # Recalculate if needed or if no cash flows exist
-        if not cash_flows or needs_recalculation:
-            logging.info(f"Recalculating cash flows for project {project_id}")
-            calculate_cash_flows(project, db)
-            # Get the updated cash flows
-            cash_flows = db.query(ScenarioCashFlow).filter(
-                ScenarioCashFlow.scenario_project_id == project_id
-            ).order_by(ScenarioCashFlow.year, ScenarioCashFlow.month).all()
-        
-        return cash_flows
+        # Serve the persisted rows unless the project inputs changed since they were calculated
+        return get_or_calculate_cash_flows(project, db)
     except Exception as e:
         logging.error(f"Error in get_project_cash_flow: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Error al obtener el flujo de caja del proyecto.")
 
 @router.get("/{project_id}/metrics", response_model=ProjectFinancialMetricsSchema)
-async def get_project_metrics(project_id: int, db: Session = Depends(get_db)):
+def get_project_metrics(project_id: int, db: Session = Depends(get_db)):
     """Obtener las métricas financieras del proyecto"""
     try:
         metrics = db.query(ProjectFinancialMetrics).filter(
@@ -1272,13 +1314,9 @@ async def get_project_metrics(project_id: int, db: Session = Depends(get_db)):
             if not project:
                 raise HTTPException(status_code=404, detail="Proyecto no encontrado")
         
-            # Calculate cash flows first
-            calculate_cash_flows(project, db)
+            # Calculate cash flows first (reusing the persisted ones if still current)
+            cash_flows_from_db = get_or_calculate_cash_flows(project, db)
             # Then calculate financial metrics
-            # Retrieve cash flows from DB as they were just calculated and persisted
-            cash_flows_from_db = db.query(ScenarioCashFlow).filter(
-                ScenarioCashFlow.scenario_project_id == project.id
-            ).order_by(ScenarioCashFlow.year, ScenarioCashFlow.month).all()
             metrics = calculate_financial_metrics(project, cash_flows_from_db, db)
     
         return metrics
@@ -1294,7 +1332,7 @@ async def options_run_sensitivity_analysis(project_id: int):
     return {"message": "OK"}
 
 @router.post("/{project_id}/sensitivity-analysis", response_model=SensitivityAnalysisSchema)
-async def run_sensitivity_analysis(
+def run_sensitivity_analysis(
     project_id: int,
     analysis_request: SensitivityAnalysisRequest,
     db: Session = Depends(get_db)
@@ -1328,13 +1366,65 @@ async def run_sensitivity_analysis(
     
     return analysis
 
+@router.options("/{project_id}/sensitivity-analysis/tornado")
+async def options_run_sensitivity_tornado(project_id: int):
+    """Handle CORS preflight for multi-variable sensitivity analysis"""
+    return {"message": "OK"}
+
+@router.post("/{project_id}/sensitivity-analysis/tornado")
+def run_sensitivity_tornado(
+    project_id: int,
+    tornado_request: SensitivityTornadoRequest,
+    db: Session = Depends(get_db)
+):
+    """Ejecutar análisis de sensibilidad de varias variables a la vez (gráfico tornado)"""
+    project = db.query(ScenarioProject).filter(ScenarioProject.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Proyecto no encontrado")
+    
+    variable_types = tornado_request.variable_types or list(SENSITIVITY_VARIABLES)
+    invalid = [v for v in variable_types if v not in SENSITIVITY_VARIABLES]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Variables no soportadas: {', '.join(invalid)}")
+    
+    snapshot = snapshot_project(db, project)
+    grid = run_sensitivity_grid(
+        snapshot,
+        variable_types,
+        min_variation_pct=tornado_request.min_variation_pct,
+        max_variation_pct=tornado_request.max_variation_pct,
+        steps=tornado_request.steps,
+    )
+    
+    # NPV range per variable, widest first, for the tornado bars
+    tornado = []
+    for variable_type, scenarios in grid["variables"].items():
+        npvs = [scenario["npv"] for scenario in scenarios]
+        tornado.append({
+            "variable_type": variable_type,
+            "base_value": float(get_base_value_for_variable(project, variable_type) or 0),
+            "min_npv": min(npvs) if npvs else None,
+            "max_npv": max(npvs) if npvs else None,
+            "npv_range": (max(npvs) - min(npvs)) if npvs else 0,
+        })
+    tornado.sort(key=lambda row: row["npv_range"], reverse=True)
+    
+    return {
+        "project_id": project_id,
+        "base_npv": grid["base_npv"],
+        "base_irr": grid["base_irr"],
+        "base_payback_months": grid["base_payback_months"],
+        "tornado": tornado,
+        "variables": grid["variables"]
+    }
+
 @router.options("/{project_id}/sensitivity-analyses")
 async def options_get_sensitivity_analyses(project_id: int):
     """Handle CORS preflight for sensitivity analyses"""
     return {"message": "OK"}
 
 @router.get("/{project_id}/financing-debug")
-async def debug_financing_costs(project_id: int, db: Session = Depends(get_db)):
+def debug_financing_costs(project_id: int, db: Session = Depends(get_db)):
     """Debug endpoint to check financing data for a project"""
     try:
         # Get credit lines
@@ -1382,7 +1472,7 @@ async def debug_financing_costs(project_id: int, db: Session = Depends(get_db)):
         return {"error": str(e), "project_id": project_id}
 
 @router.get("/{project_id}/sensitivity-analyses", response_model=List[SensitivityAnalysisSchema])
-async def get_project_sensitivity_analyses(project_id: int, db: Session = Depends(get_db)):
+def get_project_sensitivity_analyses(project_id: int, db: Session = Depends(get_db)):
     """Obtener todos los análisis de sensibilidad de un proyecto"""
     try:
         # Verify project exists
@@ -1425,13 +1515,13 @@ async def get_project_sensitivity_analyses(project_id: int, db: Session = Depend
 # --- Cost Categories Management ---
 
 @router.get("/cost-categories", response_model=List[CostCategorySchema])
-async def get_cost_categories(db: Session = Depends(get_db)):
+def get_cost_categories(db: Session = Depends(get_db)):
     """Obtener todas las categorías de costo disponibles"""
     categories = db.query(CostCategory).filter(CostCategory.is_active == True).all()
     return categories
 
 @router.post("/cost-categories", response_model=CostCategorySchema)
-async def create_cost_category(category: CostCategoryCreate, db: Session = Depends(get_db)):
+def create_cost_category(category: CostCategoryCreate, db: Session = Depends(get_db)):
     """Crear una nueva categoría de costo"""
     db_category = CostCategory(**category.dict())
     db.add(db_category)
@@ -1441,7 +1531,7 @@ async def create_cost_category(category: CostCategoryCreate, db: Session = Depen
 
 # --- Helper Functions ---
 
-async def initialize_default_cost_categories(project_id: int, db: Session):
+def initialize_default_cost_categories(project_id: int, db: Session):
     """Inicializar categorías de costo por defecto para Panamá"""
     default_categories = [
         # Terreno
@@ -1491,8 +1581,36 @@ async def initialize_default_cost_categories(project_id: int, db: Session):
     
     db.commit()
 
-def calculate_cash_flows(project: ScenarioProject, db: Session = None) -> List[ScenarioCashFlow]:
-    """Calcular flujos de caja mensuales del proyecto. Si db es None, retorna flujos en memoria."""
+def get_or_calculate_cash_flows(project: ScenarioProject, db: Session) -> List[ScenarioCashFlow]:
+    """Flujos de caja persistidos si siguen vigentes según el fingerprint; si no, recalcularlos"""
+    if is_cash_flow_fresh(db, project):
+        cash_flows = load_cash_flows(db, project.id)
+        if cash_flows:
+            return cash_flows
+
+    logging.info(f"Recalculating cash flows for project {project.id}")
+    return calculate_cash_flows(project, db)
+
+def recalculate_cash_flows_batch(projects: List[ScenarioProject], db: Session) -> Dict[int, int]:
+    """
+    Recalcular y persistir los flujos de varios proyectos en una sola transacción.
+    Retorna el número de períodos por proyecto.
+    """
+    cash_flows_by_project = {}
+    for project in projects:
+        fingerprint = compute_cash_flow_fingerprint(db, project)
+        cash_flows_by_project[project.id] = calculate_cash_flows(project, db, persist=False)
+        store_cash_flow_fingerprint(project, fingerprint)
+
+    upsert_cash_flows_batch(db, cash_flows_by_project)
+    db.commit()
+    return {project_id: len(cash_flows) for project_id, cash_flows in cash_flows_by_project.items()}
+
+def calculate_cash_flows(project: ScenarioProject, db: Session = None, persist: bool = True) -> List[ScenarioCashFlow]:
+    """
+    Calcular flujos de caja mensuales del proyecto. Si db es None, retorna flujos en memoria.
+    Con persist=False lee los datos de db pero no escribe los flujos.
+    """
     
     if not project.start_date:
         return []
@@ -1505,14 +1623,14 @@ def calculate_cash_flows(project: ScenarioProject, db: Session = None) -> List[S
 
     # --- 1. Fetch all required data upfront ---
     if db:
+        fingerprint = compute_cash_flow_fingerprint(db, project) if persist else None
         cost_items = db.query(ScenarioCostItem).filter(
             ScenarioCostItem.scenario_project_id == project.id,
             ScenarioCostItem.is_active == True
         ).all()
         
-        credit_line_uses = db.query(LineaCreditoProyectoUso).join(LineaCreditoProyecto).filter(
-            LineaCreditoProyecto.scenario_project_id == project.id
-        ).all()
+        # All credit lines and usages, loaded once for the whole period
+        credit_ledger = load_credit_line_ledger(db, project.id)
 
         units_sold = db.query(ProjectUnit).filter(
             ProjectUnit.scenario_project_id == project.id,
@@ -1523,7 +1641,7 @@ def calculate_cash_flows(project: ScenarioProject, db: Session = None) -> List[S
     else:
         # Handling for in-memory simulation if needed later
         cost_items = project.cost_items if hasattr(project, 'cost_items') else []
-        credit_line_uses = [] # Assuming not available in memory-only mode for now
+        credit_ledger = None # Assuming not available in memory-only mode for now
         units_sold = []
 
     # --- 2. Aggregate data by month ---
@@ -1532,18 +1650,25 @@ def calculate_cash_flows(project: ScenarioProject, db: Session = None) -> List[S
         period_key = unit.delivery_date.strftime('%Y-%m')
         monthly_sales_revenue[period_key] = monthly_sales_revenue.get(period_key, Decimal('0.0')) + unit.sale_price
 
-    monthly_financing = {}
-    for use in credit_line_uses:
-        period_key = use.fecha_uso.strftime('%Y-%m')
-        if period_key not in monthly_financing:
-            monthly_financing[period_key] = {'inflow': Decimal('0.0'), 'outflow': Decimal('0.0')}
-        
-        if use.tipo_transaccion in ['DISPOSICION', 'DRAWDOWN']:
-            monthly_financing[period_key]['inflow'] += Decimal(use.monto_usado)
-        else: # ABONO, PAGO_INTERESES, etc.
-            monthly_financing[period_key]['outflow'] += Decimal(use.monto_usado)
+    monthly_financing = credit_ledger.monthly_financing_flows() if credit_ledger else {}
 
-    # --- 3. Generate monthly cash flow records ---
+    # --- 3. Resolve the cost schedule once for the whole period ---
+    if project.start_date > effective_end_date:
+        total_months = 0
+    else:
+        total_months = ((effective_end_date.year - project.start_date.year) * 12) + (effective_end_date.month - project.start_date.month) + 1
+    stage_costs = load_stage_cost_phasing(db, project, total_months) if db else None
+    cost_schedule = build_cost_schedule(cost_items, total_months, project, stage_costs)
+
+    # Interest on credit line balances for every month, in one sweep over the usages
+    periods = []
+    period_date = date(project.start_date.year, project.start_date.month, 1)
+    for _ in range(total_months):
+        periods.append((period_date.year, period_date.month))
+        period_date = date(period_date.year + 1, 1, 1) if period_date.month == 12 else date(period_date.year, period_date.month + 1, 1)
+    financing_series = credit_ledger.interest_series(periods) if credit_ledger else []
+
+    # --- 4. Generate monthly cash flow records ---
     cash_flows = []
     accumulated_flow = Decimal('0.00')
     current_date = project.start_date
@@ -1559,11 +1684,11 @@ def calculate_cash_flows(project: ScenarioProject, db: Session = None) -> List[S
         financing_inflow = monthly_financing.get(period_key, {}).get('inflow', Decimal('0.0'))
         financing_outflow = monthly_financing.get(period_key, {}).get('outflow', Decimal('0.0'))
 
-        # Calculate standard monthly costs (excluding financing costs)
-        monthly_costs = calculate_monthly_costs(cost_items, month_offset, project)
+        # Standard monthly costs (excluding financing costs)
+        monthly_costs = cost_schedule.monthly_costs(month_offset)
         
         # Get actual financing costs from credit lines timeline
-        financing_costs = calculate_monthly_financing_costs(project.id, year, month, db) if db else Decimal('0.0')
+        financing_costs = financing_series[month_offset] if month_offset < len(financing_series) else Decimal('0.0')
         
         # Set financing costs from actual credit line interest calculations
         monthly_costs['financiacion'] = financing_costs
@@ -1618,18 +1743,19 @@ def calculate_cash_flows(project: ScenarioProject, db: Session = None) -> List[S
         current_date = date(next_year, next_month, 1)
         month_offset += 1
 
-    if db: # Only commit to DB if db session is provided
-        db.query(ScenarioCashFlow).filter(
-            ScenarioCashFlow.scenario_project_id == project.id
-        ).delete()
-        db.add_all(cash_flows)
+    if db and persist: # Only commit to DB if db session is provided
+        upsert_cash_flows(db, project.id, cash_flows)
+        store_cash_flow_fingerprint(project, fingerprint)
         db.commit()
+        return load_cash_flows(db, project.id)
     
     return cash_flows
 
 def calculate_cash_flows_with_projection(project: ScenarioProject, sales_projection: dict, db: Session) -> List[ScenarioCashFlow]:
     """Calculate cash flows using sales projection data with proper delivery timing"""
     
+    fingerprint = compute_cash_flow_fingerprint(db, project)
+
     # Get cost items
     cost_items = db.query(ScenarioCostItem).filter(
         ScenarioCostItem.scenario_project_id == project.id,
@@ -1643,13 +1769,17 @@ def calculate_cash_flows_with_projection(project: ScenarioProject, sales_project
         duration_months = ((end_date.year - start_date.year) * 12) + (end_date.month - start_date.month) + 1
         current_year = start_date.year
         start_month = start_date.month
+        # Stage costs are phased on the month axis of the project start
+        stage_costs = load_stage_cost_phasing(db, project, duration_months)
     else:
         duration_months = project.expected_sales_period_months or 60
         current_year = datetime.now().year
         start_month = 1
+        stage_costs = None
     
     accumulated_flow = Decimal('0.00')
     cash_flows = []
+    cost_schedule = build_cost_schedule(cost_items, duration_months, project, stage_costs)
     
     # Parse payment flows from sales projection to get detailed timing
     payment_flows = sales_projection.get("payment_flows", [])
@@ -1659,16 +1789,13 @@ def calculate_cash_flows_with_projection(project: ScenarioProject, sales_project
     monthly_delivery_count = {}      # Number of units delivered per month
     
     if payment_flows:
-        # Calculate delivery period bounds
-        delivery_start_month = None
-        delivery_end_month = None
+        # Delivery period in months from project start
+        delivery_start_month, delivery_end_month = delivery_window(project) or (None, None)
         
-        if project.delivery_start_date and project.delivery_end_date and project.start_date:
-            # Calculate delivery period in months from project start
-            delivery_start_month = ((project.delivery_start_date.year - project.start_date.year) * 12) + (project.delivery_start_date.month - project.start_date.month) + 1
-            delivery_end_month = ((project.delivery_end_date.year - project.start_date.year) * 12) + (project.delivery_end_date.month - project.start_date.month) + 1
+        # Same delivery months as the sales cash flow and the credit line timeline
+        delivery = projection_delivery_schedule(db, project, sales_projection)
         
-        for flow in payment_flows:
+        for flow, unit_delivery_month in zip(payment_flows, delivery.months):
             sale_month = flow.get("sale_month", 0)
             developer_separation = Decimal(str(flow.get("developer_separation", 0)))
             developer_delivery = Decimal(str(flow.get("developer_delivery", 0)))
@@ -1685,16 +1812,6 @@ def calculate_cash_flows_with_projection(project: ScenarioProject, sales_project
             else:
                 # Normal sale: Full unit revenue recorded when unit is delivered
                 if total_unit_revenue > 0 and delivery_start_month and delivery_end_month:
-                    # Calculate delivery month for this specific unit
-                    # Distribute deliveries evenly across the delivery period
-                    delivery_period_length = delivery_end_month - delivery_start_month + 1
-                    
-                    # For each unit, assign a delivery month within the delivery period
-                    # Use unit_id to create a consistent but distributed assignment
-                    unit_id = flow.get("unit_id", 0)
-                    unit_delivery_offset = unit_id % delivery_period_length
-                    unit_delivery_month = delivery_start_month + unit_delivery_offset
-                    
                     # Record the full unit revenue when delivered
                     monthly_delivery_revenue[unit_delivery_month] = monthly_delivery_revenue.get(unit_delivery_month, Decimal('0')) + total_unit_revenue
                     monthly_delivery_count[unit_delivery_month] = monthly_delivery_count.get(unit_delivery_month, 0) + 1
@@ -1727,7 +1844,7 @@ def calculate_cash_flows_with_projection(project: ScenarioProject, sales_project
             else:
                 monthly_revenue = Decimal(str(month_data))
         
-        monthly_costs = calculate_monthly_costs(cost_items, month_offset, project)
+        monthly_costs = cost_schedule.monthly_costs(month_offset)
         
         net_flow = monthly_revenue - monthly_costs["total"]
         accumulated_flow += net_flow
@@ -1763,21 +1880,18 @@ def calculate_cash_flows_with_projection(project: ScenarioProject, sales_project
         )
         cash_flows.append(cash_flow)
     
-    # Clear existing cash flows and add new ones
-    db.query(ScenarioCashFlow).filter(
-        ScenarioCashFlow.scenario_project_id == project.id
-    ).delete()
-    db.add_all(cash_flows)
+    # Replace the persisted month vector in place
+    upsert_cash_flows(db, project.id, cash_flows)
+    store_cash_flow_fingerprint(project, fingerprint)
     db.flush()  # Ensure the changes are available for subsequent queries
     
     return cash_flows
 
 def persist_cash_flows(project_id: int, cash_flows: List[ScenarioCashFlow], db: Session):
     """Persiste los flujos de caja en la base de datos."""
-    db.query(ScenarioCashFlow).filter(
-        ScenarioCashFlow.scenario_project_id == project_id
-    ).delete()
-    db.add_all(cash_flows)
+    upsert_cash_flows(db, project_id, cash_flows)
+    # Rows written from outside calculate_cash_flows do not match any fingerprint
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
 
 def calculate_monthly_revenue(project: ScenarioProject, month_offset: int, total_months: int) -> Decimal:
@@ -1820,201 +1934,13 @@ def calculate_monthly_revenue(project: ScenarioProject, month_offset: int, total
         return total_revenue * Decimal(str(monthly_factor)) / Decimal(str(total_months))
 
 def calculate_monthly_costs(cost_items: List[ScenarioCostItem], month_offset: int, project: ScenarioProject = None) -> dict:
-    """Calcular costos mensuales por categoría"""
-    logging.info(f"--- Calculating monthly costs for month_offset: {month_offset} with {len(cost_items)} items ---")
-    monthly_costs = {
-        "terreno": Decimal('0.00'),
-        "costos_duros": Decimal('0.00'),
-        "costos_blandos": Decimal('0.00'),
-        "financiacion": Decimal('0.00'),
-        "marketing": Decimal('0.00'),
-        "otros": Decimal('0.00'),
-        "total": Decimal('0.00')
-    }
-    
-    for item in cost_items:
-        logging.info(f"Processing item: {item.partida_costo} (ID: {item.id}) - Base: {item.base_costo}, Monto: {item.monto_proyectado}")
-        # Calculate actual cost based on base_costo type
-        actual_cost = item.monto_proyectado
-        
-        # Handle different cost bases
-        if "por m² construcción" in item.base_costo and item.unit_cost and project:
-            # Calculate cost per m² * buildable area (área construible)
-            project_area = None
-            if project.buildable_area_m2:
-                project_area = project.buildable_area_m2
-            elif project.total_area_m2:
-                project_area = project.total_area_m2
-            elif project.total_units and project.avg_unit_size_m2:
-                project_area = project.total_units * project.avg_unit_size_m2
-            
-            if project_area:
-                actual_cost = item.unit_cost * Decimal(str(project_area))
-        elif "por m² propiedad" in item.base_costo and item.unit_cost and project and project.total_units and project.avg_unit_size_m2:
-            # Calculate cost per m² * sellable property area (total_units * avg_unit_size_m2)
-            sellable_area = project.total_units * project.avg_unit_size_m2
-            if sellable_area and sellable_area > 0:
-                try:
-                    actual_cost = item.unit_cost * Decimal(str(sellable_area))
-                except (ValueError, TypeError):
-                    actual_cost = item.monto_proyectado  # Fallback to original amount
-            else:
-                actual_cost = item.monto_proyectado  # Fallback if area is invalid
-        elif "por m²" in item.base_costo and item.unit_cost and project:  # Backward compatibility - treat as construcción
-            # Calculate cost per m² * buildable area (área construible)
-            project_area = None
-            if project.buildable_area_m2:
-                project_area = project.buildable_area_m2
-            elif project.total_area_m2:
-                project_area = project.total_area_m2
-            elif project.total_units and project.avg_unit_size_m2:
-                project_area = project.total_units * project.avg_unit_size_m2
-            
-            if project_area and project_area > 0:
-                try:
-                    actual_cost = item.unit_cost * Decimal(str(project_area))
-                except (ValueError, TypeError):
-                    actual_cost = item.monto_proyectado  # Fallback to original amount
-            else:
-                actual_cost = item.monto_proyectado  # Fallback if area is invalid
-        elif "por unidad" in item.base_costo and item.unit_cost and project and project.total_units:
-            # Calculate cost per unit * total units
-            if project.total_units and project.total_units > 0:
-                try:
-                    actual_cost = item.unit_cost * Decimal(str(project.total_units))
-                except (ValueError, TypeError):
-                    actual_cost = item.monto_proyectado  # Fallback to original amount
-            else:
-                actual_cost = item.monto_proyectado  # Fallback if units is invalid
-        elif item.unit_cost and item.quantity:
-            # Calculate unit_cost * quantity
-            try:
-                actual_cost = item.unit_cost * item.quantity
-            except (ValueError, TypeError):
-                actual_cost = item.monto_proyectado  # Fallback to original amount
-        
-        logging.info(f"  > Calculated actual_cost: {actual_cost}")
-        if not actual_cost:
-            logging.info("  > Skipping item because actual_cost is zero or None.")
-            continue
-            
-        # Determine when this cost occurs
-        start_month = item.start_month if item.start_month is not None else 1
-        # Handle start_month = 0 as month 1
-        if start_month == 0:
-            start_month = 1
-        duration = item.duration_months or 1
-        logging.info(f"  > Timing: start_month={start_month}, duration={duration}")
-        
-        if start_month <= (month_offset + 1) <= (start_month + duration - 1):
-            try:
-                duration_decimal = Decimal(str(duration))
-                if duration_decimal > 0:
-                    monthly_amount = actual_cost / duration_decimal
-                else:
-                    monthly_amount = actual_cost  # Fallback if duration is invalid
-            except (ValueError, TypeError, ZeroDivisionError):
-                monthly_amount = actual_cost  # Fallback if calculation fails
-            
-            logging.info(f"  > Item is ACTIVE this month (offset {month_offset}). Monthly amount: {monthly_amount}")
-            
-            # Skip financing costs as they will be calculated from credit lines timeline
-            if "financiacion" in item.categoria.lower():
-                logging.info(f"  > Skipping financing cost item (will be calculated from credit lines): {item.partida_costo}")
-                continue
-            
-            # Categorize cost - prioritize subcategory for marketing
-            category_key = "otros"
-            subcategoria_lower = (item.subcategoria or "").lower()
-            
-            # Debug logging for marketing items
-            if "comisiones" in item.partida_costo.lower() or "publicidad" in item.partida_costo.lower():
-                logging.info(f"  > MARKETING DEBUG - Item: {item.partida_costo}")
-                logging.info(f"  > Category: '{item.categoria}', Subcategory: '{item.subcategoria}'")
-                logging.info(f"  > Subcategoria lower: '{subcategoria_lower}'")
-                logging.info(f"  > Marketing in subcategoria: {'marketing' in subcategoria_lower}")
-                logging.info(f"  > Ventas in subcategoria: {'ventas' in subcategoria_lower}")
-            
-            # Marketing takes priority - check both main category and subcategory
-            if ("marketing" in item.categoria.lower() or "marketing" in subcategoria_lower or "ventas" in subcategoria_lower):
-                category_key = "marketing"
-                logging.info(f"  > CATEGORIZED AS MARKETING: {item.partida_costo}")
-            elif "terreno" in item.categoria.lower():
-                category_key = "terreno"
-            elif "duros" in item.categoria.lower():
-                category_key = "costos_duros" 
-            elif "blandos" in item.categoria.lower():
-                category_key = "costos_blandos"
-            
-            monthly_costs[category_key] += monthly_amount
-            monthly_costs["total"] += monthly_amount
-            logging.info(f"  > Added to category: {category_key}. Current category total: {monthly_costs[category_key]}")
-    
-    logging.info(f"--- Finished monthly costs for offset {month_offset}. Totals: {monthly_costs} ---")
-    return monthly_costs
+    """Calcular costos mensuales por categoría (un solo mes; ver build_cost_schedule para el calendario completo)"""
+    return build_cost_schedule(cost_items, month_offset + 1, project).monthly_costs(month_offset)
 
 def calculate_monthly_financing_costs(project_id: int, year: int, month: int, db: Session) -> Decimal:
     """Calculate financing costs based on credit line balances and interest rates"""
     try:
-        period_label = f"{year}-{month:02d}"
-        logging.info(f"Calculating financing costs for project {project_id}, period {period_label}")
-        
-        # Get all credit lines for the project
-        credit_lines = db.query(LineaCreditoProyecto).filter(
-            LineaCreditoProyecto.scenario_project_id == project_id
-        ).all()
-        
-        logging.info(f"Found {len(credit_lines)} credit lines for project {project_id}")
-        
-        if not credit_lines:
-            logging.info("No credit lines found, returning 0")
-            return Decimal('0.0')
-        
-        total_interest = Decimal('0.0')
-        
-        for line in credit_lines:
-            logging.info(f"Processing credit line {line.id}: rate={line.interest_rate}, total={line.monto_total_linea}")
-            
-            if line.interest_rate and line.monto_total_linea:
-                # Get all drawdown usage up to this month
-                current_date = datetime(year, month, 1)
-                
-                drawdowns = db.query(
-                    func.coalesce(func.sum(LineaCreditoProyectoUso.monto_usado), 0)
-                ).filter(
-                    LineaCreditoProyectoUso.linea_credito_proyecto_id == line.id,
-                    LineaCreditoProyectoUso.tipo_transaccion.in_(["DRAWDOWN", "DISPOSICION"]),
-                    LineaCreditoProyectoUso.fecha_uso <= current_date
-                ).scalar() or Decimal('0.0')
-                
-                # Get all payments up to this month
-                payments = db.query(
-                    func.coalesce(func.sum(LineaCreditoProyectoUso.monto_usado), 0)
-                ).filter(
-                    LineaCreditoProyectoUso.linea_credito_proyecto_id == line.id,
-                    LineaCreditoProyectoUso.tipo_transaccion.in_(["PAYMENT", "ABONO_CAPITAL", "ABONO_COBRO_CLIENTE"]),
-                    LineaCreditoProyectoUso.fecha_uso <= current_date
-                ).scalar() or Decimal('0.0')
-                
-                # Calculate current balance
-                current_balance = drawdowns - payments
-                
-                logging.info(f"Line {line.id} - Drawdowns: {drawdowns}, Payments: {payments}, Balance: {current_balance}")
-                
-                if current_balance > 0:
-                    # Calculate monthly interest
-                    monthly_rate = line.interest_rate / 12
-                    monthly_interest = current_balance * monthly_rate
-                    total_interest += monthly_interest
-                    logging.info(f"Monthly interest for line {line.id}: {monthly_interest} (rate: {monthly_rate}, balance: {current_balance})")
-                else:
-                    logging.info(f"No balance for line {line.id}")
-            else:
-                logging.info(f"Line {line.id} missing rate or total amount")
-        
-        logging.info(f"Total financing costs for {year}-{month:02d}: {total_interest}")
-        return total_interest
-        
+        return load_credit_line_ledger(db, project_id).monthly_interest(year, month)
     except Exception as e:
         logging.error(f"Error calculating financing costs for {year}-{month:02d}: {e}", exc_info=True)
         return Decimal('0.0')
@@ -2051,8 +1977,11 @@ def calculate_financial_metrics(project: ScenarioProject, cash_flows: List[Scena
     # Calculate NPV
     npv = sum(cf.flujo_descontado for cf in cash_flows)
     
-    # Calculate IRR (simplified using approximation)
+    # Calculate IRR (annualized from the monthly flows)
     irr = calculate_irr([float(cf.flujo_neto) for cf in cash_flows])
+    # Cap extreme values to prevent database overflow (irr is Numeric(7,4) = max ±999.9999)
+    if irr is not None:
+        irr = max(min(irr, 999.9999), -999.9999)
     
     # Calculate payback period
     payback_months = calculate_payback_period(cash_flows)
@@ -2083,7 +2012,7 @@ def calculate_financial_metrics(project: ScenarioProject, cash_flows: List[Scena
         "total_profit": total_profit,
         "profit_margin_pct": profit_margin,
         "npv": npv,
-        "irr": Decimal(str(irr)) if irr else None,
+        "irr": Decimal(str(round(irr, 4))) if irr is not None else None,
         "payback_months": payback_months,
         "profitability_index": (npv / total_investment) if total_investment > 0 else None,
         "cost_per_unit": cost_per_unit,
@@ -2113,22 +2042,10 @@ def calculate_financial_metrics(project: ScenarioProject, cash_flows: List[Scena
         return new_metrics
 
 def calculate_irr(cash_flows: List[float], initial_guess: float = 0.1) -> Optional[float]:
-    """Calcular TIR usando método simplificado"""
+    """Calcular TIR anual efectiva de flujos mensuales (Newton con respaldo de Brent)"""
     if not cash_flows or len(cash_flows) < 2:
         return None
-    
-    # Simplified IRR calculation using approximation
-    try:
-        # Simple approximation for IRR
-        total_investment = sum(cf for cf in cash_flows if cf < 0)
-        total_returns = sum(cf for cf in cash_flows if cf > 0)
-        
-        if total_investment == 0:
-            return None
-            
-        return (total_returns / abs(total_investment)) ** (1 / len(cash_flows)) - 1
-    except:
-        return initial_guess
+    return monthly_irr_annualized(cash_flows, annual_guess=initial_guess)
 
 def calculate_payback_period(cash_flows: List[ScenarioCashFlow]) -> Optional[int]:
     """Calcular período de recuperación"""
@@ -2165,64 +2082,26 @@ def perform_sensitivity_analysis(
     request: SensitivityAnalysisRequest, 
     db: Session
 ) -> dict:
-    """Realizar análisis de sensibilidad"""
-    base_value = get_base_value_for_variable(project, request.variable_type)
-    
-    scenarios = []
-    steps = request.steps
-    min_var = float(request.min_variation_pct) / 100
-    max_var = float(request.max_variation_pct) / 100
-    
-    for i in range(steps):
-        # Calculate variation percentage
-        if steps == 1:
-            variation_pct = 0
-        else:
-            variation_pct = min_var + (max_var - min_var) * i / (steps - 1)
-        
-        # Apply variation to base value
-        new_value = base_value * (1 + Decimal(str(variation_pct)))
-        
-        # Create temporary project with modified value
-        temp_project = apply_variable_change(project, request.variable_type, new_value)
-        
-        # Manually attach cost_items to the temporary project for calculations
-        temp_project.cost_items = project.cost_items
-        
-        # Calculate metrics for this scenario
-        temp_metrics = calculate_scenario_metrics(temp_project, db)
-        
-        scenarios.append({
-            "variation_pct": variation_pct * 100,
-            "variable_value": float(new_value),
-            "npv": float(temp_metrics["npv"]),
-            "irr": float(temp_metrics["irr"]) if temp_metrics["irr"] else None,
-            "payback_months": temp_metrics["payback_months"],
-            "profit_margin": float(temp_metrics["profit_margin"])
-        })
-    
-    # Base scenario (0% variation)
-    base_metrics = calculate_scenario_metrics(project, db)
+    """Realizar análisis de sensibilidad sobre un snapshot en memoria del proyecto"""
+    snapshot = snapshot_project(db, project)
+    grid = run_sensitivity_grid(
+        snapshot,
+        [request.variable_type],
+        min_variation_pct=request.min_variation_pct,
+        max_variation_pct=request.max_variation_pct,
+        steps=request.steps,
+    )
     
     return {
-        "scenarios": scenarios,
-        "base_npv": float(base_metrics["npv"]),
-        "base_irr": float(base_metrics["irr"]) if base_metrics["irr"] else None,
-        "base_payback_months": base_metrics["payback_months"]
+        "scenarios": grid["variables"][request.variable_type],
+        "base_npv": grid["base_npv"],
+        "base_irr": grid["base_irr"],
+        "base_payback_months": grid["base_payback_months"]
     }
 
 def get_base_value_for_variable(project: ScenarioProject, variable_type: str) -> Decimal:
     """Obtener valor base para la variable de análisis"""
-    if variable_type == "PRICE_PER_M2":
-        return project.target_price_per_m2 or Decimal('1000')
-    elif variable_type == "UNIT_SIZE":
-        return project.avg_unit_size_m2 or Decimal('100')
-    elif variable_type == "TOTAL_UNITS":
-        return Decimal(str(project.total_units)) if project.total_units else Decimal('50')
-    elif variable_type == "DISCOUNT_RATE":
-        return project.discount_rate
-    else:
-        return Decimal('1000')  # Default base value
+    return base_value_for_variable(project, variable_type)
 
 def apply_variable_change(project: ScenarioProject, variable_type: str, new_value: Decimal) -> ScenarioProject:
     """Aplicar cambio de variable al proyecto (copia temporal)"""
@@ -2261,7 +2140,7 @@ def calculate_scenario_metrics(project: ScenarioProject, db: Session) -> dict:
         payback_months = calculate_payback_period(cash_flows)
         
         # Use actual unit sales total instead of cash flow revenue for more accurate metrics
-        units = db.query(ProjectUnit).filter(ProjectUnit.scenario_project_id == scenario_config.project_id).all()
+        units = db.query(ProjectUnit).filter(ProjectUnit.scenario_project_id == project.id).all()
         if units:
             # Ensure consistent types - convert to float since this returns dict, not Decimal
             total_revenue = sum(float(unit.target_price_total or 0) for unit in units)
@@ -2288,7 +2167,7 @@ def calculate_scenario_metrics(project: ScenarioProject, db: Session) -> dict:
 # --- Sales Simulation Endpoints ---
 
 @router.post("/{project_id}/simulate-sales", response_model=SalesSimulationResponse)
-async def simulate_sales_scenarios(
+def simulate_sales_scenarios(
     project_id: int,
     simulation_request: SalesSimulationRequest,
     db: Session = Depends(get_db)
@@ -2449,7 +2328,7 @@ def generate_cash_flow_comparison_data(cash_flows: List[ScenarioCashFlow], scena
 
 
 @router.get("/{project_id}/cash-flow-impact")
-async def get_project_cash_flow_impact(project_id: int, db: Session = Depends(get_db)):
+def get_project_cash_flow_impact(project_id: int, db: Session = Depends(get_db)):
     """Obtener análisis del impacto del proyecto en el cash flow empresarial"""
     project = db.query(ScenarioProject).filter(ScenarioProject.id == project_id).first()
     if not project:
@@ -2504,7 +2383,7 @@ async def get_project_cash_flow_impact(project_id: int, db: Session = Depends(ge
     }
 
 @router.get("/{project_id}/credit-requirements")
-async def get_project_credit_requirements(project_id: int, db: Session = Depends(get_db)):
+def get_project_credit_requirements(project_id: int, db: Session = Depends(get_db)):
     """Obtener análisis de requerimientos de crédito para el proyecto"""
     project = db.query(ScenarioProject).filter(ScenarioProject.id == project_id).first()
     if not project:
@@ -2615,138 +2494,153 @@ def analyze_company_liquidity_impact(scenarios: List[SalesScenarioMetrics], proj
 
 # --- Unit Sales Simulation with Payment Distribution ---
 
+def load_unit_sales_simulation_inputs(project_id: int, db: Session):
+    """Proyecto, unidades activas (por id) y líneas de crédito activas para la simulación"""
+    project = db.query(ScenarioProject).filter(ScenarioProject.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Proyecto no encontrado")
+    
+    # Ordered by id: the mortgage draw is indexed by unit position
+    units = db.query(ProjectUnit).filter(
+        ProjectUnit.scenario_project_id == project_id,
+        ProjectUnit.is_active == True
+    ).order_by(ProjectUnit.id).all()
+    
+    if not units:
+        raise HTTPException(status_code=400, detail="El proyecto no tiene unidades configuradas")
+    
+    credit_lines = db.query(LineaCreditoProyecto).filter(
+        LineaCreditoProyecto.scenario_project_id == project_id,
+        LineaCreditoProyecto.estado == "ACTIVA"
+    ).all()
+    return project, units, credit_lines
+
+def run_unit_sales_simulation(
+    project: ScenarioProject,
+    units: List[ProjectUnit],
+    credit_lines: List[LineaCreditoProyecto],
+    simulation_request: UnitSalesSimulationRequest,
+    db: Session
+):
+    """Calcular flujos y métricas de los tres escenarios, sin escribir en la base de datos"""
+    payment_config = simulation_request.payment_distribution or PaymentDistributionConfig()
+    
+    # Same seed for every scenario, so they differ only by their schedule
+    seed = simulation_request.seed if simulation_request.seed is not None else project.id
+    
+    results = []
+    for scenario_config in [
+        simulation_request.optimistic_scenario,
+        simulation_request.realistic_scenario,
+        simulation_request.conservative_scenario
+    ]:
+        payment_flows = calculate_unit_payment_flows(
+            units, scenario_config, payment_config, credit_lines, seed
+        )
+        scenario_metrics = calculate_unit_sales_scenario_metrics(
+            scenario_config, payment_flows, project, db
+        )
+        results.append((scenario_config, scenario_metrics, payment_flows))
+    return results
+
+def build_scenario_sales_projection(
+    project_id: int,
+    scenario_config: UnitSalesScenarioConfig,
+    payment_flows: List[UnitSalesPaymentFlow]
+) -> SalesProjectionCreate:
+    """Proyección de ventas de un escenario simulado (inactiva)"""
+    monthly_revenue_data = {}
+    
+    def month_entry(month: int) -> Dict[str, Any]:
+        month_key = f"month_{month}"
+        if month_key not in monthly_revenue_data:
+            monthly_revenue_data[month_key] = {
+                "units_sold": 0,
+                "unit_numbers": [],
+                "total_revenue": 0,
+                "developer_income": 0,
+                "credit_line_usage": 0
+            }
+        return monthly_revenue_data[month_key]
+    
+    for flow in payment_flows:
+        # Separation payment in the sale month
+        sale_entry = month_entry(flow.sale_month)
+        sale_entry["units_sold"] += 1
+        sale_entry["unit_numbers"].append(flow.unit_number)
+        sale_entry["total_revenue"] += float(flow.sale_price)
+        sale_entry["developer_income"] += float(flow.developer_separation)
+        sale_entry["credit_line_usage"] += float(flow.credit_line_separation)
+        
+        # Delivery payment goes to the delivery month (DELIVERY_LAG_MONTHS after the sale)
+        delivery_entry = month_entry(flow.sale_month + DELIVERY_LAG_MONTHS)
+        delivery_entry["developer_income"] += float(flow.developer_delivery)
+        delivery_entry["credit_line_usage"] += float(flow.credit_line_delivery)
+    
+    # Stored column-wise by the CRUD layer
+    payment_flows_dict = [
+        {
+            field: (float(value) if isinstance(value, Decimal) else value)
+            for field, value in flow.model_dump().items()
+        }
+        for flow in payment_flows
+    ]
+    
+    return SalesProjectionCreate(
+        scenario_project_id=project_id,
+        scenario_name=f"{scenario_config.scenario_name}_simulation",
+        monthly_revenue=monthly_revenue_data,
+        payment_flows=payment_flows_dict,
+        is_active=False  # Don't activate automatically
+    )
+
+def save_simulated_scenarios(project_id: int, simulation_results, db: Session) -> List[Dict[str, Any]]:
+    """Guardar las proyecciones de todos los escenarios en una sola transacción"""
+    projections = [
+        build_scenario_sales_projection(project_id, scenario_config, payment_flows)
+        for scenario_config, _, payment_flows in simulation_results
+    ]
+    try:
+        created = create_sales_projections_batch(db, projections)
+        # Retention: drop the stale simulations of the project in the same transaction
+        pruned = prune_simulation_projections(db, project_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    for projection_id in pruned:
+        delivery_schedules.invalidate(projection_id)
+    return created
+
 @router.post("/{project_id}/simulate-unit-sales", response_model=UnitSalesSimulationResponse)
-async def simulate_unit_sales_with_payment_distribution(
+def simulate_unit_sales_with_payment_distribution(
     project_id: int,
     simulation_request: UnitSalesSimulationRequest,
     db: Session = Depends(get_db)
 ):
-    """Simular escenarios de ventas por unidades con distribución de pagos y líneas de crédito"""
+    """
+    Simular escenarios de ventas por unidades con distribución de pagos y líneas de crédito.
+    
+    No escribe en la base de datos salvo que save_projections sea True; para guardar
+    los escenarios se usa POST /{project_id}/simulate-unit-sales/save.
+    """
     
     try:
-        # Verify project exists
-        project = db.query(ScenarioProject).filter(ScenarioProject.id == project_id).first()
-        if not project:
-            raise HTTPException(status_code=404, detail="Proyecto no encontrado")
-        
-        # Get project units
-        units = db.query(ProjectUnit).filter(
-            ProjectUnit.scenario_project_id == project_id,
-            ProjectUnit.is_active == True
-        ).all()
-        
-        if not units:
-            raise HTTPException(status_code=400, detail="El proyecto no tiene unidades configuradas")
-        
-        # Get project credit lines
-        credit_lines = db.query(LineaCreditoProyecto).filter(
-            LineaCreditoProyecto.scenario_project_id == project_id,
-            LineaCreditoProyecto.estado == "ACTIVA"
-        ).all()
-        
-        # Default payment distribution if not provided
-        payment_config = simulation_request.payment_distribution or PaymentDistributionConfig()
+        project, units, credit_lines = load_unit_sales_simulation_inputs(project_id, db)
+        simulation_results = run_unit_sales_simulation(project, units, credit_lines, simulation_request, db)
         
-        # Calculate scenarios
-        scenarios = []
-        all_payment_flows = []
+        scenarios = [scenario_metrics for _, scenario_metrics, _ in simulation_results]
+        all_payment_flows = [flow for _, _, payment_flows in simulation_results for flow in payment_flows]
         
-        for scenario_config in [
-            simulation_request.optimistic_scenario,
-            simulation_request.realistic_scenario,
-            simulation_request.conservative_scenario
-        ]:
-            # Calculate payment flows for this scenario
-            payment_flows = calculate_unit_payment_flows(
-                units, scenario_config, payment_config, credit_lines
-            )
-            
-            # Calculate metrics for this scenario
-            scenario_metrics = calculate_unit_sales_scenario_metrics(
-                scenario_config, payment_flows, project, db
-            )
-            
-            scenarios.append(scenario_metrics)
-            all_payment_flows.extend(payment_flows)
-            
-            # Save this scenario to sales_projections table
-            monthly_revenue_data = {}
-            for flow in payment_flows:
-                month_key = f"month_{flow.sale_month}"
-                if month_key not in monthly_revenue_data:
-                    monthly_revenue_data[month_key] = {
-                        "units_sold": 0,
-                        "unit_numbers": [],
-                        "total_revenue": 0,
-                        "developer_income": 0,
-                        "credit_line_usage": 0
-                    }
-                
-                monthly_revenue_data[month_key]["units_sold"] += 1
-                monthly_revenue_data[month_key]["unit_numbers"].append(flow.unit_number)
-                monthly_revenue_data[month_key]["total_revenue"] += float(flow.sale_price)
-                # Only add separation payment to sale month - delivery payment goes to delivery month
-                monthly_revenue_data[month_key]["developer_income"] += float(flow.developer_separation)
-                monthly_revenue_data[month_key]["credit_line_usage"] += float(flow.credit_line_separation)
-                
-                # Add delivery payment to delivery month (12 months after sale for now - TODO: use actual delivery schedule)
-                delivery_month = flow.sale_month + 12
-                delivery_month_key = f"month_{delivery_month}"
-                
-                if delivery_month_key not in monthly_revenue_data:
-                    monthly_revenue_data[delivery_month_key] = {
-                        "units_sold": 0,
-                        "unit_numbers": [],
-                        "total_revenue": 0,
-                        "developer_income": 0,
-                        "credit_line_usage": 0
-                    }
-                
-                monthly_revenue_data[delivery_month_key]["developer_income"] += float(flow.developer_delivery)
-                monthly_revenue_data[delivery_month_key]["credit_line_usage"] += float(flow.credit_line_delivery)
-            
-            # Create sales projection record
-            # Convert payment flows to dictionaries for JSON storage
-            payment_flows_dict = []
-            for flow in payment_flows:
-                payment_flows_dict.append({
-                    "unit_id": flow.unit_id,
-                    "unit_number": flow.unit_number,
-                    "sale_month": flow.sale_month,
-                    "sale_price": float(flow.sale_price),
-                    "uses_mortgage": flow.uses_mortgage,
-                    "separation_amount": float(flow.separation_amount),
-                    "delivery_amount": float(flow.delivery_amount),
-                    "developer_separation": float(flow.developer_separation),
-                    "developer_delivery": float(flow.developer_delivery),
-                    "credit_line_separation": float(flow.credit_line_separation),
-                    "credit_line_delivery": float(flow.credit_line_delivery),
-                    "credit_line_id": flow.credit_line_id
-                })
-            
-            sales_projection = SalesProjectionCreate(
-                scenario_project_id=project_id,
-                scenario_name=f"{scenario_config.scenario_name}_simulation",
-                monthly_revenue=monthly_revenue_data,
-                payment_flows=payment_flows_dict,  # Store as list of dictionaries
-                is_active=False  # Don't activate automatically
-            )
-            
-            try:
-                created_projection = create_sales_projection(db, sales_projection)
-                db.commit()
-            except Exception as e:
-                print(f"Error saving sales projection: {e}")
-                # Continue with simulation even if saving fails
+        if simulation_request.save_projections:
+            save_simulated_scenarios(project_id, simulation_results, db)
         
         # Generate comparison data
         cash_flow_comparison = []
-        for scenario in scenarios:
-            comparison_data = generate_unit_sales_cash_flow_data(
-                scenario.scenario_name, 
-                [flow for flow in all_payment_flows if any(s.scenario_name == scenario.scenario_name for s in scenarios)]
+        for _, scenario_metrics, payment_flows in simulation_results:
+            cash_flow_comparison.extend(
+                generate_unit_sales_cash_flow_data(scenario_metrics.scenario_name, payment_flows)
             )
-            cash_flow_comparison.extend(comparison_data)
         
         # Analyze company impact
         company_impact = analyze_unit_sales_company_impact(scenarios, project)
@@ -2783,76 +2677,100 @@ async def simulate_unit_sales_with_payment_distribution(
             payment_flows=[]
         )
 
+@router.post("/{project_id}/simulate-unit-sales/save")
+def save_unit_sales_scenarios(
+    project_id: int,
+    simulation_request: UnitSalesSimulationRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Guardar los tres escenarios simulados como proyecciones de ventas (inactivas).
+    
+    La simulación tiene semilla, así que con el mismo request se guardan
+    exactamente los flujos mostrados por /simulate-unit-sales.
+    """
+    project, units, credit_lines = load_unit_sales_simulation_inputs(project_id, db)
+    simulation_results = run_unit_sales_simulation(project, units, credit_lines, simulation_request, db)
+    try:
+        created = save_simulated_scenarios(project_id, simulation_results, db)
+    except Exception as e:
+        logging.error(f"Error saving simulated scenarios for project {project_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error al guardar los escenarios: {str(e)}")
+    
+    return {
+        "success": True,
+        "message": f"{len(created)} escenarios guardados",
+        "projections": created
+    }
+
+@router.post("/{project_id}/simulate-unit-sales/monte-carlo", response_model=UnitSalesMonteCarloResponse)
+def simulate_unit_sales_monte_carlo(
+    project_id: int,
+    simulation_request: UnitSalesMonteCarloRequest,
+    db: Session = Depends(get_db)
+):
+    """Bandas P10/P50/P90 de flujo del desarrollador, uso de línea de crédito y exposición máxima por escenario"""
+    project, units, _ = load_unit_sales_simulation_inputs(project_id, db)
+    
+    cost_items = db.query(ScenarioCostItem).filter(
+        ScenarioCostItem.scenario_project_id == project_id,
+        ScenarioCostItem.is_active == True
+    ).all()
+    
+    payment_config = simulation_request.payment_distribution or PaymentDistributionConfig()
+    seed = simulation_request.seed if simulation_request.seed is not None else project_id
+    
+    scenario_configs = [
+        simulation_request.optimistic_scenario,
+        simulation_request.realistic_scenario,
+        simulation_request.conservative_scenario
+    ]
+    scenario_arrays = [scenario_unit_arrays(units, config.units_schedule) for config in scenario_configs]
+    horizon = max(arrays.horizon_months for arrays in scenario_arrays)
+    monthly_costs = project_cost_vector(cost_items, horizon, project, load_stage_cost_phasing(db, project, horizon))
+    
+    scenarios = []
+    for scenario_config, arrays in zip(scenario_configs, scenario_arrays):
+        bands = simulate_monte_carlo(
+            arrays, payment_config, draws=simulation_request.draws, seed=seed, monthly_costs=monthly_costs
+        )
+        bands["scenario_name"] = scenario_config.scenario_name
+        bands["total_units_sold"] = len(arrays)
+        scenarios.append(bands)
+    
+    return UnitSalesMonteCarloResponse(
+        success=True,
+        message="Simulación Monte Carlo completada exitosamente",
+        draws=scenarios[0]["draws"],
+        seed=seed,
+        scenarios=scenarios
+    )
+
+def scenario_unit_arrays(units: List[ProjectUnit], units_schedule: Dict[str, int]) -> UnitArrays:
+    """Unidades programadas del escenario; un mes de venta menor que 1 es un error del request (400)"""
+    try:
+        return UnitArrays.from_schedule(units, units_schedule)
+    except UnitScheduleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 def calculate_unit_payment_flows(
     units: List[ProjectUnit], 
     scenario_config: UnitSalesScenarioConfig,
     payment_config: PaymentDistributionConfig,
-    credit_lines: List[LineaCreditoProyecto]
+    credit_lines: List[LineaCreditoProyecto],
+    seed: Optional[int] = None
 ) -> List[UnitSalesPaymentFlow]:
-    """Calcular los flujos de pago para cada unidad en el escenario"""
-    
-    payment_flows = []
+    """Calcular los flujos de pago para cada unidad en el escenario (sorteo de hipotecas con semilla)"""
     
     # Select primary credit line (first one available)
     primary_credit_line = credit_lines[0] if credit_lines else None
     
-    for unit in units:
-        unit_id_str = str(unit.id)
-        if unit_id_str not in scenario_config.units_schedule:
-            continue
-            
-        sale_month = scenario_config.units_schedule[unit_id_str]
-        sale_price = unit.target_price_total or Decimal('0')
-        
-        if sale_price <= 0:
-            continue
-        
-        # Determine if unit uses mortgage (based on percentage)
-        import random
-        uses_mortgage = random.random() < (float(payment_config.mortgage_usage_percentage) / 100)
-        
-        if uses_mortgage:
-            # Calculate separation payment (typically 10% of price)
-            separation_amount = sale_price * (payment_config.separation_payment_percentage / 100)
-            
-            # Calculate delivery payment (remaining 90% of price)
-            delivery_amount = sale_price - separation_amount
-            
-            # Distribute separation payment
-            developer_separation = separation_amount * (payment_config.separation_payment_percentage / 100)
-            credit_line_separation = separation_amount * (payment_config.separation_credit_line_percentage / 100)
-            
-            # Distribute delivery payment
-            developer_delivery = delivery_amount * (payment_config.delivery_payment_percentage / 100)
-            credit_line_delivery = delivery_amount * (payment_config.delivery_credit_line_percentage / 100)
-        else:
-            # Cash payment - all goes to developer
-            separation_amount = sale_price * Decimal('0.1')  # 10% separation
-            delivery_amount = sale_price * Decimal('0.9')    # 90% at delivery
-            
-            developer_separation = separation_amount
-            developer_delivery = delivery_amount
-            credit_line_separation = Decimal('0')
-            credit_line_delivery = Decimal('0')
-        
-        payment_flow = UnitSalesPaymentFlow(
-            unit_id=unit.id,
-            unit_number=unit.unit_number,
-            sale_month=sale_month,
-            sale_price=sale_price,
-            uses_mortgage=uses_mortgage,
-            separation_amount=separation_amount,
-            delivery_amount=delivery_amount,
-            developer_separation=developer_separation,
-            developer_delivery=developer_delivery,
-            credit_line_separation=credit_line_separation,
-            credit_line_delivery=credit_line_delivery,
-            credit_line_id=primary_credit_line.id if primary_credit_line else None
-        )
-        
-        payment_flows.append(payment_flow)
-    
-    return payment_flows
+    arrays = scenario_unit_arrays(units, scenario_config.units_schedule)
+    flows = simulate_payment_flows(
+        arrays, payment_config, seed,
+        credit_line_id=primary_credit_line.id if primary_credit_line else None
+    )
+    return [UnitSalesPaymentFlow(**flow) for flow in flows]
 
 def calculate_unit_sales_scenario_metrics(
     scenario_config: UnitSalesScenarioConfig,
@@ -3053,7 +2971,7 @@ def generate_units_summary(scenarios: List[UnitSalesScenarioMetrics], units: Lis
 # --- Excel Template and Upload Endpoints ---
 
 @router.get("/{project_id}/units/download-template")
-async def download_units_template(project_id: int, db: Session = Depends(get_db)):
+def download_units_template(project_id: int, db: Session = Depends(get_db)):
     """Descargar plantilla de Excel para cargar unidades masivamente"""
     
     # Verify project exists
@@ -3160,7 +3078,7 @@ async def download_units_template(project_id: int, db: Session = Depends(get_db)
     )
 
 @router.post("/{project_id}/units/upload-excel")
-async def upload_units_from_excel(
+def upload_units_from_excel(
     project_id: int,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
@@ -3178,121 +3096,27 @@ async def upload_units_from_excel(
     
     try:
         # Read Excel file
-        contents = await file.read()
+        contents = file.file.read()
         excel_data = pd.read_excel(io.BytesIO(contents), sheet_name='Unidades')
         
-        # Validate required columns
-        required_columns = ['unit_number', 'unit_type']
-        missing_columns = [col for col in required_columns if col not in excel_data.columns]
-        if missing_columns:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Columnas requeridas faltantes: {', '.join(missing_columns)}"
-            )
-        
-        # Process each row
-        created_units = []
-        errors = []
-        
-        for index, row in excel_data.iterrows():
-            try:
-                # Check if unit number already exists
-                existing_unit = db.query(ProjectUnit).filter(
-                    ProjectUnit.scenario_project_id == project_id,
-                    ProjectUnit.unit_number == str(row['unit_number']),
-                    ProjectUnit.is_active == True
-                ).first()
-                
-                if existing_unit:
-                    errors.append(f"Fila {index + 2}: La unidad {row['unit_number']} ya existe")
-                    continue
-                
-                # Validate unit_type
-                valid_types = ['APARTAMENTO', 'CASA', 'LOTE', 'OFICINA', 'LOCAL']
-                unit_type = str(row['unit_type']).upper()
-                if unit_type not in valid_types:
-                    errors.append(f"Fila {index + 2}: Tipo de unidad inválido '{unit_type}'. Debe ser uno de: {', '.join(valid_types)}")
-                    continue
-                
-                # Validate status if provided
-                valid_statuses = ['AVAILABLE', 'RESERVED', 'SOLD', 'DELIVERED', 'CANCELLED']
-                status = str(row.get('status', 'AVAILABLE')).upper()
-                if status not in valid_statuses:
-                    status = 'AVAILABLE'
-                
-                # Create unit object
-                unit_data = {
-                    'scenario_project_id': project_id,
-                    'unit_number': str(row['unit_number']),
-                    'unit_type': unit_type,
-                    'status': status,
-                    'is_active': True
-                }
-                
-                # Add optional fields if they exist and are not null/empty
-                optional_fields = [
-                    'construction_area_m2', 'land_area_m2', 'total_area_m2', 'bedrooms',
-                    'bathrooms', 'parking_spaces', 'floor_level', 'target_price_total',
-                    'price_per_m2_construction', 'price_per_m2_land', 'planned_sale_month',
-                    'sales_priority', 'description', 'special_features', 'notes'
-                ]
-                
-                for field in optional_fields:
-                    if field in row and pd.notna(row[field]) and str(row[field]).strip() != '':
-                        value = row[field]
-                        
-                        # Convert numeric fields
-                        if field in ['construction_area_m2', 'land_area_m2', 'total_area_m2', 
-                                   'target_price_total', 'price_per_m2_construction', 'price_per_m2_land']:
-                            try:
-                                value = Decimal(str(value))
-                            except:
-                                errors.append(f"Fila {index + 2}: Valor inválido para {field}: {value}")
-                                continue
-                        
-                        elif field in ['bedrooms', 'parking_spaces', 'floor_level', 'planned_sale_month', 'sales_priority']:
-                            try:
-                                value = int(float(value))
-                            except:
-                                errors.append(f"Fila {index + 2}: Valor inválido para {field}: {value}")
-                                continue
-                        
-                        elif field == 'bathrooms':
-                            try:
-                                value = Decimal(str(value))
-                            except:
-                                errors.append(f"Fila {index + 2}: Valor inválido para {field}: {value}")
-                                continue
-                        
-                        unit_data[field] = value
-                
-                # Create unit in database
-                new_unit = ProjectUnit(**unit_data)
-                db.add(new_unit)
-                db.flush()  # Get the ID without committing
-                
-                created_units.append({
-                    'id': new_unit.id,
-                    'unit_number': new_unit.unit_number,
-                    'unit_type': new_unit.unit_type,
-                    'target_price_total': float(new_unit.target_price_total) if new_unit.target_price_total else None
-                })
-                
-            except Exception as e:
-                errors.append(f"Fila {index + 2}: Error al procesar unidad: {str(e)}")
-                continue
+        units, row_errors = prepare_units(excel_data)
+        created_units, existing_errors = insert_units(db, project_id, units)
+        row_errors = sorted(row_errors + existing_errors, key=lambda error: error['row'])
         
         # Commit if there are successful units
         if created_units:
+            invalidate_cash_flow_cache(db, project_id)
             db.commit()
         else:
             db.rollback()
         
+        errors = [format_row_error(error) for error in row_errors]
         return {
             'success': len(created_units) > 0,
             'message': f"Procesadas {len(excel_data)} filas. Creadas {len(created_units)} unidades.",
             'created_units': created_units,
             'errors': errors,
+            'row_errors': row_errors,
             'summary': {
                 'total_rows': len(excel_data),
                 'created_count': len(created_units),
@@ -3300,16 +3124,19 @@ async def upload_units_from_excel(
             }
         }
         
+    except UnitImportError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=400, detail=f"Error al procesar archivo Excel: {str(e)}")
     finally:
-        await file.close()
+        file.file.close()
 
 # --- Project Stages Management ---
 
 @router.get("/{project_id}/stages", response_model=List[ProjectStageWithSubStages])
-async def get_project_stages(project_id: int, db: Session = Depends(get_db)):
+def get_project_stages(project_id: int, db: Session = Depends(get_db)):
     """Obtener todas las etapas de un proyecto"""
     
     # Verify project exists
@@ -3333,7 +3160,7 @@ async def get_project_stages(project_id: int, db: Session = Depends(get_db)):
     return stages
 
 @router.post("/{project_id}/stages", response_model=ProjectStageSchema)
-async def create_project_stage(
+def create_project_stage(
     project_id: int,
     stage: ProjectStageCreate,
     db: Session = Depends(get_db)
@@ -3365,6 +3192,12 @@ async def create_project_stage(
             detail=f"Ya existe una etapa con el orden {stage.stage_order}"
         )
     
+    if stage.cost_profile not in PHASING_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Perfil de costo inválido. Opciones: {', '.join(PHASING_PROFILES)}"
+        )
+    
     # Validate parent stage if specified
     if stage.parent_stage_id:
         parent_stage = db.query(ProjectStage).filter(
@@ -3384,13 +3217,15 @@ async def create_project_stage(
     
     new_stage = ProjectStage(**stage_data)
     db.add(new_stage)
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     db.refresh(new_stage)
+    stage_schedules.invalidate(project_id)
     
     return new_stage
 
 @router.put("/{project_id}/stages/{stage_id}", response_model=ProjectStageSchema)
-async def update_project_stage(
+def update_project_stage(
     project_id: int,
     stage_id: int,
     stage_update: ProjectStageUpdate,
@@ -3420,6 +3255,12 @@ async def update_project_stage(
             detail="La fecha de inicio debe ser anterior a la fecha de fin"
         )
     
+    if 'cost_profile' in update_data and update_data['cost_profile'] not in PHASING_PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Perfil de costo inválido. Opciones: {', '.join(PHASING_PROFILES)}"
+        )
+    
     # Update duration if dates changed
     if 'planned_start_date' in update_data or 'planned_end_date' in update_data:
         update_data['planned_duration_days'] = (end_date - start_date).days
@@ -3435,13 +3276,29 @@ async def update_project_stage(
     for field, value in update_data.items():
         setattr(stage, field, value)
     
+    # Dependency, hierarchy or order changes rebuild the stage graph; reject cycles
+    structural = bool({'dependencies', 'parent_stage_id', 'stage_order'} & update_data.keys())
+    if structural:
+        project_stages = db.query(ProjectStage).filter(
+            ProjectStage.scenario_project_id == project_id
+        ).all()
+        try:
+            StageGraph(project_stages)
+        except StageScheduleError as e:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
     db.refresh(stage)
     
+    # Date-only edits re-propagate the cached schedule from this stage
+    stage_schedules.stage_updated(project_id, stage, structural=structural)
+    
     return stage
 
 @router.delete("/{project_id}/stages/{stage_id}")
-async def delete_project_stage(
+def delete_project_stage(
     project_id: int,
     stage_id: int,
     db: Session = Depends(get_db)
@@ -3481,7 +3338,9 @@ async def delete_project_stage(
         )
     
     db.delete(stage)
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
+    stage_schedules.invalidate(project_id)
     
     return {"message": "Etapa eliminada exitosamente"}
 
@@ -3714,7 +3573,7 @@ async def get_stage_templates(project_id: int, project_type: str = "RESIDENTIAL"
 
 
 @router.post("/{project_id}/stages/create-defaults")
-async def create_default_stages(
+def create_default_stages(
     project_id: int,
     request: CreateDefaultStagesRequest,
     db: Session = Depends(get_db)
@@ -3744,7 +3603,7 @@ async def create_default_stages(
         )
     
     # Get templates
-    templates_response = await get_stage_templates(project_id, project_type)
+    templates_response = get_stage_templates(project_id, project_type)
     templates = templates_response['templates']
     
     # Create stages from templates
@@ -3788,6 +3647,7 @@ async def create_default_stages(
     # Refresh all stages
     for stage in created_stages:
         db.refresh(stage)
+    stage_schedules.invalidate(project_id)
     
     return {
         "message": f"Se crearon {len(created_stages)} etapas basadas en el template {project_type}",
@@ -3798,7 +3658,7 @@ async def create_default_stages(
     }
 
 @router.post("/{project_id}/stages/create-from-template")
-async def create_stages_from_template(
+def create_stages_from_template(
     project_id: int,
     project_type: str,
     start_date: date,
@@ -3808,10 +3668,10 @@ async def create_stages_from_template(
     
     # Call the main function with a proper request object
     request = CreateDefaultStagesRequest(project_type=project_type)
-    return await create_default_stages(project_id, request, db)
+    return create_default_stages(project_id, request, db)
 
 @router.get("/{project_id}/stages/timeline")
-async def get_project_stages_timeline(project_id: int, db: Session = Depends(get_db)):
+def get_project_stages_timeline(project_id: int, db: Session = Depends(get_db)):
     """Obtener cronograma de etapas del proyecto (formato para frontend)"""
     
     # Get project
@@ -3836,30 +3696,51 @@ async def get_project_stages_timeline(project_id: int, db: Session = Depends(get
             "potential_delays": []
         }
     
+    try:
+        schedule = stage_schedules.get(project_id, stages)
+    except StageScheduleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
     # Calculate project timeline
     earliest_start = min(stage.planned_start_date for stage in stages)
     latest_end = max(stage.planned_end_date for stage in stages)
     total_duration = (latest_end - earliest_start).days
     
-    # Build stages with timeline position
+    # Build stages with timeline position and CPM dates
     timeline_stages = []
+    previous_end = None
     for stage in stages:
         start_offset = (stage.planned_start_date - earliest_start).days
         duration = (stage.planned_end_date - stage.planned_start_date).days
+        result = schedule.stage_result(stage.id)
+        
+        # Overlap with the predecessors; without dependencies, with the previous stage
+        overlap = schedule.overlap_with_predecessors(stage.id)
+        if overlap is None:
+            overlap = max(0, (previous_end - stage.planned_start_date).days) if previous_end else 0
+        if stage.parent_stage_id is None:
+            previous_end = stage.planned_end_date
         
         timeline_stages.append({
             "stage": stage,
             "timeline_position": {
                 "start_offset_days": start_offset,
                 "duration_days": duration,
-                "overlap_with_previous": 0  # TODO: Calculate overlap
+                "overlap_with_previous": overlap
             },
-            "critical_path": True,  # Simplified - all stages are critical for now
-            "dependencies_met": True
+            "critical_path": result.get("critical", False),
+            "dependencies_met": result.get("dependencies_met", True),
+            "schedule": {
+                "early_start": result.get("early_start"),
+                "early_finish": result.get("early_finish"),
+                "late_start": result.get("late_start"),
+                "late_finish": result.get("late_finish"),
+                "total_float_days": result.get("total_float_days")
+            }
         })
     
-    # Simple critical path (all stages for now)
-    critical_path_stages = [stage.id for stage in stages]
+    # Critical path: zero-float stages in dependency order, plus the summary stages containing them
+    critical_path_stages = schedule.critical_stage_ids()
     
     # Potential delays based on risk level
     potential_delays = []
@@ -3886,7 +3767,7 @@ async def get_project_stages_timeline(project_id: int, db: Session = Depends(get
     }
 
 @router.get("/{project_id}/timeline", response_model=ProjectTimelineResponse)
-async def get_project_timeline(project_id: int, db: Session = Depends(get_db)):
+def get_project_timeline(project_id: int, db: Session = Depends(get_db)):
     """Obtener cronograma completo del proyecto con análisis"""
     
     # Get project
@@ -3940,8 +3821,11 @@ async def get_project_timeline(project_id: int, db: Session = Depends(get_db)):
     if total_overlapping_days > 0:
         recommendations.append(f"Hay {total_overlapping_days} días de traslape entre etapas")
     
-    # Simple critical path (stages without dependencies)
-    critical_path = [stage.id for stage in stages if not stage.dependencies]
+    # Critical path of the stage dependency graph
+    try:
+        critical_path = stage_schedules.get(project_id, stages).critical_path()
+    except StageScheduleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     schedule_analysis = {
         "total_project_duration_days": total_duration,
@@ -3998,8 +3882,10 @@ def transition_to_draft(
         )
     
     try:
-        project.status = "DRAFT"
-        project.updated_at = datetime.utcnow()
+        with portfolio_rollup_delta(db, [project.id]):
+            project.status = "DRAFT"
+            project.updated_at = datetime.utcnow()
+        invalidate_project_count_cache()
         db.commit()
         
         return {
@@ -4063,8 +3949,10 @@ def transition_to_review(
         )
     
     try:
-        project.status = "UNDER_REVIEW"
-        project.updated_at = datetime.utcnow()
+        with portfolio_rollup_delta(db, [project.id]):
+            project.status = "UNDER_REVIEW"
+            project.updated_at = datetime.utcnow()
+        invalidate_project_count_cache()
         db.commit()
         
         # Construir mensaje de respuesta
@@ -4091,37 +3979,64 @@ def transition_to_review(
 
 # New endpoints for managing sales projections
 
-@router.get("/{project_id}/sales-projections", response_model=List[SalesProjection])
-async def get_project_sales_projections(
+@router.get("/{project_id}/sales-projections", response_model=List[SalesProjectionSummary])
+def get_project_sales_projections(
     project_id: int,
     db: Session = Depends(get_db)
 ):
-    """Get all sales projections for a project"""
+    """
+    Get all sales projections for a project: metadata and summary totals only.
+    monthly_revenue and payment_flows come from GET /{project_id}/sales-projections/{projection_id}.
+    """
     # Verify project exists
     project = db.query(ScenarioProject).filter(ScenarioProject.id == project_id).first()
     if not project:
         raise HTTPException(status_code=404, detail="Proyecto no encontrado")
     
-    projections = get_sales_projections_by_project(db, project_id)
-    return [SalesProjection(**proj) for proj in projections]
+    return list_sales_projection_summaries(db, project_id)
+
+@router.post("/{project_id}/sales-projections/prune", response_model=SalesProjectionPruneResponse)
+def prune_project_simulation_projections(
+    project_id: int,
+    keep_latest: int = Query(SIMULATION_KEEP_LATEST, ge=0),
+    retention_days: int = Query(SIMULATION_RETENTION_DAYS, ge=0),
+    db: Session = Depends(get_db)
+):
+    """Borrar las proyecciones simuladas vencidas del proyecto (nunca la activa)"""
+    project = db.query(ScenarioProject).filter(ScenarioProject.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Proyecto no encontrado")
+    
+    try:
+        deleted_ids = prune_simulation_projections(db, project_id, keep_latest, retention_days)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error pruning sales projections of project {project_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error al depurar proyecciones: {str(e)}")
+    
+    for projection_id in deleted_ids:
+        delivery_schedules.invalidate(projection_id)
+    return {"deleted_ids": deleted_ids, "deleted_count": len(deleted_ids)}
 
 @router.get("/{project_id}/sales-projections/active", response_model=Optional[SalesProjectionWithImpact])
 def get_active_sales_projection(project_id: int, db: Session = Depends(get_db)):
     """
     Get the active sales projection for a project, including its impact summary and payment flows.
     """
-    # Import the model from models module
-    from ..models import SalesProjection as SalesProjectionModel
-    
-    projection = db.query(SalesProjectionModel).filter(
-        SalesProjectionModel.scenario_project_id == project_id,
-        SalesProjectionModel.is_active == True
-    ).first()
-
+    # payment_flows is stored column-wise; the CRUD layer unpacks it
+    return get_active_sales_projection_crud(db, project_id)
+
+@router.get("/{project_id}/sales-projections/{projection_id}", response_model=SalesProjection)
+def get_project_sales_projection(project_id: int, projection_id: int, db: Session = Depends(get_db)):
+    """Proyección de ventas completa, con monthly_revenue y payment_flows"""
+    projection = get_sales_projection(db, projection_id)
+    if not projection or projection["scenario_project_id"] != project_id:
+        raise HTTPException(status_code=404, detail="Proyección no encontrada")
     return projection
 
 @router.post("/{project_id}/sales-projections/{projection_id}/activate")
-async def activate_sales_projection(
+def activate_sales_projection(
     project_id: int,
     projection_id: int,
     db: Session = Depends(get_db)
@@ -4162,7 +4077,7 @@ async def activate_sales_projection(
     }
 
 @router.delete("/{project_id}/sales-projections/{projection_id}")
-async def delete_sales_projection_endpoint(
+def delete_sales_projection_endpoint(
     project_id: int,
     projection_id: int,
     db: Session = Depends(get_db)
@@ -4177,11 +4092,150 @@ async def delete_sales_projection_endpoint(
     if not success:
         raise HTTPException(status_code=404, detail="Proyección no encontrada")
     
+    invalidate_cash_flow_cache(db, project_id)
     db.commit()
+    delivery_schedules.invalidate(projection_id)
     return {"message": "Proyección eliminada exitosamente"}
 
+def sales_projection_cash_flow(project: ScenarioProject, active_projection: Dict[str, Any], db: Session):
+    """
+    Filas de flujo de caja por ventas (separación y entrega) de una proyección activa.
+    Retorna (filas, calendario de entregas).
+    """
+    project_id = project.id
+
+    # Delivery month of each unit, allocated once per projection
+    payment_flows = active_projection.get("payment_flows") or []
+    delivery = projection_delivery_schedule(db, project, active_projection)
+    monthly_delivery_count = delivery.monthly_counts(payment_flows, "delivery_amount")
+
+    enhanced_cash_flow = []
+    accumulated_flow = Decimal('0.0')
+
+    # No need to pre-calculate max months since we only process months with actual sales activity
+    
+    # Calculate separation and delivery revenues by month from payment flows
+    monthly_separation_revenue = {}
+    monthly_delivery_revenue = {}
+    monthly_units_sold = {}
+    monthly_unit_numbers = {}
+    
+    for flow, delivery_month in zip(payment_flows, delivery.months):
+        sale_month = flow.get("sale_month", 0)
+        # Use full customer payment amounts for sales revenue table
+        separation_amount = Decimal(str(flow.get("separation_amount", 0)))
+        delivery_amount = Decimal(str(flow.get("delivery_amount", 0)))
+        unit_number = flow.get("unit_number", "")
+        
+        # Track separation payment in sale month
+        if sale_month not in monthly_separation_revenue:
+            monthly_separation_revenue[sale_month] = Decimal('0.0')
+            monthly_units_sold[sale_month] = 0
+            monthly_unit_numbers[sale_month] = []
+        
+        monthly_separation_revenue[sale_month] += separation_amount
+        monthly_units_sold[sale_month] += 1
+        monthly_unit_numbers[sale_month].append(unit_number)
+        
+        # Track delivery payment in the allocated delivery month
+        if delivery_month not in monthly_delivery_revenue:
+            monthly_delivery_revenue[delivery_month] = Decimal('0.0')
+        
+        monthly_delivery_revenue[delivery_month] += delivery_amount
+    
+    # Create sales cash flow - only process months that have actual sales activity
+    all_activity_months = set(monthly_separation_revenue.keys()) | set(monthly_delivery_revenue.keys())
+    
+    for project_month in sorted(all_activity_months):
+        # Calculate year and month for this project month
+        if project.start_date:
+            start_date = project.start_date
+            target_date = date(start_date.year, start_date.month, 1)
+            # Add project_month - 1 months to start date
+            for _ in range(project_month - 1):
+                if target_date.month == 12:
+                    target_date = target_date.replace(year=target_date.year + 1, month=1)
+                else:
+                    target_date = target_date.replace(month=target_date.month + 1)
+            
+            year = target_date.year
+            month = target_date.month
+            period_label = f"{year}-{month:02d}"
+        else:
+            # Fallback if no start date
+            year = 2025 + (project_month - 1) // 12
+            month = ((project_month - 1) % 12) + 1
+            period_label = f"{year}-{month:02d}"
+        
+        # Get separation and delivery revenues for this month
+        separation_revenue = monthly_separation_revenue.get(project_month, Decimal('0.0'))
+        delivery_revenue = monthly_delivery_revenue.get(project_month, Decimal('0.0'))
+        
+        # Don't create a main combined row - only show specific separation and delivery rows
+        # This ensures clear separation between down payments and delivery payments
+        
+        # Add separate row for INGRESO POR SEPARACIÓN if there are separation revenues this month
+        if separation_revenue > 0:
+            # Update accumulated flow with separation revenue
+            accumulated_flow += separation_revenue
+            
+            separation_row = {
+                'id': f"separation_{project_month}",
+                'scenario_project_id': project_id,
+                'year': year,
+                'month': month,
+                'period_label': period_label,
+                'row_type': 'INGRESO_POR_SEPARACION',
+                'activity_name': 'INGRESO POR SEPARACIÓN',
+                'ingresos_ventas': separation_revenue,
+                'ingresos_otros': Decimal('0.0'),
+                'total_ingresos': separation_revenue,
+                'egresos_costos_duros': Decimal('0.0'),
+                'egresos_costos_blandos': Decimal('0.0'),
+                'egresos_gastos_operativos': Decimal('0.0'),
+                'egresos_gastos_financieros': Decimal('0.0'),
+                'total_egresos': Decimal('0.0'),
+                'flujo_neto': separation_revenue,
+                'flujo_acumulado': accumulated_flow,
+                'units_sold': monthly_units_sold.get(project_month, 0),
+                'unit_numbers': monthly_unit_numbers.get(project_month, []),
+                'units_delivered': 0
+            }
+            enhanced_cash_flow.append(separation_row)
+        
+        # Add separate row for INGRESO POR ENTREGA if there are delivery revenues this month
+        if delivery_revenue > 0:
+            # Update accumulated flow with delivery revenue
+            accumulated_flow += delivery_revenue
+            
+            delivery_row = {
+                'id': f"delivery_{project_month}",
+                'scenario_project_id': project_id,
+                'year': year,
+                'month': month,
+                'period_label': period_label,
+                'row_type': 'INGRESO_POR_ENTREGA',
+                'activity_name': 'INGRESO POR ENTREGA',
+                'ingresos_ventas': delivery_revenue,
+                'ingresos_otros': Decimal('0.0'),
+                'total_ingresos': delivery_revenue,
+                'egresos_costos_duros': Decimal('0.0'),
+                'egresos_costos_blandos': Decimal('0.0'),
+                'egresos_gastos_operativos': Decimal('0.0'),
+                'egresos_gastos_financieros': Decimal('0.0'),
+                'total_egresos': Decimal('0.0'),
+                'flujo_neto': delivery_revenue,
+                'flujo_acumulado': accumulated_flow,
+                'units_sold': 0,  # No new units sold during delivery
+                'unit_numbers': [],
+                'units_delivered': monthly_delivery_count.get(project_month, 0)
+            }
+            enhanced_cash_flow.append(delivery_row)
+
+    return enhanced_cash_flow, delivery
+
 @router.get("/{project_id}/cash-flow-with-projections", response_model=Dict[str, Any])
-async def get_project_cash_flow_with_sales_projections(
+def get_project_cash_flow_with_sales_projections(
     project_id: int,
     db: Session = Depends(get_db)
 ):
@@ -4196,7 +4250,7 @@ async def get_project_cash_flow_with_sales_projections(
             raise HTTPException(status_code=404, detail="Proyecto no encontrado")
     
         # Get the standard cash flow (list of SQLAlchemy model objects)
-        standard_cash_flow_models = await get_project_cash_flow(project_id, db)
+        standard_cash_flow_models = get_project_cash_flow(project_id, db)
     
         # Get active sales projection
         from ..crud_sales_projections import get_active_sales_projection as get_active_projection_crud
@@ -4210,207 +4264,7 @@ async def get_project_cash_flow_with_sales_projections(
                 "projection_data": None
             }
         
-        # Get unit delivery dates for accurate delivery timing first
-        unit_delivery_dates = {}
-        if project.start_date:
-            # Query actual units to get their delivery dates
-            units = db.query(ProjectUnit).filter(ProjectUnit.scenario_project_id == project_id).all()
-            for unit in units:
-                if unit.delivery_date and unit.unit_number:
-                    # Calculate delivery month relative to project start
-                    start_date = project.start_date
-                    delivery_date = unit.delivery_date
-                    months_diff = ((delivery_date.year - start_date.year) * 12) + (delivery_date.month - start_date.month) + 1
-                    unit_delivery_dates[unit.unit_number] = months_diff
-        
-        # Calculate delivery counts from payment flows using same logic as revenue calculation
-        payment_flows = active_projection.get("payment_flows", [])
-        monthly_delivery_count = {}
-        
-        for flow in payment_flows:
-            unit_number = flow.get("unit_number", "")
-            delivery_amount = flow.get("delivery_amount", 0)
-            sale_month = flow.get("sale_month", 0)
-            
-            # Only count units that have delivery revenue
-            if delivery_amount > 0:
-                # Use actual delivery dates if available, same logic as revenue calculation
-                delivery_month = unit_delivery_dates.get(unit_number)
-                if delivery_month is None:
-                    # Fallback: use project delivery period instead of arbitrary +12 months
-                    if project.delivery_start_date and project.delivery_end_date and project.start_date:
-                        delivery_start_month = ((project.delivery_start_date.year - project.start_date.year) * 12) + (project.delivery_start_date.month - project.start_date.month) + 1
-                        delivery_end_month = ((project.delivery_end_date.year - project.start_date.year) * 12) + (project.delivery_end_date.month - project.start_date.month) + 1
-                        
-                        # If sale is before delivery period, deliver at start of delivery period
-                        if sale_month < delivery_start_month:
-                            delivery_month = delivery_start_month
-                        # If sale is after delivery period, deliver immediately (late sale)
-                        elif sale_month > delivery_end_month:
-                            delivery_month = sale_month
-                        # If sale is during delivery period, distribute across delivery period
-                        else:
-                            # Distribute deliveries across the delivery period based on unit characteristics
-                            delivery_period_length = delivery_end_month - delivery_start_month + 1
-                            # Use unit_number hash to create consistent distribution
-                            unit_hash = hash(unit_number) if unit_number else hash(str(flow.get("unit_id", 0)))
-                            delivery_offset = abs(unit_hash) % delivery_period_length
-                            delivery_month = delivery_start_month + delivery_offset
-                    else:
-                        # Ultimate fallback if no delivery period defined
-                        delivery_month = sale_month + 12
-                
-                monthly_delivery_count[delivery_month] = monthly_delivery_count.get(delivery_month, 0) + 1
-
-        monthly_revenue = active_projection["monthly_revenue"]
-        payment_flows = active_projection.get("payment_flows", [])
-        enhanced_cash_flow = []
-        accumulated_flow = Decimal('0.0')
-
-        # No need to pre-calculate max months since we only process months with actual sales activity
-        
-        # Calculate separation and delivery revenues by month from payment flows
-        monthly_separation_revenue = {}
-        monthly_delivery_revenue = {}
-        monthly_units_sold = {}
-        monthly_unit_numbers = {}
-        
-        for flow in payment_flows:
-            sale_month = flow.get("sale_month", 0)
-            # Use full customer payment amounts for sales revenue table
-            separation_amount = Decimal(str(flow.get("separation_amount", 0)))
-            delivery_amount = Decimal(str(flow.get("delivery_amount", 0)))
-            unit_number = flow.get("unit_number", "")
-            
-            # Track separation payment in sale month
-            if sale_month not in monthly_separation_revenue:
-                monthly_separation_revenue[sale_month] = Decimal('0.0')
-                monthly_units_sold[sale_month] = 0
-                monthly_unit_numbers[sale_month] = []
-            
-            monthly_separation_revenue[sale_month] += separation_amount
-            monthly_units_sold[sale_month] += 1
-            monthly_unit_numbers[sale_month].append(unit_number)
-            
-            # Track delivery payment using actual delivery dates if available
-            delivery_month = unit_delivery_dates.get(unit_number)
-            if delivery_month is None:
-                # Fallback: use project delivery period instead of arbitrary +12 months
-                if project.delivery_start_date and project.delivery_end_date and project.start_date:
-                    delivery_start_month = ((project.delivery_start_date.year - project.start_date.year) * 12) + (project.delivery_start_date.month - project.start_date.month) + 1
-                    delivery_end_month = ((project.delivery_end_date.year - project.start_date.year) * 12) + (project.delivery_end_date.month - project.start_date.month) + 1
-                    
-                    # If sale is before delivery period, deliver at start of delivery period
-                    if sale_month < delivery_start_month:
-                        delivery_month = delivery_start_month
-                    # If sale is after delivery period, deliver immediately (late sale)
-                    elif sale_month > delivery_end_month:
-                        delivery_month = sale_month
-                    # If sale is during delivery period, distribute across delivery period
-                    else:
-                        # Distribute deliveries across the delivery period based on unit characteristics
-                        delivery_period_length = delivery_end_month - delivery_start_month + 1
-                        # Use unit_number hash to create consistent distribution
-                        unit_hash = hash(unit_number) if unit_number else hash(str(flow.get("unit_id", 0)))
-                        delivery_offset = abs(unit_hash) % delivery_period_length
-                        delivery_month = delivery_start_month + delivery_offset
-                else:
-                    # Ultimate fallback if no delivery period defined
-                    delivery_month = sale_month + 12
-            
-            if delivery_month not in monthly_delivery_revenue:
-                monthly_delivery_revenue[delivery_month] = Decimal('0.0')
-            
-            monthly_delivery_revenue[delivery_month] += delivery_amount
-        
-        # Create sales cash flow - only process months that have actual sales activity
-        all_activity_months = set(monthly_separation_revenue.keys()) | set(monthly_delivery_revenue.keys())
-        
-        for project_month in sorted(all_activity_months):
-            # Calculate year and month for this project month
-            if project.start_date:
-                start_date = project.start_date
-                target_date = date(start_date.year, start_date.month, 1)
-                # Add project_month - 1 months to start date
-                for _ in range(project_month - 1):
-                    if target_date.month == 12:
-                        target_date = target_date.replace(year=target_date.year + 1, month=1)
-                    else:
-                        target_date = target_date.replace(month=target_date.month + 1)
-                
-                year = target_date.year
-                month = target_date.month
-                period_label = f"{year}-{month:02d}"
-            else:
-                # Fallback if no start date
-                year = 2025 + (project_month - 1) // 12
-                month = ((project_month - 1) % 12) + 1
-                period_label = f"{year}-{month:02d}"
-            
-            # Get separation and delivery revenues for this month
-            separation_revenue = monthly_separation_revenue.get(project_month, Decimal('0.0'))
-            delivery_revenue = monthly_delivery_revenue.get(project_month, Decimal('0.0'))
-            
-            # Don't create a main combined row - only show specific separation and delivery rows
-            # This ensures clear separation between down payments and delivery payments
-            
-            # Add separate row for INGRESO POR SEPARACIÓN if there are separation revenues this month
-            if separation_revenue > 0:
-                # Update accumulated flow with separation revenue
-                accumulated_flow += separation_revenue
-                
-                separation_row = {
-                    'id': f"separation_{project_month}",
-                    'scenario_project_id': project_id,
-                    'year': year,
-                    'month': month,
-                    'period_label': period_label,
-                    'row_type': 'INGRESO_POR_SEPARACION',
-                    'activity_name': 'INGRESO POR SEPARACIÓN',
-                    'ingresos_ventas': separation_revenue,
-                    'ingresos_otros': Decimal('0.0'),
-                    'total_ingresos': separation_revenue,
-                    'egresos_costos_duros': Decimal('0.0'),
-                    'egresos_costos_blandos': Decimal('0.0'),
-                    'egresos_gastos_operativos': Decimal('0.0'),
-                    'egresos_gastos_financieros': Decimal('0.0'),
-                    'total_egresos': Decimal('0.0'),
-                    'flujo_neto': separation_revenue,
-                    'flujo_acumulado': accumulated_flow,
-                    'units_sold': monthly_units_sold.get(project_month, 0),
-                    'unit_numbers': monthly_unit_numbers.get(project_month, []),
-                    'units_delivered': 0
-                }
-                enhanced_cash_flow.append(separation_row)
-            
-            # Add separate row for INGRESO POR ENTREGA if there are delivery revenues this month
-            if delivery_revenue > 0:
-                # Update accumulated flow with delivery revenue
-                accumulated_flow += delivery_revenue
-                
-                delivery_row = {
-                    'id': f"delivery_{project_month}",
-                    'scenario_project_id': project_id,
-                    'year': year,
-                    'month': month,
-                    'period_label': period_label,
-                    'row_type': 'INGRESO_POR_ENTREGA',
-                    'activity_name': 'INGRESO POR ENTREGA',
-                    'ingresos_ventas': delivery_revenue,
-                    'ingresos_otros': Decimal('0.0'),
-                    'total_ingresos': delivery_revenue,
-                    'egresos_costos_duros': Decimal('0.0'),
-                    'egresos_costos_blandos': Decimal('0.0'),
-                    'egresos_gastos_operativos': Decimal('0.0'),
-                    'egresos_gastos_financieros': Decimal('0.0'),
-                    'total_egresos': Decimal('0.0'),
-                    'flujo_neto': delivery_revenue,
-                    'flujo_acumulado': accumulated_flow,
-                    'units_sold': 0,  # No new units sold during delivery
-                    'unit_numbers': [],
-                    'units_delivered': monthly_delivery_count.get(project_month, 0)
-                }
-                enhanced_cash_flow.append(delivery_row)
+        enhanced_cash_flow, _ = sales_projection_cash_flow(project, active_projection, db)
 
         return {
             "project_id": project_id,
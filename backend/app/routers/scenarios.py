@@ -41,7 +41,7 @@ router = APIRouter(
 # --- Scenario Projects CRUD ---
 
 @router.get("/projects", response_model=ScenarioProjectsListResponse)
-async def list_scenario_projects(
+def list_scenario_projects(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     status: Optional[str] = Query(None),
@@ -86,7 +86,7 @@ async def list_scenario_projects(
     return ScenarioProjectsListResponse(projects=project_summaries, total=total)
 
 @router.post("/projects", response_model=ScenarioProjectSchema)
-async def create_scenario_project(
+def create_scenario_project(
     project: ScenarioProjectCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -100,7 +100,7 @@ async def create_scenario_project(
     return db_project
 
 @router.get("/projects/{project_id}", response_model=ScenarioProjectWithDetails)
-async def get_scenario_project(
+def get_scenario_project(
     project_id: int, 
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -146,7 +146,7 @@ async def get_scenario_project(
     return project_data
 
 @router.put("/projects/{project_id}", response_model=ScenarioProjectSchema)
-async def update_scenario_project(
+def update_scenario_project(
     project_id: int,
     project_update: ScenarioProjectUpdate,
     db: Session = Depends(get_db),
@@ -167,7 +167,7 @@ async def update_scenario_project(
     return db_project
 
 @router.delete("/projects/{project_id}")
-async def delete_scenario_project(
+def delete_scenario_project(
     project_id: int, 
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -185,7 +185,7 @@ async def delete_scenario_project(
 # --- Project Units Endpoints ---
 
 @router.get("/projects/{project_id}/units", response_model=List[ProjectUnit])
-async def get_project_units(
+def get_project_units(
     project_id: int,
     skip: int = 0,
     limit: int = 100,
@@ -200,7 +200,7 @@ async def get_project_units(
     return units
 
 @router.post("/projects/{project_id}/units", response_model=ProjectUnit)
-async def create_project_unit(
+def create_project_unit(
     project_id: int,
     unit: ProjectUnitCreate,
     db: Session = Depends(get_db),
@@ -223,7 +223,7 @@ async def create_project_unit(
     return db_unit
 
 @router.get("/projects/{project_id}/units/stats", response_model=ProjectUnitsStats)
-async def get_project_units_stats(
+def get_project_units_stats(
     project_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -259,7 +259,7 @@ async def get_project_units_stats(
     )
 
 @router.get("/units/{unit_id}", response_model=ProjectUnit)
-async def get_project_unit(
+def get_project_unit(
     unit_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -271,7 +271,7 @@ async def get_project_unit(
     return unit
 
 @router.put("/units/{unit_id}", response_model=ProjectUnit)
-async def update_project_unit(
+def update_project_unit(
     unit_id: int,
     unit_update: ProjectUnitUpdate,
     db: Session = Depends(get_db),
@@ -292,7 +292,7 @@ async def update_project_unit(
     return db_unit
 
 @router.delete("/units/{unit_id}")
-async def delete_project_unit(
+def delete_project_unit(
     unit_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -308,7 +308,7 @@ async def delete_project_unit(
     return {"message": "Unidad eliminada exitosamente"}
 
 @router.post("/projects/{project_id}/units/bulk", response_model=List[ProjectUnit])
-async def create_bulk_project_units(
+def create_bulk_project_units(
     project_id: int,
     units_data: ProjectUnitsBulkCreate,
     db: Session = Depends(get_db),
@@ -358,7 +358,7 @@ async def create_bulk_project_units(
 # --- Unit Sales Simulation Endpoints ---
 
 @router.post("/projects/{project_id}/sales-simulations", response_model=UnitSalesSimulation)
-async def create_unit_sales_simulation(
+def create_unit_sales_simulation(
     project_id: int,
     simulation: UnitSalesSimulationCreate,
     db: Session = Depends(get_db),
@@ -381,7 +381,7 @@ async def create_unit_sales_simulation(
     return db_simulation
 
 @router.get("/projects/{project_id}/sales-simulations", response_model=List[UnitSalesSimulation])
-async def get_project_sales_simulations(
+def get_project_sales_simulations(
     project_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -394,7 +394,7 @@ async def get_project_sales_simulations(
     return simulations
 
 @router.get("/sales-simulations/{simulation_id}", response_model=UnitSalesSimulation)
-async def get_sales_simulation(
+def get_sales_simulation(
     simulation_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -406,7 +406,7 @@ async def get_sales_simulation(
     return simulation
 
 @router.put("/sales-simulations/{simulation_id}", response_model=UnitSalesSimulation)
-async def update_sales_simulation(
+def update_sales_simulation(
     simulation_id: int,
     simulation_update: UnitSalesSimulationUpdate,
     db: Session = Depends(get_db),
@@ -427,7 +427,7 @@ async def update_sales_simulation(
     return db_simulation
 
 @router.post("/sales-simulations/{simulation_id}/calculate", response_model=UnitSalesSimulation)
-async def calculate_sales_simulation_metrics(
+def calculate_sales_simulation_metrics(
     simulation_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -4,6 +4,8 @@ from sqlalchemy import text
 from typing import List, Dict, Any, Optional
 import re
 from .. import auth
+from .. import marketing_budget as budget
+from ..schema_catalog import get_schema_catalog, invalidate_schema_catalog
 from datetime import datetime, date, timedelta
 from dateutil.relativedelta import relativedelta
 from pydantic import BaseModel, Field
@@ -45,8 +47,15 @@ def format_table_name(name: str) -> str:
     name = name.strip('_')
     return name
 
+def budget_table(db: Session, table_name: str):
+    """(proyecto, categoria) if table_name is a category of a marketing budget, else None"""
+    parsed = budget.parse_budget_table_name(table_name)
+    if parsed and parsed[1] in budget.project_categories(db, parsed[0]):
+        return parsed
+    return None
+
 @router.post("/create")
-async def create_table(
+def create_table(
     project_name: str,
     db: Session = Depends(auth.get_db)
 ):
@@ -70,100 +79,15 @@ async def create_table(
                 detail="El nombre del proyecto debe contener al menos un carácter válido"
             )
         
-        # Define all the table names for this project
-        table_names = [
-            f"presupuesto_mercadeo_{project_name}_casa_modelo",
-            f"presupuesto_mercadeo_{project_name}_ferias_eventos",
-            f"presupuesto_mercadeo_{project_name}_gastos_casa_modelo",
-            f"presupuesto_mercadeo_{project_name}_gastos_publicitarios",
-            f"presupuesto_mercadeo_{project_name}_gastos_tramites",
-            f"presupuesto_mercadeo_{project_name}_promociones_y_bonos",
-            f"presupuesto_mercadeo_{project_name}_redes_sociales"
-        ]
-        
-        existing_tables = db.execute(
-            text("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public' 
-            AND table_name = ANY(:table_names)
-            """),
-            {"table_names": table_names}
-        ).fetchall()
-        
-        if existing_tables:
-            existing_names = ", ".join([t[0] for t in existing_tables])
+        if budget.project_has_budget(db, project_name):
+            existing_names = ", ".join(budget.list_budget_tables(db, project_name))
             raise HTTPException(
                 status_code=400,
                 detail=f"Ya existen tablas con estos nombres: {existing_names}"
             )
         
-        # Create all tables
-        for table in table_names:
-            db.execute(
-                text(f"""
-                CREATE TABLE {table} (
-                    id SERIAL PRIMARY KEY,
-                    categoria VARCHAR(255) NOT NULL,
-                    actividad VARCHAR(255) NOT NULL,
-                    enero NUMERIC(15, 2) DEFAULT 0,
-                    febrero NUMERIC(15, 2) DEFAULT 0,
-                    marzo NUMERIC(15, 2) DEFAULT 0,
-                    abril NUMERIC(15, 2) DEFAULT 0,
-                    mayo NUMERIC(15, 2) DEFAULT 0,
-                    junio NUMERIC(15, 2) DEFAULT 0,
-                    julio NUMERIC(15, 2) DEFAULT 0,
-                    agosto NUMERIC(15, 2) DEFAULT 0,
-                    septiembre NUMERIC(15, 2) DEFAULT 0,
-                    octubre NUMERIC(15, 2) DEFAULT 0,
-                    noviembre NUMERIC(15, 2) DEFAULT 0,
-                    diciembre NUMERIC(15, 2) DEFAULT 0,
-                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-                )""")
-            )
-            
-            # Create a view for each table
-            db.execute(
-                text(f"""
-                CREATE OR REPLACE VIEW v_{table}_consolidado AS
-                SELECT 
-                    categoria,
-                    actividad,
-                    COALESCE(enero, 0) AS enero,
-                    COALESCE(febrero, 0) AS febrero,
-                    COALESCE(marzo, 0) AS marzo,
-                    COALESCE(abril, 0) AS abril,
-                    COALESCE(mayo, 0) AS mayo,
-                    COALESCE(junio, 0) AS junio,
-                    COALESCE(julio, 0) AS julio,
-                    COALESCE(agosto, 0) AS agosto,
-                    COALESCE(septiembre, 0) AS septiembre,
-                    COALESCE(octubre, 0) AS octubre,
-                    COALESCE(noviembre, 0) AS noviembre,
-                    COALESCE(diciembre, 0) AS diciembre
-                FROM {table}
-                """)
-            )
-        
-        # Create a consolidated view
-        db.execute(
-            text(f"""
-            CREATE OR REPLACE VIEW v_presupuesto_mercadeo_{project_name}_consolidado AS
-            SELECT * FROM v_presupuesto_mercadeo_{project_name}_gastos_publicitarios_consolidado
-            UNION ALL
-            SELECT * FROM v_presupuesto_mercadeo_{project_name}_gastos_casa_modelo_consolidado
-            UNION ALL
-            SELECT * FROM v_presupuesto_mercadeo_{project_name}_ferias_eventos_consolidado
-            UNION ALL
-            SELECT * FROM v_presupuesto_mercadeo_{project_name}_redes_sociales_consolidado
-            UNION ALL
-            SELECT * FROM v_presupuesto_mercadeo_{project_name}_promociones_bonos_consolidado
-            UNION ALL
-            SELECT * FROM v_presupuesto_mercadeo_{project_name}_gastos_tramites_consolidado
-            """)
-        )
-        
+        # The budget categories are rows of the budget store, no DDL per project
+        table_names = budget.seed_project_budget(db, project_name)
         db.commit()
         
         return {
@@ -185,7 +109,7 @@ async def create_table(
         )
 
 @router.get("/list")
-async def list_tables(db: Session = Depends(auth.get_db)):
+def list_tables(db: Session = Depends(auth.get_db)):
     """
     List all relevant raw table names for project discovery on the frontend.
     """
@@ -193,22 +117,12 @@ async def list_tables(db: Session = Depends(auth.get_db)):
         # Get all tables that might be part of a project structure
         # This includes tables created by the new system (presupuesto_mercadeo_KEYWORD_suffix)
         # and potentially older patterns if still relevant.
-        result = db.execute(
-            text("""
-            SELECT table_name 
-            FROM information_schema.tables 
-            WHERE table_schema = 'public'
-            AND (
-                table_name LIKE 'proyecto_%' OR
-                table_name LIKE 'presupuesto_mercadeo_%' 
-            )
-            ORDER BY table_name;
-            """)
-        ).fetchall()
+        # Marketing budgets (presupuesto_mercadeo_KEYWORD_suffix) come from the budget store;
+        # legacy month-name tables not migrated to it are still listed from the catalog.
+        schema = get_schema_catalog(db)
+        catalog_tables = schema.tables_like('proyecto_%') + schema.tables_like('presupuesto_mercadeo_%')
         
-        print(f"[LIST_TABLES_DEBUG] Raw query result (fetchall): {result}") # ADDED DEBUG
-        
-        tables = [row[0] for row in result] # Extract table names from result
+        tables = sorted(set(catalog_tables) | set(budget.list_budget_tables(db)))
         print(f"[LIST_TABLES_DEBUG] Processed tables list: {tables}") # ADDED DEBUG
         
         return {"tables": tables} # Return as a dictionary with a "tables" key
@@ -221,7 +135,7 @@ async def list_tables(db: Session = Depends(auth.get_db)):
         )
 
 @router.get("/{table_name}/data")
-async def get_table_data(
+def get_table_data(
     table_name: str, 
     planned_month: str | None = None,
     db: Session = Depends(auth.get_db)
@@ -235,33 +149,17 @@ async def get_table_data(
         if not re.match(r"^[a-zA-Z0-9_]+$", table_name):
             raise HTTPException(status_code=400, detail="Invalid table name format.")
 
-        # Check if table/view exists
-        table_exists_query = text(
-            "SELECT EXISTS ("
-            "    SELECT 1"
-            "    FROM information_schema.tables"
-            "    WHERE table_schema = 'public'"
-            "    AND (table_name = :table_name OR table_name = :view_name)"
-            ")"
-        )
-        table_exists = db.execute(
-            table_exists_query, 
-            {"table_name": table_name, "view_name": table_name.lower()}
-        ).scalar()
+        budget_category = budget_table(db, table_name)
+        if budget_category:
+            return budget.raw_table(db, *budget_category)
 
-        if not table_exists:
+        # Check if table/view exists
+        schema = get_schema_catalog(db)
+        if not (schema.has_relation(table_name) or schema.has_relation(table_name.lower())):
             raise HTTPException(status_code=404, detail=f"Table/View '{table_name}' not found in public schema.")
 
         # Get columns
-        columns_query_sql = (
-            "SELECT column_name "
-            "FROM information_schema.columns "
-            "WHERE table_schema = 'public' "
-            "AND table_name = :table_name "
-            "ORDER BY ordinal_position"
-        )
-        columns_result = db.execute(text(columns_query_sql), {"table_name": table_name.lower()}).fetchall()
-        columns = [col[0] for col in columns_result]
+        columns = schema.columns(table_name.lower())
 
         # Build the query
         if table_name == "inversion_mercadeo" and planned_month:
@@ -299,7 +197,7 @@ async def get_table_data(
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred while fetching data for table '{table_name}'. Error: {str(e)}")
 
 @router.post("/{table_name}/rows", status_code=201)
-async def add_table_row(
+def add_table_row(
     table_name: str,
     row_data: Dict[str, Any],
     db: Session = Depends(auth.get_db)
@@ -311,18 +209,21 @@ async def add_table_row(
         if not re.match(r"^[a-zA-Z0-9_]+$", table_name):
             raise HTTPException(status_code=400, detail="Invalid table name format.")
 
-        table_exists_query = text(
-            "SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_schema = 'public' AND table_name = :table_name)"
-        )
-        if not db.execute(table_exists_query, {"table_name": table_name}).scalar():
+        budget_category = budget_table(db, table_name)
+        if budget_category:
+            concepto, values = budget.split_line_values(row_data)
+            if not concepto:
+                raise HTTPException(status_code=400, detail="No valid data provided for insertion. 'concepto' is required.")
+            line = budget.add_line(db, *budget_category, concepto, values)
+            db.commit()
+            amounts = budget.line_amounts(db, line)
+            return {"message": "Row added successfully", "data": budget.line_to_raw_row(line, amounts, sorted(amounts))}
+
+        schema = get_schema_catalog(db)
+        if not schema.has_table(table_name):
             raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found.")
 
-        columns_query_sql = (
-            "SELECT column_name FROM information_schema.columns "
-            "WHERE table_schema = 'public' AND table_name = :table_name ORDER BY ordinal_position"
-        )
-        db_columns_result = db.execute(text(columns_query_sql), {"table_name": table_name}).fetchall()
-        db_columns = [row[0] for row in db_columns_result]
+        db_columns = schema.columns(table_name)
         print(f"[ADD_ROW_DEBUG] Actual DB columns found for '{table_name}': {db_columns}") 
 
         if not db_columns:
@@ -355,10 +256,7 @@ async def add_table_row(
             data_to_insert['updated_at'] = datetime.utcnow()
         # Only set created_at if it doesn't have a DB default for 'created_at'
         if 'created_at' in db_columns:
-            created_at_default_check = db.execute(
-                text("SELECT column_default FROM information_schema.columns WHERE table_schema = 'public' AND table_name = :table_name AND column_name = 'created_at'"),
-                {"table_name": table_name}
-            ).scalar()
+            created_at_default_check = schema.column(table_name, 'created_at').default
             if created_at_default_check is None: # No DB default for created_at
                 print(f"[ADD_ROW_DEBUG] Setting 'created_at' as no DB default found.")
                 data_to_insert['created_at'] = datetime.utcnow()
@@ -418,7 +316,7 @@ async def add_table_row(
         raise HTTPException(status_code=500, detail=f"Error al agregar fila: {str(e)}")
 
 @router.put("/{table_name}/rows/{row_id}")
-async def update_table_row(
+def update_table_row(
     table_name: str,
     row_id: int,
     data: Dict[str, Any],
@@ -428,15 +326,24 @@ async def update_table_row(
         if not re.match(r"^[a-zA-Z0-9_]+$", table_name): # Basic validation for table_name
             raise HTTPException(status_code=400, detail="Invalid table name format.")
 
+        budget_category = budget_table(db, table_name)
+        if budget_category:
+            line = budget.get_line(db, *budget_category, row_id)
+            if line is None:
+                raise HTTPException(status_code=404, detail=f"Row with id {row_id} not found in table '{table_name}'.")
+            if not budget.update_line(db, line, data):
+                raise HTTPException(status_code=400, detail="No valid data provided for update or data keys do not match table columns.")
+            db.commit()
+            amounts = budget.line_amounts(db, line)
+            return {"message": "Row updated successfully", "data": budget.line_to_raw_row(line, amounts, sorted(amounts))}
+
         # Check if table exists
-        table_exists_query = text("SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_schema = 'public' AND table_name = :table_name)")
-        if not db.execute(table_exists_query, {"table_name": table_name}).scalar():
+        schema = get_schema_catalog(db)
+        if not schema.has_table(table_name):
             raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found.")
 
         # Fetch column names for the table
-        columns_query = text("SELECT column_name FROM information_schema.columns WHERE table_schema = 'public' AND table_name = :table_name")
-        db_columns_result = db.execute(columns_query, {"table_name": table_name}).fetchall()
-        db_columns = [row[0] for row in db_columns_result]
+        db_columns = schema.columns(table_name)
 
         if not db_columns:
              raise HTTPException(status_code=404, detail=f"No columns found for table '{table_name}'. Cannot update.")
@@ -487,7 +394,7 @@ async def update_table_row(
         raise HTTPException(status_code=500, detail=f"Error al actualizar fila: {str(e)}")
 
 @router.delete("/{table_name}/rows/{row_id}")
-async def delete_table_row(
+def delete_table_row(
     table_name: str, 
     row_id: int, 
     db: Session = Depends(auth.get_db)
@@ -500,6 +407,15 @@ async def delete_table_row(
         raise HTTPException(status_code=400, detail=f"Invalid table name format: {table_name}")
 
     try:
+        budget_category = budget_table(db, table_name)
+        if budget_category:
+            line = budget.get_line(db, *budget_category, row_id)
+            if line is None:
+                raise HTTPException(status_code=404, detail=f"Row with ID {row_id} not found in table {table_name}")
+            budget.delete_line(db, line)
+            db.commit()
+            return {"message": f"Row with ID {row_id} deleted successfully from table {table_name}"}
+
         # Check if the row exists
         # Assuming the primary key column is named 'id'. 
         # If it can be different, this logic needs to be more dynamic.
@@ -522,7 +438,7 @@ async def delete_table_row(
         raise HTTPException(status_code=500, detail=f"Error deleting row: {str(e)}")
 
 @router.delete("/{table_name}")
-async def delete_table(
+def delete_table(
     table_name: str,
     db: Session = Depends(auth.get_db)
 ):
@@ -532,18 +448,21 @@ async def delete_table(
     try:
         print(f"Starting deletion of table: {table_name}")
         
+        budget_category = budget_table(db, table_name)
+        if budget_category:
+            budget.delete_project_budget(db, *budget_category)
+            # Drop the legacy wide table too if it is still around
+            db.execute(text(f'DROP TABLE IF EXISTS \"{table_name}\" CASCADE'))
+            db.commit()
+            invalidate_schema_catalog()
+            return {
+                "success": True,
+                "message": f"Table {table_name} and its associated views have been deleted"
+            }
+        
         # First verify the table exists
-        table_exists = db.execute(
-            text("""
-            SELECT EXISTS (
-                SELECT 1 
-                FROM information_schema.tables 
-                WHERE table_schema = 'public' 
-                AND table_name = :table_name
-            )
-            """),
-            {"table_name": table_name}
-        ).scalar()
+        schema = get_schema_catalog(db)
+        table_exists = schema.has_table(table_name)
         
         print(f"Table {table_name} exists: {table_exists}")
         
@@ -555,21 +474,12 @@ async def delete_table(
         
         # Find and drop all views that reference this table
         print("Looking for views that reference this table...")
-        views = db.execute(
-            text("""
-            SELECT table_name 
-            FROM information_schema.views 
-            WHERE table_schema = 'public'
-            AND definition LIKE :table_pattern
-            """),
-            {"table_pattern": f"%{table_name}%"}
-        ).fetchall()
+        views = schema.views_referencing(table_name)
         
         print(f"Found {len(views)} views that reference this table")
         
         # Drop all related views first
-        for view in views:
-            view_name = view[0]
+        for view_name in views:
             try:
                 print(f"Dropping view: {view_name}")
                 db.execute(text(f'DROP VIEW IF EXISTS \"{view_name}\" CASCADE'))
@@ -585,6 +495,7 @@ async def delete_table(
             print(f"Dropping table: {table_name}")
             db.execute(text(f'DROP TABLE IF EXISTS \"{table_name}\" CASCADE'))
             db.commit()
+            invalidate_schema_catalog()
             print(f"Successfully dropped table: {table_name}")
             
             return {
@@ -619,7 +530,7 @@ ALLOWED_MONTH_COLUMNS = [
 ]
 
 @router.get("/{table_name}/sum/{month_column_name}")
-async def get_table_column_sum(
+def get_table_column_sum(
     table_name: str,
     month_column_name: str,
     db: Session = Depends(auth.get_db)
@@ -635,42 +546,17 @@ async def get_table_column_sum(
 
     try:
         # Check if the table exists
-        table_exists_query = text(
-            "SELECT EXISTS ("
-            "    SELECT 1"
-            "    FROM information_schema.tables"
-            "    WHERE table_schema = 'public'"
-            "    AND table_name = :table_name"
-            ")"
-        )
-        table_exists = db.execute(table_exists_query, {"table_name": table_name}).scalar()
-        # print(f"[SUM_DEBUG] Table '{table_name}' exists: {table_exists}") # Removed
-        if not table_exists:
-            # raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found (debug check).") # Reverted
+        schema = get_schema_catalog(db)
+        if not schema.has_table(table_name):
             raise HTTPException(status_code=404, detail=f"Table '{table_name}' not found.")
 
         # Check if the column exists in the table and is numeric
-        column_check_query = text(
-            # "SELECT column_name, data_type " # Reverted
-            "SELECT data_type "
-            "FROM information_schema.columns "
-            "WHERE table_schema = 'public' "
-            "AND table_name = :table_name "
-            "AND column_name = :column_name"
-        )
         target_column_name = month_column_name.lower()
-        # column_info_result = db.execute(column_check_query, {"table_name": table_name, "column_name": target_column_name}).fetchone() # Reverted
-        column_info = db.execute(column_check_query, {"table_name": table_name, "column_name": target_column_name}).fetchone()
-        
-        # print(f"[SUM_DEBUG] Column info for '{target_column_name}' in '{table_name}': {column_info_result}") # Removed
-
-        # if not column_info_result: # Reverted
+        column_info = schema.column(table_name, target_column_name)
         if not column_info:
-            # raise HTTPException(status_code=404, detail=f"[DEBUG] Column '{target_column_name}' (queried as lowercase) not found in table '{table_name}'.") # Reverted
             raise HTTPException(status_code=404, detail=f"Column '{target_column_name}' not found in table '{table_name}'.")
         
-        # column_db_name, column_data_type = column_info_result # Reverted
-        column_data_type = column_info[0]
+        column_data_type = column_info.data_type or ""
 
         if not any(numeric_type in column_data_type.lower() for numeric_type in ["numeric", "decimal", "integer", "bigint", "smallint", "real", "double precision"]):
             # raise HTTPException(status_code=400, detail=f"Column '{target_column_name}' is not of a summable numeric type (type: {column_data_type}).") # Reverted
@@ -688,7 +574,7 @@ async def get_table_column_sum(
         raise HTTPException(status_code=500, detail=f"Error calculating sum: {str(e)}")
 
 @router.get("/inversion_mercadeo/current_month_sum")
-async def get_inversion_mercadeo_current_month_sum(
+def get_inversion_mercadeo_current_month_sum(
     db: Session = Depends(auth.get_db)
 ):
     """Calculate the sum of 'monto' from 'inversion_mercadeo' for the current month based on 'created_at'."""
@@ -727,7 +613,7 @@ async def get_inversion_mercadeo_current_month_sum(
         raise HTTPException(status_code=500, detail=f"Error calculating sum for current month: {str(e)}")
 
 @router.post("/marketing_proyectos", response_model=MarketingProyecto, status_code=201)
-async def create_marketing_proyecto(
+def create_marketing_proyecto(
     marketing_proyecto_data: MarketingProyectoCreate, # Changed from MarketingProyecto
     db: Session = Depends(auth.get_db)
 ):
@@ -782,7 +668,7 @@ async def create_marketing_proyecto(
         )
 
 @router.get("/marketing_proyectos", response_model=List[MarketingProyecto])
-async def list_marketing_proyectos(db: Session = Depends(auth.get_db)):
+def list_marketing_proyectos(db: Session = Depends(auth.get_db)):
     try:
         # Check if the marketing_proyectos table exists, create if not
         try:
@@ -810,7 +696,7 @@ async def list_marketing_proyectos(db: Session = Depends(auth.get_db)):
         raise HTTPException(status_code=500, detail=f"Error al listar los proyectos de marketing: {str(e)}")
 
 @router.delete("/marketing_proyectos/{proyecto_id}", status_code=200)
-async def delete_marketing_proyecto(
+def delete_marketing_proyecto(
     proyecto_id: int,
     db: Session = Depends(auth.get_db)
 ):
@@ -860,7 +746,7 @@ async def delete_marketing_proyecto(
 
 # Marketing Summary View Endpoints
 @router.get("/marketing-summary-view/{view_name}")
-async def get_marketing_summary_view(
+def get_marketing_summary_view(
     view_name: str,
     db: Session = Depends(auth.get_db)
 ):
@@ -868,33 +754,12 @@ async def get_marketing_summary_view(
     Get data from marketing summary views (chepo, tanara, consolidado)
     """
     try:
-        # Map view names to actual database view names
-        view_mapping = {
-            "vista_presupuesto_mercadeo_chepo_resumen": "vista_presupuesto_mercadeo_chepo_resumen",
-            "vista_presupuesto_mercadeo_tanara_resumen": "vista_presupuesto_mercadeo_tanara_resumen",
-            "consolidado": "vista_presupuesto_mercadeo_consolidado"
-        }
-        
-        if view_name not in view_mapping:
-            raise HTTPException(
-                status_code=404,
-                detail=f"View '{view_name}' not found. Available views: {list(view_mapping.keys())}"
-            )
-        
-        actual_view_name = view_mapping[view_name]
-        
-        # Execute the query
-        result = db.execute(text(f"SELECT * FROM {actual_view_name}"))
-        rows = result.fetchall()
-        
-        if not rows:
-            return []
-        
-        # Convert to list of dictionaries
-        columns = result.keys()
-        data = [dict(zip(columns, row)) for row in rows]
-        
-        return data
+        proyecto = summary_view_project(view_name)
+        periods = budget.rolling_periods()
+        if view_name == "consolidado":
+            data = consolidated_summary_row(db, periods, budget.amount_column)
+            return [data] if data else []
+        return budget.project_summary_rows(db, periods, proyecto)
         
     except HTTPException:
         raise
@@ -905,59 +770,45 @@ async def get_marketing_summary_view(
             detail=f"Error fetching marketing summary view: {str(e)}"
         )
 
+SUMMARY_VIEW_RE = re.compile(r"^vista_presupuesto_mercadeo_([a-z0-9_]+)_resumen$")
+
+def summary_view_project(view_name: str) -> Optional[str]:
+    """Project keyword of a vista_presupuesto_mercadeo_<proyecto>_resumen view; None for 'consolidado'"""
+    if view_name == "consolidado":
+        return None
+    match = SUMMARY_VIEW_RE.match(view_name)
+    if not match:
+        raise HTTPException(
+            status_code=404,
+            detail=f"View '{view_name}' not found. Available views: consolidado, vista_presupuesto_mercadeo_<proyecto>_resumen"
+        )
+    return match.group(1)
+
+def consolidated_summary_row(db: Session, periods, key) -> Optional[Dict[str, Any]]:
+    """Total row of every project budget over the rolling window"""
+    rows = budget.project_summary_rows(db, periods, None, key)
+    if not rows:
+        return None
+    data = {"categoria": "TOTAL"}
+    for period in [key(periodo) for periodo in periods]:
+        data[period] = sum(row[period] for row in rows)
+    data["total"] = sum(row["total"] for row in rows)
+    return data
+
 # Add a separate router for marketing-summary-view endpoints
 marketing_router = APIRouter(prefix="/api/marketing-summary-view", tags=["marketing-summary"])
 
 @marketing_router.get("/consolidado")
-async def get_marketing_consolidado(db: Session = Depends(auth.get_db)):
+def get_marketing_consolidado(db: Session = Depends(auth.get_db)):
     """
-    Get consolidated marketing data from vista_presupuesto_mercadeo_consolidado
+    Get consolidated marketing data of every project budget
+    (3 months before current + 36 months forward)
     """
     try:
-        result = db.execute(text("SELECT * FROM vista_presupuesto_mercadeo_consolidado"))
-        row = result.fetchone()
-        
-        if not row:
+        dynamic_data = consolidated_summary_row(db, budget.rolling_periods(), budget.period_key)
+        if not dynamic_data:
             return []
         
-        # Convert to dict for JSON response
-        columns = result.keys()
-        data = dict(zip(columns, row))
-        
-        # Generate dynamic periods: 3 months before current + 36 months forward
-        from datetime import datetime, timedelta
-        import calendar
-        
-        now = datetime.now()
-        current_year = now.year
-        current_month = now.month
-        
-        # Calculate start date (3 months before current)
-        start_date = datetime(current_year, current_month, 1) - timedelta(days=90)
-        start_date = start_date.replace(day=1)  # First day of that month
-        
-        # Generate 39 months (3 before + current + 35 forward)
-        dynamic_data = {"categoria": data.get("categoria", "TOTAL")}
-        total_sum = 0
-        
-        current_date = start_date
-        for i in range(39):
-            month_key = f"{current_date.year}_{current_date.month:02d}"
-            db_key = f"amount_{current_date.year}_{current_date.month:02d}"
-            
-            # Get value from database if it exists, otherwise 0
-            value = data.get(db_key, 0) if db_key in data else 0
-            dynamic_data[month_key] = value
-            total_sum += float(value) if value else 0
-            
-            # Move to next month
-            if current_date.month == 12:
-                current_date = current_date.replace(year=current_date.year + 1, month=1)
-            else:
-                current_date = current_date.replace(month=current_date.month + 1)
-        
-        dynamic_data["total"] = total_sum
-        
         return [dynamic_data]  # Return as array since frontend expects an array
         
     except Exception as e:
@@ -968,7 +819,7 @@ async def get_marketing_consolidado(db: Session = Depends(auth.get_db)):
         )
 
 @marketing_router.get("/{view_name}")
-async def get_marketing_view_data(
+def get_marketing_view_data(
     view_name: str,
     db: Session = Depends(auth.get_db)
 ):
@@ -976,68 +827,12 @@ async def get_marketing_view_data(
     Get data from specific marketing summary views with dynamic periods
     """
     try:
-        # Map view names to actual database view names
-        view_mapping = {
-            "vista_presupuesto_mercadeo_chepo_resumen": "vista_presupuesto_mercadeo_chepo_resumen",
-            "vista_presupuesto_mercadeo_tanara_resumen": "vista_presupuesto_mercadeo_tanara_resumen"
-        }
+        proyecto = summary_view_project(view_name)
+        if proyecto is None:
+            raise HTTPException(status_code=404, detail=f"View '{view_name}' not found.")
         
-        if view_name not in view_mapping:
-            raise HTTPException(
-                status_code=404,
-                detail=f"View '{view_name}' not found. Available views: {list(view_mapping.keys())}"
-            )
-        
-        actual_view_name = view_mapping[view_name]
-        
-        # Execute the query
-        result = db.execute(text(f"SELECT * FROM {actual_view_name}"))
-        rows = result.fetchall()
-        
-        if not rows:
-            return []
-        
-        # Convert to list of dictionaries
-        columns = result.keys()
-        raw_data = [dict(zip(columns, row)) for row in rows]
-        
-        # Transform each row to dynamic periods
-        from datetime import datetime, timedelta
-        
-        now = datetime.now()
-        current_year = now.year
-        current_month = now.month
-        
-        # Calculate start date (3 months before current)
-        start_date = datetime(current_year, current_month, 1) - timedelta(days=90)
-        start_date = start_date.replace(day=1)  # First day of that month
-        
-        transformed_data = []
-        for row in raw_data:
-            # Generate 39 months (3 before + current + 35 forward)
-            dynamic_row = {"categoria": row.get("categoria", "")}
-            total_sum = 0
-            
-            current_date = start_date
-            for i in range(39):
-                month_key = f"{current_date.year}_{current_date.month:02d}"
-                db_key = f"amount_{current_date.year}_{current_date.month:02d}"
-                
-                # Get value from database if it exists, otherwise 0
-                value = row.get(db_key, 0) if db_key in row else 0
-                dynamic_row[month_key] = value
-                total_sum += float(value) if value else 0
-                
-                # Move to next month
-                if current_date.month == 12:
-                    current_date = current_date.replace(year=current_date.year + 1, month=1)
-                else:
-                    current_date = current_date.replace(month=current_date.month + 1)
-            
-            dynamic_row["total"] = total_sum
-            transformed_data.append(dynamic_row)
-        
-        return transformed_data
+        # One row per category, 3 months before current + 36 months forward
+        return budget.project_summary_rows(db, budget.rolling_periods(), proyecto, budget.period_key)
         
     except HTTPException:
         raise
@@ -1049,84 +844,14 @@ async def get_marketing_view_data(
         )
 
 @marketing_router.get("/consolidated-cash-flow")
-async def get_consolidated_cash_flow(db: Session = Depends(auth.get_db)):
+def get_consolidated_cash_flow(db: Session = Depends(auth.get_db)):
     """
-    Get consolidated cash flow data from all 'presupuesto_mercadeo_...' tables
+    Get consolidated cash flow data of every marketing budget
     with dynamic period selection.
     """
     try:
-        # Get all marketing budget tables
-        tables_result = db.execute(text(
-            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' AND table_name LIKE 'presupuesto_mercadeo_%'"
-        )).fetchall()
-        marketing_tables = [t[0] for t in tables_result]
-        print(f"[DEBUG] Found marketing tables: {marketing_tables}")
-
-        # Generate dynamic period columns (3 months before current + 36 forward)
-        now = datetime.now()
-        months = []
-        for i in range(-3, 36):
-            month_date = now + timedelta(days=i * 30) # Approximate
-            month_date = datetime(now.year, now.month, 1) + relativedelta(months=i)
-            months.append(f"amount_{month_date.year}_{month_date.month:02d}")
-        
-        select_cols_str = ", ".join(months)
-        print(f"[DEBUG] Dynamic period columns (3 months before current + 36 forward): {months}")
-
-        # Aggregate data from all marketing tables
-        consolidated_data = {}
-        for table in marketing_tables:
-            # Check which column exists in the current table
-            db_cols_result = db.execute(text("SELECT column_name FROM information_schema.columns WHERE table_name = :table"), {"table": table}).fetchall()
-            db_cols = [c[0].lower() for c in db_cols_result]
-
-            description_col = None
-            if "concepto" in db_cols:
-                description_col = '"CONCEPTO"'
-            elif "actividad" in db_cols:
-                description_col = '"actividad"'
-
-            if not description_col:
-                print(f'[WARNING] Skipping table {table} because it has neither "CONCEPTO" nor "actividad" column.')
-                continue
-
-            # Build and execute the query for the current table
-            query_sql = f'SELECT {description_col}, {select_cols_str} FROM "{table}"'
-            
-            try:
-                table_result = db.execute(text(query_sql)).fetchall()
-                
-                for row in table_result:
-                    actividad = row[0]
-                    if actividad not in consolidated_data:
-                        consolidated_data[actividad] = {month: 0 for month in months}
-                    
-                    for i, month in enumerate(months):
-                        consolidated_data[actividad][month] += float(row[i+1]) if row[i+1] is not None else 0
-            
-            except Exception as e:
-                print(f"[WARNING] Error processing table {table}: {e}")
-                db.rollback() # Rollback the single failed transaction to allow others to proceed
-                continue
-
-        # Convert to list of dictionaries for frontend
-        response_data = []
-        total_row = {"actividad": "TOTAL"}
-        for month in months:
-            total_row[month] = 0
-
-        for actividad, data in consolidated_data.items():
-            row_data = {"actividad": actividad, **data}
-            response_data.append(row_data)
-            for month in months:
-                total_row[month] += data[month]
-        
-        response_data.append(total_row)
-        
-        return {
-            "data": response_data,
-            "columns": ["actividad"] + months
-        }
+        # 3 months before current + 36 forward
+        return budget.consolidated_with_total(db, budget.rolling_periods(), budget.amount_column)
 
     except Exception as e:
         import traceback
@@ -1135,4 +860,3 @@ async def get_consolidated_cash_flow(db: Session = Depends(auth.get_db)):
             status_code=500,
             detail=f"Error fetching consolidated cash flow data: {str(e)}"
         )
-
@@ -149,7 +149,7 @@ def calculate_measurement(measurement_type: str, coordinates: List[dict], scale_
 # === ENDPOINTS ===
 
 @router.get("/projects/{project_id}/takeoffs", response_model=List[TakeoffSchema])
-async def list_project_takeoffs(
+def list_project_takeoffs(
     project_id: int,
     discipline: Optional[str] = None,
     measurement_type: Optional[str] = None,
@@ -172,7 +172,7 @@ async def list_project_takeoffs(
     return takeoffs
 
 @router.post("/projects/{project_id}/takeoffs", response_model=TakeoffSchema)
-async def create_takeoff(
+def create_takeoff(
     project_id: int,
     takeoff: TakeoffCreate,
     db: Session = Depends(get_db)
@@ -210,7 +210,7 @@ async def create_takeoff(
     return db_takeoff
 
 @router.put("/takeoffs/{takeoff_id}", response_model=TakeoffSchema)
-async def update_takeoff(
+def update_takeoff(
     takeoff_id: int,
     takeoff_update: TakeoffUpdate,
     db: Session = Depends(get_db)
@@ -236,7 +236,7 @@ async def update_takeoff(
     return takeoff
 
 @router.delete("/takeoffs/{takeoff_id}")
-async def delete_takeoff(takeoff_id: int, db: Session = Depends(get_db)):
+def delete_takeoff(takeoff_id: int, db: Session = Depends(get_db)):
     """Delete a takeoff"""
     takeoff = db.query(ProjectTakeoff).filter(
         ProjectTakeoff.id == takeoff_id
@@ -274,7 +274,7 @@ async def calculate_measurement_endpoint(
         raise HTTPException(status_code=400, detail=f"Measurement calculation failed: {str(e)}")
 
 @router.post("/takeoffs-to-quote")
-async def convert_takeoffs_to_quote_lines(
+def convert_takeoffs_to_quote_lines(
     request: TakeoffToQuoteRequest,
     db: Session = Depends(get_db)
 ):
@@ -356,7 +356,7 @@ async def convert_takeoffs_to_quote_lines(
     }
 
 @router.post("/projects/{project_id}/upload-plan")
-async def upload_plan(
+def upload_plan(
     project_id: int,
     file: UploadFile = File(...),
     plan_name: str = Form(...),
@@ -382,7 +382,7 @@ async def upload_plan(
     
     try:
         # Read file content
-        content = await file.read()
+        content = file.file.read()
         file_size = len(content)
         
         # For demo purposes, we'll store basic info
@@ -6,6 +6,8 @@ from typing import List, Optional, Dict, Any
 from ..auth import get_db # Only get_db is needed now
 # from ..models import User # User model no longer used here
 from .. import crud, schemas, models # Added crud, schemas, models imports
+from .. import marketing_budget
+from ..schema_catalog import get_schema_catalog, invalidate_schema_catalog
 from datetime import datetime, timedelta
 from dateutil.relativedelta import relativedelta # For easy month manipulation
 import calendar # To get month names
@@ -33,7 +35,7 @@ class VentasCashflowProjectionResponse(schemas.BaseModel):
 
 
 @router.get("/cashflow-projection", response_model=VentasCashflowProjectionResponse)
-async def get_ventas_cashflow_projection(db: Session = Depends(get_db)):
+def get_ventas_cashflow_projection(db: Session = Depends(get_db)):
     # 1. Date Calculation (3 months before current + 36 months forward = 39 months total)
     # This matches the dynamic period format used in other cash flow tables
     month_headers = []
@@ -68,16 +70,10 @@ async def get_ventas_cashflow_projection(db: Session = Depends(get_db)):
     try:
         # Get all commission template data
         # First check what columns actually exist in the template table
-        check_columns_query = """
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name = 'plantilla_comisiones_template' 
-        AND column_name LIKE 'amount_%'
-        ORDER BY column_name
-        """
-        
-        columns_result = db.execute(text(check_columns_query))
-        existing_columns = [row[0] for row in columns_result.fetchall()]
+        existing_columns = [
+            col for col in get_schema_catalog(db).columns('plantilla_comisiones_template')
+            if col.startswith('amount_')
+        ]
         
         # Filter period_columns to only include existing columns
         valid_period_columns = [col for col in period_columns if col in existing_columns]
@@ -207,7 +203,7 @@ async def get_ventas_cashflow_projection(db: Session = Depends(get_db)):
     )
 
 @router.post("/refresh-comisiones-view", status_code=status.HTTP_200_OK)
-async def refresh_sales_commissions_view(
+def refresh_sales_commissions_view(
     db: Session = Depends(get_db)
     # current_user: User = Depends(get_current_user) # Temporarily removed for testing
 ):
@@ -235,36 +231,24 @@ async def refresh_sales_commissions_view(
         )
 
 @router.get("/consolidated/cash-flow")
-async def get_consolidated_ventas_cash_flow(db: Session = Depends(get_db)):
+def get_consolidated_ventas_cash_flow(db: Session = Depends(get_db)):
     """
     Get consolidated sales commission cash flow data with dynamic periods.
     Returns data in the same format as marketing consolidated endpoint.
     """
     try:
-        # Calculate dynamic periods: 3 months before current + 36 months forward
-        # But limit to the actual table structure (March 2024 to May 2027)
-        current_date = datetime.now()
-        start_period = current_date - relativedelta(months=3)
-        
-        # Ensure we don't go before March 2024 or after May 2027
-        table_start = datetime(2024, 3, 1)
-        table_end = datetime(2027, 5, 1)
+        # Same rolling window as the marketing budget: 3 months before current + 36 months forward.
+        # Months the template has no column for are reported as 0.
+        periods = marketing_budget.rolling_periods()
+        period_columns = [marketing_budget.amount_column(periodo) for periodo in periods]
         
-        if start_period < table_start:
-            start_period = table_start
-        
-        # Calculate 39 periods from March 2024 to May 2027
-        period_columns = []
-        current_period = table_start
-        
-        while current_period <= table_end:
-            period_str = f"amount_{current_period.year}_{current_period.month:02d}"
-            period_columns.append(period_str)
-            current_period += relativedelta(months=1)
+        template_columns = set(get_schema_catalog(db).columns('plantilla_comisiones_template'))
+        existing_columns = [col for col in period_columns if col in template_columns]
+        select_columns = ", ".join(["concepto as actividad"] + existing_columns)
         
         # Get commission data from the new template table
         commission_query = f"""
-        SELECT concepto as actividad, {', '.join(period_columns)}
+        SELECT {select_columns}
         FROM plantilla_comisiones_template
         ORDER BY concepto
         """
@@ -281,10 +265,9 @@ async def get_consolidated_ventas_cash_flow(db: Session = Depends(get_db)):
             # Create months dictionary with proper formatting
             months = {}
             for col in period_columns:
-                if col in row_dict:
-                    # Extract year and month from column name
-                    year_month = col.replace('amount_', '')
-                    months[year_month] = float(row_dict[col] or 0)
+                # Extract year and month from column name
+                year_month = col.replace('amount_', '')
+                months[year_month] = float(row_dict.get(col) or 0)
             
             data.append({
                 "concepto": actividad,  # Still use 'concepto' for frontend compatibility
@@ -632,7 +615,7 @@ def delete_comision_record(comision_id: int, db: Session = Depends(get_db)):
         )
 
 @router.post("/migrate-to-dynamic-v2", status_code=status.HTTP_200_OK)
-async def migrate_plantilla_comisiones_to_dynamic_v2(db: Session = Depends(get_db)):
+def migrate_plantilla_comisiones_to_dynamic_v2(db: Session = Depends(get_db)):
     """
     Migrate plantilla_comisiones_ventas table to dynamic period format.
     This creates a new table and then swaps them.
@@ -742,6 +725,7 @@ async def migrate_plantilla_comisiones_to_dynamic_v2(db: Session = Depends(get_d
         db.execute(text("CREATE INDEX idx_plantilla_comisiones_actividad ON plantilla_comisiones_ventas(actividad)"))
         db.execute(text("CREATE INDEX idx_plantilla_comisiones_created_at ON plantilla_comisiones_ventas(created_at)"))
         db.commit()
+        invalidate_schema_catalog()
         
         # Verify the migration
         result = db.execute(text("SELECT actividad, amount_2025_06 FROM plantilla_comisiones_ventas ORDER BY actividad"))
@@ -764,7 +748,7 @@ async def migrate_plantilla_comisiones_to_dynamic_v2(db: Session = Depends(get_d
         )
 
 @router.get("/check-table-structure", status_code=status.HTTP_200_OK)
-async def check_plantilla_comisiones_structure(db: Session = Depends(get_db)):
+def check_plantilla_comisiones_structure(db: Session = Depends(get_db)):
     """
     Check the current structure of plantilla_comisiones_ventas table.
     """
@@ -796,20 +780,14 @@ async def check_plantilla_comisiones_structure(db: Session = Depends(get_db)):
         }
 
 @router.post("/create-commission-template", status_code=status.HTTP_200_OK)
-async def create_commission_template_table(db: Session = Depends(get_db)):
+def create_commission_template_table(db: Session = Depends(get_db)):
     """
     Create the commission template table with dynamic period structure.
     This creates a new table specifically for commission templates.
     """
     try:
         # Check if table already exists
-        check_result = db.execute(text("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'plantilla_comisiones_template'
-            )
-        """))
-        table_exists = check_result.scalar()
+        table_exists = get_schema_catalog(db).has_table('plantilla_comisiones_template')
         
         if table_exists:
             return {"message": "Commission template table already exists", "status": "already_exists"}
@@ -899,6 +877,7 @@ async def create_commission_template_table(db: Session = Depends(get_db)):
         db.execute(text("CREATE INDEX idx_plantilla_comisiones_template_actividad ON plantilla_comisiones_template(actividad)"))
         db.execute(text("CREATE INDEX idx_plantilla_comisiones_template_created_at ON plantilla_comisiones_template(created_at)"))
         db.commit()
+        invalidate_schema_catalog()
         
         # Verify the creation
         result = db.execute(text("SELECT actividad, amount_2025_06 FROM plantilla_comisiones_template ORDER BY actividad"))
@@ -922,7 +901,7 @@ async def create_commission_template_table(db: Session = Depends(get_db)):
         )
 
 @router.get("/commission-template/", status_code=status.HTTP_200_OK)
-async def get_commission_template_data(db: Session = Depends(get_db)):
+def get_commission_template_data(db: Session = Depends(get_db)):
     """
     Get all commission template data with dynamic periods.
     Always 3 months before current + 36 months forward = 39 months total.
@@ -943,16 +922,10 @@ async def get_commission_template_data(db: Session = Depends(get_db)):
         
         # Get commission data - only select columns that exist in the table
         # First, get the table structure to see which columns exist
-        table_columns_query = """
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name = 'plantilla_comisiones_template' 
-        AND column_name LIKE 'amount_%'
-        ORDER BY column_name
-        """
-        
-        table_result = db.execute(text(table_columns_query))
-        existing_columns = [row[0] for row in table_result.fetchall()]
+        existing_columns = [
+            col for col in get_schema_catalog(db).columns('plantilla_comisiones_template')
+            if col.startswith('amount_')
+        ]
         
         # Filter period_columns to only include existing columns
         valid_period_columns = [col for col in period_columns if col in existing_columns]
@@ -996,7 +969,7 @@ async def get_commission_template_data(db: Session = Depends(get_db)):
         )
 
 @router.post("/commission-template/", status_code=status.HTTP_201_CREATED)
-async def create_commission_template_row(
+def create_commission_template_row(
     concepto: str,
     db: Session = Depends(get_db)
 ):
@@ -1032,7 +1005,7 @@ async def create_commission_template_row(
         )
 
 @router.put("/commission-template/{row_id}", status_code=status.HTTP_200_OK)
-async def update_commission_template_row(
+def update_commission_template_row(
     row_id: int,
     updates: dict,
     db: Session = Depends(get_db)
@@ -1090,7 +1063,7 @@ async def update_commission_template_row(
         )
 
 @router.delete("/commission-template/{row_id}", status_code=status.HTTP_200_OK)
-async def delete_commission_template_row(
+def delete_commission_template_row(
     row_id: int,
     db: Session = Depends(get_db)
 ):
@@ -1125,7 +1098,7 @@ async def delete_commission_template_row(
         )
 
 @router.get("/comisiones-data", status_code=status.HTTP_200_OK)
-async def get_comisiones_data(
+def get_comisiones_data(
     salespersonId: Optional[str] = Query(None, description="Filter by salesperson ID"),
     db: Session = Depends(get_db)
 ):
@@ -0,0 +1,197 @@
+"""
+Process-wide cache of the public schema catalog.
+
+Endpoints that work on dynamic tables (legacy budget tables, the commission
+template, summary views) used to query information_schema on every request,
+often once per table inside a loop. The catalog loads the table names,
+columns and views in two queries and keeps them in memory.
+
+Each gunicorn worker has its own copy, so a DDL statement run by one worker
+has to be noticed by the others. Before serving a snapshot the catalog reads
+a version of the schema from pg_class: the number of relations in the
+schema and the sum of their row versions (xmin). CREATE/DROP/ALTER TABLE and
+CREATE/DROP VIEW all change it. The check is a single indexed aggregate over
+pg_class, much cheaper than the information_schema queries it replaces. The
+DDL paths of the app also call invalidate_schema_catalog() so the worker
+that ran the DDL reloads without waiting for the version to differ.
+"""
+
+import logging
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = "public"
+
+_VERSION_SQL = text("""
+    SELECT count(*), COALESCE(sum(c.xmin::text::bigint), 0)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = :schema AND c.relkind IN ('r', 'p', 'v', 'm')
+""")
+
+_RELATIONS_SQL = text("""
+    SELECT t.table_name, t.table_type, v.view_definition
+    FROM information_schema.tables t
+    LEFT JOIN information_schema.views v
+        ON v.table_schema = t.table_schema AND v.table_name = t.table_name
+    WHERE t.table_schema = :schema
+""")
+
+_COLUMNS_SQL = text("""
+    SELECT table_name, column_name, data_type, column_default
+    FROM information_schema.columns
+    WHERE table_schema = :schema
+    ORDER BY table_name, ordinal_position
+""")
+
+
+class ColumnInfo:
+    """Columna de una tabla o vista del catálogo"""
+
+    __slots__ = ("name", "data_type", "default")
+
+    def __init__(self, name: str, data_type: Optional[str], default: Optional[str]):
+        self.name = name
+        self.data_type = data_type
+        self.default = default
+
+
+def _like_regex(pattern: str):
+    """Patrón SQL LIKE (% y _) -> regex"""
+    parts = []
+    for char in pattern:
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("^" + "".join(parts) + "$", re.DOTALL)
+
+
+class CatalogSnapshot:
+    """Tablas, vistas y columnas del esquema en un momento dado (inmutable)"""
+
+    def __init__(
+        self,
+        version: Optional[Tuple[int, int]],
+        tables: Iterable[str],
+        views: Dict[str, Optional[str]],
+        columns: Dict[str, List[ColumnInfo]],
+    ):
+        self.version = version
+        self.tables = frozenset(tables)
+        self.views = dict(views)
+        self._columns = columns
+
+    def has_table(self, name: str) -> bool:
+        return name in self.tables
+
+    def has_view(self, name: str) -> bool:
+        return name in self.views
+
+    def has_relation(self, name: str) -> bool:
+        return name in self.tables or name in self.views
+
+    def columns(self, name: str) -> List[str]:
+        """Nombres de columna en orden (lista vacía si la relación no existe)"""
+        return [column.name for column in self._columns.get(name, ())]
+
+    def column(self, name: str, column_name: str) -> Optional[ColumnInfo]:
+        for column in self._columns.get(name, ()):
+            if column.name == column_name:
+                return column
+        return None
+
+    def tables_like(self, pattern: str) -> List[str]:
+        regex = _like_regex(pattern)
+        return sorted(name for name in self.tables if regex.match(name))
+
+    def views_like(self, pattern: str) -> List[str]:
+        regex = _like_regex(pattern)
+        return sorted(name for name in self.views if regex.match(name))
+
+    def views_referencing(self, name: str) -> List[str]:
+        """Vistas cuya definición menciona la relación"""
+        return sorted(view for view, definition in self.views.items() if definition and name in definition)
+
+
+class SchemaCatalog:
+    """Caché del catálogo con verificación de versión en pg_class"""
+
+    def __init__(self, schema: str = SCHEMA):
+        self.schema = schema
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def _is_postgres(self, db: Session) -> bool:
+        return db.get_bind().dialect.name == "postgresql"
+
+    def _version(self, db: Session) -> Optional[Tuple[int, int]]:
+        if not self._is_postgres(db):
+            return None
+        count, xmin_sum = db.execute(_VERSION_SQL, {"schema": self.schema}).one()
+        return int(count), int(xmin_sum)
+
+    def _load(self, db: Session, version: Optional[Tuple[int, int]]) -> CatalogSnapshot:
+        tables, views, columns = [], {}, {}
+        if self._is_postgres(db):
+            for name, table_type, definition in db.execute(_RELATIONS_SQL, {"schema": self.schema}):
+                if table_type == "VIEW":
+                    views[name] = definition
+                else:
+                    tables.append(name)
+            for table_name, column_name, data_type, default in db.execute(_COLUMNS_SQL, {"schema": self.schema}):
+                columns.setdefault(table_name, []).append(ColumnInfo(column_name, data_type, default))
+        else:
+            inspector = inspect(db.get_bind())
+            tables = inspector.get_table_names()
+            views = {name: inspector.get_view_definition(name) for name in inspector.get_view_names()}
+            for name in list(tables) + list(views):
+                columns[name] = [
+                    ColumnInfo(column["name"], str(column["type"]).lower(), column.get("default"))
+                    for column in inspector.get_columns(name)
+                ]
+        logger.info(f"Schema catalog loaded: {len(tables)} tables, {len(views)} views")
+        return CatalogSnapshot(version, tables, views, columns)
+
+    def get(self, db: Session) -> CatalogSnapshot:
+        """Snapshot vigente; se recarga si fue invalidado o si cambió la versión del esquema"""
+        version = self._version(db)
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or self._stale or snapshot.version != version:
+                self._stale = False
+                snapshot = self._snapshot = self._load(db, version)
+        return snapshot
+
+    def refresh(self, db: Session) -> CatalogSnapshot:
+        """Cargar el catálogo de inmediato (arranque del worker)"""
+        self.invalidate()
+        return self.get(db)
+
+    def invalidate(self) -> None:
+        self._stale = True
+
+
+catalog = SchemaCatalog()
+
+
+def get_schema_catalog(db: Session) -> CatalogSnapshot:
+    """Snapshot del catálogo del esquema public"""
+    return catalog.get(db)
+
+
+def invalidate_schema_catalog() -> None:
+    """Marcar el catálogo como desactualizado tras un DDL; los demás workers lo detectan por la versión"""
+    catalog.invalidate()
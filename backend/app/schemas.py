@@ -1401,6 +1401,7 @@ class ScenarioProjectBase(BaseModel):
     inflation_rate: float = 0.03
     contingency_percentage: float = 0.10
     payment_distribution_config: Optional['PaymentDistributionConfig'] = None
+    use_stage_costs: bool = False
 
 class ScenarioProjectCreate(ScenarioProjectBase):
     created_by: Optional[str] = None
@@ -1423,6 +1424,7 @@ class ScenarioProjectUpdate(BaseModel):
     inflation_rate: Optional[float] = None
     contingency_percentage: Optional[float] = None
     payment_distribution_config: Optional['PaymentDistributionConfig'] = None
+    use_stage_costs: Optional[bool] = None
 
 class ScenarioProject(ScenarioProjectBase):
     id: int
@@ -1542,6 +1544,7 @@ class ScenarioProjectSummary(BaseModel):
 class ScenarioProjectsListResponse(BaseModel):
     projects: List[ScenarioProjectSummary]
     total: int
+    next_cursor: Optional[int] = None  # Id para pedir la siguiente página con ?cursor=
 
 # Financial calculation request/response schemas
 class FinancialCalculationRequest(BaseModel):
@@ -1549,6 +1552,10 @@ class FinancialCalculationRequest(BaseModel):
     recalculate_cash_flow: bool = True
     recalculate_metrics: bool = True
 
+class CashFlowBatchRecalculateRequest(BaseModel):
+    """Proyectos cuyos flujos de caja se recalculan y persisten juntos"""
+    project_ids: List[int]
+
 class FinancialCalculationResponse(BaseModel):
     success: bool
     message: str
@@ -1563,6 +1570,13 @@ class SensitivityAnalysisRequest(BaseModel):
     max_variation_pct: Optional[Decimal] = Decimal('30.00')
     steps: Optional[int] = 13
 
+class SensitivityTornadoRequest(BaseModel):
+    """Request para analizar varias variables a la vez; vacío analiza todas"""
+    variable_types: List[str] = []
+    min_variation_pct: Optional[Decimal] = Decimal('-30.00')
+    max_variation_pct: Optional[Decimal] = Decimal('30.00')
+    steps: Optional[int] = 13
+
 # Sales Simulation Schemas
 class SalesScenarioConfig(BaseModel):
     """Configuración de un escenario de ventas"""
@@ -1727,6 +1741,12 @@ class UnitSalesSimulationRequest(BaseModel):
     realistic_scenario: UnitSalesScenarioConfig
     conservative_scenario: UnitSalesScenarioConfig
     payment_distribution: Optional[PaymentDistributionConfig] = None
+    seed: Optional[int] = None  # Semilla del sorteo de hipotecas; por defecto el id del proyecto
+    save_projections: bool = False  # Guardar los escenarios como proyecciones en la misma llamada
+
+class UnitSalesMonteCarloRequest(UnitSalesSimulationRequest):
+    """Request para la simulación Monte Carlo del sorteo de hipotecas"""
+    draws: int = Field(2000, ge=1, le=20000)
 
 class UnitSalesScenarioMetrics(BaseModel):
     """Métricas calculadas para un escenario de ventas por unidades"""
@@ -1753,6 +1773,14 @@ class UnitSalesSimulationResponse(BaseModel):
     units_summary: Dict[str, Any]  # Resumen de unidades por escenario
     payment_flows: List[UnitSalesPaymentFlow]  # Detalle de flujos de pago por unidad
 
+class UnitSalesMonteCarloResponse(BaseModel):
+    """Bandas P10/P50/P90 por escenario de la simulación Monte Carlo"""
+    success: bool
+    message: str
+    draws: int
+    seed: Optional[int] = None
+    scenarios: List[Dict[str, Any]]
+
 # Esta clase se mueve después de ProjectUnit
 
 
@@ -1882,6 +1910,7 @@ class ProjectStageBase(BaseModel):
     dependencies: Optional[List[int]] = None
     
     estimated_cost: Optional[Decimal] = None
+    cost_profile: str = "LINEAR"  # LINEAR, S_CURVE, FRONT_LOADED
     required_personnel: Optional[Dict[str, Any]] = None
     required_equipment: Optional[List[str]] = None
     
@@ -1920,6 +1949,7 @@ class ProjectStageUpdate(BaseModel):
     
     estimated_cost: Optional[Decimal] = None
     actual_cost: Optional[Decimal] = None
+    cost_profile: Optional[str] = None
     required_personnel: Optional[Dict[str, Any]] = None
     required_equipment: Optional[List[str]] = None
     
@@ -2128,6 +2158,19 @@ class SalesProjection(SalesProjectionBase):
     class Config:
         from_attributes = True
 
+class SalesProjectionSummary(BaseModel):
+    """Proyección de ventas sin monthly_revenue ni payment_flows (listados)"""
+    id: int
+    scenario_project_id: int
+    scenario_name: str
+    is_active: bool
+    created_at: datetime
+    impact_summary: Optional[Dict[str, Any]] = None  # total_revenue, total_units, project_duration_months
+
+class SalesProjectionPruneResponse(BaseModel):
+    deleted_ids: List[int]
+    deleted_count: int
+
 class SalesProjectionWithImpact(SalesProjection):
     """Sales projection with calculated cash flow impact"""
     cash_flow_impact: List[Dict[str, Any]] = []
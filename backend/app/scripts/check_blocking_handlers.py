@@ -0,0 +1,105 @@
+"""
+Lint: no synchronous database or pandas work inside coroutine handlers.
+
+An ``async def`` handler runs on the event loop, so a Session query, a
+commit or a pandas parse inside it blocks every other request of the
+worker. Handlers that need the database are plain ``def`` (FastAPI runs
+them in the thread pool, see app/concurrency.py); coroutines that must do
+blocking work wrap it in run_blocking().
+
+Usage (from backend/):
+    python -m app.scripts.check_blocking_handlers [paths...]
+
+Exits with status 1 and prints file:line for every violation.
+"""
+
+import ast
+import sys
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+ROUTERS_DIR = Path(__file__).resolve().parent.parent / "routers"
+
+# Names whose use inside a coroutine means blocking I/O or CPU work
+BLOCKING_NAMES = {"SessionLocal", "engine", "pd", "pandas", "openpyxl"}
+# Session methods that hit the database
+SESSION_METHODS = {
+    "query", "execute", "scalar", "scalars", "get", "add", "add_all", "delete",
+    "merge", "flush", "commit", "rollback", "refresh", "bulk_save_objects",
+    "bulk_insert_mappings", "bulk_update_mappings",
+}
+OFFLOAD_CALLS = {"run_blocking", "run_in_threadpool", "run_sync", "to_thread"}
+
+
+def _call_name(node: ast.Call) -> str:
+    func = node.func
+    if isinstance(func, ast.Attribute):
+        return func.attr
+    if isinstance(func, ast.Name):
+        return func.id
+    return ""
+
+
+def _session_params(fn: ast.AsyncFunctionDef) -> List[str]:
+    """Parámetros que reciben una Session (anotación Session o Depends(get_db))"""
+    args = fn.args.args + fn.args.kwonlyargs
+    defaults = [None] * (len(fn.args.args) - len(fn.args.defaults)) + list(fn.args.defaults) + list(fn.args.kw_defaults)
+    params = []
+    for arg, default in zip(args, defaults):
+        annotation = ast.unparse(arg.annotation) if arg.annotation is not None else ""
+        default_src = ast.unparse(default) if default is not None else ""
+        if annotation.endswith("Session") or "get_db" in default_src:
+            params.append(arg.arg)
+    return params
+
+
+def _walk_own_body(fn: ast.AsyncFunctionDef) -> Iterator[ast.AST]:
+    """Nodos del cuerpo sin entrar en funciones anidadas ni en llamadas a run_blocking"""
+    stack = list(ast.iter_child_nodes(fn))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)):
+            continue
+        if isinstance(node, ast.Call) and _call_name(node) in OFFLOAD_CALLS:
+            continue
+        yield node
+        stack.extend(ast.iter_child_nodes(node))
+
+
+def check_source(source: str, filename: str) -> List[Tuple[str, int, str]]:
+    """Violaciones (archivo, línea, mensaje) de un módulo"""
+    violations = []
+    for fn in ast.walk(ast.parse(source, filename)):
+        if not isinstance(fn, ast.AsyncFunctionDef):
+            continue
+        sessions = set(_session_params(fn))
+        found = []
+        for node in _walk_own_body(fn):
+            if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+                target = node.func.value
+                if isinstance(target, ast.Name) and target.id in sessions and node.func.attr in SESSION_METHODS:
+                    found.append((filename, node.lineno, f"{fn.name}: {target.id}.{node.func.attr}() in async def"))
+            elif isinstance(node, ast.Name) and node.id in BLOCKING_NAMES:
+                found.append((filename, node.lineno, f"{fn.name}: {node.id} used in async def"))
+        if sessions and not found:
+            # The session is still used synchronously by whatever the handler calls
+            found.append((filename, fn.lineno, f"{fn.name}: async def receives a Session ({', '.join(sorted(sessions))})"))
+        violations.extend(found)
+    return violations
+
+
+def main(argv: List[str]) -> int:
+    paths = [Path(arg) for arg in argv] or sorted(ROUTERS_DIR.glob("*.py"))
+    violations = []
+    for path in paths:
+        violations.extend(check_source(path.read_text(encoding="utf-8"), str(path)))
+    for filename, lineno, message in sorted(violations):
+        print(f"{filename}:{lineno}: {message}")
+    if violations:
+        print(f"{len(violations)} blocking call(s) in coroutine handlers; use def or run_blocking()")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,354 @@
+"""
+In-memory sensitivity analysis engine for scenario projects.
+
+The project, its active cost items, units and credit line usages are loaded
+once into a picklable snapshot. Every step of every variable is then evaluated
+from that snapshot with no database access, serially for small grids and
+across a process pool for large ones. The pool is created once per worker
+process and shared by every request, so concurrent analyses queue on at most
+SENSITIVITY_MAX_WORKERS processes instead of each forking its own pool.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .cost_schedule import build_cost_schedule
+from .financing_ledger import load_credit_line_ledger
+from .irr import irr_batch_annualized, monthly_irr_annualized
+from .models import ScenarioCostItem, ScenarioProject, ProjectUnit
+from .stage_cost_phasing import load_stage_cost_phasing
+
+logger = logging.getLogger(__name__)
+
+SENSITIVITY_VARIABLES = ("PRICE_PER_M2", "UNIT_SIZE", "TOTAL_UNITS", "DISCOUNT_RATE")
+
+# Grids with at least this many evaluations are fanned out to a process pool
+PARALLEL_MIN_EVALUATIONS = int(os.getenv("SENSITIVITY_PARALLEL_MIN_EVALUATIONS", "200"))
+MAX_WORKERS = int(os.getenv("SENSITIVITY_MAX_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Project fields copied into the snapshot
+_PROJECT_FIELDS = (
+    'id', 'name', 'start_date', 'end_date', 'delivery_start_date', 'delivery_end_date',
+    'total_area_m2', 'buildable_area_m2', 'total_units', 'avg_unit_size_m2',
+    'target_price_per_m2', 'discount_rate',
+)
+_COST_ITEM_FIELDS = (
+    'id', 'categoria', 'subcategoria', 'partida_costo', 'base_costo',
+    'monto_proyectado', 'unit_cost', 'quantity', 'start_month', 'duration_months',
+)
+
+
+class ProjectSnapshot:
+    """Datos planos de un proyecto, suficientes para recalcular su flujo de caja"""
+
+    def __init__(
+        self,
+        project: SimpleNamespace,
+        cost_items: List[SimpleNamespace],
+        periods: List[str],
+        sales_revenue: List[float],
+        financing_inflow: List[float],
+        financing_interest: List[float],
+        units_target_total: Optional[float],
+        stage_costs: Optional[List[float]] = None,
+    ):
+        self.project = project
+        self.cost_items = cost_items
+        self.periods = periods
+        self.sales_revenue = np.array(sales_revenue, dtype=float)
+        self.financing_inflow = np.array(financing_inflow, dtype=float)
+        self.financing_interest = np.array(financing_interest, dtype=float)
+        self.units_target_total = units_target_total
+
+        # Items whose cost depends on project area or unit count are recomputed per
+        # variation; everything else is scheduled once.
+        self.variable_cost_items = [item for item in cost_items if _depends_on_project_size(item)]
+        fixed_items = [item for item in cost_items if not _depends_on_project_size(item)]
+        self.fixed_costs = _schedule_totals(fixed_items, len(periods), project)
+        # Stage costs do not depend on the varied project size either
+        if stage_costs is not None:
+            self.fixed_costs = self.fixed_costs + np.array(stage_costs, dtype=float)
+
+
+def _depends_on_project_size(item) -> bool:
+    base_costo = item.base_costo or ""
+    return bool(item.unit_cost) and ("por m²" in base_costo or "por unidad" in base_costo)
+
+
+def _schedule_totals(cost_items: List[Any], total_months: int, project) -> np.ndarray:
+    schedule = build_cost_schedule(cost_items, total_months, project)
+    return np.array([float(schedule.monthly_costs(m)["total"]) for m in range(total_months)], dtype=float)
+
+
+def _month_periods(start_date: date, end_date: date) -> List[str]:
+    """Períodos YYYY-MM desde start_date hasta end_date, igual que calculate_cash_flows"""
+    if not start_date or not end_date or start_date > end_date:
+        return []
+    total_months = ((end_date.year - start_date.year) * 12) + (end_date.month - start_date.month) + 1
+    periods = []
+    year, month = start_date.year, start_date.month
+    for _ in range(total_months):
+        periods.append(f"{year}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return periods
+
+
+def snapshot_project(db: Session, project: ScenarioProject) -> ProjectSnapshot:
+    """Cargar el proyecto y sus datos relacionados una sola vez"""
+    project_data = SimpleNamespace(**{field: getattr(project, field) for field in _PROJECT_FIELDS})
+
+    cost_items = db.query(ScenarioCostItem).filter(
+        ScenarioCostItem.scenario_project_id == project.id,
+        ScenarioCostItem.is_active == True
+    ).all()
+    cost_items_data = [
+        SimpleNamespace(**{field: getattr(item, field) for field in _COST_ITEM_FIELDS})
+        for item in cost_items
+    ]
+
+    units = db.query(ProjectUnit).filter(ProjectUnit.scenario_project_id == project.id).all()
+
+    effective_end_date = project.delivery_end_date or project.end_date
+    periods = _month_periods(project.start_date, effective_end_date)
+    period_index = {period: idx for idx, period in enumerate(periods)}
+
+    sales_revenue = [0.0] * len(periods)
+    for unit in units:
+        if unit.status == 'SOLD' and unit.delivery_date and unit.sale_price is not None:
+            idx = period_index.get(unit.delivery_date.strftime('%Y-%m'))
+            if idx is not None:
+                sales_revenue[idx] += float(unit.sale_price)
+
+    financing_inflow = [0.0] * len(periods)
+    financing_interest = [0.0] * len(periods)
+    if periods:
+        ledger = load_credit_line_ledger(db, project.id)
+        for period, flows in ledger.monthly_financing_flows().items():
+            idx = period_index.get(period)
+            if idx is not None:
+                financing_inflow[idx] = float(flows['inflow'])
+        year_months = [(int(period[:4]), int(period[5:7])) for period in periods]
+        financing_interest = [float(value) for value in ledger.interest_series(year_months)]
+
+    units_target_total = sum(float(unit.target_price_total or 0) for unit in units) if units else None
+    stage_costs = load_stage_cost_phasing(db, project, len(periods)) if periods else None
+
+    return ProjectSnapshot(
+        project=project_data,
+        cost_items=cost_items_data,
+        periods=periods,
+        sales_revenue=sales_revenue,
+        financing_inflow=financing_inflow,
+        financing_interest=financing_interest,
+        units_target_total=units_target_total,
+        stage_costs=stage_costs.monthly_totals().tolist() if stage_costs is not None else None,
+    )
+
+
+def base_value_for_variable(project, variable_type: str) -> Decimal:
+    """Obtener valor base para la variable de análisis"""
+    if variable_type == "PRICE_PER_M2":
+        return project.target_price_per_m2 or Decimal('1000')
+    elif variable_type == "UNIT_SIZE":
+        return project.avg_unit_size_m2 or Decimal('100')
+    elif variable_type == "TOTAL_UNITS":
+        return Decimal(str(project.total_units)) if project.total_units else Decimal('50')
+    elif variable_type == "DISCOUNT_RATE":
+        return project.discount_rate
+    else:
+        return Decimal('1000')  # Default base value
+
+
+def _evaluate_flows(snapshot: ProjectSnapshot, variable_type: Optional[str], new_value: Optional[Decimal]):
+    """
+    Recalcular flujo neto y métricas (salvo TIR) con una variable modificada.
+
+    Los ingresos por unidades escalan con el precio por m², el tamaño promedio y
+    el número de unidades; los costos por m² o por unidad se recalculan con los
+    nuevos parámetros del proyecto.
+    """
+    project = SimpleNamespace(**vars(snapshot.project))
+    revenue_factor = 1.0
+
+    if variable_type is not None:
+        base_value = base_value_for_variable(snapshot.project, variable_type)
+        if variable_type == "PRICE_PER_M2":
+            project.target_price_per_m2 = new_value
+        elif variable_type == "UNIT_SIZE":
+            project.avg_unit_size_m2 = new_value
+        elif variable_type == "TOTAL_UNITS":
+            project.total_units = int(new_value)
+            new_value = Decimal(project.total_units)
+        elif variable_type == "DISCOUNT_RATE":
+            project.discount_rate = new_value
+
+        if variable_type in ("PRICE_PER_M2", "UNIT_SIZE", "TOTAL_UNITS") and base_value:
+            revenue_factor = float(new_value) / float(base_value)
+
+    total_months = len(snapshot.periods)
+    if not total_months:
+        return {"npv": 0, "payback_months": 0, "profit_margin": 0}, None
+
+    costs = snapshot.fixed_costs + snapshot.financing_interest
+    if snapshot.variable_cost_items:
+        costs = costs + _schedule_totals(snapshot.variable_cost_items, total_months, project)
+    revenue = snapshot.sales_revenue * revenue_factor + snapshot.financing_inflow
+    net_flow = revenue - costs
+
+    try:
+        discount_rate = float(project.discount_rate) if project.discount_rate is not None else 0.12
+    except (ValueError, TypeError):
+        discount_rate = 0.12
+    discount_factors = (1 + discount_rate / 12) ** np.arange(1, total_months + 1)
+    if np.all(discount_factors > 0):
+        npv = float((net_flow / discount_factors).sum())
+    else:
+        npv = float(net_flow.sum())
+
+    accumulated = np.cumsum(net_flow)
+    recovered = np.nonzero(accumulated >= 0)[0]
+    payback_months = int(recovered[0]) + 1 if len(recovered) else None
+
+    if snapshot.units_target_total is not None:
+        total_revenue = snapshot.units_target_total * revenue_factor
+    else:
+        total_revenue = float(revenue.sum())
+    total_investment = float(costs.sum())
+    total_profit = total_revenue - total_investment
+    profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
+
+    return {
+        "npv": npv,
+        "payback_months": payback_months,
+        "profit_margin": profit_margin,
+    }, net_flow
+
+
+def evaluate_snapshot(snapshot: ProjectSnapshot, variable_type: Optional[str] = None, new_value: Optional[Decimal] = None) -> Dict[str, Any]:
+    """Recalcular las métricas del proyecto con una variable modificada"""
+    metrics, net_flow = _evaluate_flows(snapshot, variable_type, new_value)
+    metrics["irr"] = monthly_irr_annualized(net_flow) if net_flow is not None else 0
+    return metrics
+
+
+def _variation_steps(min_variation_pct: Decimal, max_variation_pct: Decimal, steps: int) -> List[float]:
+    min_var = float(min_variation_pct) / 100
+    max_var = float(max_variation_pct) / 100
+    if steps == 1:
+        return [0]
+    return [min_var + (max_var - min_var) * i / (steps - 1) for i in range(steps)]
+
+
+def _evaluate_variable(snapshot: ProjectSnapshot, variable_type: str, variations: List[float]) -> List[Dict[str, Any]]:
+    """Evaluar todos los pasos de una variable (unidad de trabajo del pool)"""
+    base_value = base_value_for_variable(snapshot.project, variable_type)
+    steps = []
+    for variation_pct in variations:
+        new_value = base_value * (1 + Decimal(str(variation_pct)))
+        metrics, net_flow = _evaluate_flows(snapshot, variable_type, new_value)
+        steps.append((variation_pct, new_value, metrics, net_flow))
+
+    # Solve every step's IRR in one batch; neighbouring steps warm-start each other
+    irrs = [0] * len(steps)
+    flow_rows = [idx for idx, step in enumerate(steps) if step[3] is not None]
+    if flow_rows:
+        batch = irr_batch_annualized(np.vstack([steps[idx][3] for idx in flow_rows]))
+        for idx, irr in zip(flow_rows, batch):
+            irrs[idx] = irr
+
+    scenarios = []
+    for (variation_pct, new_value, metrics, _), irr in zip(steps, irrs):
+        scenarios.append({
+            "variation_pct": variation_pct * 100,
+            "variable_value": float(new_value),
+            "npv": float(metrics["npv"]),
+            "irr": float(irr) if irr else None,
+            "payback_months": metrics["payback_months"],
+            "profit_margin": float(metrics["profit_margin"])
+        })
+    return scenarios
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    """Pool de procesos compartido del worker, creado en el primer análisis grande"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor) -> None:
+    """Descartar un pool roto para que el siguiente análisis cree uno nuevo"""
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_executor() -> None:
+    """Cerrar el pool de procesos compartido (al apagar el worker)"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def run_sensitivity_grid(
+    snapshot: ProjectSnapshot,
+    variable_types: List[str],
+    min_variation_pct: Decimal = Decimal('-30.00'),
+    max_variation_pct: Decimal = Decimal('30.00'),
+    steps: int = 13,
+) -> Dict[str, Any]:
+    """
+    Evaluar N pasos x M variables sobre el snapshot.
+
+    Retorna {"variables": {variable_type: [escenarios]}, "base_npv", "base_irr", "base_payback_months"}.
+    """
+    variations = _variation_steps(min_variation_pct, max_variation_pct, steps)
+    results: Dict[str, List[Dict[str, Any]]] = {}
+
+    total_evaluations = len(variations) * len(variable_types)
+    if len(variable_types) > 1 and total_evaluations >= PARALLEL_MIN_EVALUATIONS and MAX_WORKERS > 1:
+        executor = _get_executor()
+        try:
+            futures = {
+                variable_type: executor.submit(_evaluate_variable, snapshot, variable_type, variations)
+                for variable_type in variable_types
+            }
+            results = {variable_type: future.result() for variable_type, future in futures.items()}
+        except BrokenProcessPool as e:
+            logger.warning(f"Sensitivity process pool broken, running serially: {e}")
+            _discard_executor(executor)
+            results = {}
+        except Exception as e:
+            logger.warning(f"Parallel sensitivity evaluation failed, running serially: {e}")
+            results = {}
+
+    for variable_type in variable_types:
+        if variable_type not in results:
+            results[variable_type] = _evaluate_variable(snapshot, variable_type, variations)
+
+    base_metrics = evaluate_snapshot(snapshot)
+    return {
+        "variables": results,
+        "base_npv": float(base_metrics["npv"]),
+        "base_irr": float(base_metrics["irr"]) if base_metrics["irr"] else None,
+        "base_payback_months": base_metrics["payback_months"],
+    }
@@ -0,0 +1,194 @@
+"""
+Stage-driven cost phasing for scenario projects.
+
+A ProjectStage with an estimated_cost spends it between its planned start and
+end dates following its cost_profile:
+- LINEAR: evenly over the days of the stage;
+- S_CURVE: slow start, peak in the middle, slow finish (3t^2 - 2t^3);
+- FRONT_LOADED: most of the cost early in the stage (1 - (1 - t)^2).
+
+All the stages of a project are phased in one vectorized pass: the cumulative
+profile is evaluated at every month boundary of the cash-flow axis, rounded
+to cents and differenced, so each stage contributes exactly its estimated cost
+as dense month x category integer arrays. The part of a stage that falls
+before the first month of the axis is booked in that first month; the part
+after the last month is beyond the horizon of the cash flow, like the cost
+items. The result is added to the cost schedule of the cash flow, so moving a
+stage only reshapes these arrays.
+
+Stage costs are opt-in per project (ScenarioProject.use_stage_costs): the
+budget of a project that is already modelled with cost items must not be
+counted twice, so only projects that enable the flag phase their stages.
+
+A summary stage (one with sub-stages) is only phased when none of its
+sub-stages has an estimated cost, so a budget is never counted twice. The
+phasing of each project is cached per worker, keyed by the version of its
+stages (see stage_schedule.stages_version) and the month axis.
+"""
+
+import threading
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .cost_schedule import COST_CATEGORIES
+from .models import ProjectStage
+from .stage_schedule import stages_version
+
+PHASING_PROFILES = ("LINEAR", "S_CURVE", "FRONT_LOADED")
+
+# Cash-flow category of the cost of each stage type; other types go to "otros"
+STAGE_TYPE_CATEGORIES = {
+    "PRELIMINARY": "costos_blandos",
+    "DESIGN": "costos_blandos",
+    "PERMITS": "costos_blandos",
+    "SITE_PREP": "costos_duros",
+    "FOUNDATION": "costos_duros",
+    "STRUCTURE": "costos_duros",
+    "MEP": "costos_duros",
+    "FINISHES": "costos_duros",
+    "CONSTRUCTION": "costos_duros",
+    "MARKETING": "marketing",
+    "SALES": "marketing",
+}
+
+
+def stage_cost_category(stage) -> str:
+    """Categoría del flujo de caja del costo de una etapa"""
+    return STAGE_TYPE_CATEGORIES.get((stage.stage_type or "").upper(), "otros")
+
+
+def _cumulative_profile(profiles: np.ndarray, t: np.ndarray) -> np.ndarray:
+    """Fracción acumulada del costo en t ∈ [0, 1] según el perfil de cada fila"""
+    s_curve = t * t * (3 - 2 * t)
+    front_loaded = 1 - (1 - t) ** 2
+    return np.where(
+        profiles[:, None] == "S_CURVE", s_curve,
+        np.where(profiles[:, None] == "FRONT_LOADED", front_loaded, t)
+    )
+
+
+def _costed_stages(stages: List) -> List:
+    """Etapas cuyo estimated_cost entra al flujo (sin contar dos veces una etapa resumen)"""
+    by_id = {stage.id: stage for stage in stages}
+    covered = set()
+    for stage in stages:
+        if not stage.estimated_cost:
+            continue
+        parent_id, seen = stage.parent_stage_id, set()
+        while parent_id in by_id and parent_id not in seen:
+            seen.add(parent_id)
+            covered.add(parent_id)
+            parent_id = by_id[parent_id].parent_stage_id
+    return [
+        stage for stage in stages
+        if stage.estimated_cost and stage.id not in covered
+        and stage.planned_start_date and stage.planned_end_date
+    ]
+
+
+def _month_boundaries(start: date, total_months: int) -> np.ndarray:
+    """Ordinales del primer día de cada mes del eje, más el del mes siguiente al último"""
+    year, month = start.year, start.month
+    boundaries = []
+    for _ in range(total_months + 1):
+        boundaries.append(date(year, month, 1).toordinal())
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return np.array(boundaries, dtype=np.int64)
+
+
+class StageCostPhasing:
+    """Costos de las etapas por mes y categoría, en centavos, sobre el eje de meses del flujo"""
+
+    __slots__ = ("total_months", "cents")
+
+    def __init__(self, total_months: int, cents: np.ndarray):
+        self.total_months = total_months
+        self.cents = cents
+
+    def monthly_costs(self, month_offset: int) -> Dict[str, Decimal]:
+        """Costos de etapas por categoría del mes (0-based)"""
+        if not 0 <= month_offset < self.total_months:
+            return {category: Decimal('0.00') for category in COST_CATEGORIES}
+        row = self.cents[month_offset]
+        return {category: Decimal(int(row[idx])) / 100 for idx, category in enumerate(COST_CATEGORIES)}
+
+    def monthly_totals(self) -> np.ndarray:
+        """Costo total de etapas por mes"""
+        return self.cents.sum(axis=1) / 100.0
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.cents.any()
+
+
+def phase_stage_costs(stages: List, start: date, total_months: int) -> StageCostPhasing:
+    """Repartir el costo estimado de las etapas en los meses del eje que empieza en `start`"""
+    total_months = max(int(total_months or 0), 0)
+    cents = np.zeros((total_months, len(COST_CATEGORIES)), dtype=np.int64)
+    costed = _costed_stages(stages)
+    if not costed or total_months == 0 or start is None:
+        return StageCostPhasing(total_months, cents)
+
+    starts = np.array([stage.planned_start_date.toordinal() for stage in costed], dtype=np.int64)
+    # The end date is a working day of the stage
+    spans = np.array(
+        [max(stage.planned_end_date.toordinal() + 1 - stage.planned_start_date.toordinal(), 1) for stage in costed],
+        dtype=np.int64
+    )
+    amounts = np.array([int(Decimal(stage.estimated_cost) * 100) for stage in costed], dtype=np.int64)
+    profiles = np.array([(stage.cost_profile or "LINEAR").upper() for stage in costed])
+    categories = np.array([COST_CATEGORIES.index(stage_cost_category(stage)) for stage in costed], dtype=np.int64)
+
+    boundaries = _month_boundaries(start, total_months)
+    t = np.clip((boundaries[None, :] - starts[:, None]) / spans[:, None], 0.0, 1.0)
+    cumulative = np.rint(_cumulative_profile(profiles, t) * amounts[:, None]).astype(np.int64)
+    per_month = np.diff(cumulative, axis=1)
+    # Cost incurred before the axis starts is paid in its first month
+    per_month[:, 0] += cumulative[:, 0]
+
+    for idx in np.unique(categories):
+        cents[:, idx] = per_month[categories == idx].sum(axis=0)
+    return StageCostPhasing(total_months, cents)
+
+
+class PhasingCache:
+    """Fases de costo por proyecto en este worker, válidas mientras no cambien las etapas ni el eje"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[Tuple, StageCostPhasing]] = {}
+
+    def get(self, project_id: int, stages: List, start: date, total_months: int) -> StageCostPhasing:
+        key = (stages_version(stages), start.replace(day=1) if start else None, total_months)
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry and entry[0] == key:
+                return entry[1]
+        phasing = phase_stage_costs(stages, start, total_months)
+        with self._lock:
+            self._entries[project_id] = (key, phasing)
+        return phasing
+
+    def invalidate(self, project_id: Optional[int] = None):
+        with self._lock:
+            if project_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(project_id, None)
+
+
+stage_cost_phasings = PhasingCache()
+
+
+def load_stage_cost_phasing(db, project, total_months: int) -> Optional[StageCostPhasing]:
+    """Fases de costo de las etapas del proyecto para su eje de flujo de caja (None si no hay costos o no están activados)"""
+    if not (project.use_stage_costs and project.start_date):
+        return None
+    stages = db.query(ProjectStage).filter(ProjectStage.scenario_project_id == project.id).all()
+    if not stages:
+        return None
+    phasing = stage_cost_phasings.get(project.id, stages, project.start_date, total_months)
+    return None if phasing.is_empty else phasing
@@ -0,0 +1,347 @@
+"""
+Critical-path scheduling of the stages of a scenario project.
+
+The stages of a project form a DAG: ProjectStage.dependencies lists the
+stages that must finish first, and a stage with sub-stages (parent_stage_id)
+is a summary of them. Only leaf stages are scheduled:
+- a dependency on a summary stage means a dependency on all its leaves;
+- a sub-stage inherits the dependencies of its ancestors;
+- a summary stage spans the dates of its leaves.
+
+A successor may start before its predecessor finishes by its allowed overlap
+(max_overlap_days, or min_overlap_days when no maximum is set; none if
+allows_overlap is off). The planned start of each stage is a "start no
+earlier than" constraint, so the early dates match the plan whenever the
+dependencies allow it and move later when they do not.
+
+StageGraph is built once per project structure (stages, dependencies,
+parents) with a topological order (Kahn). StageSchedule runs the CPM forward
+and backward passes over that order in O(V + E) and, when a single stage's
+dates or overlap change, re-propagates only the stages downstream (early
+dates) and upstream (late dates) of it. ScheduleCache keeps the schedule of
+each project in the worker, keyed by a version of its stages, so the Gantt
+endpoints do not recompute an unchanged project.
+"""
+
+import heapq
+import threading
+from collections import deque
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+class StageScheduleError(ValueError):
+    """Las dependencias de las etapas forman un ciclo"""
+
+
+def stage_lead_days(stage) -> int:
+    """Días que la etapa puede adelantarse al fin de sus predecesoras (0 si no permite traslape)"""
+    if not stage.allows_overlap:
+        return 0
+    if stage.max_overlap_days is not None:
+        return max(0, stage.max_overlap_days)
+    return max(0, stage.min_overlap_days or 0)
+
+
+def stages_version(stages: Iterable) -> Tuple:
+    """Versión de las etapas de un proyecto: cambia al crear, borrar o editar una etapa"""
+    stages = list(stages)
+    if not stages:
+        return (0, None, 0)
+    return (len(stages), max(stage.updated_at or datetime.min for stage in stages), sum(stage.id for stage in stages))
+
+
+class StageGraph:
+    """DAG de dependencias entre etapas hoja, en orden topológico"""
+
+    __slots__ = ("stage_ids", "children", "leaves", "preds", "succs", "order", "position")
+
+    def __init__(self, stages: List):
+        by_id = {stage.id: stage for stage in stages}
+        self.stage_ids = [stage.id for stage in stages]
+        self.children: Dict[int, List[int]] = {}
+        for stage in stages:
+            if stage.parent_stage_id in by_id and stage.parent_stage_id != stage.id:
+                self.children.setdefault(stage.parent_stage_id, []).append(stage.id)
+
+        self.leaves: Dict[int, List[int]] = {}
+        for stage_id in self.stage_ids:
+            self._leaves_of(stage_id)
+
+        self.preds: Dict[int, Set[int]] = {}
+        self.succs: Dict[int, Set[int]] = {}
+        for stage in stages:
+            if stage.id in self.children:
+                continue
+            preds = set()
+            for ancestor in self._self_and_ancestors(stage, by_id):
+                for dependency in ancestor.dependencies or []:
+                    preds.update(self.leaves.get(dependency, ()))
+            preds.discard(stage.id)
+            self.preds[stage.id] = preds
+            self.succs.setdefault(stage.id, set())
+            for pred in preds:
+                self.succs.setdefault(pred, set()).add(stage.id)
+
+        self.order = self._topological_order(stages, by_id)
+        self.position = {stage_id: idx for idx, stage_id in enumerate(self.order)}
+
+    def _leaves_of(self, stage_id: int) -> List[int]:
+        """Etapas hoja bajo una etapa (ella misma si no tiene sub-etapas)"""
+        if stage_id in self.leaves:
+            return self.leaves[stage_id]
+        result, stack, seen = [], [stage_id], set()
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            children = self.children.get(current)
+            if children:
+                stack.extend(children)
+            else:
+                result.append(current)
+        self.leaves[stage_id] = result
+        return result
+
+    @staticmethod
+    def _self_and_ancestors(stage, by_id: Dict) -> List:
+        chain, seen = [], set()
+        while stage is not None and stage.id not in seen:
+            chain.append(stage)
+            seen.add(stage.id)
+            stage = by_id.get(stage.parent_stage_id)
+        return chain
+
+    def _topological_order(self, stages: List, by_id: Dict) -> List[int]:
+        """Orden de Kahn; entre etapas libres, el orden de stage_order"""
+        rank = {stage.id: (stage.stage_order, stage.id) for stage in stages}
+        leaves = sorted(self.preds, key=rank.get)
+        pending = {stage_id: len(self.preds[stage_id]) for stage_id in leaves}
+        queue = deque(stage_id for stage_id in leaves if pending[stage_id] == 0)
+        order = []
+        while queue:
+            stage_id = queue.popleft()
+            order.append(stage_id)
+            for succ in sorted(self.succs[stage_id], key=rank.get):
+                pending[succ] -= 1
+                if pending[succ] == 0:
+                    queue.append(succ)
+
+        if len(order) < len(leaves):
+            in_cycle = [by_id[stage_id].stage_name for stage_id in leaves if pending[stage_id] > 0]
+            raise StageScheduleError(f"Las dependencias de las etapas forman un ciclo: {', '.join(in_cycle)}")
+        return order
+
+
+class StageSchedule:
+    """Fechas tempranas y tardías (CPM) de las etapas, con re-programación incremental"""
+
+    def __init__(self, stages: List, graph: Optional[StageGraph] = None):
+        self.graph = graph or StageGraph(stages)
+        self.duration: Dict[int, int] = {}
+        self.anchor: Dict[int, int] = {}
+        self.lead: Dict[int, int] = {}
+        self.planned_end: Dict[int, int] = {}
+        # Day ordinals
+        self.required_start: Dict[int, int] = {}
+        self.es: Dict[int, int] = {}
+        self.ef: Dict[int, int] = {}
+        self.ls: Dict[int, int] = {}
+        self.lf: Dict[int, int] = {}
+        self.finish = 0
+        for stage in stages:
+            self._load(stage)
+        self._forward(self.graph.order)
+        self.finish = max(self.ef.values(), default=0)
+        self._backward(reversed(self.graph.order))
+
+    def _load(self, stage):
+        start = stage.planned_start_date.toordinal()
+        end = stage.planned_end_date.toordinal()
+        self.duration[stage.id] = max(0, end - start)
+        self.anchor[stage.id] = start
+        self.planned_end[stage.id] = end
+        self.lead[stage.id] = stage_lead_days(stage)
+
+    def _early(self, stage_id: int) -> Tuple[int, int, Optional[int]]:
+        lead = self.lead[stage_id]
+        required = max((self.ef[pred] - lead for pred in self.graph.preds[stage_id]), default=None)
+        start = self.anchor[stage_id] if required is None else max(self.anchor[stage_id], required)
+        return start, start + self.duration[stage_id], required
+
+    def _late(self, stage_id: int) -> Tuple[int, int]:
+        finish = min((self.ls[succ] + self.lead[succ] for succ in self.graph.succs[stage_id]), default=self.finish)
+        return finish - self.duration[stage_id], finish
+
+    def _forward(self, order: Iterable[int]):
+        for stage_id in order:
+            self.es[stage_id], self.ef[stage_id], required = self._early(stage_id)
+            self._set_required(stage_id, required)
+
+    def _backward(self, order: Iterable[int]):
+        for stage_id in order:
+            self.ls[stage_id], self.lf[stage_id] = self._late(stage_id)
+
+    def _set_required(self, stage_id: int, required: Optional[int]):
+        if required is None:
+            self.required_start.pop(stage_id, None)
+        else:
+            self.required_start[stage_id] = required
+
+    def reschedule(self, stage) -> Set[int]:
+        """
+        Re-programar tras cambiar las fechas o el traslape de una etapa hoja.
+
+        Propaga las fechas tempranas solo a sus sucesoras y las tardías solo a sus
+        predecesoras (todas, si cambia el fin del proyecto). Retorna las etapas
+        hoja cuyas fechas cambiaron.
+        """
+        stage_id = stage.id
+        self._load(stage)
+        position = self.graph.position
+        changed = {stage_id}
+
+        # Forward: successors in topological order, only while early dates change
+        heap, queued = [position[stage_id]], {stage_id}
+        while heap:
+            current = self.graph.order[heapq.heappop(heap)]
+            start, finish, required = self._early(current)
+            self._set_required(current, required)
+            if current != stage_id and (start, finish) == (self.es[current], self.ef[current]):
+                continue
+            self.es[current], self.ef[current] = start, finish
+            changed.add(current)
+            for succ in self.graph.succs[current]:
+                if succ not in queued:
+                    queued.add(succ)
+                    heapq.heappush(heap, position[succ])
+
+        project_finish = max(self.ef.values(), default=0)
+        if project_finish != self.finish:
+            # Every late date hangs from the project finish
+            self.finish = project_finish
+            before = {node: (self.ls[node], self.lf[node]) for node in self.graph.order}
+            self._backward(reversed(self.graph.order))
+            changed.update(node for node in self.graph.order if before[node] != (self.ls[node], self.lf[node]))
+            return changed
+
+        # Backward: the stage and its predecessors, only while late dates change
+        heap, queued = [-position[stage_id]], {stage_id}
+        while heap:
+            current = self.graph.order[-heapq.heappop(heap)]
+            late = self._late(current)
+            if current != stage_id and late == (self.ls[current], self.lf[current]):
+                continue
+            self.ls[current], self.lf[current] = late
+            changed.add(current)
+            for pred in self.graph.preds[current]:
+                if pred not in queued:
+                    queued.add(pred)
+                    heapq.heappush(heap, -position[pred])
+        return changed
+
+    def total_float(self, stage_id: int) -> int:
+        return self.ls[stage_id] - self.es[stage_id]
+
+    def is_leaf(self, stage_id: int) -> bool:
+        return stage_id in self.graph.preds
+
+    def stage_result(self, stage_id: int) -> Dict:
+        """Fechas CPM de una etapa; una etapa con sub-etapas abarca las de sus hojas"""
+        leaves = [leaf for leaf in self.graph.leaves.get(stage_id, [stage_id]) if leaf in self.es]
+        if not leaves:
+            return {}
+        total_float = min(self.total_float(leaf) for leaf in leaves)
+        return {
+            "early_start": date.fromordinal(min(self.es[leaf] for leaf in leaves)),
+            "early_finish": date.fromordinal(max(self.ef[leaf] for leaf in leaves)),
+            "late_start": date.fromordinal(min(self.ls[leaf] for leaf in leaves)),
+            "late_finish": date.fromordinal(max(self.lf[leaf] for leaf in leaves)),
+            "total_float_days": total_float,
+            "critical": total_float == 0,
+            "dependencies_met": all(
+                self.anchor[leaf] >= self.required_start.get(leaf, self.anchor[leaf]) for leaf in leaves
+            ),
+        }
+
+    def overlap_with_predecessors(self, stage_id: int) -> Optional[int]:
+        """Días de traslape planificado con la predecesora que termina más tarde (None si no tiene)"""
+        leaves = [leaf for leaf in self.graph.leaves.get(stage_id, [stage_id]) if leaf in self.graph.preds]
+        ends = [self.planned_end[pred] for leaf in leaves for pred in self.graph.preds[leaf] if pred not in leaves]
+        if not ends:
+            return None
+        start = min(self.anchor[leaf] for leaf in leaves)
+        return max(0, max(ends) - start)
+
+    def critical_path(self) -> List[int]:
+        """Etapas hoja con holgura cero, en orden topológico"""
+        return [stage_id for stage_id in self.graph.order if self.total_float(stage_id) == 0]
+
+    def critical_stage_ids(self) -> List[int]:
+        """Etapas críticas incluyendo las etapas resumen que contienen una hoja crítica"""
+        critical = set(self.critical_path())
+        summaries = [
+            stage_id for stage_id in self.graph.children
+            if any(leaf in critical for leaf in self.graph.leaves[stage_id])
+        ]
+        return self.critical_path() + summaries
+
+    @property
+    def project_start(self) -> Optional[date]:
+        return date.fromordinal(min(self.es.values())) if self.es else None
+
+    @property
+    def project_finish(self) -> Optional[date]:
+        return date.fromordinal(self.finish) if self.es else None
+
+
+class ScheduleCache:
+    """Programas CPM por proyecto en este worker, válidos mientras no cambie la versión de las etapas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[Tuple, StageSchedule]] = {}
+
+    def get(self, project_id: int, stages: List) -> StageSchedule:
+        """Programa del proyecto para estas etapas (lo calcula si cambiaron)"""
+        version = stages_version(stages)
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry and entry[0] == version:
+                return entry[1]
+        schedule = StageSchedule(stages)
+        with self._lock:
+            self._entries[project_id] = (version, schedule)
+        return schedule
+
+    def stage_updated(self, project_id: int, stage, structural: bool = False) -> Optional[Set[int]]:
+        """
+        Aplicar la edición de una etapa al programa en caché.
+
+        Un cambio de fechas o traslape de una etapa hoja se re-programa de forma
+        incremental; un cambio de dependencias, jerarquía u orden invalida el programa.
+        Retorna las etapas cuyas fechas cambiaron, o None si no había programa o se invalidó.
+        """
+        with self._lock:
+            entry = self._entries.get(project_id)
+            if entry is None:
+                return None
+            version, schedule = entry
+            if structural or not schedule.is_leaf(stage.id):
+                del self._entries[project_id]
+                return None
+            changed = schedule.reschedule(stage)
+            count, updated_at, ids = version
+            self._entries[project_id] = ((count, max(updated_at or datetime.min, stage.updated_at or datetime.min), ids), schedule)
+            return changed
+
+    def invalidate(self, project_id: Optional[int] = None):
+        with self._lock:
+            if project_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(project_id, None)
+
+
+schedules = ScheduleCache()
@@ -0,0 +1,236 @@
+"""
+Bulk import of project units from the Excel template.
+
+The sheet is validated column-wise with pandas masks instead of row by row:
+- unit_number is required, at most 50 characters and unique within the file
+  (the first occurrence wins);
+- unit_type must be one of UNIT_TYPES; an unknown status becomes AVAILABLE;
+- a non-numeric or out-of-range optional value is reported and left empty,
+  the unit is still created.
+
+The unit numbers of the file that already exist in the project are fetched
+with one query, and the remaining units are written with a multi-row
+INSERT ... ON CONFLICT (scenario_project_id, unit_number) DO NOTHING
+RETURNING id on the ix_project_unit_number unique index. A unit created by a
+concurrent request between the pre-fetch and the insert is not returned and
+is reported as existing, so every row of the file ends up either created or
+in the error report. Everything runs in the caller's transaction.
+"""
+
+import logging
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from .database import insert_for_dialect
+from .models import ProjectUnit
+
+logger = logging.getLogger(__name__)
+
+UNIT_TYPES = ["APARTAMENTO", "CASA", "LOTE", "OFICINA", "LOCAL"]
+UNIT_STATUSES = ["AVAILABLE", "RESERVED", "SOLD", "DELIVERED", "CANCELLED"]
+
+REQUIRED_COLUMNS = ["unit_number", "unit_type"]
+DECIMAL_FIELDS = [
+    "construction_area_m2", "land_area_m2", "total_area_m2", "bathrooms",
+    "target_price_total", "price_per_m2_construction", "price_per_m2_land",
+]
+INTEGER_FIELDS = ["bedrooms", "parking_spaces", "floor_level", "planned_sale_month", "sales_priority"]
+TEXT_FIELDS = ["description", "special_features", "notes"]
+
+INSERT_COLUMNS = (
+    ["scenario_project_id", "unit_number", "unit_type", "status"]
+    + DECIMAL_FIELDS + INTEGER_FIELDS + TEXT_FIELDS
+    + ["is_active", "created_at", "updated_at"]
+)
+
+_UNIT_NUMBER_LENGTH = ProjectUnit.__table__.c.unit_number.type.length
+_INT32_MAX = 2 ** 31 - 1
+
+# Bind parameters per statement accepted by the drivers; a 2,000-unit tower fits in one INSERT on PostgreSQL
+_MAX_BIND_PARAMS = {"postgresql": 65535, "sqlite": 32766}
+
+
+class UnitImportError(ValueError):
+    """La hoja no tiene el formato de la plantilla de unidades; nada se escribe"""
+
+
+def _decimal_limit(field: str) -> float:
+    """Valor absoluto máximo que admite la columna Numeric(precision, scale)"""
+    column_type = ProjectUnit.__table__.c[field].type
+    return float(10 ** (column_type.precision - column_type.scale))
+
+
+def _is_blank(values: pd.Series) -> pd.Series:
+    return values.isna() | (values.astype("string").str.strip() == "")
+
+
+def _empty_column(frame: pd.DataFrame) -> pd.Series:
+    return pd.Series([None] * len(frame), index=frame.index, dtype=object)
+
+
+def _row_error(row: int, unit_number: Optional[str], message: str, field: Optional[str] = None) -> Dict[str, Any]:
+    return {"row": row, "unit_number": unit_number, "field": field, "error": message}
+
+
+def prepare_units(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[Dict[str, Any]]]:
+    """
+    Validar la hoja y convertirla a las columnas de project_units.
+
+    Retorna (unidades válidas con la fila de Excel en '_row', errores por fila).
+    Una fila sin número de unidad, con tipo inválido o repetida se omite completa.
+    """
+    missing_columns = [column for column in REQUIRED_COLUMNS if column not in df.columns]
+    if missing_columns:
+        raise UnitImportError(f"Columnas requeridas faltantes: {', '.join(missing_columns)}")
+
+    frame = pd.DataFrame(index=df.index)
+    # Row 1 of the sheet is the header
+    frame["_row"] = np.arange(2, len(df) + 2)
+    frame["unit_number"] = df["unit_number"].map(str).where(~_is_blank(df["unit_number"]), None)
+    frame["unit_type"] = df["unit_type"].map(str).str.upper()
+    if "status" in df.columns:
+        status = df["status"].map(str).str.upper()
+        frame["status"] = status.where(status.isin(UNIT_STATUSES), "AVAILABLE")
+    else:
+        frame["status"] = "AVAILABLE"
+
+    errors: List[Dict[str, Any]] = []
+    empty_number = frame["unit_number"].isna()
+    long_number = ~empty_number & (frame["unit_number"].str.len() > _UNIT_NUMBER_LENGTH)
+    invalid_type = ~empty_number & ~long_number & ~frame["unit_type"].isin(UNIT_TYPES)
+    repeated = ~empty_number & frame["unit_number"].duplicated(keep="first")
+    # A row is reported once, for the first problem found
+    repeated &= ~long_number & ~invalid_type
+
+    errors += [_row_error(row, None, "Número de unidad vacío", "unit_number") for row in frame.loc[empty_number, "_row"]]
+    errors += [
+        _row_error(row, number, f"Número de unidad de más de {_UNIT_NUMBER_LENGTH} caracteres", "unit_number")
+        for row, number in frame.loc[long_number, ["_row", "unit_number"]].itertuples(index=False)
+    ]
+    errors += [
+        _row_error(row, number, f"Tipo de unidad inválido '{unit_type}'. Debe ser uno de: {', '.join(UNIT_TYPES)}", "unit_type")
+        for row, number, unit_type in frame.loc[invalid_type, ["_row", "unit_number", "unit_type"]].itertuples(index=False)
+    ]
+    errors += [
+        _row_error(row, number, f"La unidad {number} está repetida en el archivo", "unit_number")
+        for row, number in frame.loc[repeated, ["_row", "unit_number"]].itertuples(index=False)
+    ]
+    valid = ~(empty_number | long_number | invalid_type | repeated)
+
+    for field in DECIMAL_FIELDS + INTEGER_FIELDS:
+        if field not in df.columns:
+            frame[field] = _empty_column(frame)
+            continue
+        raw = df[field]
+        values = pd.to_numeric(raw, errors="coerce")
+        limit = _decimal_limit(field) if field in DECIMAL_FIELDS else _INT32_MAX
+        bad = ~_is_blank(raw) & (values.isna() | ~np.isfinite(values) | (values.abs() >= limit))
+        errors += [
+            _row_error(row, number, f"Valor inválido para {field}: {value}", field)
+            for row, number, value in zip(frame.loc[valid & bad, "_row"], frame.loc[valid & bad, "unit_number"], raw[valid & bad])
+        ]
+        values = values.where(~bad)
+        if field in DECIMAL_FIELDS:
+            converted = [None if pd.isna(value) else Decimal(str(value)) for value in values]
+        else:
+            converted = [None if pd.isna(value) else int(value) for value in np.trunc(values)]
+        # object dtype keeps None and Python ints instead of NaN floats
+        frame[field] = pd.Series(converted, index=frame.index, dtype=object)
+
+    for field in TEXT_FIELDS:
+        if field in df.columns:
+            frame[field] = df[field].map(str).where(~_is_blank(df[field]), None)
+        else:
+            frame[field] = _empty_column(frame)
+
+    frame["sales_priority"] = pd.Series(
+        [1 if value is None else value for value in frame["sales_priority"]], index=frame.index, dtype=object
+    )
+    errors.sort(key=lambda error: error["row"])
+    return frame.loc[valid], errors
+
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+
+def existing_unit_numbers(db: Session, project_id: int, unit_numbers: List[str]) -> set:
+    """Números de unidad del archivo que ya existen en el proyecto (una sola consulta)"""
+    if not unit_numbers:
+        return set()
+    rows = db.query(ProjectUnit.unit_number).filter(
+        ProjectUnit.scenario_project_id == project_id,
+        ProjectUnit.unit_number.in_(unit_numbers)
+    ).all()
+    return {unit_number for (unit_number,) in rows}
+
+
+def insert_units(db: Session, project_id: int, units: pd.DataFrame) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Crear las unidades con INSERT ... ON CONFLICT DO NOTHING RETURNING (sin commit).
+
+    Retorna (unidades creadas, errores por fila de las que ya existían).
+    """
+    existing = existing_unit_numbers(db, project_id, units["unit_number"].tolist())
+    is_existing = units["unit_number"].isin(existing)
+    errors = [
+        _row_error(row, number, f"La unidad {number} ya existe", "unit_number")
+        for row, number in units.loc[is_existing, ["_row", "unit_number"]].itertuples(index=False)
+    ]
+    units = units.loc[~is_existing]
+    if units.empty:
+        return [], errors
+
+    now = datetime.utcnow()
+    rows = []
+    for unit in units.to_dict("records"):
+        # Cells left empty by pandas come back as NaN
+        row = {column: None if _is_missing(unit.get(column)) else unit.get(column) for column in INSERT_COLUMNS}
+        row.update(scenario_project_id=project_id, is_active=True, created_at=now, updated_at=now)
+        rows.append(row)
+
+    table = ProjectUnit.__table__
+    insert = insert_for_dialect(db)
+    chunk_size = _MAX_BIND_PARAMS.get(db.get_bind().dialect.name, 10000) // len(INSERT_COLUMNS)
+    created_ids: Dict[str, int] = {}
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        if insert is None:
+            # No ON CONFLICT support: the pre-fetch is the only duplicate check
+            db.execute(table.insert(), chunk)
+            created_ids.update(
+                db.query(ProjectUnit.unit_number, ProjectUnit.id).filter(
+                    ProjectUnit.scenario_project_id == project_id,
+                    ProjectUnit.unit_number.in_([row["unit_number"] for row in chunk])
+                ).all()
+            )
+            continue
+        statement = insert(table).values(chunk).on_conflict_do_nothing(
+            index_elements=["scenario_project_id", "unit_number"]
+        ).returning(table.c.id, table.c.unit_number)
+        created_ids.update((unit_number, unit_id) for unit_id, unit_number in db.execute(statement))
+
+    created = []
+    for row_number, row in zip(units["_row"], rows):
+        unit_id = created_ids.get(row["unit_number"])
+        if unit_id is None:
+            errors.append(_row_error(row_number, row["unit_number"], f"La unidad {row['unit_number']} ya existe", "unit_number"))
+            continue
+        created.append({
+            "id": unit_id,
+            "unit_number": row["unit_number"],
+            "unit_type": row["unit_type"],
+            "target_price_total": float(row["target_price_total"]) if row["target_price_total"] else None,
+        })
+    errors.sort(key=lambda error: error["row"])
+    logger.info(f"Imported {len(created)} units into project {project_id} ({len(errors)} existing)")
+    return created, errors
+
+
+def format_row_error(error: Dict[str, Any]) -> str:
+    return f"Fila {error['row']}: {error['error']}"
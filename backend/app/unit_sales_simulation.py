@@ -0,0 +1,264 @@
+"""
+Vectorized unit-sales payment simulator.
+
+The units of a scenario are held as NumPy arrays (price, sale month, delivery
+month) and the separation/delivery split between developer and credit line is
+computed for all of them at once. Mortgage usage is drawn from a seeded
+generator keyed by unit position in the project, so a given seed gives the
+same draw for every scenario and the optimistic/realistic/conservative runs
+differ only by their sales schedule.
+
+The Monte Carlo mode repeats the mortgage draw thousands of times and returns
+P10/P50/P90 bands for the developer cash flow, the credit line usage and the
+maximum capital exposure against the project cost schedule.
+"""
+
+import logging
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .cost_schedule import build_cost_schedule
+
+logger = logging.getLogger(__name__)
+
+# Delivery payment is received this many months after the sale month
+DELIVERY_LAG_MONTHS = 12
+
+# Cash buyers pay this share at separation and the rest at delivery
+CASH_SEPARATION_FRACTION = 0.1
+
+DEFAULT_MONTE_CARLO_DRAWS = 2000
+MAX_MONTE_CARLO_DRAWS = 20000
+PERCENTILES = (10, 50, 90)
+
+# Draws processed per matrix product, bounds memory to CHUNK x units
+_DRAW_CHUNK = 1000
+
+_SPLIT_FIELDS = (
+    "separation_amount", "delivery_amount",
+    "developer_separation", "developer_delivery",
+    "credit_line_separation", "credit_line_delivery",
+)
+
+
+class UnitScheduleError(ValueError):
+    """El calendario de ventas asigna a alguna unidad un mes anterior al mes 1"""
+
+
+class UnitArrays:
+    """Unidades de un escenario como arreglos paralelos"""
+
+    def __init__(
+        self,
+        unit_ids: Sequence[int],
+        unit_numbers: Sequence[str],
+        prices: Sequence[float],
+        sale_months: Sequence[int],
+        positions: Sequence[int],
+        total_units: int,
+    ):
+        self.unit_ids = np.asarray(unit_ids, dtype=np.int64)
+        self.unit_numbers = list(unit_numbers)
+        self.prices = np.asarray(prices, dtype=float)
+        self.sale_months = np.asarray(sale_months, dtype=np.int64)
+        self.delivery_months = self.sale_months + DELIVERY_LAG_MONTHS
+        # Position of each unit among all project units, used to index the draws
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.total_units = total_units
+
+    def __len__(self) -> int:
+        return len(self.unit_ids)
+
+    @property
+    def horizon_months(self) -> int:
+        """Último mes (1-based) con algún pago"""
+        return int(self.delivery_months.max()) if len(self) else 0
+
+    @classmethod
+    def from_schedule(cls, units: Sequence[Any], units_schedule: Dict[str, int]) -> "UnitArrays":
+        """
+        Unidades programadas con precio positivo; `units` debe venir en orden estable (por id).
+
+        Los meses de venta son 1-based: un mes menor que 1 levanta UnitScheduleError.
+        """
+        unit_ids, unit_numbers, prices, sale_months, positions = [], [], [], [], []
+        invalid = []
+        for position, unit in enumerate(units):
+            sale_month = units_schedule.get(str(unit.id))
+            if sale_month is None:
+                continue
+            price = float(unit.target_price_total or 0)
+            if price <= 0:
+                continue
+            if int(sale_month) < 1:
+                invalid.append(f"{unit.unit_number} ({sale_month})")
+                continue
+            unit_ids.append(unit.id)
+            unit_numbers.append(unit.unit_number)
+            prices.append(price)
+            sale_months.append(int(sale_month))
+            positions.append(position)
+        if invalid:
+            raise UnitScheduleError(f"Mes de venta menor que 1 para las unidades: {', '.join(invalid)}")
+        return cls(unit_ids, unit_numbers, prices, sale_months, positions, len(units))
+
+
+def _fraction(value) -> float:
+    return float(value or 0) / 100.0
+
+
+def split_fractions(payment_config) -> Dict[str, Dict[str, float]]:
+    """Fracción del precio que corresponde a cada componente, con y sin hipoteca"""
+    separation = _fraction(payment_config.separation_payment_percentage)
+    delivery = 1.0 - separation
+    mortgage = {
+        "separation_amount": separation,
+        "delivery_amount": delivery,
+        "developer_separation": separation * _fraction(payment_config.separation_payment_percentage),
+        "developer_delivery": delivery * _fraction(payment_config.delivery_payment_percentage),
+        "credit_line_separation": separation * _fraction(payment_config.separation_credit_line_percentage),
+        "credit_line_delivery": delivery * _fraction(payment_config.delivery_credit_line_percentage),
+    }
+    cash = {
+        "separation_amount": CASH_SEPARATION_FRACTION,
+        "delivery_amount": 1.0 - CASH_SEPARATION_FRACTION,
+        "developer_separation": CASH_SEPARATION_FRACTION,
+        "developer_delivery": 1.0 - CASH_SEPARATION_FRACTION,
+        "credit_line_separation": 0.0,
+        "credit_line_delivery": 0.0,
+    }
+    return {"mortgage": mortgage, "cash": cash}
+
+
+def payment_splits(prices: np.ndarray, uses_mortgage: np.ndarray, payment_config) -> Dict[str, np.ndarray]:
+    """Montos de separación/entrega de todas las unidades; uses_mortgage puede ser (n,) o (draws, n)"""
+    fractions = split_fractions(payment_config)
+    splits = {}
+    for field in _SPLIT_FIELDS:
+        coefficient = np.where(uses_mortgage, fractions["mortgage"][field], fractions["cash"][field])
+        splits[field] = prices * coefficient
+    return splits
+
+
+def draw_mortgage_mask(arrays: UnitArrays, mortgage_usage_percentage, seed: Optional[int], draws: Optional[int] = None) -> np.ndarray:
+    """
+    Sortear qué unidades usan hipoteca.
+
+    Se sortea un valor por unidad del proyecto (no solo las programadas) y se
+    seleccionan las del escenario, de modo que con la misma semilla cada unidad
+    recibe el mismo sorteo en todos los escenarios.
+    """
+    rng = np.random.default_rng(seed)
+    shape = (arrays.total_units,) if draws is None else (draws, arrays.total_units)
+    uniforms = rng.random(shape)
+    return uniforms[..., arrays.positions] < _fraction(mortgage_usage_percentage)
+
+
+def _to_decimal(value: float) -> Decimal:
+    return Decimal(f"{value:.2f}")
+
+
+def simulate_payment_flows(
+    arrays: UnitArrays,
+    payment_config,
+    seed: Optional[int],
+    credit_line_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Flujo de pagos de cada unidad para un único sorteo con semilla"""
+    uses_mortgage = draw_mortgage_mask(arrays, payment_config.mortgage_usage_percentage, seed)
+    splits = payment_splits(arrays.prices, uses_mortgage, payment_config)
+    columns = {field: splits[field].tolist() for field in _SPLIT_FIELDS}
+
+    flows = []
+    for idx in range(len(arrays)):
+        flow = {
+            "unit_id": int(arrays.unit_ids[idx]),
+            "unit_number": arrays.unit_numbers[idx],
+            "sale_month": int(arrays.sale_months[idx]),
+            "sale_price": _to_decimal(arrays.prices[idx]),
+            "uses_mortgage": bool(uses_mortgage[idx]),
+            "credit_line_id": credit_line_id,
+        }
+        for field in _SPLIT_FIELDS:
+            flow[field] = _to_decimal(columns[field][idx])
+        flows.append(flow)
+    return flows
+
+
+def _month_matrix(months: np.ndarray, horizon: int) -> np.ndarray:
+    """Matriz unidades x meses con un 1 en el mes (1-based) de cada unidad"""
+    matrix = np.zeros((len(months), horizon), dtype=float)
+    matrix[np.arange(len(months)), months - 1] = 1.0
+    return matrix
+
+
+def _bands(samples: np.ndarray) -> Dict[str, Any]:
+    values = np.percentile(samples, PERCENTILES, axis=0)
+    return {f"p{p}": (row.round(2).tolist() if np.ndim(row) else round(float(row), 2)) for p, row in zip(PERCENTILES, values)}
+
+
+def project_cost_vector(cost_items: List[Any], horizon: int, project=None, stage_costs=None) -> np.ndarray:
+    """Costo total mensual del proyecto para los meses 1..horizon (incluye las etapas si se pasan)"""
+    schedule = build_cost_schedule(cost_items, horizon, project, stage_costs)
+    return np.array([float(schedule.monthly_costs(m)["total"]) for m in range(horizon)], dtype=float)
+
+
+def simulate_monte_carlo(
+    arrays: UnitArrays,
+    payment_config,
+    draws: int = DEFAULT_MONTE_CARLO_DRAWS,
+    seed: Optional[int] = None,
+    monthly_costs: Optional[np.ndarray] = None,
+) -> Dict[str, Any]:
+    """
+    Bandas P10/P50/P90 del flujo del desarrollador, uso de línea de crédito y exposición máxima.
+
+    Los flujos son lineales en el indicador de hipoteca, así que cada sorteo se
+    obtiene como base_efectivo + máscara @ delta, una multiplicación de
+    matrices por bloque de sorteos. La exposición máxima es el mayor déficit
+    acumulado de (ingresos del desarrollador - monthly_costs).
+    """
+    draws = max(1, min(int(draws), MAX_MONTE_CARLO_DRAWS))
+    horizon = max(arrays.horizon_months, len(monthly_costs) if monthly_costs is not None else 0)
+    costs = np.zeros(horizon, dtype=float)
+    if monthly_costs is not None:
+        costs[:len(monthly_costs)] = monthly_costs
+
+    fractions = split_fractions(payment_config)
+    sale = _month_matrix(arrays.sale_months, horizon)
+    delivery = _month_matrix(arrays.delivery_months, horizon)
+
+    def placed(case: str, separation_field: str, delivery_field: str) -> np.ndarray:
+        f = fractions[case]
+        return (arrays.prices * f[separation_field])[:, None] * sale + (arrays.prices * f[delivery_field])[:, None] * delivery
+
+    developer_cash = placed("cash", "developer_separation", "developer_delivery")
+    developer_delta = placed("mortgage", "developer_separation", "developer_delivery") - developer_cash
+    credit_line_delta = placed("mortgage", "credit_line_separation", "credit_line_delivery")
+    developer_base = developer_cash.sum(axis=0)
+
+    developer = np.empty((draws, horizon))
+    credit_line = np.empty((draws, horizon))
+    rng = np.random.default_rng(seed)
+    threshold = _fraction(payment_config.mortgage_usage_percentage)
+    for start in range(0, draws, _DRAW_CHUNK):
+        size = min(_DRAW_CHUNK, draws - start)
+        mask = (rng.random((size, arrays.total_units))[:, arrays.positions] < threshold).astype(float)
+        developer[start:start + size] = developer_base + mask @ developer_delta
+        credit_line[start:start + size] = mask @ credit_line_delta
+
+    cumulative = np.cumsum(developer - costs, axis=1)
+    max_exposure = np.maximum(-cumulative.min(axis=1, initial=0.0), 0.0)
+
+    return {
+        "draws": draws,
+        "seed": seed,
+        "months": list(range(1, horizon + 1)),
+        "developer_cash_flow": _bands(developer),
+        "credit_line_usage": _bands(credit_line),
+        "max_exposure": _bands(max_exposure),
+        "total_developer_income": _bands(developer.sum(axis=1)),
+        "total_credit_line_usage": _bands(credit_line.sum(axis=1)),
+    }
@@ -0,0 +1,9 @@
+"""
+The app modules build their engine at import time from DATABASE_URL; the
+tests run against a throwaway SQLite file unless one is provided.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}")
+os.environ.setdefault("INTEGRATION_SCHEDULER_ENABLED", "false")
@@ -0,0 +1,147 @@
+"""
+Parity of the vectorized cost schedule with the item-by-item monthly loop it replaced.
+"""
+import random
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pytest
+
+from app.cost_schedule import COST_CATEGORIES, build_cost_schedule
+
+CENT = Decimal("0.01")
+
+
+def legacy_monthly_costs(cost_items, month_offset, project=None):
+    """calculate_monthly_costs before the cost schedule engine, without its logging"""
+    monthly_costs = {category: Decimal("0.00") for category in COST_CATEGORIES}
+    monthly_costs["total"] = Decimal("0.00")
+
+    for item in cost_items:
+        actual_cost = item.monto_proyectado
+        if "por m² construcción" in item.base_costo and item.unit_cost and project:
+            project_area = None
+            if project.buildable_area_m2:
+                project_area = project.buildable_area_m2
+            elif project.total_area_m2:
+                project_area = project.total_area_m2
+            elif project.total_units and project.avg_unit_size_m2:
+                project_area = project.total_units * project.avg_unit_size_m2
+            if project_area:
+                actual_cost = item.unit_cost * Decimal(str(project_area))
+        elif "por m² propiedad" in item.base_costo and item.unit_cost and project and project.total_units and project.avg_unit_size_m2:
+            sellable_area = project.total_units * project.avg_unit_size_m2
+            if sellable_area and sellable_area > 0:
+                actual_cost = item.unit_cost * Decimal(str(sellable_area))
+        elif "por m²" in item.base_costo and item.unit_cost and project:
+            project_area = None
+            if project.buildable_area_m2:
+                project_area = project.buildable_area_m2
+            elif project.total_area_m2:
+                project_area = project.total_area_m2
+            elif project.total_units and project.avg_unit_size_m2:
+                project_area = project.total_units * project.avg_unit_size_m2
+            if project_area and project_area > 0:
+                actual_cost = item.unit_cost * Decimal(str(project_area))
+        elif "por unidad" in item.base_costo and item.unit_cost and project and project.total_units:
+            actual_cost = item.unit_cost * Decimal(str(project.total_units))
+        elif item.unit_cost and item.quantity:
+            actual_cost = item.unit_cost * item.quantity
+
+        if not actual_cost:
+            continue
+
+        start_month = item.start_month if item.start_month is not None else 1
+        if start_month == 0:
+            start_month = 1
+        duration = item.duration_months or 1
+
+        if start_month <= (month_offset + 1) <= (start_month + duration - 1):
+            monthly_amount = actual_cost / Decimal(str(duration))
+            if "financiacion" in item.categoria.lower():
+                continue
+            category_key = "otros"
+            subcategoria_lower = (item.subcategoria or "").lower()
+            if "marketing" in item.categoria.lower() or "marketing" in subcategoria_lower or "ventas" in subcategoria_lower:
+                category_key = "marketing"
+            elif "terreno" in item.categoria.lower():
+                category_key = "terreno"
+            elif "duros" in item.categoria.lower():
+                category_key = "costos_duros"
+            elif "blandos" in item.categoria.lower():
+                category_key = "costos_blandos"
+            monthly_costs[category_key] += monthly_amount
+            monthly_costs["total"] += monthly_amount
+
+    return monthly_costs
+
+
+CATEGORIAS = [
+    ("Terreno", "Compra"),
+    ("Costos Duros", "Estructura"),
+    ("Costos Blandos", "Diseño"),
+    ("Costos Blandos", "Ventas"),
+    ("Marketing", "Publicidad"),
+    ("Financiacion", "Intereses"),
+    ("Imprevistos", None),
+]
+BASES = ["Monto Fijo", "por m² construcción", "por m² propiedad", "por m²", "por unidad", "Cantidad"]
+
+
+def make_project():
+    return SimpleNamespace(
+        buildable_area_m2=Decimal("8450.75"),
+        total_area_m2=Decimal("12000"),
+        total_units=84,
+        avg_unit_size_m2=Decimal("96.35"),
+    )
+
+
+def make_items(rng, count):
+    items = []
+    for idx in range(count):
+        categoria, subcategoria = rng.choice(CATEGORIAS)
+        base = rng.choice(BASES)
+        items.append(SimpleNamespace(
+            id=idx,
+            partida_costo=f"Partida {idx}",
+            categoria=categoria,
+            subcategoria=subcategoria,
+            base_costo=base,
+            monto_proyectado=Decimal(rng.randint(0, 50_000_000)) / 100,
+            unit_cost=Decimal(rng.randint(1, 90_000)) / 100 if base != "Monto Fijo" else None,
+            quantity=Decimal(rng.randint(1, 500)) if base == "Cantidad" else None,
+            start_month=rng.choice([None, 0, 1, 2, 5, 13, 30, 47, 60]),
+            # Durations that do not divide the amounts evenly, plus missing ones
+            duration_months=rng.choice([None, 0, 1, 3, 7, 11, 12, 18, 36]),
+        ))
+    return items
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_schedule_matches_item_loop_to_the_cent(seed):
+    rng = random.Random(seed)
+    project = make_project()
+    items = make_items(rng, 150)
+    total_months = 48
+
+    schedule = build_cost_schedule(items, total_months, project)
+
+    for month_offset in range(total_months):
+        expected = legacy_monthly_costs(items, month_offset, project)
+        actual = schedule.monthly_costs(month_offset)
+        for key in COST_CATEGORIES + ("total",):
+            assert actual[key].quantize(CENT) == expected[key].quantize(CENT), (month_offset, key)
+
+    # The schedule stops at the horizon; the old loop was never asked past it
+    assert schedule.monthly_costs(total_months)["total"] == Decimal("0.00")
+
+
+def test_schedule_matches_item_loop_without_project():
+    rng = random.Random(99)
+    items = make_items(rng, 40)
+    schedule = build_cost_schedule(items, 24)
+    for month_offset in range(24):
+        expected = legacy_monthly_costs(items, month_offset)
+        actual = schedule.monthly_costs(month_offset)
+        assert actual["total"].quantize(CENT) == expected["total"].quantize(CENT)
@@ -0,0 +1,123 @@
+"""
+The incremental portfolio rollup must always equal a full rebuild from
+scenario_cash_flows.
+"""
+from datetime import date
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.compiler import compiles
+
+from app.cash_flow_store import upsert_cash_flows, upsert_cash_flows_batch
+from app.database import Base, SessionLocal, engine
+from app.models import PortfolioCashFlowRollup, ScenarioCashFlow, ScenarioProject
+from app.portfolio_cash_flow import portfolio_rollup_delta, refresh_portfolio_rollup
+
+
+@compiles(JSONB, "sqlite")
+def _jsonb_on_sqlite(element, compiler, **kw):
+    return "JSON"
+
+
+@pytest.fixture
+def db():
+    # Deleting a project cascades through all of its relationships
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine)
+
+
+def make_project(db, name, status="ACTIVE"):
+    project = ScenarioProject(
+        name=name, status=status, start_date=date(2026, 1, 1), end_date=date(2027, 12, 1),
+        discount_rate=Decimal("0.12"), inflation_rate=Decimal("0.03"), contingency_percentage=Decimal("0.10"),
+    )
+    db.add(project)
+    db.commit()
+    return project
+
+
+def vector(first_month, amounts):
+    """Flujo mensual desde (2026, first_month) con (ingresos, egresos) por mes"""
+    rows = []
+    for offset, (ingresos, egresos) in enumerate(amounts):
+        index = 2026 * 12 + first_month - 1 + offset
+        year, month = index // 12, index % 12 + 1
+        values = {
+            column.key: Decimal("0") for column in ScenarioCashFlow.__table__.columns
+            if column.key.startswith(("ingresos", "costos", "flujo", "otros"))
+        }
+        values.update(
+            year=year, month=month, period_label=f"{year}-{month:02d}",
+            total_ingresos=Decimal(ingresos), total_egresos=Decimal(egresos),
+            flujo_neto=Decimal(ingresos) - Decimal(egresos),
+        )
+        rows.append(ScenarioCashFlow(**values))
+    return rows
+
+
+def rollup_rows(db):
+    return {
+        (row.project_status, row.year, row.month): (Decimal(row.total_ingresos), Decimal(row.total_egresos), row.projects_count)
+        for row in db.query(PortfolioCashFlowRollup).all()
+    }
+
+
+def assert_matches_rebuild(db):
+    db.commit()
+    incremental = rollup_rows(db)
+    refresh_portfolio_rollup(db)
+    db.commit()
+    assert incremental == rollup_rows(db)
+    return incremental
+
+
+def test_delta_follows_recalculations_status_changes_and_deletes(db):
+    a = make_project(db, "Torre A")
+    b = make_project(db, "Torre B")
+    c = make_project(db, "Lotes C", status="DRAFT")
+
+    upsert_cash_flows_batch(db, {
+        a.id: vector(1, [("0", "100.10"), ("50", "100.10"), ("75.25", "0")]),
+        b.id: vector(2, [("0", "200"), ("-30", "200"), ("120", "40")]),
+        c.id: vector(3, [("10", "10")]),
+    })
+    rollup = assert_matches_rebuild(db)
+    assert rollup[("ACTIVE", 2026, 2)] == (Decimal("50"), Decimal("300.10"), 2)
+
+    # A shrinks: its third month disappears from the rollup
+    upsert_cash_flows(db, a.id, vector(1, [("0", "90"), ("60", "90")]))
+    rollup = assert_matches_rebuild(db)
+    assert rollup[("ACTIVE", 2026, 3)] == (Decimal("0"), Decimal("200"), 1)
+
+    # B moves to DRAFT: its months leave ACTIVE and join DRAFT
+    with portfolio_rollup_delta(db, [b.id]):
+        b.status = "DRAFT"
+    rollup = assert_matches_rebuild(db)
+    assert rollup[("DRAFT", 2026, 3)] == (Decimal("10"), Decimal("210"), 2)
+    assert ("ACTIVE", 2026, 4) not in rollup
+
+    # C is deleted with its cash flows
+    with portfolio_rollup_delta(db, [c.id]):
+        db.delete(c)
+    rollup = assert_matches_rebuild(db)
+    assert rollup[("DRAFT", 2026, 3)] == (Decimal("0"), Decimal("200"), 1)
+
+
+def test_recalculation_only_touches_its_own_months(db):
+    a = make_project(db, "Torre A")
+    b = make_project(db, "Torre B")
+    upsert_cash_flows_batch(db, {a.id: vector(1, [("0", "10")] * 3), b.id: vector(6, [("5", "0")] * 3)})
+    db.commit()
+    untouched = db.query(PortfolioCashFlowRollup).filter(PortfolioCashFlowRollup.month >= 6).all()
+    stamps = {(row.year, row.month): row.updated_at for row in untouched}
+
+    upsert_cash_flows(db, a.id, vector(1, [("0", "20")] * 3))
+    db.commit()
+
+    assert {(row.year, row.month): row.updated_at for row in db.query(PortfolioCashFlowRollup).filter(PortfolioCashFlowRollup.month >= 6)} == stamps
+    assert_matches_rebuild(db)
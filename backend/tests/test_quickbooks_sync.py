@@ -0,0 +1,255 @@
+"""
+QuickBooks sync against a stub of the query API (httpx.MockTransport):
+STARTPOSITION / MAXRESULTS paging, the queue into batched writes and the
+incremental watermark.
+"""
+import asyncio
+import re
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+from app.database import SessionLocal, engine
+from app.integrations import base
+from app.integrations.base import AccountingSystemType, IntegrationStatus
+from app.integrations.quickbooks import QuickBooksConfig, QuickBooksIntegration
+from app.models import IntegrationAccountingEntry
+
+QUERY_PATTERN = re.compile(
+    r"SELECT \* FROM (?P<entity>\w+)(?: WHERE (?P<where>.+?))? ORDERBY Id "
+    r"STARTPOSITION (?P<start>\d+) MAXRESULTS (?P<max>\d+)$"
+)
+UPDATED_SINCE = re.compile(r"MetaData.LastUpdatedTime >= '(?P<since>[^']+)Z'")
+
+
+def journal_entry(entry_id: int, updated: datetime) -> dict:
+    return {
+        "Id": str(entry_id),
+        "TxnDate": "2026-03-15",
+        "DocNumber": f"JE-{entry_id}",
+        "MetaData": {"LastUpdatedTime": updated.strftime("%Y-%m-%dT%H:%M:%S-00:00")},
+        "Line": [
+            {
+                "Id": "0",
+                "Amount": 100 + entry_id,
+                "Description": "Anticipo contratista",
+                "DetailType": "JournalEntryLineDetail",
+                "JournalEntryLineDetail": {"PostingType": "Debit", "AccountRef": {"value": "61", "name": "Obra"}},
+            },
+            {
+                "Id": "1",
+                "Amount": 100 + entry_id,
+                "Description": "Anticipo contratista",
+                "DetailType": "JournalEntryLineDetail",
+                "JournalEntryLineDetail": {"PostingType": "Credit", "AccountRef": {"value": "35", "name": "Banco"}},
+            },
+        ],
+    }
+
+
+class StubQuickBooks:
+    """Query API en memoria: filtra por LastUpdatedTime y pagina como QuickBooks"""
+
+    def __init__(self, rows: dict):
+        self.rows = rows
+        self.queries = []
+        self.fail_at_start = None
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        query = request.url.params["query"]
+        self.queries.append(query)
+        match = QUERY_PATTERN.match(query)
+        assert match, query
+        start, max_results = int(match["start"]), int(match["max"])
+        if self.fail_at_start == start:
+            return httpx.Response(500, json={"Fault": {"type": "SERVICE"}})
+
+        rows = self.rows.get(match["entity"], [])
+        since = UPDATED_SINCE.search(match["where"] or "")
+        if since:
+            threshold = datetime.fromisoformat(since["since"])
+            rows = [
+                row for row in rows
+                if datetime.fromisoformat(row["MetaData"]["LastUpdatedTime"][:19]) >= threshold
+            ]
+        page = rows[start - 1:start - 1 + max_results]
+        return httpx.Response(200, json={"QueryResponse": {match["entity"]: page}})
+
+    def positions(self, entity: str) -> list:
+        return [
+            (int(match["start"]), int(match["max"]))
+            for match in map(QUERY_PATTERN.match, self.queries)
+            if match["entity"] == entity
+        ]
+
+
+class StubbedQuickBooksIntegration(QuickBooksIntegration):
+    def __init__(self, config: QuickBooksConfig, stub: StubQuickBooks):
+        super().__init__(config)
+        self.stub = stub
+
+    def _client_options(self):
+        return {**super()._client_options(), "transport": httpx.MockTransport(self.stub.handler)}
+
+
+def make_integration(stub: StubQuickBooks, **overrides) -> StubbedQuickBooksIntegration:
+    options = dict(
+        system_type=AccountingSystemType.QUICKBOOKS,
+        name="qb-test",
+        client_id="client",
+        client_secret="secret",
+        redirect_uri="http://localhost/callback",
+        realm_id="4620816365",
+        access_token="token",
+        page_size=3,
+        batch_size=4,
+        queue_size=2,
+    )
+    options.update(overrides)
+    integration = StubbedQuickBooksIntegration(QuickBooksConfig(**options), stub)
+    integration.integration_id = "qb-test"
+    return integration
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+@pytest.fixture(autouse=True)
+def entries_table():
+    table = IntegrationAccountingEntry.__table__
+    table.drop(engine, checkfirst=True)
+    table.create(engine)
+    yield
+    table.drop(engine, checkfirst=True)
+
+
+@pytest.fixture
+def written_batches(monkeypatch):
+    batches = []
+    store_entries_batch = base.store_entries_batch
+
+    def recording_store(integration_id, entries):
+        batches.append(len(entries))
+        return store_entries_batch(integration_id, entries)
+
+    monkeypatch.setattr(base, "store_entries_batch", recording_store)
+    return batches
+
+
+def stored_entries() -> dict:
+    db = SessionLocal()
+    try:
+        return {row.external_id: row for row in db.query(IntegrationAccountingEntry).all()}
+    finally:
+        db.close()
+
+
+def test_query_pages_walks_startposition_until_a_short_page():
+    customers = [{"Id": str(i), "Name": f"Cliente {i}"} for i in range(1, 8)]
+    stub = StubQuickBooks({"Customer": customers})
+    integration = make_integration(stub)
+
+    result = run(integration.get_customers())
+
+    assert [c.external_id for c in result] == [f"qb_{i}" for i in range(1, 8)]
+    assert stub.positions("Customer") == [(1, 3), (4, 3), (7, 3)]
+
+
+def test_query_pages_stops_on_an_empty_page_when_the_last_page_is_full():
+    stub = StubQuickBooks({"Vendor": [{"Id": str(i), "Name": f"Proveedor {i}"} for i in range(1, 7)]})
+    integration = make_integration(stub)
+
+    assert len(run(integration.get_vendors())) == 6
+    assert stub.positions("Vendor") == [(1, 3), (4, 3), (7, 3)]
+
+
+def test_page_size_is_capped_at_the_quickbooks_maximum():
+    stub = StubQuickBooks({"Class": [{"Id": "1", "Name": "Torre A", "Active": True}]})
+    integration = make_integration(stub, page_size=5000)
+
+    run(integration.get_projects())
+
+    assert stub.positions("Class") == [(1, 1000)]
+
+
+def test_sync_streams_pages_into_batched_writes(written_batches):
+    created = datetime(2026, 3, 15, 12, 0, 0)
+    stub = StubQuickBooks({"JournalEntry": [journal_entry(i, created) for i in range(1, 8)]})
+    integration = make_integration(stub)
+
+    result = run(integration.sync_accounting_entries())
+
+    assert result.status == IntegrationStatus.SUCCESS
+    assert (result.total_records, result.successful_records, result.failed_records) == (14, 14, 0)
+    # 7 journal entries of 2 lines, written in batches of batch_size
+    assert written_batches == [4, 4, 4, 2]
+    assert stub.positions("JournalEntry") == [(1, 3), (4, 3), (7, 3)]
+
+    rows = stored_entries()
+    assert len(rows) == 14
+    assert rows["qb_7_0"].debit_amount == 107
+    assert rows["qb_7_1"].credit_amount == 107
+    assert rows["qb_7_1"].external_updated_at == created
+
+
+def test_incremental_sync_requests_changes_since_the_watermark(written_batches):
+    created = datetime(2026, 3, 15, 12, 0, 0)
+    stub = StubQuickBooks({"JournalEntry": [journal_entry(i, created) for i in range(1, 5)]})
+    integration = make_integration(stub)
+
+    before = datetime.utcnow().replace(microsecond=0)
+    run(integration.sync_accounting_entries())
+    watermark = integration.config.last_sync
+    assert watermark is not None and watermark >= before
+    assert "LastUpdatedTime" not in stub.queries[0]
+
+    # Entry 2 changes after the first sync; only it comes back
+    changed = journal_entry(2, watermark + timedelta(minutes=5))
+    changed["Line"][0]["Amount"] = changed["Line"][1]["Amount"] = 250
+    stub.rows["JournalEntry"][1] = changed
+    stub.queries.clear()
+    written_batches.clear()
+
+    result = run(integration.sync_accounting_entries())
+
+    expected_since = f"MetaData.LastUpdatedTime >= '{watermark.replace(microsecond=0).isoformat()}Z'"
+    assert all(expected_since in query for query in stub.queries)
+    assert result.successful_records == 2
+    assert written_batches == [2]
+    assert integration.config.last_sync > watermark
+
+    rows = stored_entries()
+    # Upserted in place, not duplicated
+    assert len(rows) == 8
+    assert rows["qb_2_0"].debit_amount == 250
+
+
+def test_failed_page_keeps_the_watermark(written_batches):
+    created = datetime(2026, 3, 15, 12, 0, 0)
+    stub = StubQuickBooks({"JournalEntry": [journal_entry(i, created) for i in range(1, 8)]})
+    stub.fail_at_start = 4
+    integration = make_integration(stub)
+
+    result = run(integration.sync_accounting_entries())
+
+    assert result.status == IntegrationStatus.PARTIAL
+    assert result.successful_records == 6
+    assert result.errors
+    assert integration.config.last_sync is None
+
+
+def test_date_range_sync_leaves_the_watermark_alone(written_batches):
+    stub = StubQuickBooks({"JournalEntry": [journal_entry(1, datetime(2026, 3, 15, 12, 0, 0))]})
+    last_sync = datetime(2026, 3, 1, 8, 30, 0)
+    integration = make_integration(stub, last_sync=last_sync)
+
+    result = run(integration.sync_accounting_entries(
+        start_date=datetime(2026, 3, 1).date(), end_date=datetime(2026, 3, 31).date()
+    ))
+
+    assert result.status == IntegrationStatus.SUCCESS
+    assert "TxnDate >= '2026-03-01' AND TxnDate <= '2026-03-31'" in stub.queries[0]
+    assert "LastUpdatedTime" not in stub.queries[0]
+    assert integration.config.last_sync == last_sync
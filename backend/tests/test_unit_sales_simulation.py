@@ -0,0 +1,36 @@
+"""
+Sale months of the unit schedule are 1-based.
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.unit_sales_simulation import DELIVERY_LAG_MONTHS, UnitArrays, UnitScheduleError, _month_matrix
+
+UNITS = [
+    SimpleNamespace(id=10, unit_number="A-101", target_price_total=150000),
+    SimpleNamespace(id=11, unit_number="A-102", target_price_total=175000),
+    SimpleNamespace(id=12, unit_number="A-103", target_price_total=0),
+]
+
+
+def test_schedule_places_each_sale_in_its_month():
+    arrays = UnitArrays.from_schedule(UNITS, {"10": 1, "11": 3, "12": 2})
+
+    assert arrays.unit_ids.tolist() == [10, 11]
+    matrix = _month_matrix(arrays.sale_months, arrays.horizon_months)
+    assert matrix[:, 0].tolist() == [1.0, 0.0]
+    assert matrix[:, 2].tolist() == [0.0, 1.0]
+    assert arrays.horizon_months == 3 + DELIVERY_LAG_MONTHS
+
+
+@pytest.mark.parametrize("sale_month", [0, -2])
+def test_schedule_rejects_months_before_the_first(sale_month):
+    with pytest.raises(UnitScheduleError, match="A-102"):
+        UnitArrays.from_schedule(UNITS, {"10": 1, "11": sale_month})
+
+
+def test_unpriced_units_are_skipped_before_the_month_check():
+    arrays = UnitArrays.from_schedule(UNITS, {"10": 2, "12": 0})
+    assert np.array_equal(arrays.sale_months, [2])
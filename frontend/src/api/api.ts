@@ -1009,12 +1009,24 @@ export interface SalesProjection {
   created_at: string;
 }
 
+export interface SalesProjectionImpactSummary {
+  total_revenue: number;
+  total_units: number;
+  project_duration_months: number;
+}
+
 export interface SalesProjectionWithImpact extends SalesProjection {
-  impact_summary?: {
-    total_revenue: number;
-    total_units: number;
-    project_duration_months: number;
-  };
+  impact_summary?: SalesProjectionImpactSummary;
+}
+
+// Listing entry: the list endpoint leaves out monthly_revenue and payment_flows
+export interface SalesProjectionSummary {
+  id: number;
+  scenario_project_id: number;
+  scenario_name: string;
+  is_active: boolean;
+  created_at: string;
+  impact_summary?: SalesProjectionImpactSummary | null;
 }
 
 export interface CashFlowWithProjections {
@@ -1138,6 +1150,10 @@ export const unitSalesSimulations = {
   simulateUnitSalesWithPaymentDistribution: (projectId: number, request: UnitSalesSimulationRequest) =>
     api.post<UnitSalesSimulationResponse>(`/api/scenario-projects/${projectId}/simulate-unit-sales`, request),
 
+  // Persist the three simulated scenarios as (inactive) sales projections in one transaction
+  saveSimulatedScenarios: (projectId: number, request: UnitSalesSimulationRequest) =>
+    api.post(`/api/scenario-projects/${projectId}/simulate-unit-sales/save`, request),
+
   // Get sales calendar view
   getSalesCalendar: (projectId: number, year?: number) =>
     api.get(`/api/scenarios/projects/${projectId}/units/sales-calendar`, { 
@@ -1149,7 +1165,7 @@ export const unitSalesSimulations = {
 export const salesProjections = {
   // Get all sales projections for a project
   getProjections: (projectId: number) =>
-    api.get<SalesProjectionWithImpact[]>(`/api/scenario-projects/${projectId}/sales-projections`),
+    api.get<SalesProjectionSummary[]>(`/api/scenario-projects/${projectId}/sales-projections`),
 
   // Get the active projection for a project
   getActiveProjection: (projectId: number) =>
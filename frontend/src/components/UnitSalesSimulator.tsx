@@ -54,7 +54,7 @@ import type {
   PaymentDistributionConfig,
   UnitSalesPaymentFlow,
 } from '../types/projectUnitsTypes';
-import type { SalesProjectionWithImpact } from '../api/api';
+import type { SalesProjectionSummary } from '../api/api';
 import { formatCurrency, formatNumber } from '../utils/formatters';
 
 // Utility function to get scenario color
@@ -428,7 +428,7 @@ interface ScenarioManagerProps {
 }
 
 const ScenarioManager: React.FC<ScenarioManagerProps> = ({ projectId, onScenarioActivated }) => {
-  const [projections, setProjections] = useState<SalesProjectionWithImpact[]>([]);
+  const [projections, setProjections] = useState<SalesProjectionSummary[]>([]);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
 
@@ -642,6 +642,8 @@ const UnitSalesSimulator: React.FC<UnitSalesSimulatorProps> = ({ units, projectI
   const [conservativeScenario, setConservativeScenario] = useState<UnitSalesScenarioConfig | null>(null);
   const [paymentDistribution, setPaymentDistribution] = useState<PaymentDistributionConfig | null>(null);
   const [useAdvancedSimulation, setUseAdvancedSimulation] = useState(true);
+  const [lastRequest, setLastRequest] = useState<UnitSalesSimulationRequest | null>(null);
+  const [saving, setSaving] = useState(false);
 
   // Remove useEffect that loads units
   // useEffect(() => {
@@ -674,9 +676,7 @@ const UnitSalesSimulator: React.FC<UnitSalesSimulatorProps> = ({ units, projectI
       
       setSimulationResultsLocal(response.data); // Update parent
       setSimulationResults(response.data); // Update local state
-      
-      // Force scenario manager to reload after simulation
-      setScenarioManagerKey(prev => prev + 1);
+      setLastRequest(request);
     } catch (err: any) {
       setError(err.response?.data?.detail || 'Error al ejecutar la simulación');
       console.error('Error running simulation:', err);
@@ -685,6 +685,26 @@ const UnitSalesSimulator: React.FC<UnitSalesSimulatorProps> = ({ units, projectI
     }
   };
 
+  const saveScenarios = async () => {
+    if (!lastRequest) return;
+
+    try {
+      setSaving(true);
+      setError(null);
+
+      // The simulation is seeded, so the same request saves exactly the displayed flows
+      await unitSalesSimulations.saveSimulatedScenarios(Number(projectId), lastRequest);
+
+      // Force scenario manager to reload after saving
+      setScenarioManagerKey(prev => prev + 1);
+    } catch (err: any) {
+      setError(err.response?.data?.detail || 'Error al guardar los escenarios');
+      console.error('Error saving scenarios:', err);
+    } finally {
+      setSaving(false);
+    }
+  };
+
   if (units.length === 0 && !loading) {
     return (
       <Box p={3} textAlign="center">
@@ -729,6 +749,14 @@ const UnitSalesSimulator: React.FC<UnitSalesSimulatorProps> = ({ units, projectI
           >
             {loading ? 'Simulando...' : 'Ejecutar Simulación'}
           </Button>
+          <Button
+            colorScheme="green"
+            variant="outline"
+            onClick={saveScenarios}
+            isDisabled={saving || loading || !lastRequest}
+          >
+            {saving ? 'Guardando...' : 'Guardar Escenarios'}
+          </Button>
         </HStack>
       </HStack>
 
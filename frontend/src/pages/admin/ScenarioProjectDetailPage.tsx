@@ -117,6 +117,7 @@ interface ScenarioProject {
   inflation_rate: number;
   contingency_percentage: number;
   payment_distribution_config?: PaymentDistributionConfig;
+  use_stage_costs?: boolean;
   cost_items: ScenarioCostItem[];
   units: ProjectUnit[];
   credit_lines: LineaCreditoProyecto[];
@@ -135,6 +135,8 @@ export interface UnitSalesSimulationRequest {
   realistic_scenario: UnitSalesScenarioConfig;
   conservative_scenario: UnitSalesScenarioConfig;
   payment_distribution?: PaymentDistributionConfig | null;
+  seed?: number | null;
+  save_projections?: boolean;
 }
 
 export interface UnitSalesScenarioMetrics {
@@ -223,6 +225,12 @@ export interface ExcelUploadResponse {
     target_price_total?: number | null;
   }>;
   errors: string[];
+  row_errors?: Array<{
+    row: number;
+    unit_number: string | null;
+    field: string | null;
+    error: string;
+  }>;
   summary: {
     total_rows: number;
     created_count: number;